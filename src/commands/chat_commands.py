@@ -10,15 +10,17 @@ import src.stats.utils as stats_utils
 from src.config.assets import Assets
 from src.config.constants import MAX_CWEL_USAGE_DAILY, MAX_NICKNAMES_NUM, MAX_USERNAME_LENGTH, TIMEZONE
 from src.config.enums import ArgType, ChartType, EmojiType, ErrorMessage, MessageType, Table
-from src.config.paths import CHAT_VIDEO_NOTES_DIR_PATH, USERS_PATH
+from src.config.paths import CHAT_VIDEO_NOTES_DIR_PATH
 from src.core.client_api_handler import BOT_ID
 from src.core.command_logger import CommandLogger
 from src.core.job_persistance import JobPersistance
 from src.models.bot_state import BotState
 from src.models.command_args import CommandArgs
 from src.models.db.db import DB
+from src.models.users import Users
 from src.models.youtube_download import YoutubeDownload
 from src.stats import charts
+from src.stats.message_features import ensure_message_features, get_text_filter, local_day_to_period
 from src.stats.word_stats import WordStats
 
 pd.options.mode.chained_assignment = None
@@ -28,15 +30,28 @@ pd.set_option("display.width", 1000)
 log = logging.getLogger(__name__)
 
 
+def merge_updated_rows(df: pd.DataFrame, message_ids: set[int], updated_df: pd.DataFrame) -> pd.DataFrame:
+    """Replace the rows of the updated message ids with their updated rows, a message missing from updated_df was deleted."""
+    return pd.concat([df[~df["message_id"].isin(message_ids)], updated_df], ignore_index=True)
+
+
 class ChatCommands:
-    def __init__(self, command_logger: CommandLogger, job_persistance: JobPersistance, bot_state: BotState, db: DB, assets: Assets):
+    def __init__(
+        self,
+        command_logger: CommandLogger,
+        job_persistance: JobPersistance,
+        bot_state: BotState,
+        db: DB,
+        assets: Assets,
+        users: Users | None = None,
+    ):
         self.db = db
         self.assets = assets
-        self.users_df = self.db.load_table(Table.USERS)
-        self.users_map = stats_utils.get_users_map(self.users_df)
-        self.chat_df = self.db.load_table(Table.CLEANED_CHAT_HISTORY)
+        self.users = users if users is not None else Users(self.db)
+        self.chat_df = ensure_message_features(self.db.load_table(Table.CLEANED_CHAT_HISTORY))
         self.reactions_df = self.db.load_table(Table.REACTIONS)
         self.cwel_stats_df = self.db.load_table(Table.CWEL)
+        self.topic_dfs: dict[int, tuple[pd.DataFrame, pd.DataFrame]] = {}  # chat and reactions partitioned by topic, see get_dfs
 
         self.word_stats = WordStats(self.db, self.assets)
         self.command_logger = command_logger
@@ -46,6 +61,14 @@ class ChatCommands:
 
         self.run_update_job()
 
+    @property
+    def users_df(self):
+        return self.users.df
+
+    @property
+    def users_map(self):
+        return self.users.map
+
     def run_update_job(self):
         self.job_persistance.job_queue.run_repeating(
             callback=lambda context: asyncio.ensure_future(self.update()), interval=60, name="Chat commands update job"
@@ -56,43 +79,66 @@ class ChatCommands:
 
         Reads only the message IDs that ChatETL recorded since the last call,
         fetches those rows, and merges them into self.chat_df / self.reactions_df.
-        Returns immediately if nothing changed.
+        The shared users are reloaded only if their version changed. Returns immediately if nothing changed.
         """
+        await asyncio.to_thread(self.users.refresh)
         message_ids = await asyncio.to_thread(self.db.pop_updated_message_ids)
         if not message_ids:
             return
 
         log.info(f"Incremental update: {len(message_ids)} changed message IDs.")
 
-        new_chat, new_reactions, users = await asyncio.gather(
+        new_chat, new_reactions = await asyncio.gather(
             asyncio.to_thread(self.db.load_rows_by_message_ids, Table.CLEANED_CHAT_HISTORY, message_ids),
             asyncio.to_thread(self.db.load_rows_by_message_ids, Table.REACTIONS, message_ids),
-            asyncio.to_thread(self.db.load_table, Table.USERS),
         )
 
         id_set = set(message_ids)
-        self.chat_df = pd.concat([self.chat_df[~self.chat_df["message_id"].isin(id_set)], new_chat], ignore_index=True)
-        self.reactions_df = pd.concat([self.reactions_df[~self.reactions_df["message_id"].isin(id_set)], new_reactions], ignore_index=True)
-        self.users_df = users
+        self.chat_df = merge_updated_rows(self.chat_df, id_set, new_chat)
+        self.reactions_df = merge_updated_rows(self.reactions_df, id_set, new_reactions)
+        for topic_id, (topic_chat_df, topic_reactions_df) in self.topic_dfs.items():
+            new_topic_chat = new_chat[new_chat["topic_id"] == topic_id]
+            new_topic_reactions = new_reactions[new_reactions["message_id"].isin(new_topic_chat["message_id"])]
+            self.topic_dfs[topic_id] = (
+                merge_updated_rows(topic_chat_df, id_set, new_topic_chat),
+                merge_updated_rows(topic_reactions_df, id_set, new_topic_reactions),
+            )
         self.word_stats = WordStats(self.db, self.assets)
 
         log.info("Incremental update finished.")
 
-    def preprocess_input(self, command_args, emoji_type: EmojiType = EmojiType.ALL):
+    def get_dfs(self, topic_id: int | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """The chat and reactions of a forum topic, or of the whole chat if topic_id is None.
+
+        A topic is partitioned out of the full frames on its first use and then kept up to date by update(), so commands for a topic don't
+        filter the whole chat history on every call.
+        """
+        if topic_id is None:
+            return self.chat_df, self.reactions_df
+        if topic_id not in self.topic_dfs:
+            topic_chat_df = self.chat_df[self.chat_df["topic_id"] == topic_id]
+            topic_reactions_df = self.reactions_df[self.reactions_df["message_id"].isin(topic_chat_df["message_id"])]
+            self.topic_dfs[topic_id] = (topic_chat_df, topic_reactions_df)
+        return self.topic_dfs[topic_id]
+
+    def preprocess_input(self, command_args, emoji_type: EmojiType = EmojiType.ALL, update: Update | None = None):
+        """Parse the args and filter the chat and reactions by them, pass the update for commands taking the topic named arg."""
         # self.update()
 
         command_args = core_utils.parse_args(self.users_df, command_args)
         if command_args.error != "":
             return self.chat_df, self.reactions_df, command_args
+        if update is not None:
+            core_utils.set_topic_arg(update, command_args)
 
-        filtered_chat_df = stats_utils.filter_by_time_df(self.chat_df, command_args)
-        filtered_reactions_df = stats_utils.filter_by_time_df(self.reactions_df, command_args)
+        chat_df, reactions_df = self.get_dfs(command_args.topic_id)
+        filtered_chat_df = stats_utils.filter_by_time_df(chat_df, command_args)
+        filtered_reactions_df = stats_utils.filter_by_time_df(reactions_df, command_args)
 
         filtered_chat_df = stats_utils.filter_emojis_by_emoji_type(filtered_chat_df, emoji_type, "reaction_emojis")
 
-        filtered_chat_df["reactions_num"] = filtered_chat_df["reaction_emojis"].apply(lambda x: len(x))
+        filtered_chat_df["reactions_num"] = filtered_chat_df["reaction_emojis"].str.len()
         filtered_chat_df = filtered_chat_df.sort_values(["reactions_num", "timestamp"], ascending=[False, True])
-        filtered_chat_df["timestamp"] = filtered_chat_df["timestamp"].dt.tz_convert(TIMEZONE)
 
         if command_args.user is not None:
             filtered_chat_df = filtered_chat_df[filtered_chat_df["final_username"] == command_args.user]
@@ -107,13 +153,14 @@ class ChatCommands:
             args=context.args,
             expected_args=[ArgType.USER, ArgType.PERIOD],
             optional=[True, True],
-            available_named_args={"num": ArgType.POSITIVE_INT},
+            available_named_args={"num": ArgType.POSITIVE_INT, "topic": ArgType.NONE},
         )
-        chat_df, reactions_df, command_args = self.preprocess_input(command_args, EmojiType.ALL)
+        chat_df, reactions_df, command_args = self.preprocess_input(command_args, EmojiType.ALL, update)
         display_count = command_args.named_args["num"] if "num" in command_args.named_args else 3
 
-        shifted_chat_df = stats_utils.filter_by_shifted_time_df(self.chat_df, command_args)
-        shifted_reactions_df = stats_utils.filter_by_shifted_time_df(self.reactions_df, command_args)
+        all_chat_df, all_reactions_df = self.get_dfs(command_args.topic_id)
+        shifted_chat_df = stats_utils.filter_by_shifted_time_df(all_chat_df, command_args)
+        shifted_reactions_df = stats_utils.filter_by_shifted_time_df(all_reactions_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -136,9 +183,6 @@ class ChatCommands:
             sad_reactions_df.groupby("reacting_username").size().reset_index(name="count").sort_values("count", ascending=False)
         )
 
-        chat_df["word_count"] = chat_df["text"].apply(lambda x: len(str(x).split()))
-        chat_df["word_length"] = chat_df["text"].apply(lambda x: stats_utils.text_to_word_length_sum(x))
-
         user_stats = (
             chat_df.groupby("final_username")
             .agg(word_count=("word_count", "sum"), word_length=("word_length", "sum"), message_count=("text", "size"))
@@ -240,8 +284,12 @@ class ChatCommands:
         chat_df = chat_df[(chat_df["text"] != "") & (chat_df["text"].notna())]
 
         if "text" in command_args.named_args:
-            filter_phrase = command_args.named_args["text"].lower()
-            chat_df = chat_df[chat_df["text"].str.lower().str.contains(filter_phrase)]
+            column, filter_phrase, flags = get_text_filter(command_args.named_args["text"])
+            text_mask, error = await core_utils.regex_mask_async(chat_df[column], filter_phrase, flags)
+            if error != "":
+                await core_utils.send_message(update, context, MessageType.TEXT, error)
+                return
+            chat_df = chat_df[text_mask]
 
         label = stats_utils.emoji_sentiment_to_label(emoji_type)
         text = core_utils.generate_response_headline(command_args, label=f"{label} Cinco messages")
@@ -282,7 +330,11 @@ class ChatCommands:
 
         if "text" in command_args.named_args and message_type == MessageType.IMAGE:
             filter_text_lower = command_args.named_args["text"].lower()
-            chat_df = chat_df[chat_df["image_text"].str.lower().str.contains(filter_text_lower)]
+            image_text_mask, error = await core_utils.regex_mask_async(chat_df["image_text"].str.lower(), filter_text_lower)
+            if error != "":
+                await core_utils.send_message(update, context, MessageType.TEXT, error)
+                return
+            chat_df = chat_df[image_text_mask]
 
         chat_df = chat_df.sort_values(["reactions_num", "timestamp"], ascending=[False, True])
 
@@ -350,10 +402,7 @@ class ChatCommands:
             await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, error)
             return
 
-        self.users_df.at[user_id, "nicknames"] = [new_nickname] if len(current_nicknames) == 0 else current_nicknames + [new_nickname]
-        core_utils.save_df(self.users_df, USERS_PATH)
-
-        current_nicknames = self.users_df.at[user_id, "nicknames"]
+        current_nicknames = self.users.add_nickname(user_id, new_nickname)
         text = f"Nickname *{new_nickname}* added for *{current_username}*. Resulting in the following nicknames: *{', '.join(current_nicknames)}*. It will get updated in a few minutes."
         message = stats_utils.escape_special_characters(text)
         await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, message)
@@ -475,7 +524,7 @@ class ChatCommands:
         if command_args.user is None:
             users = self.users_df["final_username"].unique()
 
-        chat_df["period"] = chat_df["timestamp"].dt.to_period("D")
+        chat_df["period"] = local_day_to_period(chat_df["local_day"])
         message_counts = (
             chat_df.groupby(["period", "final_username"]).size().unstack(fill_value=0).stack().reset_index(name="message_count")
         )
@@ -611,21 +660,30 @@ class ChatCommands:
         await core_utils.send_message(update, context, current_message_type, text, path)
 
     async def cmd_relationship_graph(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_args = CommandArgs(args=context.args, expected_args=[ArgType.USER, ArgType.PERIOD], optional=[True, True])
+        command_args = CommandArgs(
+            args=context.args,
+            expected_args=[ArgType.USER, ArgType.PERIOD],
+            optional=[True, True],
+            available_named_args={"replies": ArgType.NONE, "topic": ArgType.NONE},
+        )
 
-        chat_df, reactions_df, command_args = self.preprocess_input(command_args, EmojiType.ALL)
+        chat_df, reactions_df, command_args = self.preprocess_input(command_args, EmojiType.ALL, update)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
 
-        if reactions_df.empty:
+        if "replies" in command_args.named_args:
+            edges_df = self.calculate_replies(chat_df, self.get_dfs(command_args.topic_id)[0])
+            col_1, col_2, label = "replying_username", "replied_to_username", "Reply Graph"
+        else:
+            edges_df, col_1, col_2, label = reactions_df, "reacting_username", "reacted_to_username", "Relationship Graph"
+
+        if edges_df.empty:
             await core_utils.send_message(update, context, MessageType.TEXT, ErrorMessage.NO_DATA_FOR_PERIOD)
             return
 
-        text = core_utils.generate_response_headline(command_args, label="Relationship Graph")
-        path = charts.create_bidirectional_relationship_graph(
-            reactions_df, "reacting_username", "reacted_to_username", "Relationship Network"
-        )
+        text = core_utils.generate_response_headline(command_args, label=label)
+        path = charts.create_bidirectional_relationship_graph(edges_df, col_1, col_2, "Relationship Network")
         current_message_type = MessageType.IMAGE
         await core_utils.send_message(update, context, current_message_type, text, path)
 
@@ -730,13 +788,15 @@ class ChatCommands:
                 "diacritical": ArgType.NONE,
                 "adjusted": ArgType.NONE,
                 "user": ArgType.NONE,
+                "topic": ArgType.NONE,
             },
             min_number=1,
             max_number=6,
             max_string_length=1000,
         )
         command_args = core_utils.parse_args(self.users_df, command_args)
-        filtered_ngram_dfs = self.word_stats.filter_ngrams(command_args)
+        core_utils.set_topic_arg(update, command_args)
+        filtered_ngram_dfs = await asyncio.to_thread(self.word_stats.filter_ngrams, command_args)
 
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
@@ -756,7 +816,7 @@ class ChatCommands:
             n = command_args.named_args["ngram"]
             filtered_ngram_dfs = {n: filtered_ngram_dfs[command_args.named_args["ngram"]]}
 
-        text = self.word_stats.wordstats_cmd_handler(filtered_ngram_dfs, command_args, text_filter)
+        text = await asyncio.to_thread(self.word_stats.wordstats_cmd_handler, filtered_ngram_dfs, command_args, text_filter)
         await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, text)
 
     def calculate_fun_metric(self, chat_df, reactions_df):
@@ -772,11 +832,18 @@ class ChatCommands:
 
         return fun_ratios
 
+    def calculate_replies(self, chat_df, replied_chat_df) -> pd.DataFrame:
+        """Replies of the chat_df messages as (replying_username, replied_to_username) rows, replied messages are looked up in replied_chat_df."""
+        replies_df = chat_df.loc[chat_df["reply_to_msg_id"].notna(), ["final_username", "reply_to_msg_id"]]
+        replies_df = replies_df.astype({"reply_to_msg_id": "int64"}).rename(columns={"final_username": "replying_username"})
+        replied_df = replied_chat_df[["message_id", "final_username"]].rename(columns={"final_username": "replied_to_username"})
+        replies_df = replies_df.merge(replied_df, left_on="reply_to_msg_id", right_on="message_id", how="inner")
+        return replies_df[["replying_username", "replied_to_username"]]
+
     def calculate_monologue_index_metric_periodized(self, chat_df, frequency="D"):
-        chat_df["period"] = chat_df["timestamp"].dt.to_period(frequency)
+        chat_df["period"] = local_day_to_period(chat_df["local_day"]) if frequency == "D" else chat_df["timestamp"].dt.to_period(frequency)
         chat_df = chat_df.sort_values("timestamp")
 
-        chat_df["word_count"] = chat_df["text"].apply(lambda x: len(str(x).split()))
         user_stats = (
             chat_df.groupby(["period", "final_username"])
             .agg(word_count=("word_count", "sum"), message_count=("text", "size"))
@@ -840,28 +907,35 @@ class ChatCommands:
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
 
+        if "full" in command_args.named_args:
+            async with self.ytdl.use_audio(command_args.string) as (audio_path, error):
+                if error != "":
+                    await core_utils.send_message(update, context, MessageType.TEXT, error)
+                    return
+                await core_utils.send_message(update, context, MessageType.VOICE, "", audio_path)
+            return
+
         start_time = command_args.named_args.get("start_time", 0)
-        duration = command_args.named_args.get("duration", 1000000)
+        duration = command_args.named_args.get("duration")
+        async with self.ytdl.use_audio(command_args.string, start_time, duration) as (audio_path, error):
+            if error != "":
+                await core_utils.send_message(update, context, MessageType.TEXT, error)
+                return
+
+            reply_message_id = update.message.reply_to_message.message_id if update.message.reply_to_message is not None else None
+            reply_message_type = self.get_reply_message_type(reply_message_id)
+            if reply_message_type is not None and reply_message_type in [MessageType.VIDEO, MessageType.VIDEO_NOTE, MessageType.GIF]:
+                video_path = core_utils.message_id_to_path(reply_message_id, reply_message_type)
+                message_type = MessageType.VIDEO if reply_message_type in [MessageType.VIDEO, MessageType.GIF] else MessageType.VIDEO_NOTE
+            else:
+                video_path = stats_utils.get_random_media_path(CHAT_VIDEO_NOTES_DIR_PATH)
+                message_type = MessageType.VIDEO_NOTE
+            output_path, error = await self.ytdl.swap_video_audio(video_path, audio_path)
 
-        audio_path, error = self.ytdl.download(command_args.string)
         if error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, error)
             return
 
-        if "full" in command_args.named_args:
-            await core_utils.send_message(update, context, MessageType.VOICE, "", audio_path)
-            return
-
-        reply_message_id = update.message.reply_to_message.message_id if update.message.reply_to_message is not None else None
-        reply_message_type = self.get_reply_message_type(reply_message_id)
-        if reply_message_type is not None and reply_message_type in [MessageType.VIDEO, MessageType.VIDEO_NOTE, MessageType.GIF]:
-            video_path = core_utils.message_id_to_path(reply_message_id, reply_message_type)
-            message_type = MessageType.VIDEO if reply_message_type in [MessageType.VIDEO, MessageType.GIF] else MessageType.VIDEO_NOTE
-        else:
-            video_path = stats_utils.get_random_media_path(CHAT_VIDEO_NOTES_DIR_PATH)
-            message_type = MessageType.VIDEO_NOTE
-        output_path = self.ytdl.swap_video_audio(video_path, audio_path, start_time=start_time, duration=duration)
-
         await core_utils.send_message(update, context, message_type, "", output_path)
 
     def get_reply_message_type(self, reply_message_id):
@@ -1,6 +1,6 @@
 import asyncio
-import copy
 import logging
+import random
 
 import telegram
 from telegram import InlineKeyboardButton, Update
@@ -15,6 +15,7 @@ from src.config.constants import (
     FLAG_QUIZ_TIMEOUT_SECONDS,
     MAP_QUIZ_TIMEOUT_SECONDS,
     MIN_QUIZ_TIME_TO_ANSWER_SECONDS,
+    QUIZ_POOL_COLUMNS,
     TOURNAMENT_BET_TIMEOUT_SECONDS,
     TOURNAMENT_DEFAULT_ROUNDS,
     TOURNAMENT_JOIN_TIMEOUT_SECONDS,
@@ -28,12 +29,12 @@ from src.config.enums import (
     ArgType,
     CreditActionType,
     MessageType,
-    Table,
     TournamentState,
     TournamentType,
 )
 from src.core.command_logger import CommandLogger
 from src.core.job_persistance import JobPersistance
+from src.core.message_router import ANY_USER
 from src.models.bot_state import BotState
 from src.models.command_args import CommandArgs
 from src.models.credits import Credits
@@ -44,6 +45,7 @@ from src.models.map_quiz import MapQuiz
 from src.models.quiz_model import QuizModel
 from src.models.roulette import Roulette
 from src.models.roulette_tournament import RouletteTournament
+from src.models.users import Users
 from src.stats import charts
 
 log = logging.getLogger(__name__)
@@ -51,7 +53,14 @@ log = logging.getLogger(__name__)
 
 class CreditCommands:
     def __init__(
-        self, command_logger: CommandLogger, job_persistance: JobPersistance, bot_state: BotState, credits: Credits, db: DB, assets: Assets
+        self,
+        command_logger: CommandLogger,
+        job_persistance: JobPersistance,
+        bot_state: BotState,
+        credits: Credits,
+        db: DB,
+        assets: Assets,
+        users: Users | None = None,
     ):
         self.command_logger = command_logger
         self.job_persistance = job_persistance
@@ -59,8 +68,7 @@ class CreditCommands:
         self.credits = credits
         self.db = db
         self.assets = assets
-        self.users_df = self.db.load_table(Table.USERS)
-        self.users_map = stats_utils.get_users_map(self.users_df)
+        self.users = users if users is not None else Users(self.db)
         self.roulette = Roulette(self.credits)
         self.event_manager = EventManager()
 
@@ -71,9 +79,17 @@ class CreditCommands:
         for event in QUIZ_EVENTS:
             self.event_manager.add_event("quiz", event)
 
-        bot_state.init_quiz_map(self.users_df)
+        bot_state.init_quiz_tracker(self.db)
         self.active_tournaments: dict[int, RouletteTournament] = {}
 
+    @property
+    def users_df(self):
+        return self.users.df
+
+    @property
+    def users_map(self):
+        return self.users.map
+
     async def cmd_get_credits(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         can_get_credits = self.bot_state.update_get_credits_limits(user_id)
@@ -223,26 +239,22 @@ class CreditCommands:
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
 
-        filtered_quiz_df = copy.deepcopy(self.assets.quiz_df)
-        if "category" in command_args.named_args:
-            filtered_quiz_df = filtered_quiz_df[filtered_quiz_df["category"].str.contains(command_args.named_args["category"], case=False)]
-        if "difficulty" in command_args.named_args:
-            filtered_quiz_df = filtered_quiz_df[filtered_quiz_df["difficulty"].str.contains(command_args.named_args["difficulty"])]
-        if "type" in command_args.named_args:
-            filtered_quiz_df = filtered_quiz_df[filtered_quiz_df["type"].str.contains(command_args.named_args["type"])]
-
-        if filtered_quiz_df.empty:
+        quiz_pool = self.assets.quiz_pools.get_pool(
+            **{column: self.assets.quiz_pools.match_values(column, command_args.named_args.get(column)) for column in QUIZ_POOL_COLUMNS}
+        )
+        if len(quiz_pool) == 0:
             message = "No questions in database with these parameters. :["
             await core_utils.send_message(update, context, MessageType.TEXT, message)
             return
 
-        random_quiz_id = self.bot_state.get_random_quiz_id(filtered_quiz_df, update.effective_user.id)
-        if random_quiz_id == -1:
+        quiz_position = self.bot_state.quiz_tracker.draw(update.effective_user.id, quiz_pool.positions)
+        if quiz_position == -1:
             message = "There are questions in the database with these parameters, but you have already answered them."
             await core_utils.send_message(update, context, MessageType.TEXT, message)
             return
 
-        random_quiz = filtered_quiz_df[filtered_quiz_df["quiz_id"] == random_quiz_id].iloc[0]
+        random_quiz = self.assets.quiz_pools.records[quiz_position]
+        random_quiz_id = random_quiz["quiz_id"]
         buttons = []
         for answer in random_quiz["answers"]:
             buttons.append(InlineKeyboardButton(answer, callback_data=answer))
@@ -339,23 +351,17 @@ class CreditCommands:
             await core_utils.send_message(update, context, MessageType.TEXT, message)
             return
 
-        famous_people_trivia_df = copy.deepcopy(self.assets.famous_people_trivia_df)
-        if "category" in command_args.named_args:
-            filtered_df = famous_people_trivia_df[
-                famous_people_trivia_df["category"].str.contains(command_args.named_args["category"], case=False)
-            ]
-        else:
-            filtered_df = famous_people_trivia_df
-
-        available_difficulties = []
-        for diff, (start_idx, end_idx) in MapQuiz.DIFFICULTY_INDEX_RANGES.items():
-            if not filtered_df[(filtered_df.index >= start_idx) & (filtered_df.index < end_idx)].empty:
-                available_difficulties.append(diff)
+        people_pools = self.assets.famous_people_pools
+        categories = people_pools.match_values("category", command_args.named_args.get("category"))
+        available_difficulties = [
+            diff
+            for diff in MapQuiz.DIFFICULTY_INDEX_RANGES
+            if len(people_pools.get_pool(category=categories, difficulty=frozenset([diff]))) > 0
+        ]
 
         if not available_difficulties:
             if "category" in command_args.named_args:
-                categories = sorted(famous_people_trivia_df["category"].dropna().unique().tolist())
-                cats_str = ", ".join(categories)
+                cats_str = ", ".join(people_pools.values["category"])
                 message = f"No persons found for the specified category.\nAvailable categories:\n{cats_str}"
             else:
                 message = "No persons found."
@@ -374,15 +380,10 @@ class CreditCommands:
                 return
             chosen_diff = difficulty
         else:
-            import random
-
             chosen_diff = random.choice(available_difficulties)
 
-        start_idx, end_idx = MapQuiz.DIFFICULTY_INDEX_RANGES[chosen_diff]
-        filtered_df = filtered_df[(filtered_df.index >= start_idx) & (filtered_df.index < end_idx)]
-
-        map_quiz = MapQuiz()
-        image_path, person = map_quiz.guess_random_person_on_map(filtered_df)
+        person = people_pools.pop(category=categories, difficulty=frozenset([chosen_diff]))
+        image_path = MapQuiz().get_image_path(person)
 
         reward, _ = MapQuiz.get_reward(chosen_diff, "category" in command_args.named_args, 0)
         caption = (
@@ -397,12 +398,16 @@ class CreditCommands:
             "chat_id": update.effective_chat.id,
             "thread_id": update.message.message_thread_id,
             "person": person,
+            "answer_matcher": MapQuiz.get_answer_matcher(person),
             "difficulty": chosen_diff,
             "category_specified": "category" in command_args.named_args,
             "extended_description": "extended_description" in command_args.named_args,
             "tips_given": 0,
             "job": context.job_queue.run_once(self.map_quiz_timeout, MAP_QUIZ_TIMEOUT_SECONDS, data=user_id),
         }
+        self.bot_state.message_router.register(
+            update.effective_chat.id, update.message.message_thread_id, user_id, self.handle_map_quiz_answer
+        )
 
     async def map_quiz_timeout(self, context: ContextTypes.DEFAULT_TYPE):
         user_id = context.job.data
@@ -413,6 +418,7 @@ class CreditCommands:
             person = cached_quiz.get("person")
 
             self.bot_state.map_quiz_cache.pop(user_id, None)
+            self.bot_state.message_router.unregister(chat_id, thread_id, user_id)
 
             if chat_id is not None and person is not None:
                 display_name = MapQuiz.get_person_display_name(person)
@@ -443,10 +449,10 @@ class CreditCommands:
             return
 
         person = cached_quiz["person"]
-        valid_answers = MapQuiz.get_valid_answers(person)
+        answer_matcher = cached_quiz["answer_matcher"]
         user_answer = update.message.text.lower().strip()
         extended = cached_quiz.get("extended_description", False)
-        log.info(f"handle_map_quiz_answer: answer={user_answer}, extended={extended}, valid={valid_answers}")
+        log.info(f"handle_map_quiz_answer: answer={user_answer}, extended={extended}, valid={answer_matcher.valid_answers}")
 
         if user_answer == "!tip":
             tips = MapQuiz.get_tips(person)
@@ -476,10 +482,11 @@ class CreditCommands:
 
         cached_quiz["job"].schedule_removal()
         self.bot_state.map_quiz_cache.pop(user_id, None)
+        self.bot_state.message_router.unregister(update.effective_chat.id, update.message.message_thread_id, user_id)
 
         display_name = MapQuiz.get_person_display_name(person)
 
-        is_correct = MapQuiz.is_answer_correct(user_answer, valid_answers)
+        is_correct = answer_matcher.is_correct(user_answer)
 
         if is_correct:
             reward, _ = MapQuiz.get_reward(
@@ -521,13 +528,9 @@ class CreditCommands:
             return
 
         continent_specified = "continent" in command_args.named_args
-        if continent_specified:
-            raw_continent = command_args.named_args["continent"]
-            countries_df = self.assets.countries.get_countries(continent=raw_continent)
-        else:
-            countries_df = self.assets.countries.df
-
-        if countries_df.empty:
+        continent = command_args.named_args["continent"] if continent_specified else None
+        available_difficulties = self.assets.countries.get_available_difficulties(continent=continent)
+        if not available_difficulties:
             if continent_specified:
                 continents = sorted(self.assets.countries.df["continent"].dropna().unique().tolist())
                 conts_str = ", ".join(continents)
@@ -537,14 +540,7 @@ class CreditCommands:
             await core_utils.send_message(update, context, MessageType.TEXT, message)
             return
 
-        available_difficulties = [
-            diff for diff in ["easy", "medium", "hard", "crazy"] if not countries_df[countries_df["difficulty"] == diff].empty
-        ]
-        if not available_difficulties:
-            message = "No flags found."
-            await core_utils.send_message(update, context, MessageType.TEXT, message)
-            return
-
+        difficulty = None
         if "difficulty" in command_args.named_args:
             difficulty = command_args.named_args["difficulty"].lower()
             if difficulty not in ["easy", "medium", "hard", "crazy"]:
@@ -555,17 +551,10 @@ class CreditCommands:
                 message = "No flags found for the specified continent and difficulty."
                 await core_utils.send_message(update, context, MessageType.TEXT, message)
                 return
-            filtered_countries = countries_df[countries_df["difficulty"] == difficulty]
-            country = self.assets.countries.pop_random_country(filtered_df=filtered_countries)
-            chosen_diff = difficulty
-        else:
-            # No difficulty filter — use the shuffle queue so every country appears
-            # exactly once before any repeats (eliminates birthday-paradox clustering).
-            # Pass filtered_df only when a continent was specified, so the queue is
-            # still used for the pure "random" case.
-            filter_df = countries_df if continent_specified else None
-            country = self.assets.countries.pop_random_country(filtered_df=filter_df)
-            chosen_diff = country["difficulty"]
+
+        # Every continent / difficulty pool has its own shuffle queue, so every country of the pool appears exactly once before any repeats
+        country = self.assets.countries.pop_random_country(difficulty=difficulty, continent=continent)
+        chosen_diff = country["difficulty"]
 
         flag_quiz = FlagQuiz()
         image_path = flag_quiz.get_image_path(country)
@@ -583,11 +572,15 @@ class CreditCommands:
             "chat_id": update.effective_chat.id,
             "thread_id": update.message.message_thread_id,
             "country": country,
+            "answer_matcher": FlagQuiz.get_answer_matcher(country),
             "difficulty": chosen_diff,
             "continent_specified": continent_specified,
             "tips_given": 0,
             "job": context.job_queue.run_once(self.flag_quiz_timeout, FLAG_QUIZ_TIMEOUT_SECONDS, data=user_id),
         }
+        self.bot_state.message_router.register(
+            update.effective_chat.id, update.message.message_thread_id, user_id, self.handle_flag_quiz_answer
+        )
 
     async def flag_quiz_timeout(self, context: ContextTypes.DEFAULT_TYPE):
         user_id = context.job.data
@@ -598,6 +591,7 @@ class CreditCommands:
             country = cached_quiz.get("country")
 
             self.bot_state.flag_quiz_cache.pop(user_id, None)
+            self.bot_state.message_router.unregister(chat_id, thread_id, user_id)
 
             if chat_id is not None and country is not None:
                 display_name = FlagQuiz.get_country_display_name(country)
@@ -627,9 +621,9 @@ class CreditCommands:
             return
 
         country = cached_quiz["country"]
-        valid_answers = FlagQuiz.get_valid_answers(country)
+        answer_matcher = cached_quiz["answer_matcher"]
         user_answer = update.message.text.lower().strip()
-        log.info(f"handle_flag_quiz_answer: answer={user_answer}, valid={valid_answers}")
+        log.info(f"handle_flag_quiz_answer: answer={user_answer}, valid={answer_matcher.valid_answers}")
 
         if user_answer == "!tip":
             tips = FlagQuiz.get_tips(country, continent_specified=cached_quiz.get("continent_specified", False))
@@ -659,9 +653,10 @@ class CreditCommands:
 
         cached_quiz["job"].schedule_removal()
         self.bot_state.flag_quiz_cache.pop(user_id, None)
+        self.bot_state.message_router.unregister(update.effective_chat.id, update.message.message_thread_id, user_id)
 
         display_name = FlagQuiz.get_country_display_name(country)
-        is_correct = FlagQuiz.is_answer_correct(user_answer, valid_answers)
+        is_correct = answer_matcher.is_correct(user_answer)
 
         if is_correct:
             reward, _ = FlagQuiz.get_reward(
@@ -769,6 +764,7 @@ class CreditCommands:
 
         tournament = RouletteTournament(chat_id, thread_id, user_id, username, self.credits, buy_in, max_rounds)
         self.active_tournaments[chat_id] = tournament
+        self.bot_state.message_router.register(chat_id, thread_id, ANY_USER, self.handle_tournament_message)
 
         header = tournament.format_header()
         message = stats_utils.escape_special_characters(
@@ -795,6 +791,7 @@ class CreditCommands:
         if not tournament.has_enough_players():
             message = tournament.cancel_and_refund()
             del self.active_tournaments[chat_id]
+            self.bot_state.message_router.unregister(chat_id, thread_id, ANY_USER)
             message = stats_utils.escape_special_characters(f"{tournament.format_header()}\n\n{message}")
             await context.bot.send_message(
                 chat_id=chat_id,
@@ -912,6 +909,7 @@ class CreditCommands:
             self.bot_state.ban_from_tournament(user_id, tournament.tournament_type.value)
 
         del self.active_tournaments[chat_id]
+        self.bot_state.message_router.unregister(chat_id, tournament.thread_id, ANY_USER)
 
         if extra_msg:
             final_msg = f"{extra_msg}\n\n{final_msg}"
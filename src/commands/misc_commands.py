@@ -1,7 +1,9 @@
+import asyncio
 import logging
+import re
 from datetime import datetime
 
-import pandas as pd
+import numpy as np
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -9,25 +11,41 @@ import src.core.utils as core_utils
 import src.stats.utils as stats_utils
 from src.config.assets import Assets
 from src.config.constants import LONG_MESSAGE_LIMIT
-from src.config.enums import ArgType, ErrorMessage, HolyTextType, MessageType, SiglumType, Table
+from src.config.enums import ArgType, ErrorMessage, HolyTextType, MessageType, SiglumType
 from src.core.command_logger import CommandLogger
 from src.core.job_persistance import JobPersistance
 from src.models.bot_state import BotState
 from src.models.command_args import CommandArgs
 from src.models.db.db import DB
+from src.models.users import Users
 
 log = logging.getLogger(__name__)
 
 
 class Commands:
-    def __init__(self, command_logger: CommandLogger, job_persistance: JobPersistance, bot_state: BotState, db: DB, assets: Assets):
+    def __init__(
+        self,
+        command_logger: CommandLogger,
+        job_persistance: JobPersistance,
+        bot_state: BotState,
+        db: DB,
+        assets: Assets,
+        users: Users | None = None,
+    ):
         self.command_logger = command_logger
         self.job_persistance = job_persistance
         self.bot_state = bot_state
         self.db = db
         self.assets = assets
-        self.users_df = self.db.load_table(Table.USERS)
-        self.users_map = stats_utils.get_users_map(self.users_df)
+        self.users = users if users is not None else Users(self.db)
+
+    @property
+    def users_df(self):
+        return self.users.df
+
+    @property
+    def users_map(self):
+        return self.users.map
 
     async def cmd_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         usernames = self.users_df["final_username"].tolist()
@@ -40,8 +58,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, text)
 
     async def cmd_ozjasz(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_args = CommandArgs(args=context.args, phrases=self.assets.ozjasz_phrases, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.ozjasz_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -62,8 +80,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_europejskafirma(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_args = CommandArgs(args=context.args, phrases=self.assets.europejskafirma_phrases, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.europejskafirma_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -72,8 +90,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_bartosiak(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_args = CommandArgs(args=context.args, phrases=self.assets.bartosiak_phrases, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.bartosiak_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -82,9 +100,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_tvp(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        merged_headlines = self.assets.tvp_latest_headlines + self.assets.tvp_headlines
-        command_args = CommandArgs(args=context.args, phrases=merged_headlines, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.tvp_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -93,8 +110,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_tvp_latest(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_args = CommandArgs(args=context.args, phrases=self.assets.tvp_latest_headlines, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.tvp_latest_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -103,9 +120,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_tusk(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        tusk_headlines = [headline for headline in self.assets.tvp_headlines if "tusk" in headline.lower()]
-        command_args = CommandArgs(args=context.args, phrases=tusk_headlines, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.tusk_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -114,8 +130,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_walesa(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_args = CommandArgs(args=context.args, phrases=self.assets.walesa_phrases, is_text_arg=True)
-        filtered_phrases, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.walesa_index, is_text_arg=True)
+        filtered_phrases, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -136,9 +152,8 @@ class Commands:
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
     async def cmd_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        command_infos = self.assets.commands + self.assets.arguments_help
-        command_args = CommandArgs(args=context.args, phrases=command_infos, is_text_arg=True)
-        filtered_commands, command_args = core_utils.preprocess_input(self.users_df, command_args)
+        command_args = CommandArgs(args=context.args, phrase_index=self.assets.help_index, is_text_arg=True)
+        filtered_commands, command_args = await core_utils.preprocess_input_async(self.users_df, command_args)
         if command_args.error != "":
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
@@ -178,36 +193,50 @@ class Commands:
 
         filter_phrase = command_args.joined_args_lower
         bible_df = self.assets.bible_df
-        filtered_df = bible_df[bible_df["text"].str.lower().str.contains(filter_phrase)]
+        bible_index = self.assets.bible_index
 
+        scope = None
         response = ""
         if "book" in command_args.named_args:
-            abbreviation = bible_df["abbreviation"].unique()
-            books = bible_df["book"].unique()
-            matched_abbreviation = core_utils.match_substr_to_list_of_texts(command_args.named_args["book"], abbreviation)
-            matched_book_name = core_utils.match_substr_to_list_of_texts(command_args.named_args["book"], books)
+            matched_abbreviation = core_utils.match_substr_to_list_of_texts(
+                command_args.named_args["book"], bible_index.group_positions["abbreviation"].keys()
+            )
+            matched_book_name = core_utils.match_substr_to_list_of_texts(
+                command_args.named_args["book"], bible_index.group_positions["book"].keys()
+            )
 
             if matched_abbreviation is not None:
-                filtered_df = filtered_df[filtered_df["abbreviation"] == matched_abbreviation]
+                scope = bible_index.get_group_positions("abbreviation", matched_abbreviation)
 
             if matched_book_name is not None:
-                filtered_df = filtered_df[filtered_df["book"] == matched_book_name]
+                book_positions = bible_index.get_group_positions("book", matched_book_name)
+                scope = book_positions if scope is None else np.intersect1d(scope, book_positions)
+
+        positions, error = await self.search_holy_text(bible_index, filter_phrase, scope)
+        if error != "":
+            await core_utils.send_message(update, context, MessageType.TEXT, error)
+            return
 
-            if matched_book_name is None or matched_abbreviation is None:
-                response += f"[{filtered_df.iloc[0]['abbreviation']}] {filtered_df.iloc[0]['book']}, "
+        filtered_df = bible_index.get_rows(positions, shuffle=True)
+        if "book" in command_args.named_args and (matched_book_name is None or matched_abbreviation is None) and not filtered_df.empty:
+            response += f"[{filtered_df.iloc[0]['abbreviation']}] {filtered_df.iloc[0]['book']}, "
 
         if "chapter" in command_args.named_args:  # in chapter mode we read a random chapter from the bible
-            random_row = filtered_df.sample(frac=1).iloc[0]
+            if filtered_df.empty:
+                await core_utils.send_message(update, context, MessageType.TEXT, ErrorMessage.NO_SUCH_VERSE)
+                return
+
+            random_row = filtered_df.iloc[0]
             book = random_row["book"]
             chapter = random_row["chapter"]
-            filtered_df = bible_df[(bible_df["book"] == book) & (bible_df["chapter"] == chapter)].head(command_args.named_args["chapter"])
+            filtered_df = bible_index.get_rows(bible_index.get_group_positions(("book", "chapter"), (book, chapter))).head(
+                command_args.named_args["chapter"]
+            )
             response += core_utils.display_holy_text_df(
                 filtered_df, bot_state, HolyTextType.BIBLE, label=f"{len(filtered_df)} verses from chapter {chapter}", show_siglum=False
             )
             await core_utils.send_message(update, context, MessageType.TEXT, response)
             return
-        else:
-            filtered_df = filtered_df.sample(frac=1)
 
         response, error = self.handle_holy_text_named_params(
             command_args, filtered_df, bible_df, bot_state, filter_phrase, HolyTextType.BIBLE
@@ -239,19 +268,22 @@ class Commands:
             return
 
         filter_phrase = command_args.joined_args_lower
-        filtered_df = quran_df[quran_df["text"].str.lower().str.contains(filter_phrase)]
-        filtered_df = filtered_df.sample(frac=1)
+        quran_index = self.assets.quran_index
 
-        response = ""
+        scope = None
         if "chapter" in command_args.named_args:
-            books = quran_df["chapter_name"].unique()
-            matched_chapter_name = core_utils.match_substr_to_list_of_texts(command_args.named_args["chapter"], books)
-
+            matched_chapter_name = core_utils.match_substr_to_list_of_texts(
+                command_args.named_args["chapter"], quran_index.group_positions["chapter_name"].keys()
+            )
             if matched_chapter_name is not None:
-                filtered_df = filtered_df[filtered_df["chapter_name"] == matched_chapter_name]
+                scope = quran_index.get_group_positions("chapter_name", matched_chapter_name)
+
+        positions, error = await self.search_holy_text(quran_index, filter_phrase, scope)
+        if error != "":
+            await core_utils.send_message(update, context, MessageType.TEXT, error)
+            return
 
-            if matched_chapter_name is None:
-                response += f"[Sura {filtered_df.iloc[0]['chapter_nr']}]. {filtered_df.iloc[0]['chapter_name']}, "
+        filtered_df = quran_index.get_rows(positions, shuffle=True)
 
         response, error = self.handle_holy_text_named_params(
             command_args, filtered_df, quran_df, bot_state, filter_phrase, HolyTextType.QURAN
@@ -262,6 +294,15 @@ class Commands:
 
         await core_utils.send_message(update, context, MessageType.TEXT, response)
 
+    @staticmethod
+    async def search_holy_text(holy_text_index, filter_phrase, scope=None) -> tuple[np.ndarray, str]:
+        try:
+            return await asyncio.to_thread(holy_text_index.search, filter_phrase, scope), ""
+        except re.error:
+            return np.array([], dtype=int), f"{filter_phrase} - {ErrorMessage.INVALID_REGEX.value}"
+        except TimeoutError:
+            return np.array([], dtype=int), f"{filter_phrase} - {ErrorMessage.REGEX_TIMEOUT.value}"
+
     def handle_holy_text_named_params(self, command_args, filtered_df, raw_df, bot_state, filter_phrase, holy_text_type):
         error = ""
         last_verse_id = bot_state.last_bible_verse_id if holy_text_type == HolyTextType.BIBLE else bot_state.last_quran_verse_id
@@ -282,7 +323,7 @@ class Commands:
             label = f"{command_args.named_args['prev']} {holy_text_type.value} verses before {core_utils.get_siglum(raw_df.iloc[last_verse_id], holy_text_type, SiglumType.FULL)}"
             response = core_utils.display_holy_text_df(filtered_df, bot_state, holy_text_type, label=label, show_siglum=False)
         elif "next" in command_args.named_args and last_verse_id != -1:
-            end_index = min(len(filtered_df), last_verse_id + command_args.named_args["next"] + 1)
+            end_index = min(len(raw_df), last_verse_id + command_args.named_args["next"] + 1)
             filtered_df = raw_df.iloc[last_verse_id + 1 : end_index]
             label = f"{command_args.named_args['next']} {holy_text_type.value} verses after {core_utils.get_siglum(raw_df.iloc[last_verse_id], holy_text_type, SiglumType.FULL)}"
             response = core_utils.display_holy_text_df(filtered_df, bot_state, holy_text_type, label=label, show_siglum=False)
@@ -376,7 +417,7 @@ class Commands:
     async def cmd_kiepscy(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         command_args = CommandArgs(args=context.args, expected_args=[ArgType.TEXT_MULTISPACED], min_string_length=1, max_string_length=1000)
         command_args = core_utils.parse_args(self.users_df, command_args)
-        kiepscy_df = self.assets.kiepscy_df
+        kiepscy_index = self.assets.kiepscy_index
 
         # await context.bot.send_message(chat_id=update.effective_chat.id, text='Temporarily disabled :(')
         # return
@@ -384,42 +425,26 @@ class Commands:
             await core_utils.send_message(update, context, MessageType.TEXT, command_args.error)
             return
 
-        search_phrase = command_args.string
-        search_phrases = command_args.strings
-
-        if search_phrases:  # use & operator to match multiple words
-            regex = core_utils.regexify_multiword_filter(search_phrases)
-            matching_by_title_df = kiepscy_df[kiepscy_df["title"].str.contains(regex, case=False)]
-            matching_by_description_df = kiepscy_df[kiepscy_df["description"].str.contains(regex, case=False)]
-        else:
-            matching_by_title_df = kiepscy_df[kiepscy_df["title"].str.contains(search_phrase, case=False)]
-            matching_by_description_df = kiepscy_df[kiepscy_df["description"].str.contains(search_phrase, case=False)]
-        merged_df = pd.concat([matching_by_title_df, matching_by_description_df], ignore_index=True)
-        merged_df["nr"] = merged_df["nr"].replace("—", "999").astype(int)
-        merged_df = merged_df.drop_duplicates("nr").sort_values("nr").reset_index(drop=True)
-
-        if search_phrase == "" and not search_phrases:
-            random_row = merged_df.sample(frac=1).iloc[1]
+        query = "&".join(command_args.strings) if command_args.strings else command_args.string  # use & operator to match multiple words
+        if query == "":
+            random_row = kiepscy_index.df.sample(n=1).iloc[0]
             text = f"*{random_row['nr']}: {random_row['title']}* - {random_row['description']}\n"
             text = stats_utils.escape_special_characters(text)
             await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, text)
             return
 
-        text = f"Kiepscy episodes that match [{search_phrase}]:\n"
-        last_text = text
-        message_sent_count = 0
-        for _, row in merged_df.iterrows():
-            text += f"- *{row['nr']}: {row['title']}* - {row['description']}\n"
-            if message_sent_count >= LONG_MESSAGE_LIMIT:
-                return
-            if len(text) > 4096:
-                response = stats_utils.escape_special_characters(last_text)
-                await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, response)
-                text = ""
-                message_sent_count += 1
-            last_text = text
-        text = stats_utils.escape_special_characters(text)
-        await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, text)
+        header = stats_utils.escape_special_characters(f"Kiepscy episodes that match [{query}]:\n")
+        try:
+            pages = await asyncio.to_thread(kiepscy_index.get_pages, query, header)
+        except re.error:
+            await core_utils.send_message(update, context, MessageType.TEXT, f"{query} - {ErrorMessage.INVALID_REGEX.value}")
+            return
+        except TimeoutError:
+            await core_utils.send_message(update, context, MessageType.TEXT, f"{query} - {ErrorMessage.REGEX_TIMEOUT.value}")
+            return
+
+        for page in pages[:LONG_MESSAGE_LIMIT]:
+            await core_utils.send_message(update, context, MessageType.MARKDOWN_TEXT, page)
 
     async def cmd_kiepscyurl(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         command_args = CommandArgs(args=context.args, expected_args=[ArgType.POSITIVE_INT], max_number=1000)
@@ -1,5 +1,6 @@
 import pandas as pd
 
+from src.config.constants import BIBLE_GROUP_COLUMNS, FAMOUS_PEOPLE_POOL_COLUMNS, QUIZ_POOL_COLUMNS, QURAN_GROUP_COLUMNS
 from src.config.paths import (
     ARGUMENTS_HELP_PATH,
     BARTOSIAK_PATH,
@@ -21,6 +22,10 @@ from src.config.paths import (
     WALESA_PATH,
 )
 from src.models.countries import Countries
+from src.models.flag_quiz import FlagQuiz
+from src.models.map_quiz import MapQuiz
+from src.models.record_pools import RecordPools
+from src.models.text_index import HolyTextIndex, KiepscyIndex, TextSearchIndex
 
 
 class Assets:
@@ -33,16 +38,37 @@ class Assets:
         self.arguments_help = self.read_str_file(str(ARGUMENTS_HELP_PATH))
         self.bible_df = pd.read_parquet(str(BIBLE_PATH))
         self.quran_df = pd.read_parquet(str(QURAN_PATH))
+        self.bible_index = HolyTextIndex(self.bible_df, BIBLE_GROUP_COLUMNS)
+        self.quran_index = HolyTextIndex(self.quran_df, QURAN_GROUP_COLUMNS)
         self.shopping_sundays = self.read_str_file(str(SHOPPING_SUNDAYS_PATH))
         self.europejskafirma_phrases = self.read_str_file(str(EUROPEJSKAFIRMA_PATH))
         self.boczek_phrases = self.read_str_file(str(BOCZEK_PATH))
         self.kiepscy_df = pd.read_parquet(str(KIEPSCY_PATH))
+        self.kiepscy_index = KiepscyIndex(self.kiepscy_df)
         self.walesa_phrases = self.read_str_file(str(WALESA_PATH))
         self.polish_stopwords = self.read_str_file(str(POLISH_STOPWORDS_PATH))
         self.quiz_df = pd.read_parquet(str(QUIZ_DATABASE_PATH))
         self.polish_holidays_df = pd.read_csv(str(POLISH_HOLIDAYS_PATH), sep=";")
-        self.famous_people_trivia_df = pd.read_parquet(str(FAMOUS_PEOPLE_TRIVIA_PATH))
-        self.countries = Countries(COUNTRIES_PATH)
+        self.famous_people_trivia_df = MapQuiz.add_quiz_texts(pd.read_parquet(str(FAMOUS_PEOPLE_TRIVIA_PATH)))
+        self.countries = Countries(FlagQuiz.add_quiz_texts(pd.read_parquet(str(COUNTRIES_PATH))))
+
+        self.tvp_all_headlines = self.tvp_latest_headlines + self.tvp_headlines
+        self.tusk_headlines = [headline for headline in self.tvp_headlines if "tusk" in headline.lower()]
+        self.ozjasz_index = TextSearchIndex(self.ozjasz_phrases)
+        self.bartosiak_index = TextSearchIndex(self.bartosiak_phrases)
+        self.europejskafirma_index = TextSearchIndex(self.europejskafirma_phrases)
+        self.tvp_index = TextSearchIndex(self.tvp_all_headlines)
+        self.tvp_latest_index = TextSearchIndex(self.tvp_latest_headlines)
+        self.tusk_index = TextSearchIndex(self.tusk_headlines)
+        self.walesa_index = TextSearchIndex(self.walesa_phrases)
+        self.help_index = TextSearchIndex(self.commands + self.arguments_help)
+        self.quiz_pools = RecordPools(self.quiz_df, QUIZ_POOL_COLUMNS)
+        self.famous_people_pools = RecordPools(
+            self.famous_people_trivia_df.assign(
+                difficulty=[MapQuiz.get_difficulty_from_index(i) for i in self.famous_people_trivia_df.index]
+            ),
+            FAMOUS_PEOPLE_POOL_COLUMNS,
+        )
 
     def read_str_file(self, path):
         with open(path) as f:
@@ -6,6 +6,8 @@ MAX_CWEL_USAGE_DAILY = 25
 MAX_GET_CREDITS_DAILY = 1
 MAX_STEAL_CREDITS_DAILY = 3
 LONG_MESSAGE_LIMIT = 1
+MESSAGE_LENGTH_LIMIT = 4096
+UNKNOWN_EPISODE_NR = 999
 STOPWORD_RATIO_THRESHOLD = 0.59
 MIN_QUIZ_TIME_TO_ANSWER_SECONDS = 10
 MAP_QUIZ_CREDIT_REWARD = 1000
@@ -16,9 +18,37 @@ CRITICAL_SUCCESS_CHANCE = 0.05
 MAX_INT = 2147483647
 EXCLUDED_USER_IDS = [6455867316, 6455867316, 1660481027, 1626698260, 1653222205, 1626673718, 2103796402]
 BOT_MESSAGE_RETENION_IN_MINUTES = 5
+SCHEDULED_JOBS_LOAD_HORIZON_HOURS = 24
+SCHEDULED_JOBS_REFILL_INTERVAL_MINUTES = 60
+YOUTUBE_DOWNLOAD_TIMEOUT_SECONDS = 180
+YOUTUBE_AUDIO_CACHE_MAX_BYTES = 500 * 1024 * 1024
+FFMPEG_TIMEOUT_SECONDS = 60
+ETL_SERVICE_INTERVAL_SECONDS = 300
+ETL_SERVICE_DAYS = 1
+ETL_SERVICE_SWEEP_DAYS = 7
+ETL_SERVICE_SWEEP_INTERVAL_HOURS = 24
+ETL_SERVICE_RECONCILE_INTERVAL_SECONDS = 3600
+ETL_EVENT_BATCH_SECONDS = 5
+ETL_NGRAMS_UPDATE_INTERVAL_SECONDS = 300
+ETL_FULL_VALIDATION_INTERVAL_HOURS = 24  # full pandera validation of the ETL tables, runs validate only the rows they wrote in between
+ETL_RUNS_RETENTION_DAYS = 30  # run history older than this is pruned when a run is recorded
+BACKFILL_CHUNK_SIZE = 1000
+BACKFILL_CONCURRENCY = 4
+GENERAL_TOPIC_ID = 1  # the General forum topic, also the topic of every message of a chat without topics
+CHAT_ROW_VALIDATION_SAMPLE_SIZE = 0  # rows of each ETL batch checked against the ChatMessageRow pydantic model, for debugging
 negative_emojis = ["👎", "😢", "😭", "🤬", "🤡", "💩", "😫", "😩", "🥶", "🤨", "🧐", "🙃", "😒", "😠", "😣", "🗿"]
 CREDIT_HISTORY_COLUMNS = ["timestamp", "user_id", "target_user_id", "credit_change", "action_type", "bet_type", "success"]
 TIMEZONE = "Europe/Warsaw"
+BIBLE_GROUP_COLUMNS = ["abbreviation", "book", ("book", "chapter")]
+QURAN_GROUP_COLUMNS = ["chapter_name"]
+QUIZ_POOL_COLUMNS = ["category", "difficulty", "type"]
+FAMOUS_PEOPLE_POOL_COLUMNS = ["category", "difficulty"]
+REGEX_CACHE_SIZE = 256
+REGEX_TIME_BUDGET_SECONDS = 1.0
+REGEX_WORKER_STARTUP_TIMEOUT_SECONDS = 60
+REGEX_MAX_REJECTED_PATTERNS = 1000
+REGEX_METRICS_WINDOW = 1000
+REGEX_MAX_RESIDENT_CORPORA = 8  # text lists kept in the regex worker, so a repeated search sends only the pattern
 
 TOURNAMENT_JOIN_TIMEOUT_SECONDS = 60
 TOURNAMENT_BET_TIMEOUT_SECONDS = 60
@@ -67,6 +67,8 @@ class ErrorMessage(str, Enum):
     NO_SUCH_ITEM = "Nie ma takiego przedmiotu :("
     NO_SUCH_VERSE = "Nie ma takiego wersetu. Beduinom pustynnym weszło post-nut clarity po wyruchaniu kozy. :("
     NO_SUCH_EPISODE = "Nie ma takiego epizodu :("
+    INVALID_REGEX = "Invalid regex pattern."
+    REGEX_TIMEOUT = "Regex pattern is too slow to match, try a simpler one."
     NO_DATA_FOR_PERIOD = "No data from that period, sorry :("
     TOO_MUCH_TEXT = "Too much text to display. Lower the number of messages."
     CWEL_NO_REPLY = "You have to reply to a message to cwel someone."
@@ -150,12 +152,33 @@ class Table(Enum):
     REACTIONS = "reactions"
     CREDITS = "credits"
     UPDATED_MESSAGE_IDS = "updated_message_ids"
+    QUIZ_PROGRESS = "quiz_progress"
+    SCHEDULED_JOBS = "scheduled_jobs"
+    BACKFILL_CHUNKS = "backfill_chunks"
+    TABLE_VERSIONS = "table_versions"
+    ETL_RUNS = "etl_runs"
+    ETL_RUN_STAGES = "etl_run_stages"
 
 
 class DBSaveMode(Enum):
     APPEND = "append"
     REPLACE = "replace"
     FAIL = "fail"
+    UPSERT = "upsert"
+
+
+class ETLJob(Enum):
+    CHAT_ETL = "chat_etl"
+    WORD_STATS = "word_stats"
+    ETL_CYCLE = "etl_cycle"
+    ETL_EVENTS = "etl_events"
+
+
+class ETLRunStatus(Enum):
+    SUCCESS = "success"
+    FAILED = "failed"
+    LOCKED = "locked"
+    SKIPPED = "skipped"
 
 
 # Events
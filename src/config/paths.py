@@ -11,6 +11,7 @@ DB_PATH = DATA_DIR / "bot.db"
 DB_WAL_PATH = DATA_DIR / "bot.db-wal"
 DB_SCHEMA_SQL_PATH = ROOT_DIR / "src" / "models" / "db" / "schema.sql"
 YOUTUBE_COOKIE_PATH = DATA_DIR / "cookies.txt"
+YOUTUBE_AUDIO_CACHE_DIR_PATH = DATA_DIR / "youtube_audio_cache"
 
 # Chat data
 CHAT_ETL_LOCK_PATH = DATA_DIR / "chat" / "chat_etl.lock"
@@ -36,6 +37,8 @@ CREDIT_HISTORY_PATH = DATA_DIR / "chat" / "credit_history.parquet"
 
 # Miscellaneous
 MAP_QUIZ_IMAGES_DIR_PATH = DATA_DIR / "misc" / "map_quiz_images"
+MAP_QUIZ_BASE_TILES_DIR_PATH = DATA_DIR / "misc" / "map_quiz_base_tiles"
+IMAGES_MANIFEST_PATH = DATA_DIR / "misc" / "images_manifest.json"
 TVP_HEADLINES_PATH = DATA_DIR / "misc" / "paski-tvp.txt"
 TVP_LATEST_HEADLINES_PATH = DATA_DIR / "misc" / "tvp_latest_headlines.txt"
 OZJASZ_PHRASES_PATH = DATA_DIR / "misc" / "ozjasz-wypowiedzi.txt"
@@ -53,5 +56,7 @@ WALESA_PATH = DATA_DIR / "misc" / "walesa.txt"
 QUIZ_DATABASE_PATH = DATA_DIR / "misc" / "quiz_database.parquet"
 POLISH_HOLIDAYS_PATH = DATA_DIR / "misc" / "polish_holidays.csv"
 FAMOUS_PEOPLE_TRIVIA_PATH = DATA_DIR / "misc" / "famous_people_trivia.parquet"
+FAMOUS_PEOPLE_QUIZ_TEXTS_PATH = DATA_DIR / "misc" / "famous_people_quiz_texts.parquet"
 COUNTRIES_PATH = DATA_DIR / "misc" / "countries.parquet"
+COUNTRIES_QUIZ_TEXTS_PATH = DATA_DIR / "misc" / "countries_quiz_texts.parquet"
 FLAGS_DIR_PATH = DATA_DIR / "misc" / "flags"
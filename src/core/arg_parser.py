@@ -1,4 +1,3 @@
-import copy
 import logging
 import re
 from datetime import datetime
@@ -8,7 +7,9 @@ import pandas as pd
 
 from src.config.constants import MAX_INT, TIMEZONE
 from src.config.enums import ArgType, DatetimeFormat, PeriodFilterMode
+from src.core.regex_sandbox import regex_sandbox
 from src.models.command_args import CommandArgs
+from src.models.user_index import get_user_index
 
 log = logging.getLogger(__name__)
 
@@ -53,7 +54,7 @@ class ArgParser:
         if len(command_args_ref.args) == 0:
             return command_args_ref
 
-        command_args = copy.deepcopy(command_args_ref)
+        command_args = command_args_ref.fork()
         successes = []
         expected_args = command_args.expected_args.copy()
         for i, arg_type in enumerate(expected_args):
@@ -119,17 +120,29 @@ class ArgParser:
 
     @staticmethod
     def text_filter(command_args):
+        if command_args.phrase_index is not None:
+            positions = command_args.phrase_index.search(command_args.joined_args_lower, is_regex=False)
+            return command_args.phrase_index.get_texts(positions), command_args
         return [phrase for phrase in command_args.phrases if command_args.joined_args_lower in phrase.lower()], command_args
 
     @staticmethod
     def regex_filter(command_args):
         pattern = command_args.joined_args[1:-1]  # removes brackets
         try:
-            return [phrase for phrase in command_args.phrases if re.search(pattern, phrase, flags=re.IGNORECASE)], command_args
+            if command_args.phrase_index is not None:
+                positions = command_args.phrase_index.regex_search(pattern, flags=re.IGNORECASE)
+                return command_args.phrase_index.get_texts(positions), command_args
+            matched = regex_sandbox.search(pattern, command_args.phrases, flags=re.IGNORECASE)
+            return [command_args.phrases[position] for position in matched], command_args
         except re.error as e:
             command_args.error = f"{pattern} - is and invalid regex pattern."
             log.info(f"{command_args.error} - {e}")
 
+            return [], command_args
+        except TimeoutError as e:
+            command_args.error = f"{pattern} - is too slow, try a simpler regex pattern."
+            log.info(f"{command_args.error} - {e}")
+
             return [], command_args
 
     @staticmethod
@@ -138,7 +151,7 @@ class ArgParser:
 
     @staticmethod
     def parse_arg(users_df, command_args_ref, arg_str, arg_type: ArgType, is_optional=False) -> tuple[str | int, CommandArgs]:
-        command_args = copy.deepcopy(command_args_ref)
+        command_args = command_args_ref.fork()
         value = None
         error = ""
         match arg_type:
@@ -162,11 +175,11 @@ class ArgParser:
 
     @staticmethod
     def parse_named_args(users_df, command_args_ref: CommandArgs):
-        command_args = copy.deepcopy(command_args_ref)
+        command_args = command_args_ref.fork()
         command_args.args = [arg.replace("—", "--") for arg in command_args.args]
         if not command_args.available_named_args_aliases:
             command_args.available_named_args_aliases = {arg[0]: arg for arg in command_args.available_named_args}
-        args = copy.deepcopy(command_args.args)
+        args = list(command_args.args)
         for i, arg in enumerate(args):
             named_arg = ArgParser.parse_named_arg(arg, command_args)
             if named_arg is None:
@@ -300,21 +313,14 @@ class ArgParser:
             return command_args, error
 
         user_str = arg_str.replace("@", "")
+        resolved_user = get_user_index(users_df).resolve(user_str)
 
-        exact_matching_users = users_df[users_df["final_username"].str.lower() == user_str.lower()]
-        partially_matching_users = users_df[users_df["final_username"].str.contains(user_str, case=False)]
-
-        if not exact_matching_users.empty:
-            command_args.user = exact_matching_users.iloc[0]["final_username"]
-            command_args.user_id = exact_matching_users.index[0]
-        elif len(user_str) >= 3 and not partially_matching_users.empty:
-            command_args.user = partially_matching_users.iloc[0]["final_username"]
-            command_args.user_id = partially_matching_users.index[0]
-        else:
+        if resolved_user is None:
             error = f"User {user_str} doesn't exist and cannot hurt you. Existing users are: {users_df['final_username'].tolist()}"
             log.error(error)
             return command_args, error
 
+        command_args.user, command_args.user_id = resolved_user
         return command_args, ""
 
     @staticmethod
@@ -8,6 +8,7 @@ import src.core.utils as core_utils
 import src.stats.utils as stats_utils
 from src.config.paths import CHAT_AUDIO_DIR_PATH, CHAT_GIFS_DIR_PATH, CHAT_IMAGES_DIR_PATH, CHAT_VIDEO_NOTES_DIR_PATH, CHAT_VIDEOS_DIR_PATH
 from src.config.settings import API_HASH, API_ID, BOT_ID, CHAT_ID, SESSION
+from src.stats import etl_runs
 
 log = logging.getLogger(__name__)
 
@@ -29,55 +30,86 @@ class ClientAPIHandler:
         days - number of past days of chat messages that will get updated
         :rtype: object
         """
+        with self.client:
+            return self.client.loop.run_until_complete(self.fetch_chat_history(days))
+
+    async def fetch_chat_history(self, days: int = 1) -> tuple[list, list]:
+        """Messages of the past days with their message types, downloads their media. The client has to be connected."""
+        chat_history = []
+        message_types = []
+        count = 0
+        offset_dt = datetime.now(tz=UTC) - timedelta(days=days)
+        offset_timestamp = offset_dt.timestamp()
+        async for msg in self.client.iter_messages(CHAT_ID, offset_date=offset_timestamp, reverse=True):
+            # for msg in self.client.iter_messages(CHAT_ID, offset_date=date, reverse=True):
+            if msg is None:
+                break
+            if count % 10000 == 0:
+                if hasattr(msg.sender, "first_name") and hasattr(msg.sender, "last_name") and hasattr(msg.sender, "username"):
+                    log.info(
+                        f"{msg.date}, {msg.id}, ':', {msg.sender.first_name}, {msg.sender.last_name}, {msg.sender.username}, {msg.sender_id}, ':', {msg.text}"
+                    )
+                else:
+                    log.info(f"{msg.id}, {msg.text}")
 
-        async def helper():
-            chat_history = []
-            message_types = []
-            count = 0
-            offset_dt = datetime.now(tz=UTC) - timedelta(days=days)
-            offset_timestamp = offset_dt.timestamp()
-            async with self.client:
-                async for msg in self.client.iter_messages(CHAT_ID, offset_date=offset_timestamp, reverse=True):
-                    # for msg in self.client.iter_messages(CHAT_ID, offset_date=date, reverse=True):
-                    if msg is None:
-                        break
-                    if count % 10000 == 0:
-                        if hasattr(msg.sender, "first_name") and hasattr(msg.sender, "last_name") and hasattr(msg.sender, "username"):
-                            log.info(
-                                f"{msg.date}, {msg.id}, ':', {msg.sender.first_name}, {msg.sender.last_name}, {msg.sender.username}, {msg.sender_id}, ':', {msg.text}"
-                            )
-                        else:
-                            log.info(f"{msg.id}, {msg.text}")
-
-                    message_type = core_utils.get_message_type(msg)
-                    await core_utils.download_media(msg, message_type)
-
-                    message_types.append(message_type)
-                    chat_history.append(msg)
-                    count += 1
-            return chat_history, message_types
+            message_type = core_utils.get_message_type(msg)
+            await core_utils.download_media(msg, message_type)
 
-        with self.client:
-            chat_history = self.client.loop.run_until_complete(helper())
-            return chat_history
+            message_types.append(message_type)
+            chat_history.append(msg)
+            count += 1
+        return chat_history, message_types
+
+    async def fetch_messages(self, message_ids: list) -> list:
+        """Current versions of the given messages, deleted ones are left out. The client has to be connected."""
+        messages = await self.client.get_messages(CHAT_ID, ids=message_ids)
+        return [message for message in messages if message is not None]
+
+    async def fetch_message_range(self, min_id: int, max_id: int, client=None) -> tuple[list, list]:
+        """Messages with min_id < id < max_id in chronological order and their message types, downloads their media.
+        The client has to be connected, a takeout session can be passed instead of the regular client.
+        """
+        client = client if client is not None else self.client
+        messages = [message async for message in client.iter_messages(CHAT_ID, min_id=min_id, max_id=max_id)]
+        messages.reverse()
+        return messages, await self.get_message_types(messages)
+
+    async def get_latest_message_id(self) -> int:
+        messages = await self.client.get_messages(CHAT_ID, limit=1)
+        return messages[0].id if messages else 0
+
+    async def get_last_message_id_before(self, dt: datetime) -> int:
+        """Id of the last message sent before dt, 0 if there's none."""
+        messages = await self.client.get_messages(CHAT_ID, limit=1, offset_date=dt)
+        return messages[0].id if messages else 0
+
+    async def get_message_types(self, messages: list) -> list:
+        """Message types of the given messages, downloads their media."""
+        message_types = []
+        for message in messages:
+            message_type = core_utils.get_message_type(message)
+            await core_utils.download_media(message, message_type)
+            message_types.append(message_type)
+        return message_types
 
     def get_reactions(self, message_ids: list) -> dict:
         """Get all reactions from given message_ids. Used when a message has over 3 reactions, as recent reactions in the chat_history have only 3 last reactions.
         :param message_ids: a list of message ids
         :return:
         """
-
-        async def helper():
-            async with self.client:
-                message_reactions = {}
-                for message_id in message_ids:
-                    message_reactions[message_id] = await self.client(
-                        functions.messages.GetMessageReactionsListRequest(peer=CHAT_ID, id=message_id, limit=100)
-                    )
-                return message_reactions
-
         with self.client:
-            return self.client.loop.run_until_complete(helper())
+            return self.client.loop.run_until_complete(self.fetch_reactions(message_ids))
+
+    async def fetch_reactions(self, message_ids: list) -> dict:
+        """Async version of get_reactions, the client has to be connected."""
+        message_reactions = {}
+        with etl_runs.stage("reaction_fetch") as stage_timing:
+            for message_id in message_ids:
+                message_reactions[message_id] = await self.client(
+                    functions.messages.GetMessageReactionsListRequest(peer=CHAT_ID, id=message_id, limit=100)
+                )
+            stage_timing.count(rows=len(message_ids))
+        return message_reactions
 
     def get_chat_users(self):
         with self.client:
@@ -1,56 +1,88 @@
+import logging
 import os
 import pickle
+from datetime import UTC, datetime, timedelta
 
 import src.core.utils as core_utils
+from src.config.constants import SCHEDULED_JOBS_LOAD_HORIZON_HOURS, SCHEDULED_JOBS_REFILL_INTERVAL_MINUTES
 from src.config.paths import SCHEDULED_JOBS_PATH
 
+log = logging.getLogger(__name__)
+
+# Callbacks a persisted job can run, stored in the db by name
+JOB_FUNCTIONS = {func.__name__: func for func in [core_utils.send_response_message]}
+
+
+def to_due_at(dt: datetime) -> str:
+    return dt.astimezone(UTC).isoformat()
+
 
 class JobPersistance:
-    """Persist scheduled jobs such as /remindme in a pickle file. Jobs are stored in a dict of dicts."""
+    """Persist scheduled jobs such as /remindme in the scheduled_jobs SQLite table, indexed by due time.
 
-    def __init__(self, job_queue):
+    A job is a single row insert, and it's marked as done once it fires. Only jobs due within SCHEDULED_JOBS_LOAD_HORIZON_HOURS are
+    loaded into the PTB JobQueue, a repeating refill loads the next ones, so far-future reminders stay in the db until they're close.
+    """
+
+    def __init__(self, job_queue, db):
         self.job_queue = job_queue
-        self.jobs = self.load_jobs(job_queue)
+        self.db = db
+        self.queued_job_ids = set()
+        self.migrate_pickled_jobs()
+        self.db.mark_scheduled_jobs_done(due_before=to_due_at(core_utils.get_dt_now()))  # missed while the bot was down
+        self.load_jobs(job_queue)
+        job_queue.run_repeating(self.refill_jobs, interval=timedelta(minutes=SCHEDULED_JOBS_REFILL_INTERVAL_MINUTES))
 
-    def load_jobs(self, job_queue):
+    def migrate_pickled_jobs(self):
+        """Move jobs from the legacy scheduled_jobs.pkl into the db, once."""
         if not os.path.exists(SCHEDULED_JOBS_PATH):
-            return {}
+            return
 
         with open(SCHEDULED_JOBS_PATH, "rb") as f:
             try:
-                self.jobs = pickle.load(f)
+                jobs = pickle.load(f)
             except EOFError:
-                self.jobs = {}
-        self.sync_jobs()
+                jobs = {}
 
-        for job_id, _ in self.jobs.items():
-            self.run_job(job_queue, job_id)
+        dt_now = core_utils.get_dt_now()
+        for job in jobs.values():
+            if job["dt"] >= dt_now:
+                self.db.insert_scheduled_job(to_due_at(job["dt"]), job["func"].__name__, list(job["args"]))
+        os.rename(SCHEDULED_JOBS_PATH, f"{SCHEDULED_JOBS_PATH}.migrated")
+        log.info(f"Migrated {len(jobs)} pickled jobs to the db.")
 
-        return self.jobs
+    def load_jobs(self, job_queue):
+        """Queue the pending jobs due within the load horizon that aren't queued yet."""
+        dt_now = core_utils.get_dt_now()
+        horizon = dt_now + timedelta(hours=SCHEDULED_JOBS_LOAD_HORIZON_HOURS)
+        for job_id, due_at, func, args in self.db.load_scheduled_jobs(to_due_at(dt_now), to_due_at(horizon)):
+            if job_id not in self.queued_job_ids:
+                self.run_job(job_queue, job_id, datetime.fromisoformat(due_at), func, args)
+
+    async def refill_jobs(self, context):
+        self.load_jobs(context.job_queue)
 
     def save_job(self, job_queue, dt, func, args):
-        job_id = self.get_new_job_id()
-        self.jobs[job_id] = {"dt": dt, "func": func, "args": args}
-        self.run_job(job_queue, job_id)
-        self.sync_jobs()
-        self.save_jobs()
-
-    def save_jobs(self):
-        with open(SCHEDULED_JOBS_PATH, "wb") as f:
-            pickle.dump(self.jobs, f)
-
-    def sync_jobs(self):
-        """Check if persisted jobs are still valid."""
-        dt_now = core_utils.get_dt_now()
-        new_jobs = {job_id: job for job_id, job in self.jobs.items() if job["dt"] >= dt_now}
-        self.jobs = new_jobs
+        job_id = self.db.insert_scheduled_job(to_due_at(dt), func.__name__, list(args))
+        if dt < core_utils.get_dt_now() + timedelta(hours=SCHEDULED_JOBS_LOAD_HORIZON_HOURS):
+            self.run_job(job_queue, job_id, dt, func.__name__, args)
 
     def get_latest_job_id(self, job_queue):
         return job_queue.jobs()[-1].id
 
-    def get_new_job_id(self):
-        return max(self.jobs.keys()) + 1 if self.jobs else 0
+    def run_job(self, job_queue, job_id, dt, func_name, args):
+        func = JOB_FUNCTIONS.get(func_name)
+        if func is None:
+            log.error(f"Unknown function {func_name} of scheduled job {job_id}, skipping it.")
+            self.db.mark_scheduled_jobs_done(job_ids=[job_id])
+            return
+
+        async def callback(context):
+            try:
+                await func(context, *args)
+            finally:
+                self.db.mark_scheduled_jobs_done(job_ids=[job_id])
+                self.queued_job_ids.discard(job_id)
 
-    def run_job(self, job_queue, job_id):
-        job = self.jobs[job_id]
-        job_queue.run_once(callback=lambda context: job["func"](context, *job["args"]), when=job["dt"])
+        self.queued_job_ids.add(job_id)
+        job_queue.run_once(callback=callback, when=dt)
@@ -0,0 +1,44 @@
+import logging
+from collections.abc import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+log = logging.getLogger(__name__)
+
+ANY_USER = None
+
+MessageHandlerFunc = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+
+class MessageRouter:
+    """Single entry point for plain text messages, dispatching them only to the interactive session that owns them.
+
+    Sessions (map/flag quiz answers, tournaments, ...) are indexed by (chat_id, thread_id, user_id), a session open to everyone in a
+    thread uses ANY_USER as the user_id. A message is looked up in O(1) and dropped right away if no session owns it, so new interactive
+    games should register their sessions here instead of adding another global MessageHandler group.
+    """
+
+    def __init__(self):
+        self.sessions: dict[tuple[int, int | None, int | None], MessageHandlerFunc] = {}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def register(self, chat_id: int, thread_id: int | None, user_id: int | None, handler: MessageHandlerFunc):
+        self.sessions[(chat_id, thread_id, user_id)] = handler
+
+    def unregister(self, chat_id: int, thread_id: int | None, user_id: int | None):
+        self.sessions.pop((chat_id, thread_id, user_id), None)
+
+    def get_handlers(self, chat_id: int, thread_id: int | None, user_id: int) -> list[MessageHandlerFunc]:
+        handlers = [self.sessions.get((chat_id, thread_id, user_id)), self.sessions.get((chat_id, thread_id, ANY_USER))]
+        return [handler for handler in handlers if handler is not None]
+
+    async def route(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self.sessions or not update.message or not update.message.text:
+            return
+
+        handlers = self.get_handlers(update.effective_chat.id, update.message.message_thread_id, update.effective_user.id)
+        for handler in handlers:
+            await handler(update, context)
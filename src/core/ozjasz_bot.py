@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from functools import wraps
 
@@ -13,10 +14,12 @@ from src.config.enums import EmojiType, MessageType
 from src.config.settings import CHAT_ID, TEST_CHAT_ID, TEST_TOKEN, TOKEN
 from src.core.command_logger import CommandLogger
 from src.core.job_persistance import JobPersistance
+from src.core.regex_sandbox import regex_sandbox
 from src.models.bot_state import BotState
 from src.models.credits import Credits
 from src.models.db.db import DB
 from src.models.holidays import Holidays
+from src.models.users import Users
 
 log = logging.getLogger(__name__)
 
@@ -33,14 +36,17 @@ class OzjaszBot:
         self.assets = Assets()
         self.db = DB()
         self.bot_state = BotState(self.application.job_queue, self.assets)
-        self.job_persistance = JobPersistance(self.application.job_queue)
+        self.job_persistance = JobPersistance(self.application.job_queue, self.db)
         self.credits = Credits(self.db)
-        self.holidays = Holidays(self.application.job_queue, self.credits, self.db, self.assets)
+        self.users = Users(self.db)  # shared by every consumer, refreshed by the chat commands update job when its version changes
+        self.holidays = Holidays(self.application.job_queue, self.credits, self.db, self.assets, self.users)
 
         self.command_logger = CommandLogger(self.bot_state, self.db)
-        self.core_commands = commands.Commands(self.command_logger, self.job_persistance, self.bot_state, self.db, self.assets)
-        self.chat_commands = ChatCommands(self.command_logger, self.job_persistance, self.bot_state, self.db, self.assets)
-        self.credit_commands = CreditCommands(self.command_logger, self.job_persistance, self.bot_state, self.credits, self.db, self.assets)
+        self.core_commands = commands.Commands(self.command_logger, self.job_persistance, self.bot_state, self.db, self.assets, self.users)
+        self.chat_commands = ChatCommands(self.command_logger, self.job_persistance, self.bot_state, self.db, self.assets, self.users)
+        self.credit_commands = CreditCommands(
+            self.command_logger, self.job_persistance, self.bot_state, self.credits, self.db, self.assets, self.users
+        )
 
         self.add_commands()
         self.application.run_polling()
@@ -53,6 +59,11 @@ class OzjaszBot:
         except Exception as e:
             log.error(f"Failed to register bot commands on startup: {e}")
 
+        try:
+            await asyncio.to_thread(regex_sandbox.start)
+        except Exception as e:
+            log.error(f"Failed to start the regex worker on startup, it will be started on first use: {e}")
+
     def add_commands(self):
         commands_map = self.get_commands_map()
         validated_commands_map = {
@@ -65,15 +76,7 @@ class OzjaszBot:
         command_handlers = [CommandHandler(command_name, func) for command_name, func in counted_commands_map.items()]
         self.application.add_handlers(command_handlers)
         self.application.add_handler(CallbackQueryHandler(self.credit_commands.btn_quiz_callback))
-        self.application.add_handler(
-            MessageHandler(filters.TEXT & (~filters.COMMAND), self.credit_commands.handle_map_quiz_answer), group=1
-        )
-        self.application.add_handler(
-            MessageHandler(filters.TEXT & (~filters.COMMAND), self.credit_commands.handle_flag_quiz_answer), group=3
-        )
-        self.application.add_handler(
-            MessageHandler(filters.TEXT & (~filters.COMMAND), self.credit_commands.handle_tournament_message), group=2
-        )
+        self.application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), self.bot_state.message_router.route), group=1)
 
     def get_commands_map(self):
         return {
@@ -0,0 +1,226 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from src.config.constants import (
+    REGEX_CACHE_SIZE,
+    REGEX_MAX_REJECTED_PATTERNS,
+    REGEX_MAX_RESIDENT_CORPORA,
+    REGEX_METRICS_WINDOW,
+    REGEX_TIME_BUDGET_SECONDS,
+    REGEX_WORKER_STARTUP_TIMEOUT_SECONDS,
+)
+
+log = logging.getLogger(__name__)
+
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+QUANTIFIER = r"(?:[+*]|\{\d*,?\d*\})"
+NESTED_QUANTIFIER_PATTERN = re.compile(rf"\((?:[^()\\]|\\.)*{QUANTIFIER}(?:[^()\\]|\\.)*\){QUANTIFIER}")
+WORKER_READY = "ready"
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compile_user_regex(pattern: str, flags: int = 0) -> re.Pattern:
+    """Compile a user provided regex once. Patterns with nested quantifiers like (a+)+ backtrack catastrophically and are rejected."""
+    if NESTED_QUANTIFIER_PATTERN.search(pattern):
+        raise re.error("nested quantifiers are not allowed", pattern=pattern)
+    return re.compile(pattern, flags)
+
+
+def is_regex(text: str) -> bool:
+    return any(char in REGEX_METACHARACTERS for char in text)
+
+
+def match_positions(compiled_pattern: re.Pattern, texts, positions, fullmatch: bool) -> list[int]:
+    """Positions of the matching texts, out of all texts or only the given positions."""
+    match = compiled_pattern.fullmatch if fullmatch else compiled_pattern.search
+    candidates = range(len(texts)) if positions is None else positions
+    return [int(position) for position in candidates if match(texts[position])]
+
+
+def regex_worker(connection):
+    """Worker process loop. Keeps the corpora it's sent with ("load", corpus_key, texts) until ("drop", corpus_key), and answers
+    ("search", pattern, flags, corpus_key, positions, fullmatch) with the positions of the matching texts of a corpus, or
+    ("search_texts", pattern, flags, texts, positions, fullmatch) with those of texts sent along."""
+    corpora = {}
+    connection.send(WORKER_READY)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+
+        match message:
+            case ("load", corpus_key, texts):
+                corpora[corpus_key] = texts
+            case ("drop", corpus_key):
+                corpora.pop(corpus_key, None)
+            case ("search", pattern, flags, corpus_key, positions, fullmatch):
+                connection.send(match_positions(compile_user_regex(pattern, flags), corpora[corpus_key], positions, fullmatch))
+            case ("search_texts", pattern, flags, texts, positions, fullmatch):
+                connection.send(match_positions(compile_user_regex(pattern, flags), texts, positions, fullmatch))
+
+
+class RegexSandbox:
+    """Runs user supplied regexes in a separate worker process with a hard time budget.
+
+    Python's re can't be interrupted, so a pattern that doesn't finish within the budget gets its worker killed and restarted, and the
+    pattern is remembered as rejected so it fails fast next time. Literal patterns can't backtrack and are matched in-process.
+
+    Corpora searched repeatedly, like the texts of a search index, are registered once with register_corpus and searched with their key.
+    The worker keeps the last REGEX_MAX_RESIDENT_CORPORA of them, so searching one again only sends the pattern. Other texts are sent
+    along with every search. The worker round trip blocks, handlers on the event loop use search_async / contains_async.
+    """
+
+    def __init__(self, time_budget_seconds: float = REGEX_TIME_BUDGET_SECONDS):
+        self.time_budget_seconds = time_budget_seconds
+        self.rejected_patterns = {}
+        self.durations = deque(maxlen=REGEX_METRICS_WINDOW)
+        self.calls = 0
+        self.worker_calls = 0
+        self.timeouts = 0
+        self.rejections = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()  # searches run in to_thread workers
+        self._corpus_ids = itertools.count()
+        self._process = None
+        self._connection = None
+        self._corpora = OrderedDict()  # keys of the corpora resident in the worker, least recently used first
+
+    def register_corpus(self, name: str) -> str:
+        """Key of a new corpus to search with, its texts are sent to the worker on the first search only. The texts of a key must not
+        change, changed texts are registered again."""
+        return f"{name}#{next(self._corpus_ids)}"
+
+    def search(
+        self, pattern: str, texts: list[str], flags: int = 0, fullmatch: bool = False, positions=None, corpus_key: str | None = None
+    ) -> list[int]:
+        """Positions of texts matching the pattern, only the given positions of texts are checked if passed. The texts of a registered
+        corpus are passed with its corpus_key. Raises re.error for an invalid pattern and TimeoutError when over the time budget."""
+        start_time = time.perf_counter()
+        with self._metrics_lock:
+            self.calls += 1
+        if (pattern, flags) in self.rejected_patterns:
+            with self._metrics_lock:
+                self.rejections += 1
+            raise TimeoutError(f"Regex {pattern} was rejected after exceeding the {self.time_budget_seconds}s time budget before.")
+
+        compiled_pattern = compile_user_regex(pattern, flags)
+        searched_count = len(texts) if positions is None else len(positions)
+        if not is_regex(pattern) or searched_count == 0:
+            matched = match_positions(compiled_pattern, texts, positions, fullmatch)
+        else:
+            matched = self._search_in_worker(pattern, texts, flags, fullmatch, positions, corpus_key)
+
+        duration = time.perf_counter() - start_time
+        with self._metrics_lock:
+            self.durations.append(duration)
+        log.info(f"Regex [{pattern}] matched {len(matched)}/{searched_count} texts in {duration * 1000:.1f}ms.")
+        return matched
+
+    def contains(self, series: pd.Series, pattern: str, flags: int = 0, fullmatch: bool = False) -> pd.Series:
+        """Sandboxed equivalent of series.str.contains / str.fullmatch. Only unique values are sent to the worker."""
+        unique_texts = series.dropna().unique()
+        matched = self.search(pattern, unique_texts.tolist(), flags, fullmatch)
+        return series.isin(unique_texts[np.array(matched, dtype=int)])
+
+    async def search_async(
+        self, pattern: str, texts: list[str], flags: int = 0, fullmatch: bool = False, positions=None, corpus_key: str | None = None
+    ) -> list[int]:
+        """search without blocking the event loop, the worker round trip and a worker restart run in a thread."""
+        return await asyncio.to_thread(self.search, pattern, texts, flags, fullmatch, positions, corpus_key)
+
+    async def contains_async(self, series: pd.Series, pattern: str, flags: int = 0, fullmatch: bool = False) -> pd.Series:
+        return await asyncio.to_thread(self.contains, series, pattern, flags, fullmatch)
+
+    def get_metrics(self) -> dict:
+        with self._metrics_lock:
+            durations_ms = np.array(self.durations) * 1000
+            counts = {"calls": self.calls, "worker_calls": self.worker_calls, "timeouts": self.timeouts, "rejections": self.rejections}
+        return {
+            **counts,
+            "cache_hits": compile_user_regex.cache_info().hits,
+            "p50_ms": float(np.percentile(durations_ms, 50)) if durations_ms.size else 0.0,
+            "p95_ms": float(np.percentile(durations_ms, 95)) if durations_ms.size else 0.0,
+            "max_ms": float(durations_ms.max()) if durations_ms.size else 0.0,
+        }
+
+    def start(self):
+        with self._lock:
+            self._ensure_worker()
+
+    def stop(self):
+        with self._lock:
+            self._stop_worker()
+
+    def _search_in_worker(self, pattern, texts, flags, fullmatch, positions, corpus_key) -> list[int]:
+        positions = None if positions is None else list(positions)
+        with self._lock:
+            self._ensure_worker()
+            with self._metrics_lock:
+                self.worker_calls += 1
+            if corpus_key is None:
+                self._connection.send(("search_texts", pattern, flags, list(texts), positions, fullmatch))
+            else:
+                self._load_corpus(corpus_key, texts)
+                self._connection.send(("search", pattern, flags, corpus_key, positions, fullmatch))
+            if self._connection.poll(self.time_budget_seconds):
+                return self._connection.recv()
+
+            with self._metrics_lock:
+                self.timeouts += 1
+            if len(self.rejected_patterns) >= REGEX_MAX_REJECTED_PATTERNS:
+                self.rejected_patterns.pop(next(iter(self.rejected_patterns)))
+            self.rejected_patterns[(pattern, flags)] = time.time()
+            log.warning(
+                f"Regex [{pattern}] exceeded the {self.time_budget_seconds}s time budget, restarting the regex worker. {self.get_metrics()}"
+            )
+            self._stop_worker()
+            raise TimeoutError(f"Regex {pattern} took longer than {self.time_budget_seconds}s")
+
+    def _load_corpus(self, corpus_key, texts):
+        """Send the texts to the worker unless they're already resident there, the least recently used corpus is dropped over the limit."""
+        if corpus_key in self._corpora:
+            self._corpora.move_to_end(corpus_key)
+            return
+        if len(self._corpora) >= REGEX_MAX_RESIDENT_CORPORA:
+            dropped_key, _ = self._corpora.popitem(last=False)
+            self._connection.send(("drop", dropped_key))
+        self._connection.send(("load", corpus_key, list(texts)))
+        self._corpora[corpus_key] = None
+
+    def _ensure_worker(self):
+        if self._process is not None and self._process.is_alive():
+            return
+
+        self._connection, worker_connection = self._context.Pipe()
+        self._process = self._context.Process(target=regex_worker, args=(worker_connection,), daemon=True, name="regex-sandbox")
+        self._process.start()
+        worker_connection.close()
+        if not self._connection.poll(REGEX_WORKER_STARTUP_TIMEOUT_SECONDS) or self._connection.recv() != WORKER_READY:
+            self._stop_worker()
+            raise TimeoutError("Regex worker failed to start.")
+        log.info(f"Regex worker started with pid {self._process.pid}.")
+
+    def _stop_worker(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+        if self._connection is not None:
+            self._connection.close()
+        self._process = None
+        self._connection = None
+        self._corpora.clear()
+
+
+regex_sandbox = RegexSandbox()
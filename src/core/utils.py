@@ -1,8 +1,10 @@
+import asyncio
 import json
 import locale
 import logging
 import os
 import random
+import re
 import string
 import sys
 import uuid
@@ -16,7 +18,7 @@ import telegram
 from telegram import BotCommand, Update
 from telegram.ext import ContextTypes
 
-from src.config.constants import TIMEZONE
+from src.config.constants import GENERAL_TOPIC_ID, TIMEZONE
 from src.config.enums import ArgType, ErrorMessage, HolyTextType, LuckyScoreType, MessageType, PeriodFilterMode, SiglumType
 from src.config.paths import (
     CHAT_AUDIO_DIR_PATH,
@@ -27,7 +29,9 @@ from src.config.paths import (
     COMMANDS_PATH,
 )
 from src.core.arg_parser import ArgParser
+from src.core.regex_sandbox import regex_sandbox
 from src.models.command_args import CommandArgs
+from src.stats import etl_runs
 
 log = logging.getLogger(__name__)
 
@@ -77,6 +81,11 @@ def preprocess_input(users_df: pd.DataFrame, command_args: CommandArgs):
     return ArgParser.preprocess_input(users_df, command_args)
 
 
+async def preprocess_input_async(users_df: pd.DataFrame, command_args: CommandArgs):
+    """preprocess_input for handlers, a regex phrase filter runs in the regex sandbox without blocking the event loop."""
+    return await asyncio.to_thread(preprocess_input, users_df, command_args)
+
+
 def parse_args(users_df, command_args: CommandArgs) -> CommandArgs:
     return ArgParser.parse_args(users_df, command_args)
 
@@ -215,7 +224,10 @@ async def download_media(message, message_type):
             return None
 
     if not os.path.exists(path):
-        await message.download_media(file=path)
+        with etl_runs.stage("media_download") as stage_timing:
+            downloaded_path = await message.download_media(file=path)
+            if downloaded_path is not None:
+                stage_timing.count(rows=1, bytes_downloaded=await asyncio.to_thread(os.path.getsize, downloaded_path))
 
 
 def parse_arg(users_df, command_args_ref, arg_str, arg_type: ArgType, is_optional=False) -> tuple[str | int, CommandArgs]:
@@ -427,6 +439,21 @@ def regexify_multiword_filter(words):
     return base.format("".join(expr.format(w) for w in words))
 
 
+def regex_mask(series: pd.Series, pattern: str, flags: int = 0, fullmatch: bool = False) -> tuple[pd.Series, str]:
+    """Boolean mask of a user regex matched through the regex sandbox, empty mask and an error message for invalid or too slow patterns."""
+    try:
+        return regex_sandbox.contains(series, pattern, flags, fullmatch), ""
+    except re.error:
+        return pd.Series(False, index=series.index), f"{pattern} - {ErrorMessage.INVALID_REGEX.value}"
+    except TimeoutError:
+        return pd.Series(False, index=series.index), f"{pattern} - {ErrorMessage.REGEX_TIMEOUT.value}"
+
+
+async def regex_mask_async(series: pd.Series, pattern: str, flags: int = 0, fullmatch: bool = False) -> tuple[pd.Series, str]:
+    """regex_mask for handlers, the sandbox round trip doesn't block the event loop."""
+    return await asyncio.to_thread(regex_mask, series, pattern, flags, fullmatch)
+
+
 def parse_quran_verse_arg(quran_df, arg, bot_state, holy_text_type) -> [str, str]:
     arg_split = arg.split(":")
     if len(arg_split) != 2:
@@ -490,6 +517,18 @@ def generate_response_headline(command_args, label, text_before_str="of", text_b
     return text
 
 
+def get_topic_id(update: Update) -> int:
+    """The forum topic the message was sent in, GENERAL_TOPIC_ID for the General topic and chats without topics."""
+    message = update.effective_message
+    return message.message_thread_id if message.is_topic_message else GENERAL_TOPIC_ID
+
+
+def set_topic_arg(update: Update, command_args: CommandArgs):
+    """Restrict a stats command to the topic it was sent in, if it was called with the topic named arg."""
+    if "topic" in command_args.named_args:
+        command_args.topic_id = get_topic_id(update)
+
+
 async def send_message(update: Update, context: ContextTypes.DEFAULT_TYPE, message_type: MessageType, text: str, path: str = ""):
     log.info(f"Sending message: {text} with media type: {message_type} and media path: {path}")
     match message_type:
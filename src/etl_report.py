@@ -0,0 +1,23 @@
+import argparse
+from datetime import UTC, datetime, timedelta
+
+from src.config.enums import ETLJob
+from src.models.db.db import DB
+from src.stats.etl_runs import get_recent_runs, get_stage_percentiles
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the recent ETL runs and the percentile timings of their stages.")
+    parser.add_argument("--job", default=None, choices=[job.value for job in ETLJob], help="Specify the ETL job, all jobs by default.")
+    parser.add_argument("--days", default=7, help="Specify the number of past days of ETL runs to compute the percentiles from.")
+    parser.add_argument("--runs", default=20, help="Specify the number of recent runs to print.")
+    args = parser.parse_args()
+
+    db = DB()
+    runs_df, stages_df = db.load_etl_runs(datetime.now(UTC) - timedelta(days=int(args.days)), args.job)
+    if runs_df.empty:
+        print(f"No ETL runs in the past {args.days} days.")
+    else:
+        print(f"Last {args.runs} ETL runs, stage durations in seconds:")
+        print(get_recent_runs(runs_df, stages_df, int(args.runs)).to_string())
+        print(f"\nStage durations of successful runs in the past {args.days} days, in seconds:")
+        print(get_stage_percentiles(runs_df, stages_df).to_string())
@@ -1,11 +1,26 @@
 import argparse
 
+from src.stats import utils as stats_utils
+from src.stats.chat_backfill import ChatBackfill
 from src.stats.chat_etl import ChatETL
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download and preprocess telegram chat messages and images.")
-    parser.add_argument("--days", default=7, help="Specify the number of past days of chat messages that should be updated.")
+    parser.add_argument("--days", default=None, help="Specify the number of past days of chat messages that should be updated.")
+    parser.add_argument(
+        "--backfill", action="store_true", help="Backfill the chat history in resumable chunks, the whole history by default."
+    )
+    parser.add_argument("--restart", action="store_true", help="Start the backfill over, instead of resuming the previous one.")
+    parser.add_argument("--no-takeout", action="store_true", help="Backfill with the regular client instead of a takeout session.")
+    parser.add_argument(
+        "--full-validation", action="store_true", help="Validate every row of the ETL tables, instead of only the rows of this run."
+    )
     args = parser.parse_args()
 
+    stats_utils.remove_chat_etl_lock_on_sigterm()
     chat_stats = ChatETL()
-    chat_stats.update(int(args.days), bulk_ocr=False)
+    if args.backfill:
+        days = int(args.days) if args.days is not None else None
+        ChatBackfill(chat_stats).run(days, restart=args.restart, use_takeout=not args.no_takeout)
+    else:
+        chat_stats.update(int(args.days) if args.days is not None else 7, bulk_ocr=False, full_validation=args.full_validation)
@@ -0,0 +1,24 @@
+import argparse
+
+from src.config.assets import Assets
+from src.models.db.db import DB
+from src.stats import utils as stats_utils
+from src.stats.chat_etl import ChatETL
+from src.stats.etl_service import ETLService
+from src.stats.word_stats import WordStats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the chat ETL as a resident service, instead of the main_etl.py and word_stats_etl.py cron runs."
+    )
+    parser.add_argument("--interval", default=None, help="Specify the number of seconds between polling ETL cycles.")
+    parser.add_argument("--polling", action="store_true", help="Only poll the chat history, without listening to chat events.")
+    args = parser.parse_args()
+
+    stats_utils.remove_chat_etl_lock_on_sigterm()
+    db = DB()
+    chat_etl = ChatETL(db)
+    word_stats = WordStats(db, Assets())
+    interval_seconds = int(args.interval) if args.interval is not None else None
+    service = ETLService(db, chat_etl, word_stats, realtime=not args.polling, interval_seconds=interval_seconds)
+    chat_etl.client_api_handler.client.loop.run_until_complete(service.run())
@@ -0,0 +1,111 @@
+import difflib
+import re
+
+import src.stats.utils as stats_utils
+
+_ROMAN_NUMERAL_PATTERN = re.compile(r"^m{0,4}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$")
+_FUZZY_CUTOFF = 0.75
+_MIN_FUZZY_WORD_LENGTH = 3
+
+
+def levenshtein(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous_row = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current_row = [i]
+        for j, char_b in enumerate(b, start=1):
+            current_row.append(min(previous_row[j] + 1, current_row[j - 1] + 1, previous_row[j - 1] + (char_a != char_b)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree of words, finds every word within an edit distance of a query without comparing it to all of them."""
+
+    def __init__(self, words):
+        self.root: tuple[str, dict] | None = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        if self.root is None:
+            self.root = (word, {})
+            return
+
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> list[str]:
+        matches = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node_word, children = nodes.pop()
+            distance = levenshtein(word, node_word)
+            if distance <= max_distance:
+                matches.append(node_word)
+            nodes.extend(child for child_distance, child in children.items() if abs(child_distance - distance) <= max_distance)
+        return matches
+
+
+class AnswerMatcher:
+    """Quiz answer checker, built once per quiz from its valid answers (see MapQuiz.get_valid_answers, FlagQuiz.get_valid_answers).
+
+    An answer is correct if it's one of the valid answers, or if every word of it is. A word of at least 3 letters that isn't a roman
+    numeral also matches its closest valid single word with a difflib ratio >= 0.75, if their lengths differ by at most 1 (2 for words
+    longer than 6 letters). Fuzzy matching compares diacritic-folded words, and the closest words are looked up in a BK-tree bounded by
+    the largest edit distance a 0.75 ratio allows, so only a few candidates get scored. Results are cached per word.
+    """
+
+    def __init__(self, valid_answers: set[str]):
+        self.valid_answers = valid_answers
+        self.tree = BKTree(sorted({self.normalize(answer) for answer in valid_answers if len(answer.split()) == 1}))
+        self.word_cache: dict[str, bool] = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return stats_utils.remove_diactric_accents(text.lower().strip())
+
+    def is_correct(self, user_answer: str) -> bool:
+        if user_answer in self.valid_answers:
+            return True
+
+        user_words = user_answer.split()
+        if not user_words:
+            return False
+        return all(self.is_word_correct(word) for word in user_words)
+
+    def is_word_correct(self, word: str) -> bool:
+        is_correct = self.word_cache.get(word)
+        if is_correct is None:
+            is_correct = word in self.valid_answers or (
+                len(word) >= _MIN_FUZZY_WORD_LENGTH and not _ROMAN_NUMERAL_PATTERN.match(word) and self.is_close_match(word)
+            )
+            self.word_cache[word] = is_correct
+        return is_correct
+
+    def is_close_match(self, word: str) -> bool:
+        word = self.normalize(word)
+        # A ratio of 2 * matches / (len(a) + len(b)) >= 0.75 needs len(b) <= 5/3 * len(a), which bounds the edit distance by 2/3 * len(a)
+        candidates = self.tree.search(word, max_distance=2 * len(word) // 3)
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        scored_candidates = []
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() >= _FUZZY_CUTOFF and matcher.quick_ratio() >= _FUZZY_CUTOFF and matcher.ratio() >= _FUZZY_CUTOFF:
+                scored_candidates.append((matcher.ratio(), candidate))
+        if not scored_candidates:
+            return False
+
+        _, best_match = max(scored_candidates)
+        return abs(len(word) - len(best_match)) <= (1 if len(word) <= 6 else 2)
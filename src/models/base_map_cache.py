@@ -0,0 +1,171 @@
+import logging
+import math
+import os
+from dataclasses import dataclass
+from functools import cache, lru_cache
+
+from PIL import Image
+
+from src.config.paths import MAP_QUIZ_BASE_TILES_DIR_PATH
+
+log = logging.getLogger(__name__)
+
+# WGS84 ellipsoid, same as the default globe of cartopy's Mercator, so cached rasters line up with the cartopy renders
+_EARTH_RADIUS = 6378137.0
+_ECCENTRICITY = 0.0818191908426
+_MAX_LAT = 80.0
+TILE_SIZE = 512
+_MAX_UPSCALE = 1.5
+_TILE_CACHE_SIZE = 48
+
+
+@dataclass(frozen=True)
+class BaseMapLevel:
+    """A zoom level of the base map raster, a full Mercator world (±80° lat) cut into square tiles."""
+
+    name: str
+    pixels_per_degree: int
+    resolution: str
+    show_borders: bool
+
+    @property
+    def meters_per_pixel(self) -> float:
+        return _EARTH_RADIUS * math.pi / 180 / self.pixels_per_degree
+
+    @property
+    def grid_size(self) -> tuple[int, int]:
+        """Returns (columns, rows) of tiles covering the level."""
+        width = 2 * math.pi * _EARTH_RADIUS / self.meters_per_pixel
+        height = 2 * mercator_y(_MAX_LAT) / self.meters_per_pixel
+        return math.ceil(width / TILE_SIZE), math.ceil(height / TILE_SIZE)
+
+
+# Zoomed out maps use the 50m shapes without borders and close-ups the 10m shapes with borders, like MapQuiz.generate_image
+BASE_MAP_LEVELS = [
+    BaseMapLevel("world_8", 8, "50m", False),
+    BaseMapLevel("world_16", 16, "50m", False),
+    BaseMapLevel("world_32", 32, "50m", False),
+    BaseMapLevel("detail_32", 32, "10m", True),
+    BaseMapLevel("detail_64", 64, "10m", True),
+    BaseMapLevel("detail_128", 128, "10m", True),
+]
+
+
+def mercator_x(lon: float) -> float:
+    return _EARTH_RADIUS * math.radians(lon)
+
+
+def mercator_y(lat: float) -> float:
+    phi = math.radians(lat)
+    e_sin = _ECCENTRICITY * math.sin(phi)
+    return _EARTH_RADIUS * math.log(math.tan(math.pi / 4 + phi / 2) * ((1 - e_sin) / (1 + e_sin)) ** (_ECCENTRICITY / 2))
+
+
+def get_tile_bounds(level: BaseMapLevel, column: int, row: int) -> tuple[float, float, float, float]:
+    """Returns (x_min, x_max, y_min, y_max) of a tile in Mercator meters."""
+    tile_meters = TILE_SIZE * level.meters_per_pixel
+    x_min = -math.pi * _EARTH_RADIUS + column * tile_meters
+    y_max = mercator_y(_MAX_LAT) - row * tile_meters
+    return x_min, x_min + tile_meters, y_max - tile_meters, y_max
+
+
+@cache
+def _report_missing_levels(tiles_dir: str, level_names: tuple[str, ...]):
+    """Logs the unbuilt levels once per process, map quizzes of those levels fall back to a full cartopy render of several seconds."""
+    log.error(
+        f"Map quiz base tiles of levels {list(level_names)} are missing in {tiles_dir}, map quizzes are rendered with cartopy. "
+        f"Build them once with `python src/scripts/build_map_quiz_base_tiles.py`."
+    )
+
+
+@lru_cache(maxsize=_TILE_CACHE_SIZE)
+def _load_tile(path: str) -> Image.Image:
+    with Image.open(path) as tile:
+        return tile.convert("RGB")
+
+
+class BaseMapCache:
+    """Pre-rendered base map tiles (see src/scripts/build_map_quiz_base_tiles.py) cropped to a map extent without cartopy.
+
+    Every level is a Mercator raster centered at 0° longitude. For a Mercator projection the central longitude is only a shift along x, so
+    a crop of the cached raster is the same picture cartopy would render for any map that doesn't cross the antimeridian.
+    """
+
+    def __init__(self, tiles_dir: str = MAP_QUIZ_BASE_TILES_DIR_PATH, levels: list[BaseMapLevel] = None):
+        self.tiles_dir = str(tiles_dir)
+        self.levels = BASE_MAP_LEVELS if levels is None else levels
+        missing_levels = self.get_missing_levels()
+        if missing_levels:
+            _report_missing_levels(self.tiles_dir, tuple(level.name for level in missing_levels))
+
+    def get_tile_path(self, level: BaseMapLevel, column: int, row: int) -> str:
+        return os.path.join(self.tiles_dir, level.name, f"{row}_{column}.png")
+
+    def get_missing_levels(self) -> list[BaseMapLevel]:
+        return [level for level in self.levels if not os.path.isdir(os.path.join(self.tiles_dir, level.name))]
+
+    def get_available_levels(self, show_borders: bool) -> list[BaseMapLevel]:
+        levels = [level for level in self.levels if level.show_borders == show_borders]
+        levels = [level for level in levels if os.path.isdir(os.path.join(self.tiles_dir, level.name))]
+        return sorted(levels, key=lambda level: level.pixels_per_degree)
+
+    def choose_level(self, meters_per_pixel: float, show_borders: bool) -> BaseMapLevel | None:
+        """The coarsest available level that doesn't need more than _MAX_UPSCALE of upscaling, or the finest one."""
+        levels = self.get_available_levels(show_borders)
+        for level in levels:
+            if level.meters_per_pixel <= meters_per_pixel * _MAX_UPSCALE:
+                return level
+        return levels[-1] if levels else None
+
+    @staticmethod
+    def get_image_size(extent: list[float], max_size: tuple[int, int]) -> tuple[int, int]:
+        """Returns (width, height) of an extent [lon_min, lon_max, lat_min, lat_max] scaled to fit max_size, keeping the Mercator aspect."""
+        lon_min, lon_max, lat_min, lat_max = extent
+        width_meters = mercator_x(lon_max) - mercator_x(lon_min)
+        height_meters = mercator_y(lat_max) - mercator_y(lat_min)
+        scale = min(max_size[0] / width_meters, max_size[1] / height_meters)
+        return max(1, round(width_meters * scale)), max(1, round(height_meters * scale))
+
+    @staticmethod
+    def project(lon: float, lat: float, extent: list[float], size: tuple[int, int]) -> tuple[float, float]:
+        """Pixel position of (lon, lat) on an image of the given size showing the extent."""
+        lon_min, lon_max, lat_min, lat_max = extent
+        x_min, x_max = mercator_x(lon_min), mercator_x(lon_max)
+        y_min, y_max = mercator_y(lat_min), mercator_y(lat_max)
+        x = (mercator_x(lon) - x_min) / (x_max - x_min) * size[0]
+        y = (y_max - mercator_y(lat)) / (y_max - y_min) * size[1]
+        return x, y
+
+    def get_base_map(self, extent: list[float], show_borders: bool, max_size: tuple[int, int]) -> Image.Image | None:
+        """Base map of the extent [lon_min, lon_max, lat_min, lat_max] stitched from the cached tiles, None if any tile is missing."""
+        size = self.get_image_size(extent, max_size)
+        lon_min, lon_max, lat_min, lat_max = extent
+        x_min, x_max = mercator_x(lon_min), mercator_x(lon_max)
+        y_min, y_max = mercator_y(lat_min), mercator_y(lat_max)
+
+        level = self.choose_level((x_max - x_min) / size[0], show_borders)
+        if level is None:
+            return None
+
+        # Extent in pixels of the level's full world raster
+        origin_x, origin_y = -math.pi * _EARTH_RADIUS, mercator_y(_MAX_LAT)
+        left = (x_min - origin_x) / level.meters_per_pixel
+        right = (x_max - origin_x) / level.meters_per_pixel
+        top = (origin_y - y_max) / level.meters_per_pixel
+        bottom = (origin_y - y_min) / level.meters_per_pixel
+
+        columns, rows = level.grid_size
+        first_column, last_column = max(0, int(left // TILE_SIZE)), min(columns - 1, int(math.ceil(right / TILE_SIZE)) - 1)
+        first_row, last_row = max(0, int(top // TILE_SIZE)), min(rows - 1, int(math.ceil(bottom / TILE_SIZE)) - 1)
+
+        canvas = Image.new("RGB", ((last_column - first_column + 1) * TILE_SIZE, (last_row - first_row + 1) * TILE_SIZE), "white")
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                tile_path = self.get_tile_path(level, column, row)
+                if not os.path.exists(tile_path):
+                    return None
+                canvas.paste(_load_tile(tile_path), ((column - first_column) * TILE_SIZE, (row - first_row) * TILE_SIZE))
+
+        offset_x, offset_y = first_column * TILE_SIZE, first_row * TILE_SIZE
+        box = (left - offset_x, top - offset_y, right - offset_x, bottom - offset_y)
+        return canvas.resize(size, Image.Resampling.BILINEAR, box=box)
@@ -1,11 +1,12 @@
 import datetime
 import logging
-import random
 from collections import defaultdict
 from zoneinfo import ZoneInfo
 
 from src.config.constants import MAX_CWEL_USAGE_DAILY, MAX_GET_CREDITS_DAILY, MAX_REMINDERS_DAILY_USAGE, MAX_STEAL_CREDITS_DAILY, TIMEZONE
 from src.config.enums import HolyTextType
+from src.core.message_router import MessageRouter
+from src.models.quiz_tracker import QuizTracker
 
 log = logging.getLogger(__name__)
 
@@ -22,27 +23,14 @@ class BotState:
         self.quiz_cache = {}
         self.map_quiz_cache = {}
         self.flag_quiz_cache = {}
-        self.available_quiz_id_map = {}
+        self.quiz_tracker = None
         self.tournament_daily_bans = defaultdict(set)
+        self.message_router = MessageRouter()
 
         self.run_schedules(job_queue)
 
-    def init_quiz_map(self, users_df):
-        for user_id in users_df.index:
-            self.available_quiz_id_map[user_id] = self.assets.quiz_df["quiz_id"].tolist()
-
-    def get_random_quiz_id(self, quiz_df, user_id):
-        if user_id not in self.available_quiz_id_map or not self.available_quiz_id_map[user_id]:  # reset the quizes for the user
-            self.available_quiz_id_map[user_id] = quiz_df["quiz_id"].tolist()
-
-        quiz_ids = quiz_df["quiz_id"].tolist()
-        joined_quiz_ids = list(set(self.available_quiz_id_map[user_id]) & set(quiz_ids))
-        if not joined_quiz_ids:
-            return -1
-
-        quiz_id = random.choice(joined_quiz_ids)
-        self.available_quiz_id_map[user_id].remove(quiz_id)
-        return quiz_id
+    def init_quiz_tracker(self, db):
+        self.quiz_tracker = QuizTracker(self.assets.quiz_df, db)
 
     def update_cwel_usage_map(self, cwel_giver_id, cwel_value) -> [bool, str]:
         if (
@@ -89,6 +77,8 @@ class BotState:
         self.get_credits_daily_count_map = defaultdict(int)
         self.steal_credits_daily_count_map = defaultdict(int)
         self.quiz_cache = {}
+        for user_id, quiz in [*self.map_quiz_cache.items(), *self.flag_quiz_cache.items()]:
+            self.message_router.unregister(quiz["chat_id"], quiz["thread_id"], user_id)
         self.map_quiz_cache = {}
         self.flag_quiz_cache = {}
         self.tournament_daily_bans = defaultdict(set)
@@ -1,10 +1,12 @@
+import copy
 from dataclasses import dataclass, field
 from datetime import datetime
 
 from src.config.enums import ArgType, DatetimeFormat, PeriodFilterMode
+from src.models.text_index import TextSearchIndex
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandArgs:
     args: list[str] = field(default_factory=lambda: [])
     joined_args: str = ""
@@ -19,10 +21,12 @@ class CommandArgs:
     optional_errors: list[str] = field(default_factory=lambda: [])
     arg_type: ArgType = None
     phrases: list[str] = field(default_factory=lambda: [])
+    phrase_index: TextSearchIndex = None
     period_mode: PeriodFilterMode = PeriodFilterMode.TOTAL
     period_time: int = -1
     user: str = None
     user_id: str = None
+    topic_id: int = None
     start_dt: datetime = None
     end_dt: datetime = None
     dt: datetime = None
@@ -44,3 +48,13 @@ class CommandArgs:
     def __post_init__(self):
         if not self.optional:
             self.optional = [False] * len(self.expected_args)
+
+    def fork(self) -> "CommandArgs":
+        """Cheap copy for a parsing step. Only containers mutated while parsing are copied, everything else (phrases, phrase indexes,
+        named args definitions) is shared with the original."""
+        command_args = copy.copy(self)
+        command_args.args = list(self.args)
+        command_args.named_args = dict(self.named_args)
+        command_args.errors = list(self.errors)
+        command_args.optional_errors = list(self.optional_errors)
+        return command_args
@@ -1,11 +1,11 @@
 import logging
-import random
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
 from src.config.paths import COUNTRIES_PATH
+from src.models.record_pools import RecordPools, ShuffledPool
 
 log = logging.getLogger(__name__)
 
@@ -29,6 +29,7 @@ CONTINENT_ALIASES = {
     "oc": "Oceania",
     "australia": "Oceania",
 }
+DIFFICULTIES = ["easy", "medium", "hard", "crazy"]
 
 
 class Countries:
@@ -49,11 +50,10 @@ class Countries:
 
         df = df.sort_values(by="easiness_score", ascending=False).reset_index(drop=True)
 
-        difficulties = ["easy", "medium", "hard", "crazy"]
-        chunks = np.array_split(df.index, len(difficulties))
+        chunks = np.array_split(df.index, len(DIFFICULTIES))
         df["difficulty"] = "crazy"
         self.difficulty_index_ranges = {}
-        for diff, chunk in zip(difficulties, chunks, strict=False):
+        for diff, chunk in zip(DIFFICULTIES, chunks, strict=False):
             if len(chunk) > 0:
                 df.loc[chunk, "difficulty"] = diff
                 self.difficulty_index_ranges[diff] = (int(chunk[0]), int(chunk[-1]) + 1)
@@ -61,51 +61,36 @@ class Countries:
                 self.difficulty_index_ranges[diff] = (0, 0)
 
         self.df = df
-        self._shuffle_queue: list[int] = []
+        self.pools = RecordPools(df, ["continent", "difficulty"])
         log.info(
             f"Countries loaded and partitioned: {len(self.df)} countries across difficulties {list(self.difficulty_index_ranges.keys())}."
         )
 
-    def get_countries(self, difficulty: str | None = None, continent: str | None = None) -> pd.DataFrame:
-        filtered_df = self.df
+    def get_pool(self, difficulty: str | None = None, continent: str | None = None) -> ShuffledPool:
+        continents = None
         if continent is not None and str(continent).strip() != "":
             norm_cont = str(continent).strip().lower()
-            if norm_cont in CONTINENT_ALIASES:
-                target_cont = CONTINENT_ALIASES[norm_cont]
-                filtered_df = filtered_df[filtered_df["continent"].str.contains(target_cont, case=False, na=False)]
-            else:
-                filtered_df = filtered_df[filtered_df["continent"].str.contains(continent, case=False, na=False)]
+            continents = self.pools.match_values("continent", CONTINENT_ALIASES.get(norm_cont, norm_cont))
 
+        difficulties = None
         if difficulty is not None and str(difficulty).strip() != "":
-            norm_diff = str(difficulty).strip().lower()
-            filtered_df = filtered_df[filtered_df["difficulty"] == norm_diff]
-
-        return filtered_df
+            difficulties = frozenset([str(difficulty).strip().lower()])
 
-    def get_available_difficulties(self, continent: str | None = None) -> list[str]:
-        filtered_df = self.get_countries(continent=continent)
-        return [diff for diff in ["easy", "medium", "hard", "crazy"] if not filtered_df[filtered_df["difficulty"] == diff].empty]
+        return self.pools.get_pool(continent=continents, difficulty=difficulties)
 
-    def _refill_shuffle_queue(self) -> None:
-        indices = self.df.index.tolist()
-        random.shuffle(indices)
-        self._shuffle_queue = indices
+    def get_countries(self, difficulty: str | None = None, continent: str | None = None) -> pd.DataFrame:
+        return self.df.iloc[self.get_pool(difficulty, continent).positions]
 
-    def pop_random_country(self, filtered_df: pd.DataFrame | None = None) -> dict:
-        """Return one country as a dict.
+    def get_available_difficulties(self, continent: str | None = None) -> list[str]:
+        return [diff for diff in DIFFICULTIES if len(self.get_pool(diff, continent)) > 0]
 
-        When *filtered_df* is given (difficulty / continent filter active) the
-        choice is a plain uniform sample from that sub-pool — the pool is
-        already constrained so the queue approach would not help much.
+    def pop_random_country(self, difficulty: str | None = None, continent: str | None = None) -> dict | None:
+        """Return one country as a dict, or None if no country matches the filters.
 
-        When called without a filter, uses a Fisher-Yates shuffle queue so that
-        every country appears exactly once before any country repeats, which
-        eliminates the birthday-paradox clustering that makes pure random.sample
-        feel non-random.
+        Every difficulty / continent filter has its own Fisher-Yates shuffle queue, so that every country of the pool appears exactly
+        once before any country repeats, which eliminates the birthday-paradox clustering that makes pure random.sample feel non-random.
         """
-        if filtered_df is not None:
-            return filtered_df.sample(n=1).iloc[0].to_dict()
-        if not self._shuffle_queue:
-            self._refill_shuffle_queue()
-        idx = self._shuffle_queue.pop()
-        return self.df.loc[idx].to_dict()
+        pool = self.get_pool(difficulty, continent)
+        if len(pool) == 0:
+            return None
+        return self.pools.records[pool.pop()]
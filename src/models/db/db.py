@@ -1,11 +1,12 @@
 import json
 import logging
 import sqlite3
+from datetime import UTC, datetime, timedelta
 
 import pandas as pd
 
 import src.core.utils as core_utils
-from src.config.constants import TIMEZONE
+from src.config.constants import ETL_RUNS_RETENTION_DAYS, TIMEZONE
 from src.config.enums import DBSaveMode, Table
 from src.config.paths import (
     CHAT_HISTORY_PATH,
@@ -19,9 +20,31 @@ from src.config.paths import (
     USERS_PATH,
 )
 from src.models.credits import Credits
+from src.stats import etl_runs
 
 log = logging.getLogger(__name__)
 
+SQLITE_MAX_PARAMS = 999  # bound parameters per statement, the limit of older sqlite builds
+
+# Columns added to existing tables after their creation, CREATE TABLE IF NOT EXISTS doesn't add them to an existing db
+ADDED_COLUMNS = {
+    Table.CHAT_HISTORY: {"reply_to_msg_id": "INTEGER", "topic_id": "INTEGER"},
+    Table.CLEANED_CHAT_HISTORY: {
+        "word_count": "INTEGER",
+        "word_length": "INTEGER",
+        "char_length": "INTEGER",
+        "emoji_count": "INTEGER",
+        "has_link": "INTEGER",
+        "local_day": "INTEGER",
+        "local_hour": "INTEGER",
+        "text_folded": "TEXT",
+        "reply_to_msg_id": "INTEGER",
+        "topic_id": "INTEGER",
+    },
+}
+BOOL_COLUMNS = ["success", "has_link"]
+NULLABLE_INT_COLUMNS = ["reply_to_msg_id", "topic_id"]
+
 
 class DB:
     """SQLite database manager for the Telegram bot.
@@ -60,9 +83,24 @@ class DB:
         with open(DB_SCHEMA_SQL_PATH) as schema_file:
             schema_sql = schema_file.read()
 
+        self.add_missing_columns()
         self.conn.executescript(schema_sql)
         self.conn.commit()
 
+    def add_missing_columns(self) -> None:
+        """Add the ADDED_COLUMNS missing from tables of an existing database, their values stay NULL until backfilled.
+
+        Runs before the schema script, which also creates the indexes of the added columns.
+        """
+        for table, columns in ADDED_COLUMNS.items():
+            existing_columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table.value})")}
+            if not existing_columns:  # a new database, the schema script creates the table
+                continue
+            for column, column_type in columns.items():
+                if column not in existing_columns:
+                    log.info(f"Adding column {column} to {table.value} table.")
+                    self.conn.execute(f"ALTER TABLE {table.value} ADD COLUMN {column} {column_type}")
+
     def serialize_lists(self, df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
         """Convert list columns to JSON strings for database storage."""
         for col in columns:
@@ -113,6 +151,22 @@ class DB:
             df[col] = df[col].astype(bool)
         return df
 
+    def serialize_nullable_ints(self, df: pd.DataFrame, int_columns: list[str]) -> pd.DataFrame:
+        """Convert nullable integer (Int64) columns to python ints and None for database storage."""
+        for col in int_columns:
+            if col not in df.columns:
+                continue
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+        return df
+
+    def deserialize_nullable_ints(self, df: pd.DataFrame, int_columns: list[str]) -> pd.DataFrame:
+        """Convert integer columns with NULLs, read as floats or objects, back to nullable integers (Int64)."""
+        for col in int_columns:
+            if col not in df.columns:
+                continue
+            df[col] = df[col].astype("Int64")
+        return df
+
     def migrate(self) -> None:
         """Migrate all parquet data to SQLite database.
         Reads data from all parquet files and the credits pickle file,
@@ -155,7 +209,7 @@ class DB:
         Args:
             df: DataFrame to save to the database
             table: Target table enum value
-            mode: Save mode (APPEND, REPLACE, or FAIL)
+            mode: Save mode (APPEND, REPLACE, FAIL or UPSERT)
         """
         if df is None or df.empty:
             log.info(f"No data found for table {table}, skipping.")
@@ -166,6 +220,9 @@ class DB:
             case Table.CHAT_HISTORY | Table.CLEANED_CHAT_HISTORY:
                 df_copy = self.serialize_lists(df_copy, ["reaction_emojis", "reaction_user_ids"])
                 df_copy = self.serialize_datetimes(df_copy, ["timestamp"])
+                df_copy = self.serialize_nullable_ints(df_copy, NULLABLE_INT_COLUMNS)
+                if "has_link" in df_copy.columns:
+                    df_copy = self.bool_to_int(df_copy, "has_link")
             case Table.USERS:
                 df_copy = self.serialize_lists(df_copy, ["nicknames"])
             case Table.REACTIONS | Table.COMMANDS_USAGE | Table.CWEL | Table.CREDIT_HISTORY:
@@ -175,18 +232,25 @@ class DB:
             case _:
                 # default: no special handling
                 pass
-        write_index = table == Table.USERS
+        if table == Table.USERS:  # user_id is the index, the insert modes write columns only
+            df_copy = df_copy.reset_index()
 
         # Write to SQLite
-        before_count = self.count_rows(table)
-        if mode == DBSaveMode.REPLACE:
-            self.conn.execute(f"DELETE FROM {table.value}")
-            df_copy.to_sql(table.value, self.conn, if_exists="append", index=write_index, chunksize=1000, method="multi")
-            self.conn.commit()
-        elif mode == DBSaveMode.APPEND:
-            self.insert_ignore_duplicates(df_copy, table)
-        after_count = self.count_rows(table)
+        with etl_runs.stage("db_write") as stage_timing:
+            before_count = self.count_rows(table)
+            if mode == DBSaveMode.REPLACE:
+                self.conn.execute(f"DELETE FROM {table.value}")
+                df_copy.to_sql(table.value, self.conn, if_exists="append", index=False, chunksize=1000, method="multi")
+                self.conn.commit()
+            elif mode == DBSaveMode.APPEND:
+                self.insert_ignore_duplicates(df_copy, table)
+            elif mode == DBSaveMode.UPSERT:
+                self.insert_replace_duplicates(df_copy, table)
+            after_count = self.count_rows(table)
+            stage_timing.count(rows=len(df_copy))
         log.info(f"Added {after_count - before_count} rows to {table.value} table in {mode.value} mode. Currently at: {after_count} rows.")
+        if table == Table.USERS:
+            self.bump_table_version(table)
 
     def count_rows(self, table: Table):
         return self.conn.execute(f"SELECT COUNT(*) FROM {table.value}").fetchone()[0]
@@ -211,6 +275,51 @@ class DB:
         self.conn.executemany(sql, df.itertuples(index=False, name=None))
         self.conn.commit()
 
+    def insert_replace_duplicates(self, df: pd.DataFrame, table: Table) -> None:
+        """Insert records into the specified table, replacing the rows with the same primary key, e.g. edited messages."""
+        cols = ", ".join(df.columns)
+        placeholders = ", ".join("?" for _ in df.columns)
+
+        sql = f"""
+            INSERT OR REPLACE INTO {table.value} ({cols})
+            VALUES ({placeholders})
+        """
+
+        self.conn.executemany(sql, df.itertuples(index=False, name=None))
+        self.conn.commit()
+
+    def delete_messages(self, message_ids: list[int]) -> None:
+        """Delete messages removed from the chat with their reactions, and record them so the bot drops them too."""
+        params = [(int(message_id),) for message_id in message_ids]
+        with etl_runs.stage("db_write") as stage_timing, self.conn:
+            self.conn.execute("BEGIN")
+            for table in [Table.CHAT_HISTORY, Table.CLEANED_CHAT_HISTORY, Table.REACTIONS]:
+                self.conn.executemany(f"DELETE FROM {table.value} WHERE message_id = ?", params)
+            self.conn.executemany("INSERT OR IGNORE INTO updated_message_ids (message_id) VALUES (?)", params)
+            stage_timing.count(rows=len(params))
+
+    def apply_reactions_diff(self, inserts_df: pd.DataFrame, updates_df: pd.DataFrame, deletes_df: pd.DataFrame) -> None:
+        """Write a reactions diff (see chat_etl.diff_reactions) in one transaction, rows are matched by message_id and both usernames."""
+        inserts_df = self.serialize_datetimes(inserts_df.copy(), ["timestamp"])
+        key_condition = "message_id = ? AND reacted_to_username = ? AND reacting_username = ?"
+        key_columns = ["message_id", "reacted_to_username", "reacting_username"]
+        cols = ", ".join(inserts_df.columns)
+        placeholders = ", ".join("?" for _ in inserts_df.columns)
+        with etl_runs.stage("db_write") as stage_timing, self.conn:
+            stage_timing.count(rows=len(inserts_df) + len(updates_df) + len(deletes_df))
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {Table.REACTIONS.value} ({cols}) VALUES ({placeholders})",
+                inserts_df.itertuples(index=False, name=None),
+            )
+            self.conn.executemany(
+                f"UPDATE {Table.REACTIONS.value} SET emoji = ?, text = ? WHERE {key_condition}",
+                updates_df[["emoji", "text", *key_columns]].itertuples(index=False, name=None),
+            )
+            self.conn.executemany(
+                f"DELETE FROM {Table.REACTIONS.value} WHERE {key_condition}", deletes_df[key_columns].itertuples(index=False, name=None)
+            )
+
     def load_table(self, table: Table) -> pd.DataFrame:
         """Load all data from a table into a DataFrame with appropriate deserialization.
 
@@ -223,16 +332,53 @@ class DB:
         Returns:
             DataFrame with properly deserialized data types
         """
-        df = pd.read_sql_query(f"SELECT * FROM {table.value}", self.conn)
-        df = self.deserialize_lists(df, ["reaction_emojis", "reaction_user_ids", "nicknames"])
-        df = self.deserialize_datetimes(df, ["timestamp"])
-        df = self.deserialize_bools(df, ["success"])
+        with etl_runs.stage("db_read") as stage_timing:
+            df = pd.read_sql_query(f"SELECT * FROM {table.value}", self.conn)
+            df = self.deserialize_lists(df, ["reaction_emojis", "reaction_user_ids", "nicknames"])
+            df = self.deserialize_datetimes(df, ["timestamp"])
+            df = self.deserialize_nullable_ints(df, NULLABLE_INT_COLUMNS)
+            df = self.deserialize_bools(df, BOOL_COLUMNS)
+            stage_timing.count(rows=len(df))
 
         if table == Table.USERS:
             df = df.set_index("user_id")
 
         return df
 
+    def load_rows_since(self, table: Table, since_dt: datetime) -> pd.DataFrame:
+        """Load the rows of a table with a timestamp >= since_dt. Applies the same deserialization as load_table.
+
+        Timestamps are stored as ISO strings with a UTC or local (ahead of UTC) offset, so comparing them to the UTC ISO string of since_dt
+        selects a superset of the rows through the timestamp index, and the exact filter is applied after deserialization.
+        """
+        since_text = since_dt.astimezone(UTC).isoformat()
+        df = pd.read_sql_query(f"SELECT * FROM {table.value} WHERE [timestamp] >= ?", self.conn, params=[since_text])
+        df = self.deserialize_lists(df, ["reaction_emojis", "reaction_user_ids", "nicknames"])
+        df = self.deserialize_datetimes(df, ["timestamp"])
+        df = self.deserialize_nullable_ints(df, NULLABLE_INT_COLUMNS)
+        df = self.deserialize_bools(df, BOOL_COLUMNS)
+        return df[df["timestamp"] >= since_dt].reset_index(drop=True)
+
+    def fill_reply_and_topic_ids(self, chat_df: pd.DataFrame) -> None:
+        """Fill the NULL reply_to_msg_id and topic_id of stored messages from re-fetched ones, in both chat history tables.
+
+        Messages stored before the columns were added keep NULLs under INSERT OR IGNORE, their other columns (e.g. the OCR text) are kept.
+        """
+        chat_df = chat_df.dropna(subset=NULLABLE_INT_COLUMNS, how="all")
+        if chat_df.empty:
+            return
+        rows = [
+            (*(None if pd.isna(value) else int(value) for value in (row.reply_to_msg_id, row.topic_id)), int(row.message_id))
+            for row in chat_df.itertuples(index=False)
+        ]
+        for table in (Table.CHAT_HISTORY, Table.CLEANED_CHAT_HISTORY):
+            self.conn.executemany(
+                f"UPDATE {table.value} SET reply_to_msg_id = COALESCE(reply_to_msg_id, ?), topic_id = COALESCE(topic_id, ?) "
+                "WHERE message_id = ? AND (reply_to_msg_id IS NULL OR topic_id IS NULL)",
+                rows,
+            )
+        self.conn.commit()
+
     def record_updated_message_ids(self, message_ids) -> None:
         """Write message IDs to the tracking table so the bot can do incremental loads."""
         self.conn.executemany(
@@ -252,13 +398,145 @@ class DB:
         """Load specific rows from a table by message_id. Applies the same deserialization as load_table."""
         if not message_ids:
             return pd.DataFrame()
-        placeholders = ", ".join("?" for _ in message_ids)
-        df = pd.read_sql_query(
-            f"SELECT * FROM {table.value} WHERE message_id IN ({placeholders})",
-            self.conn,
-            params=message_ids,
-        )
+        chunk_dfs = []
+        for start in range(0, len(message_ids), SQLITE_MAX_PARAMS):
+            chunk_ids = [int(message_id) for message_id in message_ids[start : start + SQLITE_MAX_PARAMS]]
+            placeholders = ", ".join("?" for _ in chunk_ids)
+            chunk_dfs.append(
+                pd.read_sql_query(f"SELECT * FROM {table.value} WHERE message_id IN ({placeholders})", self.conn, params=chunk_ids)
+            )
+        df = pd.concat(chunk_dfs, ignore_index=True) if len(chunk_dfs) > 1 else chunk_dfs[0]
+        df = self.deserialize_lists(df, ["reaction_emojis", "reaction_user_ids", "nicknames"])
+        df = self.deserialize_datetimes(df, ["timestamp"])
+        df = self.deserialize_nullable_ints(df, NULLABLE_INT_COLUMNS)
+        df = self.deserialize_bools(df, BOOL_COLUMNS)
+        return df
+
+    def load_rows_missing(self, table: Table, column: str) -> pd.DataFrame:
+        """Load the rows of a table where the column is NULL, e.g. rows written before the column was added. Applies the same deserialization as load_table."""
+        df = pd.read_sql_query(f"SELECT * FROM {table.value} WHERE {column} IS NULL", self.conn)
         df = self.deserialize_lists(df, ["reaction_emojis", "reaction_user_ids", "nicknames"])
         df = self.deserialize_datetimes(df, ["timestamp"])
-        df = self.deserialize_bools(df, ["success"])
+        df = self.deserialize_nullable_ints(df, NULLABLE_INT_COLUMNS)
         return df
+
+    def save_quiz_progress(self, user_id: int, seen_quiz_ids: bytes) -> None:
+        """Upsert the packed bitset of quizzes already drawn by the user."""
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {Table.QUIZ_PROGRESS.value} (user_id, seen_quiz_ids) VALUES (?, ?)",
+            (int(user_id), seen_quiz_ids),
+        )
+        self.conn.commit()
+
+    def get_table_version(self, table: Table) -> int:
+        """Version of a versioned table, bumped on every write to it, 0 if it was never written."""
+        row = self.conn.execute(f"SELECT version FROM {Table.TABLE_VERSIONS.value} WHERE table_name = ?", (table.value,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def bump_table_version(self, table: Table) -> None:
+        self.conn.execute(
+            f"INSERT INTO {Table.TABLE_VERSIONS.value} (table_name, version) VALUES (?, 1) "
+            "ON CONFLICT (table_name) DO UPDATE SET version = version + 1",
+            (table.value,),
+        )
+        self.conn.commit()
+
+    def update_user_nicknames(self, user_id: int, nicknames: list[str]) -> None:
+        self.conn.execute(
+            f"UPDATE {Table.USERS.value} SET nicknames = ? WHERE user_id = ?", (core_utils.safe_json_dump(nicknames), int(user_id))
+        )
+        self.bump_table_version(Table.USERS)
+
+    def update_user_names(self, names_df: pd.DataFrame) -> None:
+        """Update the telegram names (first_name, last_name, username) of users indexed by user_id, their other columns are kept."""
+        rows = [
+            (*(None if pd.isna(value) else value for value in (row.first_name, row.last_name, row.username)), int(user_id))
+            for user_id, row in names_df.iterrows()
+        ]
+        self.conn.executemany(f"UPDATE {Table.USERS.value} SET first_name = ?, last_name = ?, username = ? WHERE user_id = ?", rows)
+        self.bump_table_version(Table.USERS)
+
+    def load_quiz_progress(self) -> dict[int, bytes]:
+        rows = self.conn.execute(f"SELECT user_id, seen_quiz_ids FROM {Table.QUIZ_PROGRESS.value}").fetchall()
+        return {user_id: seen_quiz_ids for user_id, seen_quiz_ids in rows}
+
+    def insert_scheduled_job(self, due_at: str, func: str, args: list) -> int:
+        """Insert a single scheduled job and return its job_id."""
+        cursor = self.conn.execute(
+            f"INSERT INTO {Table.SCHEDULED_JOBS.value} (due_at, func, args) VALUES (?, ?, ?)",
+            (due_at, func, json.dumps(args)),
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def load_scheduled_jobs(self, due_from: str, due_until: str) -> list[tuple[int, str, str, list]]:
+        """Pending jobs with due_from <= due_at < due_until as (job_id, due_at, func, args), in due order."""
+        rows = self.conn.execute(
+            f"SELECT job_id, due_at, func, args FROM {Table.SCHEDULED_JOBS.value} WHERE done = 0 AND due_at >= ? AND due_at < ? ORDER BY due_at",
+            (due_from, due_until),
+        ).fetchall()
+        return [(job_id, due_at, func, json.loads(args)) for job_id, due_at, func, args in rows]
+
+    def mark_scheduled_jobs_done(self, job_ids: list[int] | None = None, due_before: str | None = None) -> None:
+        """Mark the given jobs, or every pending job due before due_before, as done."""
+        if job_ids is not None:
+            self.conn.executemany(
+                f"UPDATE {Table.SCHEDULED_JOBS.value} SET done = 1 WHERE job_id = ?", ((int(job_id),) for job_id in job_ids)
+            )
+        if due_before is not None:
+            self.conn.execute(f"UPDATE {Table.SCHEDULED_JOBS.value} SET done = 1 WHERE done = 0 AND due_at < ?", (due_before,))
+        self.conn.commit()
+
+    def load_backfill_chunks(self) -> set[tuple[int, int]]:
+        """Completed backfill chunks as (chunk_start, chunk_end)."""
+        rows = self.conn.execute(f"SELECT chunk_start, chunk_end FROM {Table.BACKFILL_CHUNKS.value}").fetchall()
+        return {(chunk_start, chunk_end) for chunk_start, chunk_end in rows}
+
+    def mark_backfill_chunk_done(self, chunk_start: int, chunk_end: int, message_count: int, completed_at: str) -> None:
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {Table.BACKFILL_CHUNKS.value} (chunk_start, chunk_end, message_count, completed_at) VALUES (?, ?, ?, ?)",
+            (chunk_start, chunk_end, message_count, completed_at),
+        )
+        self.conn.commit()
+
+    def clear_backfill_chunks(self) -> None:
+        self.conn.execute(f"DELETE FROM {Table.BACKFILL_CHUNKS.value}")
+        self.conn.commit()
+
+    def insert_etl_run(self, run_row: tuple, stage_rows: list[tuple]) -> int:
+        """Record an ETL run with its stages in one transaction, returns its run_id. Runs older than ETL_RUNS_RETENTION_DAYS are pruned.
+
+        Args:
+            run_row: (job, started_at, duration_seconds, lock_wait_seconds, status)
+            stage_rows: (stage, duration_seconds, row_count, bytes_downloaded) per stage
+        """
+        prune_before = (datetime.now(UTC) - timedelta(days=ETL_RUNS_RETENTION_DAYS)).isoformat()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            run_id = self.conn.execute(
+                f"INSERT INTO {Table.ETL_RUNS.value} (job, started_at, duration_seconds, lock_wait_seconds, status) VALUES (?, ?, ?, ?, ?)",
+                run_row,
+            ).lastrowid
+            self.conn.executemany(
+                f"INSERT INTO {Table.ETL_RUN_STAGES.value} (run_id, stage, duration_seconds, row_count, bytes_downloaded) VALUES (?, ?, ?, ?, ?)",
+                ((run_id, *stage_row) for stage_row in stage_rows),
+            )
+            self.conn.execute(
+                f"DELETE FROM {Table.ETL_RUN_STAGES.value} WHERE run_id IN (SELECT run_id FROM {Table.ETL_RUNS.value} WHERE started_at < ?)",
+                (prune_before,),
+            )
+            self.conn.execute(f"DELETE FROM {Table.ETL_RUNS.value} WHERE started_at < ?", (prune_before,))
+        return run_id
+
+    def load_etl_runs(self, since_dt: datetime, job: str | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """ETL runs started since since_dt, of a single job if given, and their stages, as (runs_df, stages_df)."""
+        job_condition = "AND job = ?" if job is not None else ""
+        params = [since_dt.astimezone(UTC).isoformat()] + ([job] if job is not None else [])
+        runs_df = pd.read_sql_query(f"SELECT * FROM {Table.ETL_RUNS.value} WHERE started_at >= ? {job_condition}", self.conn, params=params)
+        stages_df = pd.read_sql_query(
+            f"SELECT stages.* FROM {Table.ETL_RUN_STAGES.value} stages JOIN {Table.ETL_RUNS.value} runs USING (run_id) "
+            f"WHERE runs.started_at >= ? {job_condition}",
+            self.conn,
+            params=params,
+        )
+        return runs_df, stages_df
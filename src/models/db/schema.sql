@@ -26,7 +26,9 @@ CREATE TABLE IF NOT EXISTS chat_history (
     image_text TEXT,
     reaction_emojis TEXT,        -- JSON array
     reaction_user_ids TEXT,      -- JSON array
-    message_type TEXT NOT NULL
+    message_type TEXT NOT NULL,
+    reply_to_msg_id INTEGER,
+    topic_id INTEGER             -- forum topic, 1 is General
 );
 
 CREATE INDEX IF NOT EXISTS idx_chat_history_user_id
@@ -35,6 +37,12 @@ CREATE INDEX IF NOT EXISTS idx_chat_history_user_id
 CREATE INDEX IF NOT EXISTS idx_chat_history_timestamp
     ON chat_history([timestamp]);
 
+CREATE INDEX IF NOT EXISTS idx_chat_history_reply_to_msg_id
+    ON chat_history(reply_to_msg_id);
+
+CREATE INDEX IF NOT EXISTS idx_chat_history_topic_id
+    ON chat_history(topic_id, [timestamp]);
+
 -- ---------------------------------------------------------
 -- 2. Cleaned Chat History
 -- ---------------------------------------------------------
@@ -47,7 +55,18 @@ CREATE TABLE IF NOT EXISTS cleaned_chat_history (
     image_text TEXT,
     reaction_emojis TEXT,        -- JSON array
     reaction_user_ids TEXT,      -- JSON array
-    message_type TEXT NOT NULL
+    message_type TEXT NOT NULL,
+    -- derived at ingest by the chat ETL (src/stats/message_features.py)
+    word_count INTEGER,
+    word_length INTEGER,
+    char_length INTEGER,
+    emoji_count INTEGER,
+    has_link INTEGER,            -- 0/1
+    local_day INTEGER,           -- days since 1970-01-01 in the local timezone
+    local_hour INTEGER,
+    text_folded TEXT,            -- lowercase, without diacritics
+    reply_to_msg_id INTEGER,
+    topic_id INTEGER             -- forum topic, 1 is General
 );
 
 CREATE INDEX IF NOT EXISTS idx_cleaned_chat_user_id
@@ -56,6 +75,12 @@ CREATE INDEX IF NOT EXISTS idx_cleaned_chat_user_id
 CREATE INDEX IF NOT EXISTS idx_cleaned_chat_timestamp
     ON cleaned_chat_history([timestamp]);
 
+CREATE INDEX IF NOT EXISTS idx_cleaned_chat_reply_to_msg_id
+    ON cleaned_chat_history(reply_to_msg_id);
+
+CREATE INDEX IF NOT EXISTS idx_cleaned_chat_topic_id
+    ON cleaned_chat_history(topic_id, [timestamp]);
+
 -- ---------------------------------------------------------
 -- 3. Commands Usage
 -- ---------------------------------------------------------
@@ -164,3 +189,73 @@ CREATE TABLE IF NOT EXISTS updated_message_ids (
     message_id INTEGER PRIMARY KEY
 );
 
+-- ---------------------------------------------------------
+-- 10. Quiz Progress
+-- ---------------------------------------------------------
+-- Quizzes already drawn by a user, packed bitset indexed by quiz_id.
+CREATE TABLE IF NOT EXISTS quiz_progress (
+    user_id INTEGER PRIMARY KEY,
+    seen_quiz_ids BLOB NOT NULL
+);
+
+-- ---------------------------------------------------------
+-- 11. Scheduled Jobs
+-- ---------------------------------------------------------
+-- Reminders (/remindme, /remind), due_at is a UTC ISO datetime so it sorts chronologically.
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    due_at TEXT NOT NULL,
+    func TEXT NOT NULL,           -- name of the callback, see JobPersistance.JOB_FUNCTIONS
+    args TEXT NOT NULL,           -- JSON list
+    done INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_done_due_at
+    ON scheduled_jobs(done, due_at);
+
+-- ---------------------------------------------------------
+-- 12. Backfill Chunks
+-- ---------------------------------------------------------
+-- Message id ranges already written by the history backfill (main_etl.py --backfill), so an interrupted backfill resumes.
+CREATE TABLE IF NOT EXISTS backfill_chunks (
+    chunk_start INTEGER NOT NULL,
+    chunk_end INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (chunk_start, chunk_end)
+);
+
+-- ---------------------------------------------------------
+-- 13. Table Versions
+-- ---------------------------------------------------------
+-- Bumped on every write to a versioned table (users), so the bot reloads it only after it changed.
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+-- ---------------------------------------------------------
+-- 14. ETL Runs
+-- ---------------------------------------------------------
+-- One row per run of the chat ETL, word stats or an ETL service cycle / event batch, see src/stats/etl_runs.py.
+CREATE TABLE IF NOT EXISTS etl_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,                -- ETLJob value
+    started_at TEXT NOT NULL,         -- UTC ISO datetime
+    duration_seconds REAL NOT NULL,
+    lock_wait_seconds REAL NOT NULL,
+    status TEXT NOT NULL              -- ETLRunStatus value
+);
+
+CREATE INDEX IF NOT EXISTS idx_etl_runs_started_at
+    ON etl_runs(started_at);
+
+-- Time spent in each stage of a run, excluding the stages nested in it, with the rows and downloaded bytes it handled.
+CREATE TABLE IF NOT EXISTS etl_run_stages (
+    run_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    duration_seconds REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    bytes_downloaded INTEGER NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
@@ -1,10 +1,12 @@
 import logging
 import os
 
+import numpy as np
 import pandas as pd
 
-from src.config.paths import FLAGS_DIR_PATH
-from src.models.map_quiz import MapQuiz
+from src.config.paths import COUNTRIES_QUIZ_TEXTS_PATH, FLAGS_DIR_PATH
+from src.models import quiz_texts
+from src.models.answer_matcher import AnswerMatcher
 
 log = logging.getLogger(__name__)
 
@@ -15,6 +17,8 @@ REWARD_LEVELS = {
     "crazy": 25000,
 }
 
+QUIZ_TEXT_SOURCE_COLUMNS = ["country_name", "continent", "population", "capital"]
+
 
 class FlagQuiz:
     REWARD_LEVELS = REWARD_LEVELS
@@ -32,13 +36,43 @@ class FlagQuiz:
         decrease_pct = int(round((base_reward - current_reward) / base_reward * 100)) if base_reward > 0 else 0
         return current_reward, decrease_pct
 
+    @staticmethod
+    def build_quiz_texts(country: dict) -> dict:
+        """Texts shown by the flag quiz handlers, precomputed offline (see src/scripts/build_quiz_texts.py) and looked up at answer time."""
+        return {
+            "quiz_display_name": FlagQuiz.build_country_display_name(country),
+            "quiz_description": FlagQuiz.build_country_description(country),
+            "quiz_tips": FlagQuiz.build_tips(country),
+        }
+
+    @staticmethod
+    def add_quiz_texts(countries_df: pd.DataFrame, texts_path: str = COUNTRIES_QUIZ_TEXTS_PATH) -> pd.DataFrame:
+        return quiz_texts.add_quiz_texts(countries_df, "country_code", QUIZ_TEXT_SOURCE_COLUMNS, FlagQuiz.build_quiz_texts, str(texts_path))
+
     @staticmethod
     def get_country_display_name(country: dict | pd.Series) -> str:
+        display_name = country.get("quiz_display_name")
+        return display_name if isinstance(display_name, str) else FlagQuiz.build_country_display_name(country)
+
+    @staticmethod
+    def get_country_description(country: dict | pd.Series) -> str:
+        description = country.get("quiz_description")
+        return description if isinstance(description, str) else FlagQuiz.build_country_description(country)
+
+    @staticmethod
+    def get_tips(country: dict | pd.Series, continent_specified: bool = False) -> list[str]:
+        tips = country.get("quiz_tips")
+        if not isinstance(tips, list | np.ndarray):
+            return FlagQuiz.build_tips(country, continent_specified)
+        return list(tips[1:]) if continent_specified else list(tips)  # the first tip is the continent
+
+    @staticmethod
+    def build_country_display_name(country: dict | pd.Series) -> str:
         name = country.get("country_name", "") if isinstance(country, dict) else country["country_name"]
         return str(name)
 
     @staticmethod
-    def get_country_description(country: dict | pd.Series) -> str:
+    def build_country_description(country: dict | pd.Series) -> str:
         if not isinstance(country, dict):
             country = country.to_dict()
         capital = country.get("capital", "N/A")
@@ -51,7 +85,7 @@ class FlagQuiz:
         return f"Capital: {capital} | Continent: {continent} | Population: {pop_str}"
 
     @staticmethod
-    def get_tips(country: dict | pd.Series, continent_specified: bool = False) -> list[str]:
+    def build_tips(country: dict | pd.Series, continent_specified: bool = False) -> list[str]:
         if not isinstance(country, dict):
             country = country.to_dict()
 
@@ -88,9 +122,13 @@ class FlagQuiz:
 
         return valid_answers
 
+    @staticmethod
+    def get_answer_matcher(country: dict | pd.Series) -> AnswerMatcher:
+        return AnswerMatcher(FlagQuiz.get_valid_answers(country))
+
     @staticmethod
     def is_answer_correct(user_answer: str, valid_answers: set[str]) -> bool:
-        return MapQuiz.is_answer_correct(user_answer, valid_answers)
+        return AnswerMatcher(valid_answers).is_correct(user_answer)
 
     @staticmethod
     def get_flag_filename_for_country(country: dict | pd.Series) -> str:
@@ -9,8 +9,8 @@ from dotenv import load_dotenv
 import src.core.utils as core_utils
 import src.stats.utils as stats_utils
 from src.config.constants import TIMEZONE
-from src.config.enums import Table
 from src.config.settings import CHAT_ID
+from src.models.users import Users
 
 pd.options.mode.chained_assignment = None
 pd.set_option("display.max_columns", None)
@@ -22,11 +22,11 @@ THREAD_ID = int(os.getenv("BOT_CHAT_THREAD_ID"))
 
 
 class Holidays:
-    def __init__(self, job_queue, credits_obj, db, assets):
+    def __init__(self, job_queue, credits_obj, db, assets, users: Users | None = None):
         self.job_queue = job_queue
         self.db = db
         self.assets = assets
-        self.users_df = self.db.load_table(Table.USERS)
+        self.users = users if users is not None else Users(self.db)
         self.credits = credits_obj
 
         self.run()
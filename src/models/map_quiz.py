@@ -1,15 +1,20 @@
-import difflib
 import os
 import re
+from functools import lru_cache
 
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib import font_manager
+from PIL import Image, ImageDraw, ImageFont
 
-from src.config.paths import MAP_QUIZ_IMAGES_DIR_PATH, TEMP_DIR
+from src.config.paths import FAMOUS_PEOPLE_QUIZ_TEXTS_PATH, MAP_QUIZ_IMAGES_DIR_PATH, TEMP_DIR
 from src.core import utils as core_utils
+from src.models import quiz_texts
+from src.models.answer_matcher import AnswerMatcher
+from src.models.base_map_cache import BaseMapCache
 
 _FEATURE_RESOLUTION = "50m"
 _LAND_COLOR = "#d3d0cb"
@@ -23,6 +28,8 @@ _RING_WIDTH = 1.5
 _LABEL_OFFSET = (12, 4)
 _LABEL_FONT_SIZE = 14
 _SAVE_JPG_DPI = 200
+_SAVE_JPG_QUALITY = 90
+_DESCRIPTION_MAX_LENGTH = 3500
 
 REWARD_LEVELS = {
     "easy": 1000,
@@ -32,6 +39,8 @@ REWARD_LEVELS = {
     "crazy": 50000,
 }
 
+QUIZ_TEXT_SOURCE_COLUMNS = ["name_pl", "name_en", "description", "citizenship", "birth_country", "death_country"]
+
 DIFFICULTY_INDEX_RANGES = {
     "easy": (0, 30),
     "medium": (30, 100),
@@ -45,9 +54,10 @@ class MapQuiz:
     REWARD_LEVELS = REWARD_LEVELS
     DIFFICULTY_INDEX_RANGES = DIFFICULTY_INDEX_RANGES
 
-    def __init__(self, padding_deg: float = 15.0, figsize: tuple[float, float] = (10, 6)):
+    def __init__(self, padding_deg: float = 15.0, figsize: tuple[float, float] = (10, 6), base_map_cache: BaseMapCache = None):
         self.padding_deg = padding_deg
         self.figsize = figsize
+        self.base_map_cache = base_map_cache or BaseMapCache()
 
     @staticmethod
     def get_difficulty_from_index(index: int) -> str:
@@ -69,8 +79,39 @@ class MapQuiz:
         decrease_pct = int(round((base_reward - current_reward) / base_reward * 100)) if base_reward > 0 else 0
         return current_reward, decrease_pct
 
+    @staticmethod
+    def build_quiz_texts(person: dict) -> dict:
+        """Texts shown by the map quiz handlers, precomputed offline (see src/scripts/build_quiz_texts.py) and looked up at answer time."""
+        return {
+            "quiz_display_name": MapQuiz.build_person_display_name(person),
+            "quiz_description": MapQuiz.build_person_description(person),
+            "quiz_description_extended": MapQuiz.build_person_description(person, extended=True),
+            "quiz_tips": MapQuiz.build_tips(person),
+        }
+
+    @staticmethod
+    def add_quiz_texts(people_df: pd.DataFrame, texts_path: str = FAMOUS_PEOPLE_QUIZ_TEXTS_PATH) -> pd.DataFrame:
+        return quiz_texts.add_quiz_texts(people_df, "uri", QUIZ_TEXT_SOURCE_COLUMNS, MapQuiz.build_quiz_texts, str(texts_path))
+
     @staticmethod
     def get_person_display_name(person: dict) -> str:
+        display_name = person.get("quiz_display_name")
+        return display_name if isinstance(display_name, str) else MapQuiz.build_person_display_name(person)
+
+    @staticmethod
+    def get_person_description(person: dict, max_length: int = _DESCRIPTION_MAX_LENGTH, extended: bool = False) -> str:
+        description = person.get("quiz_description_extended" if extended else "quiz_description")
+        if isinstance(description, str) and max_length == _DESCRIPTION_MAX_LENGTH:
+            return description
+        return MapQuiz.build_person_description(person, max_length, extended)
+
+    @staticmethod
+    def get_tips(person: dict) -> list[str]:
+        tips = person.get("quiz_tips")
+        return list(tips) if isinstance(tips, list | np.ndarray) else MapQuiz.build_tips(person)
+
+    @staticmethod
+    def build_person_display_name(person: dict) -> str:
         is_polish = False
         for field in ["citizenship", "birth_country", "death_country"]:
             val = str(person.get(field, "")).lower()
@@ -85,7 +126,7 @@ class MapQuiz:
         return str(display_name)
 
     @staticmethod
-    def get_person_description(person: dict, max_length: int = 3500, extended: bool = False) -> str:
+    def build_person_description(person: dict, max_length: int = _DESCRIPTION_MAX_LENGTH, extended: bool = False) -> str:
         desc = str(person.get("description", "")).strip()
         if desc.lower() in ("", "nan", "none"):
             return ""
@@ -114,7 +155,7 @@ class MapQuiz:
         return truncated + "..."
 
     @staticmethod
-    def get_tips(person: dict) -> list[str]:
+    def build_tips(person: dict) -> list[str]:
         desc = str(person.get("description", "")).strip()
         if desc.lower() in ("", "nan", "none"):
             return []
@@ -173,28 +214,13 @@ class MapQuiz:
                     valid_answers.add(part)
         return valid_answers
 
+    @staticmethod
+    def get_answer_matcher(person: dict) -> AnswerMatcher:
+        return AnswerMatcher(MapQuiz.get_valid_answers(person))
+
     @staticmethod
     def is_answer_correct(user_answer: str, valid_answers: set[str]) -> bool:
-        if user_answer in valid_answers:
-            return True
-
-        user_words = user_answer.split()
-        if not user_words:
-            return False
-
-        valid_parts = {w for w in valid_answers if len(w.split()) == 1}
-        matched_words = 0
-        for word in user_words:
-            matches = difflib.get_close_matches(word, valid_parts, n=1, cutoff=0.75)
-            if word in valid_answers or (
-                len(word) >= 3
-                and not re.match(r"^m{0,4}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$", word)
-                and matches
-                and abs(len(word) - len(matches[0])) <= (1 if len(word) <= 6 else 2)
-            ):
-                matched_words += 1
-
-        return matched_words == len(user_words)
+        return AnswerMatcher(valid_answers).is_correct(user_answer)
 
     @staticmethod
     def _extract_year(date_str) -> str:
@@ -237,22 +263,22 @@ class MapQuiz:
             locations.append((float(person["death_lon"]), float(person["death_lat"]), dod, "red"))
         return locations
 
-    def guess_random_person_on_map(self, people_trivia_df):
-        person = people_trivia_df.sample(n=1).iloc[0]
-
+    def get_image_path(self, person: dict) -> str:
+        """Return the path to the pregenerated map of *person*, or generate it if it's missing."""
         filename = MapQuiz.get_image_filename_for_person(person)
         image_path = os.path.join(MAP_QUIZ_IMAGES_DIR_PATH, filename)
 
         if os.path.exists(image_path):
-            return image_path, person
+            return image_path
 
         locations = MapQuiz.get_locations_for_person(person)
-        fallback_path = self.generate_image(locations)
-        return fallback_path, person
+        return self.generate_image(locations)
 
     def generate_image(self, locations: list[tuple[float, float, str, str]]) -> str:
         """Generate a map quiz image with ring markers at given locations.
 
+        The markers are composited onto a cached base map raster if its tiles are built, otherwise the whole map is rendered with cartopy.
+
         Args:
             locations: List of (longitude, latitude, label, color) tuples.
 
@@ -260,46 +286,51 @@ class MapQuiz:
             Path to the generated JPEG image in the temp directory.
         """
         lon_center, lat_center, lon_half, lat_half = self._compute_extent(locations)
+        show_borders = lon_half <= 15
+        lon_min = max(lon_center - lon_half * _LON_ASPECT_RATIO, -179.9)
+        lon_max = min(lon_center + lon_half * _LON_ASPECT_RATIO, 179.9)
+        lat_min = max(lat_center - lat_half, -80.0)
+        lat_max = min(lat_center + lat_half, 80.0)
+        extent = [lon_min, lon_max, lat_min, lat_max]
+        label_placements = self._get_label_placements(locations, lon_half, lat_half)
+
+        max_size = (round(self.figsize[0] * _SAVE_JPG_DPI), round(self.figsize[1] * _SAVE_JPG_DPI))
+        base_map = self.base_map_cache.get_base_map(extent, show_borders, max_size)
+        if base_map is not None:
+            return self._composite_on_base_map(base_map, extent, locations, label_placements)
+
         data_crs = ccrs.PlateCarree()
         projection = ccrs.Mercator(central_longitude=lon_center)
 
         fig = plt.figure(figsize=self.figsize)
         ax = fig.add_subplot(1, 1, 1, projection=projection)
-        res = "10m" if lon_half <= 15 else _FEATURE_RESOLUTION
-        self._add_base_layers(ax, res, show_borders=(lon_half <= 15))
-
-        lon_min = max(lon_center - lon_half * _LON_ASPECT_RATIO, -179.9)
-        lon_max = min(lon_center + lon_half * _LON_ASPECT_RATIO, 179.9)
-        lat_min = max(lat_center - lat_half, -80.0)
-        lat_max = min(lat_center + lat_half, 80.0)
-        ax.set_extent([lon_min, lon_max, lat_min, lat_max], crs=data_crs)
+        res = "10m" if show_borders else _FEATURE_RESOLUTION
+        self._add_base_layers(ax, res, show_borders=show_borders)
+        ax.set_extent(extent, crs=data_crs)
         ax.axis("off")
 
-        # Smart label offset calculation
-        offsets = [_LABEL_OFFSET for _ in locations]
-        ha = ["left" for _ in locations]
-        va = ["bottom" for _ in locations]
+        for (lon, lat, label, color), (offset, ha, va) in zip(locations, label_placements, strict=True):
+            self._draw_marker(ax, lon, lat, label, color, data_crs, offset, ha, va)
+
+        return self._save(fig)
+
+    @staticmethod
+    def _get_label_placements(
+        locations: list[tuple[float, float, str, str]], lon_half: float, lat_half: float
+    ) -> list[tuple[tuple[float, float], str, str]]:
+        """Smart label offset calculation, returns (offset, ha, va) per location."""
+        top_right = (_LABEL_OFFSET, "left", "bottom")
+        bottom_left = ((-_LABEL_OFFSET[0], -_LABEL_OFFSET[1]), "right", "top")
+        placements = [top_right for _ in locations]
 
         if len(locations) == 2:
             lon1, lat1, _, _ = locations[0]
             lon2, lat2, _, _ = locations[1]
             dist = np.sqrt((lon1 - lon2) ** 2 + (lat1 - lat2) ** 2)
             if dist < max(lon_half, lat_half) * 0.5:  # Close relative to the map scale
-                if lon1 >= lon2:
-                    offsets[0] = _LABEL_OFFSET  # top right
-                    ha[0], va[0] = "left", "bottom"
-                    offsets[1] = (-_LABEL_OFFSET[0], -_LABEL_OFFSET[1])  # bottom left
-                    ha[1], va[1] = "right", "top"
-                else:
-                    offsets[0] = (-_LABEL_OFFSET[0], -_LABEL_OFFSET[1])  # bottom left
-                    ha[0], va[0] = "right", "top"
-                    offsets[1] = _LABEL_OFFSET  # top right
-                    ha[1], va[1] = "left", "bottom"
-
-        for i, (lon, lat, label, color) in enumerate(locations):
-            self._draw_marker(ax, lon, lat, label, color, data_crs, offsets[i], ha[i], va[i])
+                placements = [top_right, bottom_left] if lon1 >= lon2 else [bottom_left, top_right]
 
-        return self._save(fig)
+        return placements
 
     def _compute_extent(self, locations: list[tuple[float, float, str, str]]) -> tuple[float, float, float, float]:
         """Returns (lon_center, lat_center, lon_half, lat_half) for the bounding box."""
@@ -377,6 +408,46 @@ class MapQuiz:
         plt.close(fig)
         return path
 
+    def _composite_on_base_map(
+        self,
+        base_map: Image.Image,
+        extent: list[float],
+        locations: list[tuple[float, float, str, str]],
+        label_placements: list[tuple[tuple[float, float], str, str]],
+    ) -> str:
+        """Draw the markers and labels of _draw_marker onto a cached base map with PIL, sizes in points are scaled to _SAVE_JPG_DPI."""
+        draw = ImageDraw.Draw(base_map)
+        font = _get_label_font(_points_to_pixels(_LABEL_FONT_SIZE))
+        for (lon, lat, label, color), (offset, ha, va) in zip(locations, label_placements, strict=True):
+            x, y = self.base_map_cache.project(lon, lat, extent, base_map.size)
+            ring_radius = _points_to_pixels(_RING_SIZE) / 2
+            dot_radius = _points_to_pixels(_DOT_SIZE) / 2
+            draw.ellipse(
+                [x - ring_radius, y - ring_radius, x + ring_radius, y + ring_radius],
+                outline=color,
+                width=round(_points_to_pixels(_RING_WIDTH)),
+            )
+            draw.ellipse([x - dot_radius, y - dot_radius, x + dot_radius, y + dot_radius], fill=color)
+
+            anchor = ("l" if ha == "left" else "r") + ("d" if va == "bottom" else "a")
+            label_position = (x + _points_to_pixels(offset[0]), y - _points_to_pixels(offset[1]))
+            draw.text(label_position, label, fill=color, font=font, anchor=anchor)
+
+        core_utils.create_dir(TEMP_DIR)
+        path = os.path.join(TEMP_DIR, f"{core_utils.get_random_id()}.jpg")
+        base_map.save(path, format="JPEG", quality=_SAVE_JPG_QUALITY)
+        return path
+
+
+def _points_to_pixels(points: float) -> float:
+    return points * _SAVE_JPG_DPI / 72
+
+
+@lru_cache(maxsize=4)
+def _get_label_font(size: float) -> ImageFont.FreeTypeFont:
+    font_path = font_manager.findfont(font_manager.FontProperties(family="DejaVu Sans", weight="bold"))
+    return ImageFont.truetype(font_path, round(size))
+
 
 if __name__ == "__main__":
     data = [
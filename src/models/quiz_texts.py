@@ -0,0 +1,44 @@
+import hashlib
+import json
+import os
+from collections.abc import Callable
+
+import pandas as pd
+
+SOURCE_HASH_COLUMN = "quiz_source_hash"
+
+
+def get_source_hash(record: dict, source_columns: list[str]) -> str:
+    values = [str(record.get(column)) for column in source_columns]
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+
+def build_quiz_texts(df: pd.DataFrame, key_column: str, source_columns: list[str], build_texts: Callable[[dict], dict]) -> pd.DataFrame:
+    """Quiz texts (display names, descriptions, tips) of every record, keyed by key_column, with a hash of the columns they're built from."""
+    rows = [
+        {key_column: record[key_column], SOURCE_HASH_COLUMN: get_source_hash(record, source_columns), **build_texts(record)}
+        for record in df.to_dict("records")
+    ]
+    return pd.DataFrame(rows)
+
+
+def add_quiz_texts(
+    df: pd.DataFrame, key_column: str, source_columns: list[str], build_texts: Callable[[dict], dict], texts_path: str
+) -> pd.DataFrame:
+    """Join the quiz texts precomputed offline into texts_path onto df, so quiz handlers only look them up.
+
+    Records missing from the texts file, or whose source columns changed since it was built, get their texts built here at load.
+    """
+    texts_by_key = {}
+    if os.path.exists(texts_path):
+        texts_by_key = {texts[key_column]: texts for texts in pd.read_parquet(texts_path).to_dict("records")}
+
+    rows = []
+    for record in df.to_dict("records"):
+        source_hash = get_source_hash(record, source_columns)
+        texts = texts_by_key.get(record[key_column])
+        if texts is None or texts[SOURCE_HASH_COLUMN] != source_hash:
+            texts = build_texts(record)
+        rows.append({column: value for column, value in texts.items() if column not in (key_column, SOURCE_HASH_COLUMN)})
+
+    return pd.concat([df, pd.DataFrame(rows, index=df.index)], axis=1)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+class QuizTracker:
+    """No-repeat /quiz draws, tracked per user as a packed bitset over quiz positions, one bit per quiz.
+
+    Filtered draws take the precomputed positions of a quiz pool (see RecordPools), so a draw is a vectorized lookup of the pool positions
+    in the user's bitset instead of filtering the quiz dataframe. Bitsets are persisted to SQLite packed over quiz ids, so they survive
+    restarts and quiz database reorders.
+    """
+
+    def __init__(self, quiz_df: pd.DataFrame, db=None):
+        self.db = db
+        self.quiz_ids = quiz_df["quiz_id"].to_numpy()
+        self.all_seen = np.packbits(np.ones(len(self.quiz_ids), dtype=bool))
+        self.seen = {}
+        if db is not None:
+            self.seen = {user_id: self.unpack(packed_seen) for user_id, packed_seen in db.load_quiz_progress().items()}
+
+    def draw(self, user_id: int, positions: np.ndarray) -> int:
+        """Random quiz position from the given positions that the user hasn't seen yet, or -1 if they have seen all of them."""
+        seen = self.seen.get(user_id)
+        if seen is None or np.array_equal(seen, self.all_seen):  # reset the quizzes for the user
+            seen = np.zeros_like(self.all_seen)
+            self.seen[user_id] = seen
+
+        is_seen = (seen[positions >> 3] >> (7 - (positions & 7))) & 1
+        available_positions = positions[is_seen == 0]
+        if available_positions.size == 0:
+            return -1
+
+        position = int(np.random.choice(available_positions))
+        seen[position >> 3] |= 1 << (7 - (position & 7))
+        self.save(user_id)
+        return position
+
+    def get_seen_positions(self, user_id: int) -> np.ndarray:
+        seen = self.seen.get(user_id, np.zeros_like(self.all_seen))
+        return np.flatnonzero(np.unpackbits(seen, count=len(self.quiz_ids)))
+
+    def save(self, user_id: int):
+        if self.db is not None:
+            self.db.save_quiz_progress(user_id, self.pack(self.seen[user_id]))
+
+    def pack(self, seen: np.ndarray) -> bytes:
+        """Repack a bitset over quiz positions over quiz ids, for storage."""
+        seen_by_quiz_id = np.zeros(self.quiz_ids.max() + 1 if len(self.quiz_ids) else 0, dtype=bool)
+        seen_by_quiz_id[self.quiz_ids[np.unpackbits(seen, count=len(self.quiz_ids)).astype(bool)]] = True
+        return np.packbits(seen_by_quiz_id).tobytes()
+
+    def unpack(self, packed_seen: bytes) -> np.ndarray:
+        """Bitset over quiz positions of a stored bitset over quiz ids, ids of removed quizzes are dropped."""
+        seen_by_quiz_id = np.unpackbits(np.frombuffer(packed_seen, dtype=np.uint8)).astype(bool)
+        seen = np.zeros(len(self.quiz_ids), dtype=bool)
+        is_known = self.quiz_ids < len(seen_by_quiz_id)
+        seen[is_known] = seen_by_quiz_id[self.quiz_ids[is_known]]
+        return np.packbits(seen)
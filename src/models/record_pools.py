@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+class ShuffledPool:
+    """Fisher-Yates no-repeat queue over a fixed array of record positions, every position is drawn once before any repeats."""
+
+    def __init__(self, positions: np.ndarray):
+        self.positions = positions
+        self._queue: list[int] = []
+
+    def __len__(self):
+        return len(self.positions)
+
+    def pop(self) -> int:
+        if not self._queue:
+            self._queue = np.random.permutation(self.positions).tolist()
+        return self._queue.pop()
+
+
+class RecordPools:
+    """Records of a dataframe materialized once as dicts, with a ShuffledPool of positions for filtered draws.
+
+    Pools of every combination of single key column values (or any value) are precomputed at load. A filter matching several values,
+    like a substring of multiple categories, gets its pool built from the value columns on first use and kept, so its queue persists too.
+    """
+
+    def __init__(self, df: pd.DataFrame, key_columns: list[str]):
+        self.records = df.to_dict("records")
+        self.key_columns = key_columns
+        self.column_values = {column: df[column].to_numpy() for column in key_columns}
+        self.values = {column: sorted(df[column].dropna().unique().tolist()) for column in key_columns}
+        self.pools: dict[tuple[frozenset | None, ...], ShuffledPool] = {(None,) * len(key_columns): ShuffledPool(np.arange(len(df)))}
+        for grouped_flags in itertools.product([False, True], repeat=len(key_columns)):
+            grouped_columns = [column for column, is_grouped in zip(key_columns, grouped_flags, strict=True) if is_grouped]
+            if not grouped_columns:
+                continue
+            for group_values, positions in df.groupby(grouped_columns, sort=False).indices.items():
+                group_values = iter(group_values if isinstance(group_values, tuple) else (group_values,))
+                key = tuple(frozenset([next(group_values)]) if is_grouped else None for is_grouped in grouped_flags)
+                self.pools[key] = ShuffledPool(positions)
+
+    def __len__(self):
+        return len(self.records)
+
+    def match_values(self, column: str, query: str | None) -> frozenset | None:
+        """Values of the column containing the query (case insensitive), None for no filter."""
+        if query is None or str(query).strip() == "":
+            return None
+        query = str(query).strip().lower()
+        return frozenset(value for value in self.values[column] if query in str(value).lower())
+
+    def get_pool(self, **filters: frozenset | None) -> ShuffledPool:
+        """Pool of records whose key column values are in the given value sets, a missing or None filter matches any value."""
+        key = tuple(filters.get(column) for column in self.key_columns)
+        pool = self.pools.get(key)
+        if pool is None:
+            mask = np.ones(len(self.records), dtype=bool)
+            for column, values in zip(self.key_columns, key, strict=True):
+                if values is not None:
+                    mask &= np.isin(self.column_values[column], list(values))
+            pool = ShuffledPool(np.flatnonzero(mask))
+            self.pools[key] = pool
+        return pool
+
+    def pop(self, **filters: frozenset | None) -> dict | None:
+        pool = self.get_pool(**filters)
+        if len(pool) == 0:
+            return None
+        return self.records[pool.pop()]
@@ -22,6 +22,8 @@ class ChatMessageRow(BaseModel):
     reaction_emojis: list = []
     reaction_user_ids: list = []
     message_type: str
+    reply_to_msg_id: int | None = None
+    topic_id: int | None = None
 
 
 @dataclass
@@ -42,7 +44,7 @@ class CreditHistoryRow:
 
 chat_history_schema = pa.DataFrameSchema(
     {
-        "message_id": pa.Column(int),  # int64
+        "message_id": pa.Column(int, pa.Check.gt(0)),  # int64
         "timestamp": pa.Column(pandas_engine.DateTime(tz=TIMEZONE)),
         "user_id": pa.Column(int),  # object (string)
         "first_name": pa.Column(str, nullable=True),  # string
@@ -53,6 +55,8 @@ chat_history_schema = pa.DataFrameSchema(
         "reaction_emojis": pa.Column(object, nullable=True),  # list (nullable)
         "reaction_user_ids": pa.Column(object, nullable=True),  # list (nullable)
         "message_type": pa.Column(str),  # string
+        "reply_to_msg_id": pa.Column("Int64", nullable=True),
+        "topic_id": pa.Column("Int64", nullable=True),  # forum topic, nullable for messages stored before it was captured
     },
     name="chat_history",
 )
@@ -60,7 +64,7 @@ chat_history_schema = pa.DataFrameSchema(
 # 1. Cleaned Chat History Schema
 cleaned_chat_history_schema = pa.DataFrameSchema(
     {
-        "message_id": pa.Column(int),  # int64
+        "message_id": pa.Column(int, pa.Check.gt(0)),  # int64
         "timestamp": pa.Column(pandas_engine.DateTime(tz=TIMEZONE)),  # datetime64[ns]
         "user_id": pa.Column(int),  # string
         "final_username": pa.Column(str),  # string
@@ -69,6 +73,16 @@ cleaned_chat_history_schema = pa.DataFrameSchema(
         "reaction_emojis": pa.Column(object, nullable=True),  # list (nullable)
         "reaction_user_ids": pa.Column(object, nullable=True),  # list (nullable)
         "message_type": pa.Column(str),  # string
+        "word_count": pa.Column(int, pa.Check.ge(0)),
+        "word_length": pa.Column(int, pa.Check.ge(0)),
+        "char_length": pa.Column(int, pa.Check.ge(0)),
+        "emoji_count": pa.Column(int, pa.Check.ge(0)),
+        "has_link": pa.Column(bool),
+        "local_day": pa.Column(int),  # days since 1970-01-01 in the local timezone
+        "local_hour": pa.Column(int, pa.Check.in_range(0, 23)),
+        "text_folded": pa.Column(str, nullable=True),  # lowercase text without diacritics
+        "reply_to_msg_id": pa.Column("Int64", nullable=True),
+        "topic_id": pa.Column("Int64", nullable=True),
     },
     name="cleaned_chat_history",
 )
@@ -86,7 +100,7 @@ commands_usage_schema = pa.DataFrameSchema(
 # 3. Reactions Schema
 reactions_schema = pa.DataFrameSchema(
     {
-        "message_id": pa.Column(int),  # string
+        "message_id": pa.Column(int, pa.Check.gt(0)),  # string
         "timestamp": pa.Column(pandas_engine.DateTime(tz=TIMEZONE)),  # datetime64[ns]
         "reacted_to_username": pa.Column(str),  # string
         "reacting_username": pa.Column(str),  # string
@@ -0,0 +1,183 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import src.stats.utils as stats_utils
+from src.config.constants import MESSAGE_LENGTH_LIMIT, UNKNOWN_EPISODE_NR
+from src.core.regex_sandbox import compile_user_regex, is_regex, regex_sandbox
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Escapes (whole \x41, \u0105, \N{...} or octal sequences) and classes with their quantifiers, and quantified optional chars
+OPTIONAL_REGEX_PARTS_PATTERN = re.compile(
+    r"(?:\\(?:x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|N\{[^}]*\}|[0-7]{1,3}|.)|\[[^\]]*\])(?:[?*]|\{[^}]*\})?|.[?*]|.\{[^}]*\}"
+)
+AND_SEPARATOR = "&"
+
+
+class TextSearchIndex:
+    """Inverted token index over a list of texts, built once at load.
+
+    Texts are kept pre-lowercased and diacritic-folded. A query is split into word pieces, every piece has to be a substring of some
+    token of a matching text, so the token index narrows the search down to candidates and only those are verified with `in` / regex.
+    ASCII-only queries are matched against the folded texts, so "bog" finds "Bóg".
+    """
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.texts_lower = [text.lower() for text in texts]
+        self.texts_folded = [stats_utils.remove_diactric_accents(text) for text in self.texts_lower]
+        self.all_positions = np.arange(len(texts))
+        self.token_index = self.build_token_index(self.texts_lower)
+        self.folded_token_index = self.build_token_index(self.texts_folded)
+        self.piece_positions = lru_cache(maxsize=2048)(self._piece_positions)
+        # Regexes are verified in the regex sandbox worker, which keeps the registered corpora resident
+        self.corpora = {"texts": self.texts, "lower": self.texts_lower, "folded": self.texts_folded}
+        self.corpus_keys = {name: regex_sandbox.register_corpus(f"text_index.{name}") for name in self.corpora}
+
+    def __len__(self):
+        return len(self.texts)
+
+    @staticmethod
+    def build_token_index(texts: list[str]) -> dict[str, np.ndarray]:
+        token_index = {}
+        for position, text in enumerate(texts):
+            for token in set(TOKEN_PATTERN.findall(text)):
+                token_index.setdefault(token, []).append(position)
+        return {token: np.array(positions) for token, positions in token_index.items()}
+
+    def search(self, query: str, scope: np.ndarray | None = None, is_regex: bool | None = None) -> np.ndarray:
+        """Return sorted positions of texts matching the query, optionally limited to the scope positions.
+
+        The query is a substring or a regex (by default if it contains regex metacharacters), terms separated with "&" all have to match.
+        Raises re.error for an invalid regex and TimeoutError for a regex that takes too long.
+        """
+        query = query.lower()
+        is_folded = query.isascii()
+        candidates = self.all_positions if scope is None else np.sort(scope)
+        terms = [term.strip() for term in query.split(AND_SEPARATOR)] if AND_SEPARATOR in query else [query]
+        for term in terms:
+            candidates = self._filter_term(term, candidates, is_folded, is_regex)
+            if candidates.size == 0:
+                break
+        return candidates
+
+    def regex_search(self, pattern: str, flags: int = re.IGNORECASE) -> np.ndarray:
+        """Match a regex against the original texts, candidates are narrowed down by the literal word pieces of the pattern."""
+        compile_user_regex(pattern, flags)  # report invalid patterns even if no text can match
+        candidates = self.all_positions
+        for piece in [piece.lower() for piece in self.get_required_literals(pattern)]:  # lowercased after, \N{...} is case sensitive
+            candidates = np.intersect1d(candidates, self.piece_positions(piece, False), assume_unique=True)
+        return self.match_candidates(pattern, flags, "texts", candidates)
+
+    def match_candidates(self, pattern: str, flags: int, corpus_name: str, candidates: np.ndarray) -> np.ndarray:
+        """Runs the regex through the regex sandbox on candidate texts of a corpus only, the corpus stays resident in the sandbox worker."""
+        positions = regex_sandbox.search(
+            pattern, self.corpora[corpus_name], flags, positions=candidates, corpus_key=self.corpus_keys[corpus_name]
+        )
+        return np.array(positions, dtype=int)
+
+    def get_texts(self, positions: np.ndarray) -> list[str]:
+        if len(positions) == len(self.texts):
+            return self.texts
+        return [self.texts[position] for position in positions]
+
+    def _filter_term(self, term: str, candidates: np.ndarray, is_folded: bool, is_regex_term: bool | None) -> np.ndarray:
+        if term == "":
+            return candidates
+
+        if is_regex_term is None:
+            is_regex_term = is_regex(term)
+        if is_regex_term:
+            compile_user_regex(term)  # report invalid patterns even if no text can match
+        pieces = self.get_required_literals(term) if is_regex_term else TOKEN_PATTERN.findall(term)
+        for piece in pieces:
+            candidates = np.intersect1d(candidates, self.piece_positions(piece, is_folded), assume_unique=True)
+            if candidates.size == 0:
+                return candidates
+
+        if not is_regex_term and pieces == [term]:  # a single word piece matched within a token is already a substring match
+            return candidates
+
+        texts = self.texts_folded if is_folded else self.texts_lower
+        if is_regex_term:
+            return self.match_candidates(term, 0, "folded" if is_folded else "lower", candidates)
+        return np.array([position for position in candidates if term in texts[position]], dtype=int)
+
+    def _piece_positions(self, piece: str, is_folded: bool) -> np.ndarray:
+        token_index = self.folded_token_index if is_folded else self.token_index
+        matching = [positions for token, positions in token_index.items() if piece in token]
+        if not matching:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(matching))
+
+    @staticmethod
+    def get_required_literals(pattern: str) -> list[str]:
+        """Word pieces that every match of the regex has to contain. Alternations and groups can make anything optional, so they yield
+        no pieces and the regex is verified against all candidates."""
+        if "|" in pattern or "(" in pattern:
+            return []
+        return TOKEN_PATTERN.findall(OPTIONAL_REGEX_PARTS_PATTERN.sub(" ", pattern))
+
+
+class HolyTextIndex:
+    """Search index over a holy text dataframe (bible/quran) with precomputed positions of every book/chapter group.
+
+    Positions are iloc positions in the dataframe, which has a RangeIndex, so they are also the verse ids kept in BotState.
+    """
+
+    def __init__(self, df: pd.DataFrame, group_columns: list[str | tuple[str, ...]]):
+        self.df = df
+        self.text_index = TextSearchIndex(df["text"].tolist())
+        self.group_positions = {
+            columns: df.groupby(list(columns) if isinstance(columns, tuple) else columns, sort=False).indices for columns in group_columns
+        }
+
+    def get_group_positions(self, columns: str | tuple[str, ...], value) -> np.ndarray:
+        return self.group_positions[columns].get(value, np.array([], dtype=int))
+
+    def search(self, query: str, scope: np.ndarray | None = None) -> np.ndarray:
+        return self.text_index.search(query, scope)
+
+    def get_rows(self, positions: np.ndarray, shuffle: bool = False) -> pd.DataFrame:
+        if shuffle:
+            positions = np.random.permutation(positions)
+        return self.df.iloc[positions]
+
+
+class KiepscyIndex:
+    """Search index over Kiepscy episodes with one token index per searchable field.
+
+    Episodes are deduplicated and pre-sorted by episode number (episodes without a number go last), and every episode line is formatted
+    and escaped once, so a result set only has to be paged.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.copy()
+        df["nr"] = df["nr"].replace("—", str(UNKNOWN_EPISODE_NR)).astype(int)
+        self.df = df.drop_duplicates("nr").sort_values("nr").reset_index(drop=True)
+        self.title_index = TextSearchIndex(self.df["title"].fillna("").tolist())
+        self.description_index = TextSearchIndex(self.df["description"].fillna("").tolist())
+        self.lines = [
+            stats_utils.escape_special_characters(f"- *{row.nr}: {row.title}* - {row.description}\n") for row in self.df.itertuples()
+        ]
+        self.get_pages = lru_cache(maxsize=256)(self._get_pages)
+
+    def search(self, query: str) -> np.ndarray:
+        """Positions of matching episodes ranked by the matched field: title matches first, then description only matches."""
+        title_positions = self.title_index.search(query)
+        description_positions = np.setdiff1d(self.description_index.search(query), title_positions, assume_unique=True)
+        return np.concatenate([title_positions, description_positions])
+
+    def _get_pages(self, query: str, header: str) -> list[str]:
+        """Escaped result messages for the query, each within the telegram message length limit."""
+        pages = []
+        page = header
+        for position in self.search(query):
+            if len(page) + len(self.lines[position]) > MESSAGE_LENGTH_LIMIT:
+                pages.append(page)
+                page = ""
+            page += self.lines[position]
+        pages.append(page)
+        return pages
@@ -0,0 +1,112 @@
+import weakref
+from bisect import bisect_left, insort
+
+import pandas as pd
+
+import src.stats.utils as stats_utils
+
+MIN_PARTIAL_MATCH_LENGTH = 3
+
+
+class UserIndex:
+    """Literal user resolution index over the users table.
+
+    Usernames, telegram handles and nicknames are normalized once (lowercased, without "@" and diacritics), so a lookup is a dict hit
+    for exact names/nicknames and a bisect over the sorted names for prefixes. Only if both miss, a plain substring check over the
+    usernames is done, to keep supporting partial names like "smith" for "JaneSmith". Nothing is treated as a regex.
+    """
+
+    def __init__(self, users_df: pd.DataFrame):
+        self.usernames = {}
+        self.exact_map = {}
+        self.nickname_map = {}
+        self.sorted_names = []
+        for user_id, row in users_df.iterrows():
+            self.update_user(user_id, row["final_username"], self.get_row_names(row), self.get_row_nicknames(row))
+
+    def __len__(self):
+        return len(self.usernames)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return stats_utils.remove_diactric_accents(text.replace("@", "").strip().lower())
+
+    @staticmethod
+    def get_row_names(row: pd.Series) -> list[str]:
+        names = [row["final_username"]]
+        username = row.get("username")
+        if isinstance(username, str) and username != "":
+            names.append(username)
+        return names
+
+    @staticmethod
+    def get_row_nicknames(row: pd.Series) -> list[str]:
+        nicknames = row.get("nicknames")
+        if nicknames is None or isinstance(nicknames, float):  # missing column or NaN
+            return []
+        return list(nicknames)
+
+    def update_user(self, user_id: int, final_username: str, names: list[str], nicknames: list[str]):
+        """Add or replace a single user in the index, without rebuilding the rest of it."""
+        self.remove_user(user_id)
+        self.usernames[user_id] = final_username
+        for name in names:
+            self._add_key(self.exact_map, self.normalize(name), user_id)
+        for nickname in nicknames:
+            self._add_key(self.nickname_map, self.normalize(nickname), user_id)
+
+    def remove_user(self, user_id: int):
+        if user_id not in self.usernames:
+            return
+
+        del self.usernames[user_id]
+        for key_map in (self.exact_map, self.nickname_map):
+            for key in [key for key, key_user_id in key_map.items() if key_user_id == user_id]:
+                del key_map[key]
+        self.sorted_names = [(key, key_user_id) for key, key_user_id in self.sorted_names if key_user_id != user_id]
+
+    def update_from_row(self, user_id: int, row: pd.Series):
+        self.update_user(user_id, row["final_username"], self.get_row_names(row), self.get_row_nicknames(row))
+
+    def resolve(self, user_str: str) -> tuple[str, int] | None:
+        """Return (final_username, user_id) of the user matching user_str, or None. Exact names win over nicknames, then prefixes."""
+        key = self.normalize(user_str)
+        if key == "":
+            return None
+
+        user_id = self.exact_map.get(key, self.nickname_map.get(key))
+        if user_id is None and len(key) >= MIN_PARTIAL_MATCH_LENGTH:
+            user_id = self._resolve_partial(key)
+        if user_id is None:
+            return None
+        return self.usernames[user_id], user_id
+
+    def _resolve_partial(self, key: str) -> int | None:
+        position = bisect_left(self.sorted_names, (key,))
+        if position < len(self.sorted_names) and self.sorted_names[position][0].startswith(key):
+            return self.sorted_names[position][1]
+
+        for user_id, username in self.usernames.items():
+            if key in self.normalize(username):
+                return user_id
+        return None
+
+    def _add_key(self, key_map: dict, key: str, user_id: int):
+        if key == "" or key in key_map:  # the first user with a given name keeps it
+            return
+        key_map[key] = user_id
+        insort(self.sorted_names, (key, user_id))
+
+
+_user_indexes: dict[int, UserIndex] = {}
+
+
+def get_user_index(users_df: pd.DataFrame) -> UserIndex:
+    """Index of the given users table, built on first use and shared by every caller holding the same DataFrame."""
+    key = id(users_df)
+    user_index = _user_indexes.get(key)
+    if user_index is None:
+        user_index = UserIndex(users_df)
+        _user_indexes[key] = user_index
+        weakref.finalize(users_df, _user_indexes.pop, key, None)
+    return user_index
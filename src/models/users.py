@@ -0,0 +1,45 @@
+import logging
+
+import pandas as pd
+
+import src.stats.utils as stats_utils
+from src.config.enums import Table
+from src.models.user_index import get_user_index
+
+log = logging.getLogger(__name__)
+
+
+class Users:
+    """The users dimension (users table), a single instance shared by the bot commands, holidays and the chat ETL.
+
+    Consumers hold a reference to it instead of their own users_df copy. Every write to the users table bumps its version in the db,
+    so refresh() is a single query unless the ETL added or renamed users or a nickname was added, and only then reloads the table.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.version = None
+        self.df = pd.DataFrame()
+        self.map = {}
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Reload the users if their version changed since the last load, returns whether they were reloaded."""
+        version = self.db.get_table_version(Table.USERS)
+        if version == self.version:
+            return False
+
+        # A write between reading the version and the table only makes the next refresh reload again
+        self.df = self.db.load_table(Table.USERS)
+        self.map = stats_utils.get_users_map(self.df)
+        self.version = version
+        log.info(f"Users loaded at version {version}: {len(self.df)} users.")
+        return True
+
+    def add_nickname(self, user_id: int, nickname: str) -> list[str]:
+        """Append a nickname of the user in the db and in place, returns the user's nicknames."""
+        nicknames = list(self.df.at[user_id, "nicknames"]) + [nickname]
+        self.db.update_user_nicknames(user_id, nicknames)
+        self.df.at[user_id, "nicknames"] = nicknames
+        get_user_index(self.df).update_from_row(user_id, self.df.loc[user_id])
+        return nicknames
@@ -1,51 +1,220 @@
+import asyncio
+import glob
+import logging
 import os.path
+import re
+import sys
+from collections import Counter
+from contextlib import asynccontextmanager
 
 import ffmpeg
-import yt_dlp
 
 import src.core.utils as core_utils
-from src.config.paths import TEMP_DIR, YOUTUBE_COOKIE_PATH
+from src.config.constants import FFMPEG_TIMEOUT_SECONDS, YOUTUBE_AUDIO_CACHE_MAX_BYTES, YOUTUBE_DOWNLOAD_TIMEOUT_SECONDS
+from src.config.paths import TEMP_DIR, YOUTUBE_AUDIO_CACHE_DIR_PATH, YOUTUBE_COOKIE_PATH
+
+log = logging.getLogger(__name__)
+
+VIDEO_ID_PATTERN = re.compile(r"^https://(?:www\.youtube\.com/watch\?v=|youtu\.be/|www\.youtube\.com/shorts/)([\w-]{11})")
+SEGMENT_PATTERN = re.compile(r"^(?P<video_id>[\w-]{11})_(?P<start>\d+)_(?P<end>\d+|end)\.\w+$")
 
 
 class YoutubeDownload:
-    def download(self, url):
-        if not self.validate_url(url):
-            return "", "Invalid youtube url"
+    """Fetches audio windows of youtube videos with yt-dlp and ffmpeg run as async subprocesses, so /play never blocks the bot.
 
-        output_path = os.path.join(TEMP_DIR, f"{core_utils.get_random_id()}.webm")
-        ydl_opts = {
-            "outtmpl": output_path,
-            "format": "bestaudio/best",
-            "noplaylist": True,
-            "cookiefile": YOUTUBE_COOKIE_PATH,
-            "remote_components": ["ejs:github"],
-        }
+    Fetched windows are cached on disk as {video_id}_{start}_{end}.{ext} segments, evicted least recently used above
+    YOUTUBE_AUDIO_CACHE_MAX_BYTES, except for the segments in use by a request. A request inside an already cached segment is only
+    trimmed out of it locally.
+    """
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+    def __init__(self, cache_dir: str = YOUTUBE_AUDIO_CACHE_DIR_PATH, max_cache_bytes: int = YOUTUBE_AUDIO_CACHE_MAX_BYTES):
+        self.cache_dir = str(cache_dir)
+        self.max_cache_bytes = max_cache_bytes
+        self.video_locks: dict[str, asyncio.Lock] = {}
+        self.video_lock_users: Counter[str] = Counter()
+        self.cache_lock = asyncio.Lock()
+        self.segments_in_use: Counter[str] = Counter()  # segment paths without the extension, which yt-dlp picks
 
-        if not os.path.exists(output_path):
-            return "", "Error with downloading youtube video"
+    @asynccontextmanager
+    async def use_audio(self, url: str, start_time: int = 0, duration: int | None = None):
+        """Yields (path, error) of the audio of the url between start_time and start_time + duration seconds, the whole audio by default.
 
-        return output_path, ""
+        The cached segment the audio comes from isn't evicted until the block exits, so the path stays valid inside of it.
+        """
+        video_id = self.get_video_id(url)
+        if video_id is None:
+            yield "", "Invalid youtube url"
+            return
+
+        end_time = start_time + duration if duration is not None else None
+        segment_stem = None
+        try:
+            async with self.lock_video(video_id):
+                async with self.cache_lock:
+                    segment = self.find_cached_segment(video_id, start_time, end_time)
+                    segment_stem = (
+                        self.get_segment_stem(video_id, start_time, end_time) if segment is None else os.path.splitext(segment[0])[0]
+                    )
+                    self.segments_in_use[segment_stem] += 1
+
+                error = ""
+                if segment is None:
+                    segment, error = await self.download(url, video_id, start_time, end_time)
+                else:
+                    log.info(f"Youtube audio cache hit: {segment}")
+
+            if error != "":
+                yield "", error
+                return
+
+            path, segment_start, segment_end = segment
+            os.utime(path)  # mark as recently used
+            async with self.cache_lock:
+                await asyncio.to_thread(self.evict_cache)
+            if start_time == segment_start and end_time == segment_end:
+                yield path, ""
+            else:
+                yield await self.trim_audio(path, start_time - segment_start, end_time - start_time if end_time is not None else None)
+        finally:
+            if segment_stem is not None:
+                self.release_segment(segment_stem)
+
+    @asynccontextmanager
+    async def lock_video(self, video_id: str):
+        """Serializes the fetches of a video, its lock is dropped once no request holds or waits for it."""
+        lock = self.video_locks.setdefault(video_id, asyncio.Lock())
+        self.video_lock_users[video_id] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.video_lock_users[video_id] -= 1
+            if self.video_lock_users[video_id] == 0:
+                del self.video_locks[video_id], self.video_lock_users[video_id]
+
+    def release_segment(self, segment_stem: str):
+        self.segments_in_use[segment_stem] -= 1
+        if self.segments_in_use[segment_stem] == 0:
+            del self.segments_in_use[segment_stem]
+
+    @staticmethod
+    def get_video_id(url: str) -> str | None:
+        match = VIDEO_ID_PATTERN.match(url)
+        return match.group(1) if match else None
+
+    def get_segments(self, video_id: str | None = None) -> list[tuple[str, int, int | None]]:
+        """Cached segments as (path, start, end), end is None for segments reaching the end of the video."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+
+        segments = []
+        for filename in os.listdir(self.cache_dir):
+            match = SEGMENT_PATTERN.match(filename)
+            if match is None or (video_id is not None and match["video_id"] != video_id):
+                continue
+            end = None if match["end"] == "end" else int(match["end"])
+            segments.append((os.path.join(self.cache_dir, filename), int(match["start"]), end))
+        return segments
 
-    def swap_video_audio(self, video_path, audio_path, start_time=0, duration=10000000000):
-        input_kwargs = {"ss": start_time, "t": duration}
+    def find_cached_segment(self, video_id: str, start_time: int, end_time: int | None) -> tuple[str, int, int | None] | None:
+        """The shortest cached segment of the video containing the [start_time, end_time] window."""
+        containing = [
+            (path, start, end)
+            for path, start, end in self.get_segments(video_id)
+            if start <= start_time and (end is None or (end_time is not None and end_time <= end))
+        ]
+        if not containing:
+            return None
+        return min(containing, key=lambda segment: (segment[2] is None, (segment[2] or 0) - segment[1]))
 
+    def get_segment_stem(self, video_id: str, start_time: int, end_time: int | None) -> str:
+        return os.path.join(self.cache_dir, f"{video_id}_{start_time}_{end_time if end_time is not None else 'end'}")
+
+    async def download(self, url: str, video_id: str, start_time: int, end_time: int | None) -> tuple[tuple[str, int, int | None], str]:
+        core_utils.create_dir(self.cache_dir)
+        output_stem = self.get_segment_stem(video_id, start_time, end_time)
+        args = [
+            sys.executable,
+            "-m",
+            "yt_dlp",
+            url,
+            "--format",
+            "bestaudio/best",
+            "--no-playlist",
+            "--cookies",
+            str(YOUTUBE_COOKIE_PATH),
+            "--remote-components",
+            "ejs:github",
+            "--output",
+            f"{output_stem}.%(ext)s",
+        ]
+        if start_time > 0 or end_time is not None:
+            args += ["--download-sections", f"*{start_time}-{end_time if end_time is not None else 'inf'}"]
+
+        error = await self.run_subprocess(args, YOUTUBE_DOWNLOAD_TIMEOUT_SECONDS)
+        output_paths = glob.glob(f"{glob.escape(output_stem)}.*")
+        paths = [path for path in output_paths if SEGMENT_PATTERN.match(os.path.basename(path))]
+        if error != "" or not paths:
+            for path in output_paths:  # a failed or timed out download can leave a partial file, which would be served as cached
+                os.remove(path)
+            return None, "Error with downloading youtube video"
+        return (paths[0], start_time, end_time), ""
+
+    async def trim_audio(self, audio_path: str, offset: int, duration: int | None) -> tuple[str, str]:
+        core_utils.create_dir(TEMP_DIR)
+        output_path = os.path.join(TEMP_DIR, f"{core_utils.get_random_id()}{os.path.splitext(audio_path)[1]}")
+        input_kwargs = {"ss": offset} if duration is None else {"ss": offset, "t": duration}
+        args = ffmpeg.input(audio_path, **input_kwargs).output(output_path, acodec="copy").overwrite_output().compile()
+
+        error = await self.run_subprocess(args, FFMPEG_TIMEOUT_SECONDS)
+        if error != "":
+            return "", "Error with trimming youtube audio"
+        return output_path, ""
+
+    async def swap_video_audio(self, video_path: str, audio_path: str) -> tuple[str, str]:
         input_video = ffmpeg.input(video_path)
-        input_audio = ffmpeg.input(audio_path, **input_kwargs)
+        input_audio = ffmpeg.input(audio_path)
         output_path = os.path.join(TEMP_DIR, f"{core_utils.get_random_id()}.mp4")
-        ffmpeg.output(
-            input_video.video,
-            input_audio.audio,
-            output_path,
-            vcodec="copy",
-            acodec="aac",
-            shortest=None,
-        ).run(overwrite_output=True)
-
-        return output_path
-
-    def validate_url(self, url):
-        valid_prefixes = ["https://www.youtube.com/watch?v=", "https://youtu.be/", "https://www.youtube.com/shorts/"]
-        return any(url.startswith(prefix) for prefix in valid_prefixes)
+        args = (
+            ffmpeg.output(input_video.video, input_audio.audio, output_path, vcodec="copy", acodec="aac", shortest=None)
+            .overwrite_output()
+            .compile()
+        )
+
+        error = await self.run_subprocess(args, FFMPEG_TIMEOUT_SECONDS)
+        if error != "":
+            return "", "Error with swapping the video audio"
+        return output_path, ""
+
+    def evict_cache(self):
+        """Remove the least recently used segments until the cache fits in max_cache_bytes, segments in use are never removed.
+
+        Must run under cache_lock, so a segment can't be picked up by a request while it's being removed.
+        """
+        segments = sorted((os.stat(path).st_mtime, os.path.getsize(path), path) for path, _, _ in self.get_segments())
+        total_bytes = sum(size for _, size, _ in segments)
+        for _, size, path in segments:
+            if total_bytes <= self.max_cache_bytes:
+                break
+            if os.path.splitext(path)[0] in self.segments_in_use:
+                continue
+            os.remove(path)
+            total_bytes -= size
+
+    @staticmethod
+    async def run_subprocess(args: list[str], timeout_seconds: float) -> str:
+        """Run a command without blocking the event loop, returns an error message or "" on success."""
+        process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout_seconds)
+        except TimeoutError:
+            process.kill()
+            await process.wait()
+            log.error(f"{args[0]} timed out after {timeout_seconds}s")
+            return f"Timed out after {timeout_seconds}s"
+
+        if process.returncode != 0:
+            error = stderr.decode(errors="ignore").strip()
+            log.error(f"{args[0]} failed with code {process.returncode}: {error[-1000:]}")
+            return error or f"Exit code {process.returncode}"
+        return ""
@@ -0,0 +1,51 @@
+import logging
+import timeit
+
+import pandas as pd
+
+from src.config.enums import ArgType
+from src.core.arg_parser import ArgParser
+from src.models.command_args import CommandArgs
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+logging.getLogger("src.core.arg_parser").setLevel(logging.CRITICAL)
+logger = logging.getLogger(__name__)
+
+CORPUS_SIZES = [100, 10_000, 100_000]
+REPEATS = 200
+
+USERS_DF = pd.DataFrame({"final_username": ["Ozjasz", "Boczek", "Ferdek"]}, index=[1, 2, 3])
+BIBLE_NAMED_ARGS = {"prev": ArgType.POSITIVE_INT, "next": ArgType.POSITIVE_INT, "all": ArgType.NONE, "num": ArgType.POSITIVE_INT}
+
+
+def parse_tvp(phrases):
+    """/tvp foo bar - text arg with the phrase corpus attached."""
+    return ArgParser.parse_args(USERS_DF, CommandArgs(args=["foo", "bar"], phrases=phrases, is_text_arg=True))
+
+
+def parse_bible(phrases):
+    """/bible bóg --num 5 - text arg with named args."""
+    command_args = CommandArgs(args=["bóg", "--num", "5"], phrases=phrases, is_text_arg=True, available_named_args=BIBLE_NAMED_ARGS)
+    return ArgParser.parse_args(USERS_DF, command_args)
+
+
+def parse_summary(phrases):
+    """/summary boczek 7d - optional user and period args."""
+    command_args = CommandArgs(args=["boczek", "7d"], phrases=phrases, expected_args=[ArgType.USER, ArgType.PERIOD], optional=[True, True])
+    return ArgParser.parse_args(USERS_DF, command_args)
+
+
+def run():
+    benchmarks = [parse_tvp, parse_bible, parse_summary]
+    logger.info(f"{'Command':<16}" + "".join(f"{f'{size} phrases':>18}" for size in CORPUS_SIZES))
+    for benchmark in benchmarks:
+        timings = []
+        for size in CORPUS_SIZES:
+            phrases = [f"headline number {i}" for i in range(size)]
+            seconds = timeit.timeit(lambda benchmark=benchmark, phrases=phrases: benchmark(phrases), number=REPEATS)
+            timings.append(seconds / REPEATS * 1_000_000)
+        logger.info(f"{benchmark.__name__:<16}" + "".join(f"{f'{timing:.1f} us':>18}" for timing in timings))
+
+
+if __name__ == "__main__":
+    run()
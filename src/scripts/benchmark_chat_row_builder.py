@@ -0,0 +1,153 @@
+import logging
+import random
+import timeit
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+
+from src.config.constants import TIMEZONE
+from src.config.enums import MessageType
+from src.models.schemas import ChatMessageRow
+from src.stats.chat_row_builder import ChatRowBuilder, get_reply_and_topic_ids
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+logging.getLogger("src.stats.chat_row_builder").setLevel(logging.CRITICAL)
+logger = logging.getLogger(__name__)
+
+WINDOW_SIZES = [1_000, 10_000, 100_000]
+REPEATS = 3
+
+EMOJIS = ["👍", "😂", "❤", "🔥", "🤡", "👎"]
+SENDERS = [
+    SimpleNamespace(first_name="Ferdynand", last_name="Kiepski", username="ferdek"),
+    SimpleNamespace(first_name="Marian", last_name=None, username=None),
+    SimpleNamespace(first_name="Arnold", last_name="Boczek", username="boczek"),
+]
+
+
+def make_reaction(rng: random.Random, is_malformed: bool = False):
+    peer_id = SimpleNamespace() if is_malformed else SimpleNamespace(user_id=rng.randint(1, 3))
+    return SimpleNamespace(reaction=SimpleNamespace(emoticon=rng.choice(EMOJIS)), peer_id=peer_id)
+
+
+def make_reply_to(rng: random.Random, message_id: int):
+    """A forum reply header of a message in a topic, a reply in the General topic or None, in the shape of telethon's MessageReplyHeader."""
+    topic_id = rng.choice([None, 2, 5])
+    reply_to_msg_id = rng.randint(1, message_id) if rng.random() < 0.3 else None
+    if topic_id is None:
+        return SimpleNamespace(reply_to_msg_id=reply_to_msg_id, reply_to_top_id=None, forum_topic=False) if reply_to_msg_id else None
+    if reply_to_msg_id is None:
+        return SimpleNamespace(reply_to_msg_id=topic_id, reply_to_top_id=None, forum_topic=True)
+    return SimpleNamespace(reply_to_msg_id=reply_to_msg_id, reply_to_top_id=topic_id, forum_topic=True)
+
+
+def make_messages(num_messages: int, seed: int = 0) -> tuple[list, list, dict]:
+    """Synthetic telethon-like messages with a realistic mix of reactions, as (messages, message_types, detailed message_reactions)."""
+    rng = random.Random(seed)
+    reply_rng = random.Random(seed + 1)  # separate stream, the messages stay the same as without reply headers
+    start_dt = datetime(2025, 1, 1, tzinfo=UTC)
+    messages, message_types, message_reactions = [], [], {}
+    for message_id in range(1, num_messages + 1):
+        num_reactions = rng.choice([0, 0, 0, 1, 2, 3, 5, 8])
+        reactions = None
+        if num_reactions > 0:
+            is_malformed = rng.random() < 0.01
+            recent_reactions = [make_reaction(rng, is_malformed) for _ in range(min(num_reactions, 3))]
+            results = [SimpleNamespace(count=1) for _ in range(num_reactions)]
+            reactions = SimpleNamespace(recent_reactions=recent_reactions, results=results)
+            if num_reactions > 3:
+                message_reactions[message_id] = SimpleNamespace(reactions=[make_reaction(rng) for _ in range(num_reactions)])
+
+        sender_id = rng.randint(1, 3)
+        messages.append(
+            SimpleNamespace(
+                id=message_id,
+                # Out of order timestamps, like messages of a backfill chunk
+                date=start_dt + timedelta(seconds=rng.randint(0, num_messages * 60)),
+                sender_id=sender_id,
+                sender=None if rng.random() < 0.005 else SENDERS[sender_id - 1],
+                text=rng.choice(["", "siema", "co tam słychać", None]),
+                reactions=reactions,
+                reply_to=make_reply_to(reply_rng, message_id),
+            )
+        )
+        message_types.append(rng.choice([MessageType.TEXT, MessageType.TEXT, MessageType.IMAGE, MessageType.GIF]))
+    return messages, message_types, message_reactions
+
+
+def parse_reactions(message_reactions) -> tuple[list, list, bool]:
+    reaction_emojis, reaction_user_ids, success = [], [], True
+    for reaction in message_reactions:
+        try:
+            reaction_emojis.append(reaction.reaction.emoticon)
+            reaction_user_ids.append(reaction.peer_id.user_id)
+        except AttributeError:
+            success = False
+    return reaction_emojis, reaction_user_ids, success
+
+
+def build_with_pydantic_rows(messages, message_types, message_reactions) -> pd.DataFrame:
+    """The previous ChatETL conversion, a ChatMessageRow per message dumped into a list of dicts, kept as the benchmark baseline."""
+    data = []
+    for message, message_type in zip(messages, message_types, strict=False):
+        reaction_emojis, reaction_user_ids = [], []
+        if message is None or message.sender is None:
+            continue
+        success = True
+
+        if message.reactions is not None and message.reactions.recent_reactions is not None:
+            reaction_emojis, reaction_user_ids, success = parse_reactions(message.reactions.recent_reactions)
+            if ChatRowBuilder.count_reactions(message) > 3 and message_reactions:
+                reaction_emojis, reaction_user_ids, detailed_success = parse_reactions(message_reactions[message.id].reactions)
+                success = success and detailed_success
+
+        if not success:
+            continue
+
+        reply_to_msg_id, topic_id = get_reply_and_topic_ids(message)
+        row = ChatMessageRow(
+            message_id=int(message.id),
+            timestamp=message.date,
+            user_id=int(message.sender_id),
+            first_name=message.sender.first_name,
+            last_name=message.sender.last_name,
+            username=message.sender.username,
+            text=message.text,
+            image_text="",
+            reaction_emojis=reaction_emojis,
+            reaction_user_ids=reaction_user_ids,
+            message_type=message_type.value,
+            reply_to_msg_id=reply_to_msg_id,
+            topic_id=topic_id,
+        )
+        data.append(row.model_dump())
+
+    chat_df = pd.DataFrame(data)
+    chat_df[["reply_to_msg_id", "topic_id"]] = chat_df[["reply_to_msg_id", "topic_id"]].astype("Int64")
+    chat_df["timestamp"] = pd.to_datetime(chat_df["timestamp"], utc=True).dt.tz_convert(TIMEZONE).astype(f"datetime64[ns, {TIMEZONE}]")
+    return chat_df.sort_values(by="timestamp").reset_index(drop=True)
+
+
+def build_with_row_builder(messages, message_types, message_reactions) -> pd.DataFrame:
+    row_builder = ChatRowBuilder()
+    row_builder.add_messages(messages, message_types, message_reactions)
+    return row_builder.build()
+
+
+def run():
+    builders = [build_with_pydantic_rows, build_with_row_builder]
+    logger.info(f"{'Builder':<26}" + "".join(f"{f'{size} messages':>20}" for size in WINDOW_SIZES))
+    timings = {builder.__name__: [] for builder in builders}
+    for size in WINDOW_SIZES:
+        messages = make_messages(size)
+        for builder in builders:
+            seconds = min(timeit.repeat(lambda builder=builder, messages=messages: builder(*messages), number=1, repeat=REPEATS))
+            timings[builder.__name__].append(size / seconds)
+
+    for name, messages_per_second in timings.items():
+        logger.info(f"{name:<26}" + "".join(f"{f'{rate / 1000:.0f}k msg/s':>20}" for rate in messages_per_second))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,109 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import cartopy.crs as ccrs
+import cartopy.io.shapereader as shpreader
+import matplotlib.pyplot as plt
+
+from src.config.paths import MAP_QUIZ_BASE_TILES_DIR_PATH
+from src.models.base_map_cache import BASE_MAP_LEVELS, TILE_SIZE, BaseMapCache, get_tile_bounds
+from src.models.map_quiz import MapQuiz
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger(__name__)
+
+_RENDER_DPI = 100
+_LEVELS_BY_NAME = {level.name: level for level in BASE_MAP_LEVELS}
+# Natural Earth shapes drawn by MapQuiz._add_base_layers, (category, name)
+_BASE_SHAPES = [("physical", "ocean"), ("physical", "land"), ("physical", "lakes"), ("physical", "coastline")]
+_BORDER_SHAPES = [("cultural", "admin_0_boundary_lines_land")]
+
+
+def render_tile(task: tuple[str, str, int, int]) -> dict:
+    """Worker function to render a single base map tile with the same layers as MapQuiz.generate_image."""
+    tiles_dir, level_name, column, row = task
+    level = _LEVELS_BY_NAME[level_name]
+    tile_path = BaseMapCache(tiles_dir).get_tile_path(level, column, row)
+    if os.path.exists(tile_path):
+        return {"tile": tile_path, "status": "skipped"}
+
+    try:
+        x_min, x_max, y_min, y_max = get_tile_bounds(level, column, row)
+        projection = ccrs.Mercator()
+        fig = plt.figure(figsize=(TILE_SIZE / _RENDER_DPI, TILE_SIZE / _RENDER_DPI), dpi=_RENDER_DPI)
+        ax = fig.add_axes([0, 0, 1, 1], projection=projection)
+        MapQuiz._add_base_layers(ax, level.resolution, show_borders=level.show_borders)
+        ax.set_extent([x_min, x_max, y_min, y_max], crs=projection)
+        ax.axis("off")
+
+        # Write to a temp file first, so an interrupted build never leaves a broken tile behind
+        temp_path = f"{tile_path}.tmp.png"
+        fig.savefig(temp_path, dpi=_RENDER_DPI, facecolor="white")
+        plt.close(fig)
+        os.replace(temp_path, tile_path)
+        return {"tile": tile_path, "status": "generated"}
+    except Exception as e:
+        return {"tile": tile_path, "status": "error", "error": str(e)}
+
+
+class BaseTilesBuilder:
+    """Renders the base map tiles used by BaseMapCache offline, from the Natural Earth shapes cached by cartopy.
+
+    The shapes are downloaded into cartopy's data dir once, before rendering, so the build needs network access only on the first run.
+    Already rendered tiles are skipped, so an interrupted build can be resumed by running the script again.
+    """
+
+    def __init__(self, tiles_dir: str = MAP_QUIZ_BASE_TILES_DIR_PATH, level_names: list[str] = None, num_cores: int = None):
+        self.tiles_dir = str(tiles_dir)
+        self.levels = [_LEVELS_BY_NAME[name] for name in level_names] if level_names else BASE_MAP_LEVELS
+        self.num_cores = num_cores or min(multiprocessing.cpu_count(), 8)
+        self.counts = {"generated": 0, "skipped": 0, "error": 0}
+
+    def get_tasks(self) -> list[tuple[str, str, int, int]]:
+        tasks = []
+        for level in self.levels:
+            os.makedirs(os.path.join(self.tiles_dir, level.name), exist_ok=True)
+            columns, rows = level.grid_size
+            tasks.extend((self.tiles_dir, level.name, column, row) for row in range(rows) for column in range(columns))
+        return tasks
+
+    def download_shapes(self):
+        """Fetch the shapes of the levels up front, so the workers don't race to download them and a build without them fails at once."""
+        for resolution, show_borders in sorted({(level.resolution, level.show_borders) for level in self.levels}):
+            for category, name in _BASE_SHAPES + (_BORDER_SHAPES if show_borders else []):
+                try:
+                    logger.info(f"Natural Earth shape {name} {resolution}: {shpreader.natural_earth(resolution, category, name)}")
+                except Exception as e:
+                    raise RuntimeError(f"Natural Earth shape {name} {resolution} is not cached and couldn't be downloaded: {e}") from e
+
+    def run(self):
+        self.download_shapes()
+        tasks = self.get_tasks()
+        logger.info(f"Building {len(tasks)} tiles of levels {[level.name for level in self.levels]} with {self.num_cores} cores.")
+
+        start_time = time.time()
+        with multiprocessing.Pool(processes=self.num_cores) as pool:
+            for i, result in enumerate(pool.imap_unordered(render_tile, tasks, chunksize=8), start=1):
+                self.counts[result["status"]] += 1
+                if result["status"] == "error":
+                    logger.error(f"Error rendering tile {result['tile']}: {result['error']}")
+                if i % 100 == 0 or i == len(tasks):
+                    logger.info(f"Progress: {i}/{len(tasks)} {self.counts}")
+
+        logger.info(f"--- Base tiles built in {time.time() - start_time:.2f} seconds: {self.counts} ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the cached base map tiles of the map quiz.")
+    parser.add_argument("--levels", nargs="*", choices=list(_LEVELS_BY_NAME), help="Levels to build, all of them by default.")
+    parser.add_argument("--cores", type=int, default=None)
+    args = parser.parse_args()
+    BaseTilesBuilder(level_names=args.levels, num_cores=args.cores).run()
@@ -0,0 +1,34 @@
+import logging
+import time
+
+import pandas as pd
+
+from src.config.paths import COUNTRIES_PATH, COUNTRIES_QUIZ_TEXTS_PATH, FAMOUS_PEOPLE_QUIZ_TEXTS_PATH, FAMOUS_PEOPLE_TRIVIA_PATH
+from src.models import flag_quiz, map_quiz
+from src.models.flag_quiz import FlagQuiz
+from src.models.map_quiz import MapQuiz
+from src.models.quiz_texts import build_quiz_texts
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger(__name__)
+
+
+def build_all_quiz_texts():
+    """Precompute display names, descriptions and censored tips of every map quiz person and flag quiz country next to their parquet."""
+    start_time = time.time()
+    people_df = pd.read_parquet(str(FAMOUS_PEOPLE_TRIVIA_PATH))
+    people_texts_df = build_quiz_texts(people_df, "uri", map_quiz.QUIZ_TEXT_SOURCE_COLUMNS, MapQuiz.build_quiz_texts)
+    people_texts_df.to_parquet(str(FAMOUS_PEOPLE_QUIZ_TEXTS_PATH))
+
+    countries_df = pd.read_parquet(str(COUNTRIES_PATH))
+    countries_texts_df = build_quiz_texts(countries_df, "country_code", flag_quiz.QUIZ_TEXT_SOURCE_COLUMNS, FlagQuiz.build_quiz_texts)
+    countries_texts_df.to_parquet(str(COUNTRIES_QUIZ_TEXTS_PATH))
+
+    logger.info(
+        f"Built quiz texts of {len(people_texts_df)} people and {len(countries_texts_df)} countries in {time.time() - start_time:.2f}s."
+    )
+
+
+if __name__ == "__main__":
+    build_all_quiz_texts()
@@ -1,52 +1,183 @@
+import argparse
+import hashlib
+import json
 import logging
 import multiprocessing
 import os
 import shutil
 import time
 
+import matplotlib
+
+matplotlib.use("Agg")
+
 import pandas as pd
+from PIL import Image
 
-from src.config.paths import MAP_QUIZ_IMAGES_DIR_PATH
+from src.config.paths import FAMOUS_PEOPLE_TRIVIA_PATH, FLAGS_DIR_PATH, IMAGES_MANIFEST_PATH, MAP_QUIZ_IMAGES_DIR_PATH
+from src.models.base_map_cache import BaseMapCache
 from src.models.map_quiz import MapQuiz
+from src.scripts.build_quiz_texts import build_all_quiz_texts
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
 logger = logging.getLogger(__name__)
 
-PARQUET_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "misc", "famous_people_trivia.parquet")
+PARQUET_PATH = FAMOUS_PEOPLE_TRIVIA_PATH
+
+# Bump to re-render every map after a change of the map style
+RENDER_VERSION = 1
+FLAG_WIDTH = 640
+FLAG_JPG_QUALITY = 90
+
+# Warm up locations rendering both the zoomed out (50m) and the close-up (10m + borders) base layers
+_WARM_UP_LOCATIONS = [[(0.0, 0.0, "", "red"), (90.0, 40.0, "", "red")], [(21.0, 52.2, "", "red")]]
+
+# State of a pool worker, set once by init_worker instead of being rebuilt for every image
+_worker_people: list[dict] = []
+_worker_quiz: MapQuiz | None = None
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
+
+
+def get_location_hash(person: dict) -> str:
+    """Hash of everything drawn on the person's map, so a changed coordinate or year label triggers a re-render."""
+    locations = MapQuiz.get_locations_for_person(person)
+    return hashlib.sha1(json.dumps([RENDER_VERSION, locations]).encode()).hexdigest()
+
+
+def load_manifest(path: str = IMAGES_MANIFEST_PATH) -> dict:
+    """Manifest of the pregenerated images: {"people": {person_id: {file, location_hash, image_hash}}, "flags": {file: image_hash}}."""
+    manifest = {"people": {}, "flags": {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest.update(json.load(f))
+    return manifest
+
+
+def save_manifest(manifest: dict, path: str = IMAGES_MANIFEST_PATH):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def init_worker(parquet_path: str):
+    """Pool initializer: load the dataset once per worker and warm up cartopy by rendering throwaway maps of both resolutions."""
+    global _worker_people, _worker_quiz
+    _worker_people = pd.read_parquet(parquet_path).to_dict("records")
+    _worker_quiz = MapQuiz(base_map_cache=BaseMapCache(levels=[]))  # pregenerated images are always full vector renders
+
+    for locations in _WARM_UP_LOCATIONS:
+        try:
+            os.remove(_worker_quiz.generate_image(locations))
+        except Exception as e:
+            logger.warning(f"Cartopy warm up failed: {e}")
 
 
 def pregenerate_single_image(idx: int) -> dict:
     """Worker function to generate a map image for a single person."""
+    person = _worker_people[idx]
+    filename = MapQuiz.get_image_filename_for_person(person)
     try:
-        df = pd.read_parquet(PARQUET_PATH)
-        person = df.iloc[idx]
+        temp_path = _worker_quiz.generate_image(MapQuiz.get_locations_for_person(person))
 
-        filename = MapQuiz.get_image_filename_for_person(person)
+        # Move from temp to final destination
         final_path = os.path.join(MAP_QUIZ_IMAGES_DIR_PATH, filename)
+        shutil.move(temp_path, final_path)
 
-        if os.path.exists(final_path):
-            return {"idx": idx, "status": "skipped", "file": filename}
+        return {"idx": idx, "status": "generated", "file": filename, "image_hash": hash_file(final_path)}
+    except Exception as e:
+        return {"idx": idx, "status": "error", "file": filename, "error": str(e)}
 
-        quiz = MapQuiz()
-        locations = MapQuiz.get_locations_for_person(person)
 
-        temp_path = quiz.generate_image(locations)
+def normalize_flag(filename: str) -> dict:
+    """Worker function to convert a flag image to an RGB JPEG of FLAG_WIDTH width, in place."""
+    path = os.path.join(FLAGS_DIR_PATH, filename)
+    try:
+        with Image.open(path) as image:
+            is_normalized = image.format == "JPEG" and image.mode == "RGB" and image.width == FLAG_WIDTH
+            if not is_normalized:
+                image = image.convert("RGB")
+                if image.width != FLAG_WIDTH:
+                    image = image.resize((FLAG_WIDTH, round(image.height * FLAG_WIDTH / image.width)), Image.Resampling.LANCZOS)
 
-        # Move from temp to final destination
-        shutil.move(temp_path, final_path)
+        if not is_normalized:
+            temp_path = f"{path}.tmp"
+            image.save(temp_path, format="JPEG", quality=FLAG_JPG_QUALITY)
+            os.replace(temp_path, path)
 
-        return {"idx": idx, "status": "generated", "file": filename}
+        return {"file": filename, "status": "skipped" if is_normalized else "generated", "image_hash": hash_file(path)}
     except Exception as e:
-        return {"idx": idx, "status": "error", "error": str(e)}
+        return {"file": filename, "status": "error", "error": str(e)}
+
+
+def plan_people(people: list[dict], manifest: dict, force: bool = False) -> tuple[list[int], dict, list[str]]:
+    """Compare the dataset with the manifest.
+
+    Returns:
+        Indices of people to render, the people manifest for images that are up to date and stale image files to prune.
+        An image without a manifest entry (made before the manifest existed) is adopted as up to date, unless force is set.
+    """
+    old_entries = manifest["people"]
+    entries, to_render = {}, []
+    for idx, person in enumerate(people):
+        person_id = str(person["uri"])
+        filename = MapQuiz.get_image_filename_for_person(person)
+        path = os.path.join(MAP_QUIZ_IMAGES_DIR_PATH, filename)
+        location_hash = get_location_hash(person)
+        entry = old_entries.get(person_id)
+
+        if force or not os.path.exists(path):
+            to_render.append(idx)
+        elif entry is None:
+            entries[person_id] = {"file": filename, "location_hash": location_hash, "image_hash": hash_file(path)}
+        elif entry["file"] != filename or entry["location_hash"] != location_hash or entry["image_hash"] != hash_file(path):
+            to_render.append(idx)
+        else:
+            entries[person_id] = entry
+
+    expected_files = {MapQuiz.get_image_filename_for_person(person) for person in people}
+    existing_files = os.listdir(MAP_QUIZ_IMAGES_DIR_PATH) if os.path.isdir(MAP_QUIZ_IMAGES_DIR_PATH) else []
+    stale_files = sorted(file for file in existing_files if file.endswith(".jpg") and file not in expected_files)
+    return to_render, entries, stale_files
+
+
+def plan_flags(manifest: dict, force: bool = False) -> tuple[list[str], dict]:
+    """Returns flag files to normalize and the flags manifest for the ones that didn't change since the last run."""
+    old_entries = manifest["flags"]
+    entries, to_normalize = {}, []
+    filenames = sorted(os.listdir(FLAGS_DIR_PATH)) if os.path.isdir(FLAGS_DIR_PATH) else []
+    for filename in filenames:
+        if filename.endswith(".tmp"):
+            continue
+        image_hash = hash_file(os.path.join(FLAGS_DIR_PATH, filename))
+        if not force and old_entries.get(filename) == image_hash:
+            entries[filename] = image_hash
+        else:
+            to_normalize.append(filename)
+    return to_normalize, entries
+
+
+def get_chunksize(num_tasks: int, num_cores: int) -> int:
+    return max(1, num_tasks // (num_cores * 4))
 
 
 class MapQuizPregenerator:
-    """Handles the bulk pregeneration of Map Quiz images using multiprocessing."""
+    """Handles the incremental pregeneration of Map Quiz images and normalization of flag images using multiprocessing.
 
-    def __init__(self, num_cores: int = None):
+    Only people whose map changed since the last run (see the manifest) are rendered, and images of people removed from the dataset are
+    pruned. Workers load the dataset and warm up cartopy once, and tasks are dispatched in chunks.
+    """
+
+    def __init__(self, num_cores: int = None, force: bool = False):
         self.num_cores = num_cores or min(multiprocessing.cpu_count(), 8)
+        self.force = force
         self.total_persons = 0
+        self.to_render = 0
         self.generated = 0
         self.skipped = 0
         self.errors = 0
@@ -59,44 +190,78 @@ class MapQuizPregenerator:
             logger.error(f"Parquet file not found at {os.path.abspath(PARQUET_PATH)}")
             return
 
-        df = pd.read_parquet(PARQUET_PATH)
-        self.total_persons = len(df)
-        indices = list(range(self.total_persons))
+        build_all_quiz_texts()
+        people = pd.read_parquet(PARQUET_PATH).to_dict("records")
+        self.total_persons = len(people)
+        manifest = load_manifest()
+        indices, people_entries, stale_files = plan_people(people, manifest, self.force)
+        flag_files, flag_entries = plan_flags(manifest, self.force)
+        self.to_render = len(indices)
+        self.skipped = self.total_persons - self.to_render
 
-        logger.info(f"Loaded {self.total_persons} records. Utilizing {self.num_cores} cores.")
+        logger.info(
+            f"Loaded {self.total_persons} records, {self.to_render} to render, {len(stale_files)} stale, {len(flag_files)} flags to check. "
+            f"Utilizing {self.num_cores} cores."
+        )
 
         start_time = time.time()
+        if indices or flag_files:
+            with multiprocessing.Pool(processes=self.num_cores, initializer=init_worker, initargs=(PARQUET_PATH,)) as pool:
+                chunksize = get_chunksize(len(indices), self.num_cores)
+                for result in pool.imap_unordered(pregenerate_single_image, indices, chunksize=chunksize):
+                    self._handle_result(result, people, people_entries)
+
+                for result in pool.imap_unordered(normalize_flag, flag_files, chunksize=get_chunksize(len(flag_files), self.num_cores)):
+                    self._handle_flag_result(result, flag_entries)
 
-        with multiprocessing.Pool(processes=self.num_cores) as pool:
-            for result in pool.imap_unordered(pregenerate_single_image, indices):
-                self._handle_result(result)
+        for filename in stale_files:
+            os.remove(os.path.join(MAP_QUIZ_IMAGES_DIR_PATH, filename))
+            logger.info(f"Pruned stale image {filename}")
 
+        save_manifest({"people": people_entries, "flags": flag_entries})
         duration = time.time() - start_time
-        self._print_summary(duration)
+        self._print_summary(duration, len(stale_files))
 
-    def _handle_result(self, result: dict):
-        if result["status"] == "skipped":
-            self.skipped += 1
-        elif result["status"] == "generated":
+    def _handle_result(self, result: dict, people: list[dict], people_entries: dict):
+        if result["status"] == "generated":
             self.generated += 1
+            person = people[result["idx"]]
+            people_entries[str(person["uri"])] = {
+                "file": result["file"],
+                "location_hash": get_location_hash(person),
+                "image_hash": result["image_hash"],
+            }
         else:
             self.errors += 1
             logger.error(f"Error generating image for index {result['idx']}: {result.get('error')}")
 
-        completed = self.generated + self.skipped + self.errors
-        if completed % 10 == 0 or completed == self.total_persons:
-            logger.info(
-                f"Progress: {completed}/{self.total_persons} (Generated: {self.generated}, Skipped: {self.skipped}, Errors: {self.errors})"
-            )
+        completed = self.generated + self.errors
+        if completed % 10 == 0 or completed == self.to_render:
+            logger.info(f"Progress: {completed}/{self.to_render} (Generated: {self.generated}, Errors: {self.errors})")
+
+    @staticmethod
+    def _handle_flag_result(result: dict, flag_entries: dict):
+        if result["status"] == "error":
+            logger.error(f"Error normalizing flag {result['file']}: {result.get('error')}")
+            return
+
+        flag_entries[result["file"]] = result["image_hash"]
+        if result["status"] == "generated":
+            logger.info(f"Normalized flag {result['file']}")
 
-    def _print_summary(self, duration: float):
+    def _print_summary(self, duration: float, pruned: int):
         logger.info("--- Pregeneration Complete ---")
         logger.info(f"Time taken: {duration:.2f} seconds")
         logger.info(f"Successfully generated: {self.generated}")
-        logger.info(f"Skipped (already existed): {self.skipped}")
+        logger.info(f"Skipped (up to date): {self.skipped}")
+        logger.info(f"Pruned: {pruned}")
         logger.info(f"Errors: {self.errors}")
 
 
 if __name__ == "__main__":
-    pregenerator = MapQuizPregenerator()
+    parser = argparse.ArgumentParser(description="Pregenerate the map quiz images and normalize the flag images.")
+    parser.add_argument("--force", action="store_true", help="Re-render every image, ignoring the manifest.")
+    parser.add_argument("--cores", type=int, default=None)
+    args = parser.parse_args()
+    pregenerator = MapQuizPregenerator(num_cores=args.cores, force=args.force)
     pregenerator.run()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+from datetime import UTC, datetime, timedelta
+
+from telethon import errors
+
+import src.core.utils as core_utils
+import src.stats.utils as stats_utils
+from src.config.constants import BACKFILL_CHUNK_SIZE, BACKFILL_CONCURRENCY
+
+log = logging.getLogger(__name__)
+
+
+def get_chunks(first_message_id: int, last_message_id: int, chunk_size: int = BACKFILL_CHUNK_SIZE) -> list[tuple[int, int]]:
+    """Inclusive (chunk_start, chunk_end) message id ranges covering first_message_id..last_message_id, newest first.
+
+    Chunks are aligned to multiples of chunk_size, so they stay the same across runs and completed ones can be skipped on resume.
+    """
+    if last_message_id < first_message_id:
+        return []
+    first_index = (max(first_message_id, 1) - 1) // chunk_size
+    last_index = (last_message_id - 1) // chunk_size
+    return [(index * chunk_size + 1, (index + 1) * chunk_size) for index in range(last_index, first_index - 1, -1)]
+
+
+class ChatBackfill:
+    """Resumable history backfill, for a first import or a rebuild of the chat history.
+
+    The message id range is split into chunks of BACKFILL_CHUNK_SIZE ids, fetched with min_id/max_id by up to BACKFILL_CONCURRENCY
+    concurrent workers, through a takeout session when telegram allows it (higher flood limits). Each chunk goes through the regular
+    ChatETL steps and is written and checkpointed in the backfill_chunks table as soon as it's done, so an interrupted backfill
+    resumes with the remaining chunks and memory is bounded by the chunk size.
+    """
+
+    def __init__(self, chat_etl, chunk_size: int = BACKFILL_CHUNK_SIZE, concurrency: int = BACKFILL_CONCURRENCY):
+        self.chat_etl = chat_etl
+        self.db = chat_etl.db
+        self.client_api_handler = chat_etl.client_api_handler
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.last_message_id = 0
+        self.message_count = 0
+        self.failed_chunks = 0
+
+    @stats_utils.chat_etl_lock_decorator
+    def run(self, days: int | None = None, restart: bool = False, use_takeout: bool = True):
+        """Backfill the past days of chat history, or the whole history if days is None. restart drops the checkpoints of a previous backfill."""
+        if restart:
+            log.info("Dropping the checkpoints of the previous backfill.")
+            self.db.clear_backfill_chunks()
+
+        client = self.client_api_handler.client
+        with client:
+            client.loop.run_until_complete(self.backfill(days, use_takeout))
+        self.chat_etl.cleanup_temp_dir()
+
+    async def backfill(self, days: int | None, use_takeout: bool):
+        self.last_message_id = await self.client_api_handler.get_latest_message_id()
+        first_message_id = 1
+        if days is not None:
+            first_message_id = await self.client_api_handler.get_last_message_id_before(datetime.now(tz=UTC) - timedelta(days=days)) + 1
+        chunks = get_chunks(first_message_id, self.last_message_id, self.chunk_size)
+
+        if use_takeout:
+            try:
+                async with self.client_api_handler.client.takeout(chats=True, megagroups=True, files=True) as takeout_client:
+                    await self.backfill_chunks(chunks, takeout_client)
+                return
+            except errors.TakeoutInitDelayError as e:
+                log.warning(f"Takeout session isn't allowed for another {e.seconds}s, backfilling with the regular client.")
+        await self.backfill_chunks(chunks, self.client_api_handler.client)
+
+    async def backfill_chunks(self, chunks: list[tuple[int, int]], client):
+        completed_chunks = self.db.load_backfill_chunks()
+        pending_chunks = [chunk for chunk in chunks if chunk not in completed_chunks]
+        log.info(
+            f"Backfilling {len(pending_chunks)} chunks of {self.chunk_size} message ids, {len(chunks) - len(pending_chunks)} already done."
+        )
+
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(chunk):
+            async with semaphore:
+                await self.backfill_chunk(chunk, client)
+
+        await asyncio.gather(*[worker(chunk) for chunk in pending_chunks])
+        log.info(
+            f"Backfill finished in {round(time.time() - start_time, 2)} seconds with {self.message_count} messages written "
+            f"and {self.failed_chunks} failed chunks, rerun to retry them."
+        )
+
+    async def backfill_chunk(self, chunk: tuple[int, int], client):
+        chunk_start, chunk_end = chunk
+        try:
+            messages, message_types = await self.client_api_handler.fetch_message_range(chunk_start - 1, chunk_end + 1, client)
+            message_ids = self.chat_etl.get_message_ids_for_reaction_api_update(messages)
+            message_reactions = await self.client_api_handler.fetch_reactions(message_ids) if message_ids else []
+
+            # Writes don't await, so chunks finishing concurrently don't interleave them
+            chat_df = self.chat_etl.build_chat_history_df(messages, message_types, message_reactions)
+            self.chat_etl.save_chat_history(chat_df)
+            if not chat_df.empty:
+                self.chat_etl.extract_users()
+                cleaned_chat_df = self.chat_etl.clean_chat_history(chat_df)
+                if cleaned_chat_df is not None and not cleaned_chat_df.empty:
+                    self.chat_etl.generate_reactions_df(cleaned_chat_df)
+        except Exception as e:
+            self.failed_chunks += 1
+            log.error(f"Backfill of messages {chunk_start}-{chunk_end} failed: {e}")
+            return
+
+        if chunk_end <= self.last_message_id:  # the newest chunk is still filling up, it's fetched again on resume
+            self.db.mark_backfill_chunk_done(chunk_start, chunk_end, len(chat_df), core_utils.get_dt_now().isoformat())
+        self.message_count += len(chat_df)
+        log.info(f"Backfilled messages {chunk_start}-{chunk_end}: {len(chat_df)} messages.")
@@ -9,21 +9,25 @@ import pandas as pd
 
 import src.core.utils as core_utils
 import src.stats.utils as stats_utils
-from src.config.constants import BOT_MESSAGE_RETENION_IN_MINUTES, EXCLUDED_USER_IDS, TIMEZONE
-from src.config.enums import DBSaveMode, MessageType, Table
-from src.config.paths import TEMP_DIR, USERS_PATH
+from src.config.constants import BOT_MESSAGE_RETENION_IN_MINUTES, CHAT_ROW_VALIDATION_SAMPLE_SIZE, EXCLUDED_USER_IDS, TIMEZONE
+from src.config.enums import DBSaveMode, ETLJob, MessageType, Table
+from src.config.paths import TEMP_DIR
 from src.config.settings import BOT_ID
 from src.core.client_api_handler import ClientAPIHandler
 from src.models.db.db import DB
 from src.models.schemas import (
-    ChatMessageRow,
     chat_history_schema,
     cleaned_chat_history_schema,
     commands_usage_schema,
     reactions_schema,
     users_schema,
 )
+from src.models.users import Users
+from src.stats import etl_runs
+from src.stats.chat_row_builder import ChatRowBuilder, validate_sample
+from src.stats.message_features import add_message_features
 from src.stats.ocr import OCR
+from src.stats.schema_checks import check_schema
 
 pd.set_option("display.max_columns", None)
 pd.set_option("display.max_rows", None)
@@ -32,16 +36,64 @@ pd.options.mode.chained_assignment = None
 
 log = logging.getLogger(__name__)
 
+USER_NAME_COLUMNS = ["first_name", "last_name", "username"]
+REACTION_KEY_COLUMNS = ["message_id", "reacted_to_username", "reacting_username"]
+REACTION_VALUE_COLUMNS = ["emoji", "text"]
+
+FULL_VALIDATION_SCHEMAS = {
+    Table.CHAT_HISTORY: chat_history_schema,
+    Table.CLEANED_CHAT_HISTORY: cleaned_chat_history_schema,
+    Table.REACTIONS: reactions_schema,
+    Table.USERS: users_schema,
+    Table.COMMANDS_USAGE: commands_usage_schema,
+}
+
+
+def diff_reactions(reactions_df: pd.DataFrame, stored_reactions_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Compare the fresh reactions of some messages with their stored reactions, returns (inserts, updates, deletes).
+
+    Reactions are matched by REACTION_KEY_COLUMNS, like the unique constraint of the table. Updates are reactions with a changed emoji
+    or message text and deletes hold the keys of stored reactions that were removed.
+    """
+    reactions_df = reactions_df.drop_duplicates(REACTION_KEY_COLUMNS)  # the first reaction of a user is kept, as INSERT OR IGNORE did
+    no_changes_df = reactions_df.iloc[0:0]
+    if stored_reactions_df.empty:
+        return reactions_df, no_changes_df, pd.DataFrame(columns=REACTION_KEY_COLUMNS)
+    if reactions_df.empty:
+        return no_changes_df, no_changes_df, stored_reactions_df[REACTION_KEY_COLUMNS]
+
+    merged_df = reactions_df.merge(
+        stored_reactions_df[REACTION_KEY_COLUMNS + REACTION_VALUE_COLUMNS],
+        on=REACTION_KEY_COLUMNS,
+        how="outer",
+        suffixes=("", "_stored"),
+        indicator=True,
+    )
+    inserts_df = merged_df.loc[merged_df["_merge"] == "left_only", reactions_df.columns]
+    deletes_df = merged_df.loc[merged_df["_merge"] == "right_only", REACTION_KEY_COLUMNS]
+
+    matched_df = merged_df[merged_df["_merge"] == "both"]
+    is_changed = pd.Series(False, index=matched_df.index)
+    for column in REACTION_VALUE_COLUMNS:
+        is_changed |= matched_df[column].fillna("") != matched_df[f"{column}_stored"].fillna("")
+    updates_df = matched_df.loc[is_changed, reactions_df.columns]
+    return inserts_df, updates_df, deletes_df
+
 
 class ChatETL:
     """Core chat downloader and data processor."""
 
-    def __init__(self):
-        self.db = DB()
+    def __init__(self, db=None):
+        self.db = db if db is not None else DB()
         self.client_api_handler = ClientAPIHandler(self.db)
+        self.users = Users(self.db)
+        self.backfill_message_features()
 
-    def update(self, days: int, bulk_ocr=False):
+    @etl_runs.recorded_run(ETLJob.CHAT_ETL)
+    @stats_utils.chat_etl_lock_decorator
+    def update(self, days: int, bulk_ocr=False, full_validation=False):
         log.info(f"Running chat ETL for the past: {days} days")
+        start_dt = core_utils.get_dt_now() - timedelta(days=days)
 
         # ETL
         latest_chat_history = self.download_chat_history(days)
@@ -53,77 +105,55 @@ class ChatETL:
             self.perform_bulk_ocr()
 
         # Validate
-        self.validate_data()
+        self.validate_data(None if full_validation else start_dt)
 
         # Cleanup
         # self.delete_bot_messages() # with the introduction of topici, this is not needed
         self.cleanup_temp_dir()
 
     def download_chat_history(self, days):
-        latest_messages, message_types = self.client_api_handler.get_chat_history(days)
-        data = []
-
-        malformed_count = 0
-        ocr_count = 0
-        message_ids_for_reaction_api_update = [message.id for message in latest_messages if self.count_reactions(message) > 3]
+        with etl_runs.stage("download") as stage_timing:
+            latest_messages, message_types = self.client_api_handler.get_chat_history(days)
+            stage_timing.count(rows=len(latest_messages))
+        message_ids_for_reaction_api_update = self.get_message_ids_for_reaction_api_update(latest_messages)
         message_reactions = (
             self.client_api_handler.get_reactions(message_ids_for_reaction_api_update) if message_ids_for_reaction_api_update else []
         )
         log.info(f"Additional {len(message_ids_for_reaction_api_update)} messages pulled with more detailed reactions.")
 
-        for message, message_type in zip(latest_messages, message_types, strict=False):
-            reaction_emojis, reaction_user_ids = [], []
-            if message is None or message.sender is None:
-                continue
-            success = True
-
-            if message.reactions is not None and message.reactions.recent_reactions is not None:
-                reaction_emojis, reaction_user_ids, malformed_count, success = self.parse_reactions(
-                    message, message.reactions.recent_reactions, malformed_count, success
-                )
-                reactions_count = self.count_reactions(message)
-                if reactions_count > 3 and message_reactions:
-                    reaction_emojis, reaction_user_ids, malformed_count, success = self.parse_reactions(
-                        message, message_reactions[message.id].reactions, malformed_count, success
-                    )
-
-            if not success:
-                continue
-
-            image_text = ""
-            # if message_type == MessageType.IMAGE and (old_chat_df is None or old_chat_df[old_chat_df['message_id'] == message.id].empty):
-            #     path = core_utils.message_id_to_path(message.id, MessageType.IMAGE)
-            #     image_text = OCR.extract_text_from_image(path)
-            #     ocr_count += 1
-
-            row = ChatMessageRow(
-                message_id=int(message.id),
-                timestamp=message.date,
-                user_id=int(message.sender_id),
-                first_name=message.sender.first_name,
-                last_name=message.sender.last_name,
-                username=message.sender.username,
-                text=message.text,
-                image_text=image_text,
-                reaction_emojis=reaction_emojis,
-                reaction_user_ids=reaction_user_ids,
-                message_type=message_type.value,
-            )
-            data.append(row.model_dump())
-
-        latest_chat_df = pd.DataFrame(data)
+        latest_chat_df = self.build_chat_history_df(latest_messages, message_types, message_reactions)
         data_pull_start_dt = (datetime.now(tz=ZoneInfo(TIMEZONE)) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
-        latest_chat_df["timestamp"] = (
-            pd.to_datetime(latest_chat_df["timestamp"], utc=True).dt.tz_convert(TIMEZONE).astype(f"datetime64[ns, {TIMEZONE}]")
-        )
-        log.info(
-            f"Since {data_pull_start_dt}: {len(latest_chat_df)} messages were pulled with {malformed_count} malformed records and {ocr_count} ocr performed on images."
-        )
+        log.info(f"Since {data_pull_start_dt}: {len(latest_chat_df)} messages were pulled.")
 
-        latest_chat_df = latest_chat_df.sort_values(by="timestamp").reset_index(drop=True)
-        stats_utils.validate_schema(latest_chat_df, chat_history_schema)
+        self.save_chat_history(latest_chat_df)
+        return latest_chat_df
 
-        self.db.save_dataframe(latest_chat_df, Table.CHAT_HISTORY, mode=DBSaveMode.APPEND)
+    def save_chat_history(self, latest_chat_df, mode=DBSaveMode.APPEND):
+        self.db.save_dataframe(latest_chat_df, Table.CHAT_HISTORY, mode=mode)
+        if mode == DBSaveMode.APPEND and not latest_chat_df.empty:  # re-fetched messages stored without them get their reply and topic ids
+            self.db.fill_reply_and_topic_ids(latest_chat_df)
+
+    def get_message_ids_for_reaction_api_update(self, messages) -> list[int]:
+        """Messages with over 3 reactions, their recent_reactions hold only the last 3, so the full list has to be pulled separately."""
+        return [message.id for message in messages if ChatRowBuilder.count_reactions(message) > 3]
+
+    def build_chat_history_df(
+        self, latest_messages, message_types, message_reactions, validation_sample_size: int = CHAT_ROW_VALIDATION_SAMPLE_SIZE
+    ) -> pd.DataFrame:
+        """Convert telethon messages into a chat history df, message_reactions are the detailed reactions of messages with over 3 reactions."""
+        with etl_runs.stage("build") as stage_timing:
+            row_builder = ChatRowBuilder()
+            row_builder.add_messages(latest_messages, message_types, message_reactions)
+            if len(row_builder) == 0:
+                log.info("No messages to convert.")
+                return pd.DataFrame()
+
+            latest_chat_df = row_builder.build()
+            stage_timing.count(rows=len(latest_chat_df))
+        log.info(f"{len(latest_chat_df)} messages were converted with {row_builder.malformed_count} malformed records.")
+
+        validate_sample(latest_chat_df, validation_sample_size)
+        check_schema(latest_chat_df, chat_history_schema)
         return latest_chat_df
 
     def perform_bulk_ocr(self):
@@ -140,15 +170,17 @@ class ChatETL:
         missing_images = 0
         log.info(f"Performing bulk ocr on {len(image_chat_df)} images out of {len(chat_df)} messages total.")
         start_time = time.time()
-        for i, row in image_chat_df.iterrows():
-            path = core_utils.message_id_to_path(row.message_id, MessageType.IMAGE)
-            if not os.path.exists(path):
-                missing_images += 1
-                chat_df.at[i, "image_text"] = ""
-                continue
-            image_text = OCR.extract_text_from_image(path)
-            chat_df.at[i, "image_text"] = image_text
-            ocr_count += 1
+        with etl_runs.stage("ocr") as stage_timing:
+            for i, row in image_chat_df.iterrows():
+                path = core_utils.message_id_to_path(row.message_id, MessageType.IMAGE)
+                if not os.path.exists(path):
+                    missing_images += 1
+                    chat_df.at[i, "image_text"] = ""
+                    continue
+                image_text = OCR.extract_text_from_image(path)
+                chat_df.at[i, "image_text"] = image_text
+                ocr_count += 1
+            stage_timing.count(rows=ocr_count)
         end_time = time.time()
 
         ocr_text_detected_df = image_chat_df[image_chat_df["image_text"] != ""]
@@ -158,33 +190,29 @@ class ChatETL:
         # core_utils.save_df(chat_df, CHAT_HISTORY_PATH)
         self.db.save_dataframe(chat_df, Table.CHAT_HISTORY, mode=DBSaveMode.APPEND)
 
-    def parse_reactions(self, msg, message_reactions, malformed_count, success):
-        reaction_emojis, reaction_user_ids = [], []
-
-        for reaction in message_reactions:
-            try:
-                reaction_emojis.append(reaction.reaction.emoticon)
-                reaction_user_ids.append(reaction.peer_id.user_id)
-            except AttributeError:
-                success = False
-                malformed_count += 1
-                log.error(f"Issue with reading message reaction emojis/user_id: {msg}.")
-
-        return reaction_emojis, reaction_user_ids, malformed_count, success
-
-    def count_reactions(self, message):
-        return sum(reaction_count.count for reaction_count in message.reactions.results) if message.reactions is not None else 0
-
-    def clean_chat_history(self, latest_chat_df):
+    def clean_chat_history(self, latest_chat_df, mode=DBSaveMode.APPEND):
         if latest_chat_df.empty:
             log.info("No chat history, no cleaning to perform.")
             return
         log.info("Cleaning chat history...")
+        with etl_runs.stage("cleaning") as stage_timing:
+            cleaned_chat_df = self.build_cleaned_chat_df(latest_chat_df)
+            stage_timing.count(rows=len(cleaned_chat_df))
+
+        log.info(f"Cleaned chat history df, from: {len(latest_chat_df)} to: {len(cleaned_chat_df)}")
+        self.db.save_dataframe(cleaned_chat_df, Table.CLEANED_CHAT_HISTORY, mode=mode)
+        self.db.record_updated_message_ids(cleaned_chat_df["message_id"])
+        return cleaned_chat_df
 
-        users_df = stats_utils.read_users()
+    def build_cleaned_chat_df(self, latest_chat_df) -> pd.DataFrame:
+        self.apply_user_changes(latest_chat_df)
         filtered_df = latest_chat_df[~latest_chat_df["user_id"].isin(EXCLUDED_USER_IDS)]
         cleaned_chat_df = filtered_df.drop(["first_name", "last_name", "username"], axis=1)
-        cleaned_chat_df = cleaned_chat_df.merge(users_df, on="user_id")
+        cleaned_chat_df["final_username"] = cleaned_chat_df["user_id"].map(self.users.map)
+        unknown_user_ids = cleaned_chat_df.loc[cleaned_chat_df["final_username"].isna(), "user_id"].unique()
+        if len(unknown_user_ids) > 0:
+            log.warning(f"Dropping the messages of users missing in the users table: {unknown_user_ids.tolist()}")
+        cleaned_chat_df = cleaned_chat_df.dropna(subset=["final_username"]).reset_index(drop=True)
         cleaned_chat_df = cleaned_chat_df[
             [
                 "message_id",
@@ -196,24 +224,33 @@ class ChatETL:
                 "reaction_emojis",
                 "reaction_user_ids",
                 "message_type",
+                "reply_to_msg_id",
+                "topic_id",
             ]
         ]
         cleaned_chat_df["timestamp"] = cleaned_chat_df["timestamp"].dt.tz_convert(TIMEZONE)
         cleaned_chat_df["reaction_user_ids"] = cleaned_chat_df["reaction_user_ids"].tolist()
-        stats_utils.validate_schema(cleaned_chat_df, cleaned_chat_history_schema)
+        cleaned_chat_df = add_message_features(cleaned_chat_df)
+        check_schema(cleaned_chat_df, cleaned_chat_history_schema)
+        return cleaned_chat_df
 
-        log.info(f"Cleaned chat history df, from: {len(latest_chat_df)} to: {len(cleaned_chat_df)}")
-        self.db.save_dataframe(cleaned_chat_df, Table.CLEANED_CHAT_HISTORY, mode=DBSaveMode.APPEND)
+    def backfill_message_features(self):
+        """Compute the message features of cleaned messages stored before they were derived at ingest, a no-op once all are filled."""
+        cleaned_chat_df = self.db.load_rows_missing(Table.CLEANED_CHAT_HISTORY, "word_count")
+        if cleaned_chat_df.empty:
+            return
+
+        log.info(f"Backfilling message features of {len(cleaned_chat_df)} cleaned messages.")
+        cleaned_chat_df = add_message_features(cleaned_chat_df)
+        check_schema(cleaned_chat_df, cleaned_chat_history_schema)
+        self.db.save_dataframe(cleaned_chat_df, Table.CLEANED_CHAT_HISTORY, mode=DBSaveMode.UPSERT)
         self.db.record_updated_message_ids(cleaned_chat_df["message_id"])
-        return cleaned_chat_df
 
     def extract_users(self):
         """Extract users from the chat history"""
 
         if self.db.count_rows(Table.USERS) > 0:
-            log.info(f"Users already extracted, {USERS_PATH} exists.")
-            users_df = self.db.load_table(Table.USERS)
-            stats_utils.validate_schema(users_df, users_schema)
+            log.info("Users already extracted, new and renamed users are applied while cleaning.")
             return
 
         log.info("Extracting users...")
@@ -226,33 +263,87 @@ class ChatETL:
         filtered_users_df["nicknames"] = [[] for _ in range(len(filtered_users_df))]
         filtered_users_df = filtered_users_df.set_index("user_id")
 
-        stats_utils.validate_schema(filtered_users_df, users_schema)
+        check_schema(filtered_users_df, users_schema)
         self.db.save_dataframe(filtered_users_df, Table.USERS, mode=DBSaveMode.APPEND)
 
+    def apply_user_changes(self, latest_chat_df):
+        """Add the new users of the latest messages to the users table and update the telegram names of the renamed ones.
+
+        final_username of a renamed user is kept, the stats are keyed by it. Only changed users are written, which bumps the users version.
+        """
+        self.users.refresh()
+        latest_users_df = latest_chat_df.drop_duplicates("user_id", keep="last").set_index("user_id")[USER_NAME_COLUMNS]
+        latest_users_df = latest_users_df[~latest_users_df.index.isin(EXCLUDED_USER_IDS)]
+        users_df = self.users.df
+
+        is_new = ~latest_users_df.index.isin(users_df.index)
+        new_users_df = latest_users_df[is_new]
+        taken_usernames = set(users_df["final_username"]) if "final_username" in users_df.columns else set()
+        new_users_df["final_username"] = [
+            self.get_unique_final_username(user_id, self.create_final_username(row), taken_usernames)
+            for user_id, row in new_users_df.iterrows()
+        ]
+        new_users_df["nicknames"] = [[] for _ in range(len(new_users_df))]
+
+        known_users_df = latest_users_df[~is_new]
+        stored_names_df = users_df.loc[known_users_df.index, USER_NAME_COLUMNS]
+        is_renamed = (known_users_df.fillna("").astype(str) != stored_names_df.fillna("").astype(str)).any(axis=1)
+        renamed_users_df = known_users_df[is_renamed]
+
+        if new_users_df.empty and renamed_users_df.empty:
+            return
+        log.info(f"Applying {len(new_users_df)} new and {len(renamed_users_df)} renamed users.")
+        check_schema(new_users_df, users_schema)
+        self.db.save_dataframe(new_users_df, Table.USERS, mode=DBSaveMode.APPEND)
+        if not renamed_users_df.empty:
+            self.db.update_user_names(renamed_users_df)  # only the name columns, nicknames added meanwhile by /addnickname are kept
+        self.users.refresh()
+
+    @staticmethod
+    def get_unique_final_username(user_id: int, final_username: str, taken_usernames: set[str]) -> str:
+        """final_username of a new user, suffixed with a number if another user already has it, final_username is unique in users."""
+        unique_username, suffix = final_username, 2
+        while unique_username in taken_usernames:
+            unique_username, suffix = f"{final_username} {suffix}", suffix + 1
+        if unique_username != final_username:
+            log.warning(f"Username {final_username} of the new user {user_id} is taken, they're added as {unique_username}.")
+        taken_usernames.add(unique_username)
+        return unique_username
+
     def create_final_username(self, row):
         final_username = row["username"]
-        if final_username is None:
-            final_username = f"{row['first_name']} {row['last_name']}" if row["last_name"] is not None else row["first_name"]
+        if pd.isna(final_username):
+            final_username = f"{row['first_name']} {row['last_name']}" if not pd.isna(row["last_name"]) else row["first_name"]
         return final_username
 
     def generate_reactions_df(self, cleaned_chat_df):
         """Include all reactions and fill the missing user_ids with None"""
         log.info("Generating reactions df...")
 
-        users_df = self.db.load_table(Table.USERS)
-        cleaned_chat_df["len_reactions"] = cleaned_chat_df["reaction_emojis"].apply(lambda x: len(x))
-        cleaned_chat_df["len_reaction_users"] = cleaned_chat_df["reaction_user_ids"].apply(lambda x: len(x))
-        filtered_clean_df = cleaned_chat_df[cleaned_chat_df["len_reactions"] > 0]
-        reactions_df = filtered_clean_df.explode(["reaction_emojis", "reaction_user_ids"])
-
-        reactions_df = reactions_df.merge(users_df, left_on="reaction_user_ids", right_on="user_id", how="left")
-        reactions_df = reactions_df[["message_id", "timestamp", "final_username_x", "final_username_y", "text", "reaction_emojis"]]
-        reactions_df.columns = ["message_id", "timestamp", "reacted_to_username", "reacting_username", "text", "emoji"]
-        reactions_df = reactions_df.dropna(subset=["message_id", "timestamp", "reacted_to_username", "reacting_username", "emoji"])
+        with etl_runs.stage("reactions") as stage_timing:
+            users_df = self.users.df
+            cleaned_chat_df["len_reactions"] = cleaned_chat_df["reaction_emojis"].apply(lambda x: len(x))
+            cleaned_chat_df["len_reaction_users"] = cleaned_chat_df["reaction_user_ids"].apply(lambda x: len(x))
+            filtered_clean_df = cleaned_chat_df[cleaned_chat_df["len_reactions"] > 0]
+            reactions_df = filtered_clean_df.explode(["reaction_emojis", "reaction_user_ids"])
+
+            reactions_df = reactions_df.merge(users_df, left_on="reaction_user_ids", right_on="user_id", how="left")
+            reactions_df = reactions_df[["message_id", "timestamp", "final_username_x", "final_username_y", "text", "reaction_emojis"]]
+            reactions_df.columns = ["message_id", "timestamp", "reacted_to_username", "reacting_username", "text", "emoji"]
+            reactions_df = reactions_df.dropna(subset=["message_id", "timestamp", "reacted_to_username", "reacting_username", "emoji"])
+
+            check_schema(reactions_df, reactions_schema)
+            stored_reactions_df = self.db.load_rows_by_message_ids(Table.REACTIONS, cleaned_chat_df["message_id"].tolist())
+            inserts_df, updates_df, deletes_df = diff_reactions(reactions_df, stored_reactions_df)
+            stage_timing.count(rows=len(reactions_df))
+        log.info(f"Reactions diff: {len(inserts_df)} new, {len(updates_df)} changed and {len(deletes_df)} removed reactions.")
+        if inserts_df.empty and updates_df.empty and deletes_df.empty:
+            return
 
-        stats_utils.validate_schema(reactions_df, reactions_schema)
-        self.db.save_dataframe(reactions_df, Table.REACTIONS, mode=DBSaveMode.APPEND)
-        self.db.record_updated_message_ids(reactions_df["message_id"])
+        self.db.apply_reactions_diff(inserts_df, updates_df, deletes_df)
+        self.db.record_updated_message_ids(
+            pd.concat([inserts_df["message_id"], updates_df["message_id"], deletes_df["message_id"]]).unique()
+        )
 
     def delete_bot_messages(self):
         """Be carefull here, you could delete someone's messages forever if you are not sure about the bot_id!"""
@@ -294,6 +385,19 @@ class ChatETL:
             dst_path = core_utils.message_id_to_path(message_id, MessageType.VIDEO_NOTE)
             shutil.move(src_path, dst_path)
 
-    def validate_data(self):
-        commands_usage_df = self.db.load_table(Table.COMMANDS_USAGE)
-        stats_utils.validate_schema(commands_usage_df, commands_usage_schema)
+    def validate_data(self, since_dt: datetime | None = None):
+        """Validate the commands usage logged by the bot since since_dt, the chat tables are checked as their rows are written.
+
+        Without since_dt it's a full sweep, every ETL table is loaded and validated with pandera.
+        """
+        if since_dt is None:
+            log.info("Running a full validation of the ETL tables.")
+            for table, schema in FULL_VALIDATION_SCHEMAS.items():
+                df = self.db.load_table(table)
+                with etl_runs.stage("validation") as stage_timing:
+                    stats_utils.validate_schema(df, schema)
+                    stage_timing.count(rows=len(df))
+            return
+
+        commands_usage_df = self.db.load_rows_since(Table.COMMANDS_USAGE, since_dt)
+        check_schema(commands_usage_df, commands_usage_schema)
@@ -0,0 +1,157 @@
+import logging
+import random
+
+import numpy as np
+import pandas as pd
+
+from src.config.constants import GENERAL_TOPIC_ID, TIMEZONE
+from src.models.schemas import ChatMessageRow
+
+log = logging.getLogger(__name__)
+
+CHAT_HISTORY_COLUMNS = list(ChatMessageRow.model_fields)
+
+
+def get_reply_and_topic_ids(message) -> tuple[int | None, int]:
+    """The id of the message replied to and the forum topic of a telethon message, as (reply_to_msg_id, topic_id).
+
+    A message posted in a topic replies to the topic's first message without being a reply, so its reply_to_msg_id is None. Messages
+    of the General topic and of a chat without topics have no forum reply header and get GENERAL_TOPIC_ID.
+    """
+    reply_to = message.reply_to
+    reply_to_msg_id = getattr(reply_to, "reply_to_msg_id", None)
+    if not getattr(reply_to, "forum_topic", False):
+        return reply_to_msg_id, GENERAL_TOPIC_ID
+    if reply_to.reply_to_top_id is None:
+        return None, reply_to_msg_id
+    return reply_to_msg_id, reply_to.reply_to_top_id
+
+
+class ChatRowBuilder:
+    """Builds the chat history df from telethon messages column by column.
+
+    Every message appends straight into per-column lists, and reactions of all messages go into two flat parallel lists (emojis and user
+    ids) with an offsets list marking where each message's reactions start, so no per-message dict or pydantic model is created. The
+    result is identical to building a ChatMessageRow per message and a df from their model_dump(). ChatMessageRow is kept as a debug
+    validator, see validate_sample.
+    """
+
+    def __init__(self):
+        self.message_ids: list[int] = []
+        self.timestamps: list = []
+        self.user_ids: list[int] = []
+        self.first_names: list[str | None] = []
+        self.last_names: list[str | None] = []
+        self.usernames: list[str | None] = []
+        self.texts: list[str | None] = []
+        self.message_types: list[str] = []
+        self.reply_to_msg_ids: list[int | None] = []
+        self.topic_ids: list[int] = []
+        self.reaction_emojis: list[str] = []
+        self.reaction_user_ids: list[int] = []
+        self.reaction_offsets: list[int] = [0]
+        self.malformed_count = 0
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def add_messages(self, messages, message_types, message_reactions):
+        """message_reactions are the detailed reactions of messages with over 3 reactions, keyed by message id."""
+        for message, message_type in zip(messages, message_types, strict=False):
+            self.add_message(message, message_type, message_reactions)
+
+    def add_message(self, message, message_type, message_reactions) -> bool:
+        if message is None or message.sender is None:
+            return False
+
+        reactions_start = len(self.reaction_emojis)
+        reactions = message.reactions
+        if reactions is not None and reactions.recent_reactions is not None:
+            success = self.add_reactions(message, reactions.recent_reactions)
+            if self.count_reactions(message) > 3 and message_reactions:
+                # The detailed list replaces the recent reactions, which hold only the last 3
+                del self.reaction_emojis[reactions_start:], self.reaction_user_ids[reactions_start:]
+                success = self.add_reactions(message, message_reactions[message.id].reactions) and success
+
+            if not success:
+                del self.reaction_emojis[reactions_start:], self.reaction_user_ids[reactions_start:]
+                return False
+
+        sender = message.sender
+        self.message_ids.append(int(message.id))
+        self.timestamps.append(message.date)
+        self.user_ids.append(int(message.sender_id))
+        self.first_names.append(sender.first_name)
+        self.last_names.append(sender.last_name)
+        self.usernames.append(sender.username)
+        self.texts.append(message.text)
+        self.message_types.append(message_type.value)
+        reply_to_msg_id, topic_id = get_reply_and_topic_ids(message)
+        self.reply_to_msg_ids.append(reply_to_msg_id)
+        self.topic_ids.append(topic_id)
+        self.reaction_offsets.append(len(self.reaction_emojis))
+        return True
+
+    def add_reactions(self, message, reactions) -> bool:
+        success = True
+        for reaction in reactions:
+            try:
+                emoji, user_id = reaction.reaction.emoticon, reaction.peer_id.user_id
+            except AttributeError:
+                success = False
+                self.malformed_count += 1
+                log.error(f"Issue with reading message reaction emojis/user_id: {message}.")
+                continue
+            self.reaction_emojis.append(emoji)
+            self.reaction_user_ids.append(user_id)
+        return success
+
+    @staticmethod
+    def count_reactions(message) -> int:
+        return sum(reaction_count.count for reaction_count in message.reactions.results) if message.reactions is not None else 0
+
+    def split_reactions(self, flat_values: list) -> list[list]:
+        offsets = self.reaction_offsets
+        return [flat_values[start:end] for start, end in zip(offsets, offsets[1:], strict=False)]
+
+    def build(self) -> pd.DataFrame:
+        """The chat history df sorted by timestamp, empty if no message was added."""
+        if not self.message_ids:
+            return pd.DataFrame()
+
+        num_rows = len(self.message_ids)
+        chat_df = pd.DataFrame(
+            {
+                "message_id": np.array(self.message_ids, dtype=np.int64),
+                "timestamp": pd.to_datetime(self.timestamps, utc=True),
+                "user_id": np.array(self.user_ids, dtype=np.int64),
+                "first_name": self.first_names,
+                "last_name": self.last_names,
+                "username": self.usernames,
+                "text": self.texts,
+                "image_text": [""] * num_rows,
+                "reaction_emojis": self.split_reactions(self.reaction_emojis),
+                "reaction_user_ids": self.split_reactions(self.reaction_user_ids),
+                "message_type": self.message_types,
+                "reply_to_msg_id": pd.array(self.reply_to_msg_ids, dtype="Int64"),
+                "topic_id": pd.array(self.topic_ids, dtype="Int64"),
+            },
+            columns=CHAT_HISTORY_COLUMNS,
+        )
+        chat_df["timestamp"] = chat_df["timestamp"].dt.tz_convert(TIMEZONE).astype(f"datetime64[ns, {TIMEZONE}]")
+        return chat_df.sort_values(by="timestamp").reset_index(drop=True)
+
+
+def validate_sample(chat_df: pd.DataFrame, sample_size: int) -> int:
+    """Debug check of up to sample_size random rows of the chat history df against ChatMessageRow, raises a ValidationError on a bad row.
+
+    Returns the number of validated rows.
+    """
+    if sample_size <= 0 or chat_df.empty:
+        return 0
+
+    indices = random.sample(range(len(chat_df)), min(sample_size, len(chat_df)))
+    sample_df = chat_df.iloc[indices].astype(object)
+    for record in sample_df.where(sample_df.notna(), None).to_dict("records"):
+        ChatMessageRow.model_validate(record)
+    return len(indices)
@@ -0,0 +1,157 @@
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from functools import wraps
+
+import pandas as pd
+
+from src.config.constants import TIMEZONE
+from src.config.enums import ETLJob, ETLRunStatus
+
+log = logging.getLogger(__name__)
+
+STAGE_PERCENTILES = [0.5, 0.9, 0.99]
+
+
+@dataclass
+class StageTiming:
+    seconds: float = 0.0
+    rows: int = 0
+    bytes_downloaded: int = 0
+
+    def count(self, rows: int = 0, bytes_downloaded: int = 0):
+        self.rows += int(rows)
+        self.bytes_downloaded += int(bytes_downloaded)
+
+
+class ETLRun:
+    """Stage timings of a single ETL run, recorded in the etl_runs and etl_run_stages tables by track_run.
+
+    A stage's time excludes the stages nested in it, e.g. the db writes of the cleaning, so the stages of a run add up to at most its
+    duration. A stage entered several times (every downloaded media file) accumulates.
+    """
+
+    def __init__(self, job: ETLJob, lock_wait_seconds: float = 0.0):
+        self.job = job
+        self.lock_wait_seconds = lock_wait_seconds
+        self.status = ETLRunStatus.SUCCESS
+        self.started_at = datetime.now(UTC)
+        self.start_time = time.perf_counter()
+        self.duration_seconds = 0.0
+        self.stages: dict[str, StageTiming] = {}
+        self.nested_seconds: list[float] = []  # time of the stages nested in each open stage
+
+    def finish(self):
+        self.duration_seconds = time.perf_counter() - self.start_time
+
+    def get_stage_rows(self) -> list[tuple]:
+        return [(name, timing.seconds, timing.rows, timing.bytes_downloaded) for name, timing in self.stages.items()]
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {timing.seconds:.2f}s" for name, timing in self.stages.items())
+        return f"ETL run {self.job.value} {self.status.value} in {self.duration_seconds:.2f}s ({stages})"
+
+
+current_run: ContextVar[ETLRun | None] = ContextVar("current_etl_run", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current ETL run, yields its StageTiming to count rows and bytes. Outside of a run the timing is discarded."""
+    run = current_run.get()
+    if run is None:
+        yield StageTiming()
+        return
+
+    timing = run.stages.setdefault(name, StageTiming())
+    run.nested_seconds.append(0.0)
+    start_time = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        elapsed_seconds = time.perf_counter() - start_time
+        timing.seconds += elapsed_seconds - run.nested_seconds.pop()
+        if run.nested_seconds:
+            run.nested_seconds[-1] += elapsed_seconds
+
+
+def set_run_status(status: ETLRunStatus):
+    run = current_run.get()
+    if run is not None:
+        run.status = status
+
+
+@contextmanager
+def track_run(db, job: ETLJob, lock_wait_seconds: float = 0.0):
+    """Run the body as an ETL run, its stages are recorded in the db when it ends, failed if it raises."""
+    run = ETLRun(job, lock_wait_seconds)
+    token = current_run.set(run)
+    try:
+        yield run
+    except Exception:
+        run.status = ETLRunStatus.FAILED
+        raise
+    finally:
+        current_run.reset(token)
+        run.finish()
+        log.info(run.summary())
+        try:
+            db.insert_etl_run(
+                (job.value, run.started_at.isoformat(), run.duration_seconds, run.lock_wait_seconds, run.status.value), run.get_stage_rows()
+            )
+        except sqlite3.Error as e:
+            log.error(f"Failed to record the ETL run: {e}")
+
+
+def recorded_run(job: ETLJob):
+    """Decorator recording every call of a method of an object with a db attribute as an ETL run, see track_run."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with track_run(self.db, job):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_recent_runs(runs_df: pd.DataFrame, stages_df: pd.DataFrame, limit: int) -> pd.DataFrame:
+    """The last runs with their durations, lock waits and statuses, and a duration column per stage, newest first."""
+    recent_runs_df = runs_df.sort_values("run_id", ascending=False).head(limit).set_index("run_id")
+    recent_runs_df["started_at"] = (
+        pd.to_datetime(recent_runs_df["started_at"], utc=True).dt.tz_convert(TIMEZONE).dt.strftime("%Y-%m-%d %H:%M")
+    )
+    stage_durations_df = stages_df[stages_df["run_id"].isin(recent_runs_df.index)].pivot(
+        index="run_id", columns="stage", values="duration_seconds"
+    )
+    recent_runs_df = recent_runs_df[["job", "started_at", "status", "duration_seconds", "lock_wait_seconds"]]
+    return recent_runs_df.join(stage_durations_df).rename(columns={"duration_seconds": "total", "lock_wait_seconds": "lock_wait"}).round(2)
+
+
+def get_stage_percentiles(runs_df: pd.DataFrame, stages_df: pd.DataFrame, percentiles: list[float] = STAGE_PERCENTILES) -> pd.DataFrame:
+    """Duration percentiles per job and stage of the successful runs, with the mean rows and megabytes downloaded per run.
+
+    The whole run is the "total" stage and the lock wait before it the "lock_wait" stage.
+    """
+    runs_df = runs_df[runs_df["status"] == ETLRunStatus.SUCCESS.value]
+    run_totals_df = runs_df[["run_id", "duration_seconds"]].assign(stage="total")
+    lock_waits_df = (
+        runs_df[["run_id", "lock_wait_seconds"]].rename(columns={"lock_wait_seconds": "duration_seconds"}).assign(stage="lock_wait")
+    )
+    timings_df = pd.concat([stages_df, run_totals_df, lock_waits_df], ignore_index=True).fillna({"row_count": 0, "bytes_downloaded": 0})
+    timings_df = timings_df.merge(runs_df[["run_id", "job"]], on="run_id")
+
+    grouped = timings_df.groupby(["job", "stage"])
+    percentiles_df = grouped["duration_seconds"].quantile(percentiles).unstack()
+    percentiles_df.columns = [f"p{round(percentile * 100)}" for percentile in percentiles]
+    percentiles_df["max"] = grouped["duration_seconds"].max()
+    percentiles_df["runs"] = grouped.size()
+    percentiles_df["rows"] = grouped["row_count"].mean()
+    percentiles_df["mb"] = grouped["bytes_downloaded"].mean() / 1e6
+    return percentiles_df.round(2)
@@ -0,0 +1,378 @@
+import asyncio
+import inspect
+import logging
+import time
+import traceback
+from collections.abc import Callable, Sized
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import pandas as pd
+from telethon import events, types, utils
+
+import src.core.utils as core_utils
+import src.stats.utils as stats_utils
+from src.config.constants import (
+    ETL_EVENT_BATCH_SECONDS,
+    ETL_FULL_VALIDATION_INTERVAL_HOURS,
+    ETL_NGRAMS_UPDATE_INTERVAL_SECONDS,
+    ETL_SERVICE_DAYS,
+    ETL_SERVICE_INTERVAL_SECONDS,
+    ETL_SERVICE_RECONCILE_INTERVAL_SECONDS,
+    ETL_SERVICE_SWEEP_DAYS,
+    ETL_SERVICE_SWEEP_INTERVAL_HOURS,
+)
+from src.config.enums import DBSaveMode, ETLJob, ETLRunStatus
+from src.config.settings import CHAT_ID
+from src.stats import etl_runs
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ETLStage:
+    """A step of the ETL, run with the outputs of depends_on (upstream stages or inputs of StageGraph.run) as positional arguments."""
+
+    name: str
+    run: Callable
+    depends_on: tuple[str, ...] = ()
+
+
+def has_new_data(output) -> bool:
+    if output is None:
+        return False
+    if isinstance(output, pd.DataFrame):
+        return not output.empty
+    if isinstance(output, Sized):
+        return len(output) > 0
+    return bool(output)
+
+
+class StageGraph:
+    """Small dependency graph of ETL stages, a stage runs only when every stage it depends on produced new data."""
+
+    def __init__(self, stages: list[ETLStage], inputs: tuple[str, ...] = ()):
+        known_names = set(inputs)
+        for stage in stages:
+            unknown_names = [name for name in stage.depends_on if name not in known_names]
+            if unknown_names:
+                raise ValueError(f"Stage {stage.name} depends on {unknown_names}, which have to be declared before it.")
+            known_names.add(stage.name)
+        self.stages = stages
+
+    async def run(self, **inputs) -> dict:
+        """Run the stages in order, returns the outputs of the inputs and the stages that ran. A stage whose output is passed in isn't run."""
+        outputs = dict(inputs)
+        for stage in self.stages:
+            if stage.name in outputs:
+                continue
+            if not all(has_new_data(outputs.get(name)) for name in stage.depends_on):
+                log.info(f"ETL stage {stage.name} skipped, no new upstream data.")
+                continue
+
+            start_time = time.perf_counter()
+            with etl_runs.stage(f"graph.{stage.name}"):  # ChatETL and WordStats time inner stages of the same names
+                output = stage.run(*[outputs[name] for name in stage.depends_on])
+                if inspect.isawaitable(output):
+                    output = await output
+            outputs[stage.name] = output
+            log.info(f"ETL stage {stage.name} took {time.perf_counter() - start_time:.2f}s.")
+        return outputs
+
+
+def get_message_fingerprint(message) -> tuple:
+    """Everything of a telethon message the ETL stores that can change after it's sent."""
+    reactions = message.reactions
+    if reactions is None:
+        return message.edit_date, message.text, (), ()
+
+    reaction_counts = tuple((str(result.reaction), result.count) for result in reactions.results)
+    recent_reactions = tuple((str(reaction.reaction), str(reaction.peer_id)) for reaction in reactions.recent_reactions or [])
+    return message.edit_date, message.text, reaction_counts, recent_reactions
+
+
+class ETLService:
+    """Resident chat ETL, replacing the cron runs of main_etl.py and word_stats_etl.py.
+
+    The db, the word stats ngrams and a single connected telethon client are kept across cycles. A cycle runs the stage graph:
+    chat download -> reactions -> cleaning -> ngrams / aggregates, and deletes. Messages whose fingerprint didn't change since they were
+    last processed are dropped after the download, so a quiet chat ends the cycle there.
+
+    In realtime mode new, edited and deleted messages and reaction updates arrive as telethon events. They're collected for
+    ETL_EVENT_BATCH_SECONDS and run through the same graph as a micro-batch, the chat download stage replaced by the batch. Polling then
+    only reconciles gaps every ETL_SERVICE_RECONCILE_INTERVAL_SECONDS, instead of every ETL_SERVICE_INTERVAL_SECONDS. Every
+    ETL_SERVICE_SWEEP_INTERVAL_HOURS (and at start) the polling window is widened to ETL_SERVICE_SWEEP_DAYS.
+
+    Cycles and batches hold the chat ETL lock file. While a manual main_etl.py run holds it, cycles are skipped and events are kept for
+    the next batch.
+    """
+
+    def __init__(self, db, chat_etl, word_stats, realtime: bool = True, interval_seconds: int | None = None):
+        self.db = db
+        self.chat_etl = chat_etl
+        self.client_api_handler = chat_etl.client_api_handler
+        self.word_stats = word_stats
+        self.realtime = realtime
+        default_interval_seconds = ETL_SERVICE_RECONCILE_INTERVAL_SECONDS if realtime else ETL_SERVICE_INTERVAL_SECONDS
+        self.interval_seconds = interval_seconds or default_interval_seconds
+        self.message_fingerprints: dict[int, tuple] = {}
+        self.pending_fingerprints: dict[int, tuple] = {}
+        self.last_sweep_dt: datetime | None = None
+        self.last_validation_dt: datetime | None = None
+        self.last_full_validation_dt: datetime | None = None
+        self.run_lock = asyncio.Lock()  # cycles and event batches share the fingerprints, so they run one at a time
+        self.event_batches_task: asyncio.Task | None = None
+
+        # Events received since the last micro-batch
+        self.event_messages: dict[int, object] = {}
+        self.event_reaction_message_ids: set[int] = set()
+        self.event_deleted_message_ids: set[int] = set()
+
+        # Cleaned rows not in the ngrams yet, ngram parquets are rewritten at most every ETL_NGRAMS_UPDATE_INTERVAL_SECONDS
+        self.ngrams_backlog: list[pd.DataFrame] = []
+        self.last_ngrams_update_time: float | None = None
+
+        self.graph = StageGraph(
+            [
+                ETLStage("chat_download", self.download_stage, ("days",)),
+                ETLStage("reactions", self.reactions_stage, ("chat_download",)),
+                ETLStage("cleaning", self.cleaning_stage, ("reactions",)),
+                ETLStage("ngrams", self.ngrams_stage, ("cleaning",)),
+                ETLStage("aggregates", self.aggregates_stage, ("cleaning",)),
+                ETLStage("deletes", self.deletes_stage, ("deleted_message_ids",)),
+            ],
+            inputs=("days", "deleted_message_ids"),
+        )
+
+    async def run(self):
+        self.word_stats.full_update()
+        async with self.client_api_handler.client:
+            if self.realtime:
+                self.register_event_handlers()
+                self.start_event_batches()
+            while True:
+                await self.run_cycle(self.get_cycle_days())
+                await asyncio.sleep(self.interval_seconds)
+
+    def get_cycle_days(self) -> int:
+        dt_now = core_utils.get_dt_now()
+        if self.last_sweep_dt is None or dt_now - self.last_sweep_dt >= timedelta(hours=ETL_SERVICE_SWEEP_INTERVAL_HOURS):
+            self.last_sweep_dt = dt_now
+            return ETL_SERVICE_SWEEP_DAYS
+        return ETL_SERVICE_DAYS
+
+    def get_validation_since_dt(self) -> datetime | None:
+        """Start of the rows to validate, the previous validation. None (a full validation) at start and every ETL_FULL_VALIDATION_INTERVAL_HOURS."""
+        dt_now = core_utils.get_dt_now()
+        since_dt, self.last_validation_dt = self.last_validation_dt, dt_now
+        full_validation_interval = timedelta(hours=ETL_FULL_VALIDATION_INTERVAL_HOURS)
+        if self.last_full_validation_dt is None or dt_now - self.last_full_validation_dt >= full_validation_interval:
+            self.last_full_validation_dt = dt_now
+            return None
+        return since_dt
+
+    async def run_cycle(self, days: int) -> dict | None:
+        log.info(f"Running chat ETL cycle for the past: {days} days")
+        wait_start_time = time.perf_counter()
+        async with self.run_lock:
+            outputs = await self.run_graph(ETLJob.ETL_CYCLE, time.perf_counter() - wait_start_time, days=days)
+        if outputs is not None and days >= ETL_SERVICE_SWEEP_DAYS:
+            # Forget messages that fell out of the widest window
+            self.message_fingerprints = {message_id: self.message_fingerprints[message_id] for message_id in self.pending_fingerprints}
+        return outputs
+
+    async def run_graph(self, job: ETLJob, lock_wait_seconds: float = 0.0, **inputs) -> dict | None:
+        """Run the stage graph under the chat ETL lock, returns its outputs or None if it's locked by a different process or failed.
+
+        The run is recorded in the ETL run history, lock_wait_seconds is the time the cycle or batch waited for the previous one.
+        """
+        with etl_runs.track_run(self.db, job, lock_wait_seconds):
+            return await self.run_graph_in_current_run(**inputs)
+
+    async def run_graph_in_current_run(self, **inputs) -> dict | None:
+        """run_graph in an ETL run that's already tracked, so work done before the graph (e.g. an event batch's refetch) is in its run."""
+        if stats_utils.is_chat_etl_locked():
+            log.info("Chat ETL is locked by a different process, skipping.")
+            etl_runs.set_run_status(ETLRunStatus.LOCKED)
+            return None
+
+        stats_utils.lock_chat_etl()
+        try:
+            outputs = await self.graph.run(**inputs)
+        except Exception as e:
+            log.error(f"Chat ETL failed: {e}")
+            traceback.print_exc()
+            etl_runs.set_run_status(ETLRunStatus.FAILED)
+            return None
+        finally:
+            self.chat_etl.cleanup_temp_dir()
+            stats_utils.remove_chat_etl_lock()
+
+        # Only remember messages once they're saved, so a failed run retries them
+        self.message_fingerprints.update(self.pending_fingerprints)
+        return outputs
+
+    def get_changed_messages(self, messages: list, message_types: list) -> list[tuple]:
+        """Messages that are new or changed since they were last processed, as (message, message_type)."""
+        self.pending_fingerprints = {message.id: get_message_fingerprint(message) for message in messages}
+        return [
+            (message, message_type)
+            for message, message_type in zip(messages, message_types, strict=True)
+            if self.message_fingerprints.get(message.id) != self.pending_fingerprints[message.id]
+        ]
+
+    async def download_stage(self, days: int) -> list[tuple]:
+        messages, message_types = await self.client_api_handler.fetch_chat_history(days)
+        changed_messages = self.get_changed_messages(messages, message_types)
+        log.info(f"{len(changed_messages)} out of {len(messages)} downloaded messages are new or changed.")
+        return changed_messages
+
+    async def reactions_stage(self, changed_messages: list[tuple]) -> pd.DataFrame:
+        messages = [message for message, _ in changed_messages]
+        message_types = [message_type for _, message_type in changed_messages]
+        message_ids = self.chat_etl.get_message_ids_for_reaction_api_update(messages)
+        message_reactions = await self.client_api_handler.fetch_reactions(message_ids) if message_ids else []
+        log.info(f"Additional {len(message_ids)} messages pulled with more detailed reactions.")
+
+        chat_df = self.chat_etl.build_chat_history_df(messages, message_types, message_reactions)
+        self.chat_etl.save_chat_history(chat_df, mode=DBSaveMode.UPSERT)  # changed messages replace their stored versions
+        return chat_df
+
+    def cleaning_stage(self, chat_df: pd.DataFrame) -> pd.DataFrame | None:
+        self.chat_etl.extract_users()
+        return self.chat_etl.clean_chat_history(chat_df, mode=DBSaveMode.UPSERT)
+
+    def ngrams_stage(self, cleaned_chat_df: pd.DataFrame):
+        self.ngrams_backlog.append(cleaned_chat_df.copy())
+        self.update_ngrams(force=not self.realtime)
+
+    def aggregates_stage(self, cleaned_chat_df: pd.DataFrame):
+        self.chat_etl.generate_reactions_df(cleaned_chat_df.copy())
+        self.chat_etl.validate_data(self.get_validation_since_dt())
+
+    def deletes_stage(self, deleted_message_ids: set[int]):
+        self.db.delete_messages(sorted(deleted_message_ids))
+        for message_id in deleted_message_ids:
+            self.message_fingerprints.pop(message_id, None)
+        self.ngrams_backlog = [backlog_df[~backlog_df["message_id"].isin(deleted_message_ids)] for backlog_df in self.ngrams_backlog]
+        self.word_stats.delete_ngrams(sorted(deleted_message_ids))
+        log.info(f"Deleted {len(deleted_message_ids)} messages removed from the chat.")
+
+    def is_ngrams_update_due(self) -> bool:
+        """Whether there's an ngrams backlog and ETL_NGRAMS_UPDATE_INTERVAL_SECONDS passed since the last update."""
+        if not self.ngrams_backlog:
+            return False
+        return self.last_ngrams_update_time is None or time.monotonic() - self.last_ngrams_update_time >= ETL_NGRAMS_UPDATE_INTERVAL_SECONDS
+
+    def update_ngrams(self, force: bool = False):
+        """Merge the ngrams backlog into the word stats, if it's due or forced."""
+        if not self.ngrams_backlog or not (force or self.is_ngrams_update_due()):
+            return
+
+        backlog_df = pd.concat(self.ngrams_backlog, ignore_index=True).drop_duplicates(subset="message_id", keep="last")
+        self.ngrams_backlog = []
+        self.last_ngrams_update_time = time.monotonic()
+        try:
+            self.word_stats.update_ngrams(backlog_df)
+        except Exception:
+            self.ngrams_backlog.insert(0, backlog_df)  # retried by the next update
+            raise
+
+    def register_event_handlers(self):
+        client = self.client_api_handler.client
+        client.add_event_handler(self.on_message, events.NewMessage(chats=CHAT_ID))
+        client.add_event_handler(self.on_message, events.MessageEdited(chats=CHAT_ID))
+        client.add_event_handler(self.on_message_deleted, events.MessageDeleted(chats=CHAT_ID))
+        client.add_event_handler(self.on_reactions_update, events.Raw(types.UpdateMessageReactions))
+        log.info("Listening to chat events.")
+
+    async def on_message(self, event):
+        await event.message.get_sender()
+        self.event_messages[event.message.id] = event.message
+        self.event_deleted_message_ids.discard(event.message.id)
+
+    async def on_message_deleted(self, event):
+        self.event_deleted_message_ids.update(event.deleted_ids)
+        for message_id in event.deleted_ids:
+            self.event_messages.pop(message_id, None)
+            self.event_reaction_message_ids.discard(message_id)
+
+    async def on_reactions_update(self, update):
+        if utils.get_peer_id(update.peer) == CHAT_ID:
+            self.event_reaction_message_ids.add(update.msg_id)
+
+    def start_event_batches(self):
+        self.event_batches_task = asyncio.create_task(self.run_event_batches())
+        self.event_batches_task.add_done_callback(self.on_event_batches_done)
+
+    def on_event_batches_done(self, task: asyncio.Task):
+        """Supervises the event batches task, it's restarted if it ever dies so events don't silently pile up."""
+        if task.cancelled() or task.exception() is None:
+            return
+        log.error(f"Event batches task died: {task.exception()!r}, restarting it.")
+        self.start_event_batches()
+
+    async def run_event_batches(self):
+        while True:
+            await asyncio.sleep(ETL_EVENT_BATCH_SECONDS)
+            try:
+                await self.process_event_batch()
+                if self.is_ngrams_update_due():  # the backlog of quiet batches is merged outside of them, as its own word stats run
+                    with etl_runs.track_run(self.db, ETLJob.WORD_STATS):
+                        self.update_ngrams()
+            except Exception as e:
+                log.error(f"Event batch failed: {e}")
+                traceback.print_exc()
+
+    async def process_event_batch(self) -> dict | None:
+        """Run the events received since the last batch through the stage graph, they're kept for the next batch if the ETL is locked."""
+        if not (self.event_messages or self.event_reaction_message_ids or self.event_deleted_message_ids):
+            return None
+        if stats_utils.is_chat_etl_locked():
+            log.info("Chat ETL is locked by a different process, keeping the events for the next batch.")
+            return None
+
+        wait_start_time = time.perf_counter()
+        async with self.run_lock:
+            return await self.run_event_batch(time.perf_counter() - wait_start_time)
+
+    async def run_event_batch(self, lock_wait_seconds: float = 0.0) -> dict | None:
+        messages, reaction_message_ids, deleted_message_ids = (
+            self.event_messages,
+            self.event_reaction_message_ids,
+            self.event_deleted_message_ids,
+        )
+        self.event_messages, self.event_reaction_message_ids, self.event_deleted_message_ids = {}, set(), set()
+
+        try:
+            # The refetch and media downloads replace the chat download stage, so they're timed as it in the batch's run
+            with etl_runs.track_run(self.db, ETLJob.ETL_EVENTS, lock_wait_seconds):
+                with etl_runs.stage("graph.chat_download"):
+                    # Reaction updates carry only the counts, so the messages are refetched with their reactions
+                    refetch_ids = sorted(reaction_message_ids - messages.keys())
+                    if refetch_ids:
+                        for message in await self.client_api_handler.fetch_messages(refetch_ids):
+                            messages[message.id] = message
+
+                    message_list = list(messages.values())
+                    message_types = await self.client_api_handler.get_message_types(message_list)
+                    changed_messages = self.get_changed_messages(message_list, message_types)
+                log.info(f"Processing an event batch of {len(changed_messages)} changed and {len(deleted_message_ids)} deleted messages.")
+
+                outputs = await self.run_graph_in_current_run(chat_download=changed_messages, deleted_message_ids=deleted_message_ids)
+        except BaseException:
+            self.restore_events(messages, reaction_message_ids, deleted_message_ids)
+            raise
+
+        if outputs is None:
+            # Failed messages are retried by the next polling cycle, deletions aren't visible to polling so they're kept
+            self.event_deleted_message_ids.update(deleted_message_ids)
+        return outputs
+
+    def restore_events(self, messages: dict[int, object], reaction_message_ids: set[int], deleted_message_ids: set[int]):
+        """Put the events of a failed batch back for the next one, events received in the meantime are newer and take precedence."""
+        deleted_message_ids = deleted_message_ids - self.event_messages.keys()
+        messages = {message_id: message for message_id, message in messages.items() if message_id not in self.event_deleted_message_ids}
+        self.event_messages = messages | self.event_messages
+        self.event_reaction_message_ids |= reaction_message_ids - self.event_deleted_message_ids
+        self.event_deleted_message_ids |= deleted_message_ids
@@ -0,0 +1,91 @@
+import re
+import unicodedata
+
+import pandas as pd
+
+import src.stats.utils as stats_utils
+from src.config.constants import TIMEZONE
+
+# Columns derived from a cleaned chat message, computed once by the chat ETL and stored with the cleaned chat history
+MESSAGE_FEATURE_COLUMNS = ["word_count", "word_length", "char_length", "emoji_count", "has_link", "local_day", "local_hour", "text_folded"]
+
+LINK_PATTERN = r"https?://|www\."
+EMOJI_PATTERN = re.compile(
+    "["
+    "\U0001f1e6-\U0001f1ff"  # flags (regional indicators)
+    "\U0001f300-\U0001f5ff"  # symbols & pictographs
+    "\U0001f600-\U0001f64f"  # emoticons
+    "\U0001f680-\U0001f6ff"  # transport & map
+    "\U0001f900-\U0001faff"  # supplemental symbols & pictographs
+    "\u2600-\u27bf"  # misc symbols, dingbats
+    "\u2b50\u2b55"  # star, circle
+    "]"
+)
+EPOCH_DAY = pd.Timestamp("1970-01-01")
+# Lowercase letters without a unicode decomposition that unidecode folds, so strip_diacritics folds them the same way
+UNDECOMPOSED_LETTERS = str.maketrans({"ł": "l", "ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "đ": "d", "ı": "i"})
+
+
+def add_message_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the MESSAGE_FEATURE_COLUMNS to a cleaned chat df, with vectorized string and datetime operations.
+
+    local_day is the number of days since 1970-01-01 in the local timezone (the ordinal of a daily pd.Period), local_hour is 0-23.
+    """
+    text = df["text"].fillna("").astype(str)
+    words = text.str.split()
+    df["word_count"] = words.str.len().astype("int64")
+    df["word_length"] = (text.str.len() - text.str.count(r"\s")).astype("int64")
+    df["char_length"] = text.str.len().astype("int64")
+    df["emoji_count"] = text.str.count(EMOJI_PATTERN).astype("int64")
+    df["has_link"] = text.str.contains(LINK_PATTERN, regex=True)
+
+    local_timestamp = df["timestamp"].dt.tz_convert(TIMEZONE).dt.tz_localize(None)
+    df["local_day"] = (local_timestamp.dt.normalize() - EPOCH_DAY).dt.days.astype("int64")
+    df["local_hour"] = local_timestamp.dt.hour.astype("int64")
+
+    # Unique texts are folded once, chats repeat a lot of short messages
+    text_lower = df["text"].str.lower()
+    folded_map = {value: stats_utils.remove_diactric_accents(value) for value in text_lower.dropna().unique()}
+    df["text_folded"] = text_lower.map(folded_map)
+    return df
+
+
+def fold_text(text: str) -> str:
+    """Fold a text the way text_folded is, e.g. for a filter phrase matched against it."""
+    return stats_utils.remove_diactric_accents(text.lower())
+
+
+def strip_diacritics(text: str) -> str:
+    """Only the diacritics of a text removed, unlike fold_text emoji and other scripts are kept."""
+    decomposed = unicodedata.normalize("NFKD", text).translate(UNDECOMPOSED_LETTERS)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def get_text_filter(phrase: str) -> tuple[str, str, int]:
+    """(column, pattern, flags) to filter messages by a phrase. The phrase is matched against text_folded if folding only strips its
+    diacritics. Folding drops emoji (a phrase folded to "" would match every message) and transliterates other scripts, so those
+    phrases are matched against text, ignoring case."""
+    folded_phrase = fold_text(phrase)
+    if folded_phrase == strip_diacritics(phrase.lower()):
+        return "text_folded", folded_phrase, 0
+    return "text", phrase, re.IGNORECASE
+
+
+def local_day_to_period(local_day: pd.Series) -> pd.Series:
+    """The daily pd.Period of each local_day, same as timestamp.dt.to_period("D") of local timestamps."""
+    return pd.Series(pd.PeriodIndex.from_ordinals(local_day.to_numpy(), freq="D"), index=local_day.index)
+
+
+def to_local_day(dt) -> int:
+    """The local_day of a datetime or date."""
+    timestamp = pd.Timestamp(dt)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(TIMEZONE).tz_localize(None)
+    return (timestamp.normalize() - EPOCH_DAY).days
+
+
+def ensure_message_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Compute the features of a cleaned chat df loaded before the chat ETL backfilled them, see ChatETL.backfill_message_features."""
+    if df.empty or ("word_count" in df.columns and not df["word_count"].isna().any()):
+        return df
+    return add_message_features(df)
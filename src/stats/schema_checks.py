@@ -0,0 +1,100 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pandera.pandas as pa
+from pandera.engines import pandas_engine
+
+from src.stats import etl_runs
+
+log = logging.getLogger(__name__)
+
+FAILURE_CASE_COLUMNS = ["schema_context", "column", "check", "check_number", "failure_case", "index"]
+
+# Vectorized versions of pandera's built-in range checks, by check name, from the check statistics
+RANGE_CHECKS = {
+    "greater_than": lambda series, stats: series > stats["min_value"],
+    "greater_than_or_equal_to": lambda series, stats: series >= stats["min_value"],
+    "less_than": lambda series, stats: series < stats["max_value"],
+    "less_than_or_equal_to": lambda series, stats: series <= stats["max_value"],
+    "in_range": lambda series, stats: (
+        (series >= stats["min_value"] if stats["include_min"] else series > stats["min_value"])
+        & (series <= stats["max_value"] if stats["include_max"] else series < stats["max_value"])
+    ),
+    "isin": lambda series, stats: series.isin(stats["allowed_values"]),
+    "notin": lambda series, stats: ~series.isin(stats["forbidden_values"]),
+}
+
+
+def get_failure_cases(df: pd.DataFrame, schema: pa.DataFrameSchema) -> pd.DataFrame:
+    """The failure cases of df against a pandera schema, in the format of SchemaErrors.failure_cases of schema.validate(df, lazy=True).
+
+    Covers what the ETL schemas use: required columns, dtypes, nullability and the built-in range checks. Every check is a vectorized
+    operation on a whole column, python only runs per failing value.
+    """
+    failure_cases = []
+    for name, column in schema.columns.items():
+        if name not in df.columns:
+            if column.required:
+                failure_cases.append(("DataFrameSchema", schema.name, "column_in_dataframe", None, name, None))
+            continue
+        failure_cases.extend(get_column_failure_cases(df[name], column, "Column", name))
+
+    if schema.index is not None:
+        index_series = df.index.to_series(index=df.index)
+        failure_cases.extend(get_column_failure_cases(index_series, schema.index, "Index", schema.index.name))
+    return pd.DataFrame(failure_cases, columns=FAILURE_CASE_COLUMNS, dtype=object)
+
+
+def get_column_failure_cases(series: pd.Series, column, schema_context: str, name: str) -> list[tuple]:
+    failure_cases = []
+    null_mask = series.isna().to_numpy()
+    if not column.nullable and null_mask.any():
+        failure_cases.extend(to_failure_cases(series, null_mask, schema_context, name, "not_nullable", None))
+
+    if column.dtype is not None:
+        dtype_check = f"dtype('{column.dtype}')"
+        dtype_check_output = column.dtype.check(pandas_engine.Engine.dtype(series.dtype))
+        if not dtype_check_output:
+            failure_cases.append((schema_context, name, dtype_check, None, str(series.dtype), None))
+        elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in ["string", "empty"]:
+            # Object columns can pass as strings, pandera then checks every value, here only non-string columns get there
+            element_check_output = column.dtype.check(pandas_engine.Engine.dtype(series.dtype), series)
+            if not isinstance(element_check_output, bool):
+                failing_mask = ~np.asarray(element_check_output, dtype=bool) & ~null_mask
+                failure_cases.extend(to_failure_cases(series, failing_mask, schema_context, name, dtype_check, None))
+
+    for check_number, check in enumerate(column.checks):
+        range_check = RANGE_CHECKS.get(check.name)
+        passed = range_check(series, check.statistics) if range_check is not None else check(series).check_output
+        failing_mask = ~np.asarray(passed, dtype=bool) & ~null_mask
+        failure_cases.extend(to_failure_cases(series, failing_mask, schema_context, name, check.error or check.name, check_number))
+    return failure_cases
+
+
+def to_failure_cases(series: pd.Series, failing_mask: np.ndarray, schema_context: str, name: str, check: str, check_number) -> list[tuple]:
+    failing_series = series[failing_mask]
+    return [
+        (schema_context, name, check, check_number, value, index) for index, value in zip(failing_series.index, failing_series, strict=True)
+    ]
+
+
+def check_schema(df: pd.DataFrame, schema: pa.DataFrameSchema):
+    """Hot path counterpart of stats_utils.validate_schema, raises the same pandera SchemaError for an invalid df.
+
+    The df is checked with get_failure_cases, and only if it fails pandera validates the failing rows, so the error report is pandera's own.
+    """
+    log.info(f"Checking schema: {schema.name}")
+    if df is None or df.empty:
+        return
+
+    with etl_runs.stage("validation") as stage_timing:
+        failure_cases = get_failure_cases(df, schema)
+        stage_timing.count(rows=len(df))
+    if failure_cases.empty:
+        return
+
+    failing_index = failure_cases["index"].dropna().unique()
+    failing_df = df.loc[df.index.isin(failing_index)] if len(failing_index) else df.head(1)
+    schema(failing_df)
+    log.warning(f"Schema {schema.name} passed pandera validation despite failure cases:\n{failure_cases}")
@@ -3,6 +3,8 @@ import logging
 import os
 import random
 import re
+import signal
+import sys
 import traceback
 from datetime import timedelta
 from zoneinfo import ZoneInfo
@@ -11,14 +13,13 @@ import pandas as pd
 import unidecode
 
 from src.config.constants import MATCHING_USERNAME_THRESHOLD, TIMEZONE, negative_emojis
-from src.config.enums import DatetimeFormat, DBSaveMode, EmojiType, PeriodFilterMode, Table
-from src.config.paths import CHAT_ETL_LOCK_PATH, CWEL_STATS_PATH, USERS_PATH
+from src.config.enums import DatetimeFormat, DBSaveMode, EmojiType, ETLRunStatus, PeriodFilterMode, Table
+from src.config.paths import CHAT_ETL_LOCK_PATH, CWEL_STATS_PATH
+from src.stats import etl_runs
 
 log = logging.getLogger(__name__)
 
-
-def read_users():
-    return pd.read_parquet(USERS_PATH)
+is_chat_etl_lock_held = False  # whether this process holds the chat ETL lock
 
 
 def create_empty_file(path):
@@ -318,19 +319,67 @@ def get_random_media_path(directory):
 
 
 def is_chat_etl_locked():
-    return os.path.exists(CHAT_ETL_LOCK_PATH)
+    """The lock file holds the PID of its owner. A lock left behind by a dead process, e.g. of a killed container, is stale and removed."""
+    if not os.path.exists(CHAT_ETL_LOCK_PATH):
+        return False
+
+    owner_pid = get_chat_etl_lock_owner()
+    if owner_pid is not None and is_process_alive(owner_pid):
+        return True
+
+    log.warning(f"Removing a stale chat ETL lock of process {owner_pid}.")
+    remove_chat_etl_lock()
+    return False
+
+
+def get_chat_etl_lock_owner() -> int | None:
+    try:
+        with open(CHAT_ETL_LOCK_PATH) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def is_process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        # After a container restart the same PID is likely reused, so a lock with our PID is only held if this process took it
+        return is_chat_etl_lock_held
+    if os.name == "nt":
+        return True  # os.kill(pid, 0) would terminate the process on Windows, assume it's alive
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
 
 
 def lock_chat_etl():
+    global is_chat_etl_lock_held
     log.info("Locking Chat ETL process.")
     with open(CHAT_ETL_LOCK_PATH, "w") as f:
-        f.write("")
+        f.write(str(os.getpid()))
+    is_chat_etl_lock_held = True
 
 
 def remove_chat_etl_lock():
+    global is_chat_etl_lock_held
     if os.path.exists(CHAT_ETL_LOCK_PATH):
         log.info("Chat ETL lock removed.")
         os.remove(CHAT_ETL_LOCK_PATH)
+    is_chat_etl_lock_held = False
+
+
+def remove_chat_etl_lock_on_sigterm():
+    """Remove the chat ETL lock held by this process when it's stopped with SIGTERM, e.g. by docker stop in the middle of a run."""
+
+    def handle_sigterm(signum, frame):
+        if is_chat_etl_lock_held:
+            remove_chat_etl_lock()
+        sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
 
 def chat_etl_lock_decorator(func):
@@ -339,6 +388,7 @@ def chat_etl_lock_decorator(func):
     def wrapper(*args, **kwargs):
         if is_chat_etl_locked():
             log.info("Chat ETL is locked by a different process, skipping.")
+            etl_runs.set_run_status(ETLRunStatus.LOCKED)
             return
 
         lock_chat_etl()
@@ -347,6 +397,7 @@ def chat_etl_lock_decorator(func):
         except Exception as e:
             log.error(f"Chat ETL failed: {e}")
             traceback.print_exc()
+            etl_runs.set_run_status(ETLRunStatus.FAILED)
             result = None
 
         remove_chat_etl_lock()
@@ -7,9 +7,11 @@ from nltk import ngrams
 import src.core.utils as core_utils
 import src.stats.utils as stats_utils
 from src.config.constants import STOPWORD_RATIO_THRESHOLD
-from src.config.enums import PeriodFilterMode, Table
+from src.config.enums import ETLJob, ETLRunStatus, PeriodFilterMode, Table
 from src.config.paths import CHAT_WORD_STATS_DIR_PATH, WORD_STATS_UPDATE_LOCK_PATH
 from src.models.command_args import CommandArgs
+from src.stats import etl_runs
+from src.stats.message_features import ensure_message_features
 
 pd.set_option("display.max_columns", None)
 pd.set_option("display.max_rows", None)
@@ -24,6 +26,7 @@ class WordStats:
         self.db = db
         self.assets = assets
         self.ngram_dfs = {}
+        self.topic_ngram_dfs = {}  # ngram_dfs partitioned by topic, see get_ngram_dfs
         self.ngram_range = [1, 2, 3, 4, 5]
         self.load_ngrams()
 
@@ -46,18 +49,21 @@ class WordStats:
                 return False
         return True
 
+    @etl_runs.recorded_run(ETLJob.WORD_STATS)
     def full_update(self, days=None):
         log.info(f"Do all ngram parquets exist: {self.do_all_ngram_parquets_exist()}")
         if os.path.exists(CHAT_WORD_STATS_DIR_PATH) and self.do_all_ngram_parquets_exist() and days is None:
             log.info("All word stats ngram parquets exist, no need to run full update")
+            etl_runs.set_run_status(ETLRunStatus.SKIPPED)
             return
 
-        if self.db.count_rows(Table.CLEANED_CHAT_HISTORY):
+        if not self.db.count_rows(Table.CLEANED_CHAT_HISTORY):
             log.error("Cleaned chat history is empty, no word stats to extract.")
+            etl_runs.set_run_status(ETLRunStatus.SKIPPED)
             return
 
         log.info("Ngram word stats parquets not found, running full word stats update.")
-        chat_df = self.db.load_table(Table.CLEANED_CHAT_HISTORY)
+        chat_df = ensure_message_features(self.db.load_table(Table.CLEANED_CHAT_HISTORY))
 
         if days:
             chat_df = stats_utils.filter_by_time_df(chat_df, CommandArgs(period_mode=PeriodFilterMode.DAY, period_time=days))
@@ -65,14 +71,15 @@ class WordStats:
 
         if len(chat_df) == 0:
             log.info("Chat history is empty, skipping word stats update")
+            etl_runs.set_run_status(ETLRunStatus.SKIPPED)
             return
 
         self.update_ngrams(chat_df, full_update=True)
 
     def clean_chat_messages(self, chat_df):
-        filtered_chat_df = chat_df[chat_df["text"] != ""].dropna()
+        filtered_chat_df = chat_df[chat_df["text"] != ""].dropna(subset=["text"])
         filtered_chat_df = filtered_chat_df[~filtered_chat_df["text"].str.startswith("/")]  # remove user commands
-        filtered_chat_df = filtered_chat_df[~filtered_chat_df["text"].str.contains("https")]  # remove rows with links
+        filtered_chat_df = filtered_chat_df[~filtered_chat_df["has_link"]]  # remove rows with links
         filtered_chat_df["text"] = filtered_chat_df["text"].str.replace(r"\(.*\)", "", regex=True)  # remove text inside braces/brackets
         filtered_chat_df["text"] = filtered_chat_df["text"].apply(core_utils.remove_punctuation)  # remove special characters
         filtered_chat_df["text"] = filtered_chat_df["text"].str.lower()
@@ -92,21 +99,24 @@ class WordStats:
                 log.info(f"{self.get_ngram_path(n)} does not exist, skipping {n}-gram update")
                 continue
 
-            df = df_raw.copy(deep=True)
-            df["ngrams"] = df["text"].str.split().apply(lambda x: list(map(" ".join, ngrams(x, n=n))))
-            df = df[df["ngrams"].str.len() > 0]  # remove empty ngram rows
-            latest_ngram_df = df.explode("ngrams")
-            latest_ngram_df = latest_ngram_df[latest_ngram_df.apply(lambda row: self.stopword_filter(row["ngrams"], n), axis=1)]
-            latest_ngram_df["ngram_id"] = latest_ngram_df.groupby("message_id").cumcount() + 1
+            with etl_runs.stage("ngrams") as stage_timing:
+                df = df_raw.copy(deep=True)
+                df["ngrams"] = df["text"].str.split().apply(lambda x: list(map(" ".join, ngrams(x, n=n))))
+                df = df[df["ngrams"].str.len() > 0]  # remove empty ngram rows
+                latest_ngram_df = df.explode("ngrams")
+                latest_ngram_df = latest_ngram_df[latest_ngram_df.apply(lambda row: self.stopword_filter(row["ngrams"], n), axis=1)]
+                latest_ngram_df["ngram_id"] = latest_ngram_df.groupby("message_id").cumcount() + 1
 
-            self.update_ngram(n, latest_ngram_df)
+                self.update_ngram(n, latest_ngram_df)
+                stage_timing.count(rows=len(latest_ngram_df))
             self.save_ngram(n)
 
         self.remove_lock_file()
 
     def update_ngram(self, n, latest_df):
-        columns = ["timestamp", "final_username", "message_id", "ngram_id", "ngrams"]  # try to optimize memory
+        columns = ["timestamp", "final_username", "message_id", "ngram_id", "ngrams", "topic_id"]  # try to optimize memory
         latest_df = latest_df[columns]
+        self.topic_ngram_dfs = {}
         if self.ngram_dfs.get(n) is None:
             self.ngram_dfs[n] = latest_df
             log.info(f"Init ngram-{n} stats with {len(latest_df)} rows")
@@ -122,12 +132,33 @@ class WordStats:
 
         log.info(f"Updated ngram-{n} stats with {len(merged_ngram_df) - len(old_ngram_df)} rows, now its {len(merged_ngram_df)}")
 
+    def delete_ngrams(self, message_ids: list[int]):
+        """Drop the ngrams of messages deleted from the chat, from memory and the parquets."""
+        if self.is_word_stats_update_locked():
+            log.info("Word stats update is locked, skipping the deletion of ngrams")
+            return
+
+        self.create_lock_file()
+        for n, ngram_df in self.ngram_dfs.items():
+            is_deleted = ngram_df["message_id"].isin(message_ids)
+            if not is_deleted.any():
+                continue
+
+            self.topic_ngram_dfs = {}
+            self.ngram_dfs[n] = ngram_df[~is_deleted].reset_index(drop=True)
+            self.save_ngram(n)
+            log.info(f"Deleted {is_deleted.sum()} rows of ngram-{n} stats, now its {len(self.ngram_dfs[n])}")
+
+        self.remove_lock_file()
+
     def save_ngram(self, n):
         if not os.path.exists(CHAT_WORD_STATS_DIR_PATH):
             core_utils.create_dir(CHAT_WORD_STATS_DIR_PATH)
 
         # for ngram, df in self.ngram_dfs.items():
-        self.ngram_dfs[n].to_parquet(self.get_ngram_path(n))
+        with etl_runs.stage("parquet_write") as stage_timing:
+            self.ngram_dfs[n].to_parquet(self.get_ngram_path(n))
+            stage_timing.count(rows=len(self.ngram_dfs[n]))
 
     def wordstats_cmd_handler(self, filtered_ngram_dfs, command_args, text_filter):
         n = command_args.named_args["ngram"] if "ngram" in command_args.named_args else None
@@ -136,14 +167,19 @@ class WordStats:
         if text_filter is not None and exact_match:
             filter_ngram = len(text_filter.split())
             ngram_df = filtered_ngram_dfs[filter_ngram]
-            merged_df = ngram_df[ngram_df["ngrams"].str.lower().str.fullmatch(text_filter)]
+            mask, error = core_utils.regex_mask(ngram_df["ngrams"].str.lower(), text_filter, fullmatch=True)
+            if error != "":
+                return stats_utils.escape_special_characters(error)
+            merged_df = ngram_df[mask]
             groupby_cols = ["final_username", "ngrams"]
         elif text_filter is not None:  # partial match
-            dfs = (
-                [df[df["ngrams"].str.lower().str.contains(text_filter)] for df in filtered_ngram_dfs.values()]
-                if n is None
-                else [filtered_ngram_dfs[n][filtered_ngram_dfs[n]["ngrams"].str.contains(text_filter)]]
-            )
+            ngram_dfs = list(filtered_ngram_dfs.values()) if n is None else [filtered_ngram_dfs[n]]
+            dfs = []
+            for df in ngram_dfs:
+                mask, error = core_utils.regex_mask(df["ngrams"].str.lower() if n is None else df["ngrams"], text_filter)
+                if error != "":
+                    return stats_utils.escape_special_characters(error)
+                dfs.append(df[mask])
             merged_df = pd.concat(dfs)
             groupby_cols = ["final_username", "ngrams"] if groupby_user else ["ngrams"]
         elif groupby_user:
@@ -171,7 +207,7 @@ class WordStats:
         text = core_utils.generate_response_headline(command_args, label="``` Word stats")
         max_len_username = core_utils.max_str_length_in_col(df[user_col]) if user_col is not None else -1
         max_len_ngram = core_utils.max_str_length_in_col(df["ngrams"].head(10)) if ngram_col is not None else -1
-        total_word_counts_by_user_map = self.user_word_counts(self.ngram_dfs[1])
+        total_word_counts_by_user_map = self.user_word_counts(self.get_ngram_dfs(command_args.topic_id)[1])
         for i, (_, row) in enumerate(df.head(10).iterrows()):
             username = row[user_col] if user_col else None
             count = (
@@ -228,16 +264,33 @@ class WordStats:
         """Filter ngrams by time and user"""
 
         fitlered_ngram_dfs = {}
-        for n, df in self.ngram_dfs.items():
+        for n, df in self.get_ngram_dfs(command_args.topic_id).items():
             if command_args.user is not None:
                 df = df[df["final_username"] == command_args.user]
             df = stats_utils.filter_by_time_df(df, command_args)
             if text_filter is not None:
-                df = df[df["ngrams"].str.contains(text_filter)]
+                mask, error = core_utils.regex_mask(df["ngrams"], text_filter)
+                if error != "":
+                    command_args.error = error
+                    return {}
+                df = df[mask]
             fitlered_ngram_dfs[n] = df
 
         return fitlered_ngram_dfs
 
+    def get_ngram_dfs(self, topic_id: int | None = None) -> dict[int, pd.DataFrame]:
+        """The ngram dfs of a forum topic, or of the whole chat if topic_id is None. A topic is partitioned out on its first use.
+
+        Ngrams saved before topics were captured have no topic_id and belong to no topic.
+        """
+        if topic_id is None:
+            return self.ngram_dfs
+        if topic_id not in self.topic_ngram_dfs:
+            self.topic_ngram_dfs[topic_id] = {
+                n: df[df["topic_id"] == topic_id] if "topic_id" in df.columns else df.iloc[0:0] for n, df in self.ngram_dfs.items()
+            }
+        return self.topic_ngram_dfs[topic_id]
+
     def create_lock_file(self):
         if not os.path.exists(WORD_STATS_UPDATE_LOCK_PATH):
             core_utils.create_dir(CHAT_WORD_STATS_DIR_PATH)
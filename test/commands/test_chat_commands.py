@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pandas as pd
@@ -6,6 +7,7 @@ import pytest
 from src.commands.chat_commands import ChatCommands
 from src.config.enums import EmojiType, ErrorMessage, MessageType, Table
 from src.models.bot_state import BotState
+from src.models.user_index import get_user_index
 
 # ---------------------------------------------------------------------------
 # Fixture data
@@ -33,6 +35,8 @@ CHAT_DATA = [
     (8, pd.Timestamp("2025-01-11 11:00", tz=TIMEZONE), 222, "user_b", "last one",      None, [],            [],         "video_note"),
 ]
 CHAT_COLS = ["message_id", "timestamp", "user_id", "final_username", "text", "image_text", "reaction_emojis", "reaction_user_ids", "message_type"]
+CHAT_REPLY_TO_MSG_IDS = [None, 1, None, None, None, 5, None, 2]
+CHAT_TOPIC_IDS = [1, 1, 1, 1, 5, 5, 5, 1]
 
 REACTIONS_DATA = [
     (1, pd.Timestamp("2025-01-10 10:05", tz=TIMEZONE), "user_a", "user_b", "hello world", "👍"),
@@ -66,7 +70,10 @@ def users_df():
 
 @pytest.fixture()
 def chat_df():
-    return pd.DataFrame(CHAT_DATA, columns=CHAT_COLS)
+    chat_df = pd.DataFrame(CHAT_DATA, columns=CHAT_COLS)
+    chat_df["reply_to_msg_id"] = pd.array(CHAT_REPLY_TO_MSG_IDS, dtype="Int64")
+    chat_df["topic_id"] = pd.array(CHAT_TOPIC_IDS, dtype="Int64")
+    return chat_df
 
 
 @pytest.fixture()
@@ -94,6 +101,12 @@ def db(users_df, chat_df, reactions_df, cwel_df):
         def load_table(self, table):
             return self._tables[table]
 
+        def get_table_version(self, table) -> int:
+            return 0
+
+        def update_user_nicknames(self, user_id, nicknames) -> None:
+            pass
+
         def pop_updated_message_ids(self) -> list[int]:
             ids, self._pending_ids = self._pending_ids, []
             return ids
@@ -271,6 +284,7 @@ async def test_cmd_add_nickname_happy_path(mocker, chat_commands, update, contex
     text = sent_text(context)
     assert "new_nick" in text
     assert "added" in text
+    assert get_user_index(chat_commands.users_df).resolve("new_nick") == ("user_a", 111)
 
 
 @pytest.mark.asyncio
@@ -368,7 +382,6 @@ async def test_cmd_last_messages_too_long(mocker, chat_commands, update, context
 @pytest.mark.asyncio
 async def test_cmd_summary_sends_image(mocker, chat_commands, update, context):
     mocker.patch("src.commands.chat_commands.stats_utils.dt_to_str", return_value="10.01.2025")
-    mocker.patch("src.commands.chat_commands.stats_utils.text_to_word_length_sum", return_value=5)
     mocker.patch("src.commands.chat_commands.stats_utils.filter_by_shifted_time_df", return_value=pd.DataFrame())
     mocker.patch("src.commands.chat_commands.stats_utils.filter_emoji_by_emoji_type", return_value=pd.DataFrame(columns=REACTIONS_COLS))
     mocker.patch("src.commands.chat_commands.charts.create_table_plotly", return_value="/fake/path.png")
@@ -453,6 +466,20 @@ async def test_cmd_relationship_graph_sends_image(mocker, chat_commands, update,
     assert mock_send.await_args.args[2] == MessageType.IMAGE
 
 
+@pytest.mark.asyncio
+async def test_cmd_relationship_graph_replies_in_topic(mocker, chat_commands, update, context):
+    context.args = ["--replies", "--topic"]
+    update.effective_message.is_topic_message = True
+    update.effective_message.message_thread_id = 5
+    mock_graph = mocker.patch("src.commands.chat_commands.charts.create_bidirectional_relationship_graph", return_value="/fake/graph.png")
+    mocker.patch("src.commands.chat_commands.core_utils.send_message", new_callable=AsyncMock)
+
+    await chat_commands.cmd_relationship_graph(update, context)
+
+    edges_df, col_1, col_2, _ = mock_graph.call_args.args
+    assert edges_df[[col_1, col_2]].values.tolist() == [["user_a", "user_b"]]
+
+
 @pytest.mark.asyncio
 async def test_cmd_relationship_graph_empty_reactions(mocker, chat_commands, update, context, chat_df):
     empty_reactions = pd.DataFrame(columns=REACTIONS_COLS)
@@ -633,11 +660,19 @@ async def test_cmd_wordstats_dispatches_to_handler(mocker, chat_commands, update
 # ---------------------------------------------------------------------------
 
 
+def fake_use_audio(result):
+    @asynccontextmanager
+    async def use_audio(*args):
+        yield result
+
+    return MagicMock(side_effect=use_audio)
+
+
 @pytest.mark.asyncio
 async def test_cmd_play_download_error(mocker, chat_commands, update, context):
     ca = MagicMock(error="", string="some_url")
     mocker.patch("src.commands.chat_commands.core_utils.parse_args", return_value=ca)
-    chat_commands.ytdl.download.return_value = (None, "download_failed")
+    chat_commands.ytdl.use_audio = fake_use_audio(("", "download_failed"))
 
     await chat_commands.cmd_play(update, context)
 
@@ -648,7 +683,7 @@ async def test_cmd_play_download_error(mocker, chat_commands, update, context):
 async def test_cmd_play_full_flag_sends_voice(mocker, chat_commands, update, context):
     ca = MagicMock(error="", string="url", named_args={"full": None})
     mocker.patch("src.commands.chat_commands.core_utils.parse_args", return_value=ca)
-    chat_commands.ytdl.download.return_value = ("/audio.mp3", "")
+    chat_commands.ytdl.use_audio = fake_use_audio(("/audio.mp3", ""))
     mock_send = mocker.patch("src.commands.chat_commands.core_utils.send_message", new_callable=AsyncMock)
 
     await chat_commands.cmd_play(update, context)
@@ -661,8 +696,8 @@ async def test_cmd_play_full_flag_sends_voice(mocker, chat_commands, update, con
 async def test_cmd_play_default_video_note(mocker, chat_commands, update, context):
     ca = MagicMock(error="", string="url", named_args={})
     mocker.patch("src.commands.chat_commands.core_utils.parse_args", return_value=ca)
-    chat_commands.ytdl.download.return_value = ("/audio.mp3", "")
-    chat_commands.ytdl.swap_video_audio.return_value = "/output.mp4"
+    chat_commands.ytdl.use_audio = fake_use_audio(("/audio.mp3", ""))
+    chat_commands.ytdl.swap_video_audio = AsyncMock(return_value=("/output.mp4", ""))
     mocker.patch("src.commands.chat_commands.stats_utils.get_random_media_path", return_value="/random.mp4")
     mock_send = mocker.patch("src.commands.chat_commands.core_utils.send_message", new_callable=AsyncMock)
     update.message.reply_to_message = None
@@ -671,6 +706,8 @@ async def test_cmd_play_default_video_note(mocker, chat_commands, update, contex
 
     mock_send.assert_awaited_once()
     assert mock_send.await_args.args[2] == MessageType.VIDEO_NOTE
+    chat_commands.ytdl.use_audio.assert_called_once_with("url", 0, None)
+    chat_commands.ytdl.swap_video_audio.assert_awaited_once_with("/random.mp4", "/audio.mp3")
 
 
 # ---------------------------------------------------------------------------
@@ -703,6 +740,12 @@ def test_calculate_fun_metric(chat_commands, chat_df, reactions_df):
     assert result.iloc[0]["ratio"] > 0
 
 
+def test_calculate_replies(chat_commands, chat_df):
+    replies_df = chat_commands.calculate_replies(chat_df, chat_df)
+
+    assert sorted(replies_df.itertuples(index=False, name=None)) == [("user_a", "user_b"), ("user_b", "user_a"), ("user_b", "user_b")]
+
+
 def test_calculate_wholesome_metric(chat_commands, reactions_df):
     result = chat_commands.calculate_wholesome_metric(reactions_df)
 
@@ -762,3 +805,25 @@ async def test_update_merges_new_rows(chat_commands, chat_df, reactions_df):
     assert new_row_id in chat_commands.reactions_df["message_id"].values
     # Existing rows should still be present
     assert 1 in chat_commands.chat_df["message_id"].values
+
+
+@pytest.mark.asyncio
+async def test_update_keeps_topic_partitions_up_to_date(chat_commands, chat_df, reactions_df):
+    topic_chat_df, topic_reactions_df = chat_commands.get_dfs(5)
+    assert topic_chat_df["message_id"].tolist() == [5, 6, 7]
+    assert sorted(set(topic_reactions_df["message_id"])) == [5, 6, 7]
+
+    new_chat_row = chat_df[chat_df["message_id"] == 7].assign(message_id=99, text="nowa")
+    new_reaction_row = reactions_df[reactions_df["message_id"] == 7].head(1).assign(message_id=99)
+    chat_commands.db._tables[Table.CLEANED_CHAT_HISTORY] = pd.concat([chat_df[chat_df["message_id"] != 6], new_chat_row], ignore_index=True)
+    chat_commands.db._tables[Table.REACTIONS] = pd.concat(
+        [reactions_df[reactions_df["message_id"] != 6], new_reaction_row], ignore_index=True
+    )
+    chat_commands.db._pending_ids = [6, 99]
+
+    await chat_commands.update()
+
+    topic_chat_df, topic_reactions_df = chat_commands.topic_dfs[5]
+    assert topic_chat_df["message_id"].tolist() == [5, 7, 99]
+    assert sorted(set(topic_reactions_df["message_id"])) == [5, 7, 99]
+    assert chat_commands.get_dfs(1)[0]["message_id"].tolist() == [1, 2, 3, 4, 8]
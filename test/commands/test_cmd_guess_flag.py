@@ -5,6 +5,7 @@ import pytest
 
 from src.commands.credit_commands import CreditCommands
 from src.config.enums import CreditActionType
+from src.models.flag_quiz import FlagQuiz
 
 
 @pytest.fixture()
@@ -90,11 +91,16 @@ def assets(users_df):
             df = df[df["difficulty"] == difficulty.lower()]
         return df
 
-    def mock_pop_random_country(filtered_df=None):
-        df = filtered_df if filtered_df is not None else countries_df
+    def mock_get_available_difficulties(continent=None):
+        df = mock_get_countries(continent=continent)
+        return [diff for diff in ["easy", "medium", "hard", "crazy"] if (df["difficulty"] == diff).any()]
+
+    def mock_pop_random_country(difficulty=None, continent=None):
+        df = mock_get_countries(difficulty=difficulty, continent=continent)
         return df.sample(n=1).iloc[0].to_dict()
 
     a.countries.get_countries.side_effect = mock_get_countries
+    a.countries.get_available_difficulties.side_effect = mock_get_available_difficulties
     a.countries.pop_random_country.side_effect = mock_pop_random_country
     return a
 
@@ -160,6 +166,7 @@ async def test_cmd_guess_flag_valid(mocker, commands, update, context):
     cached = commands.bot_state.flag_quiz_cache[111]
     assert cached["difficulty"] == "easy"
     assert cached["country"]["country_code"] == "PL"
+    assert cached["answer_matcher"].is_correct("polska")
     assert not cached["continent_specified"]
     context.job_queue.run_once.assert_called_once()
 
@@ -173,6 +180,7 @@ async def test_cmd_guess_flag_with_continent(mocker, commands, update, context):
     assert 111 in commands.bot_state.flag_quiz_cache
     cached = commands.bot_state.flag_quiz_cache[111]
     assert cached["continent_specified"] is True
+    commands.bot_state.message_router.register.assert_called_once_with(999, 42, 111, commands.handle_flag_quiz_answer)
     assert cached["country"]["country_code"] == "DE"
 
 
@@ -224,6 +232,7 @@ async def test_handle_flag_quiz_answer_tip_without_continent(commands, update, c
         "chat_id": 999,
         "thread_id": 42,
         "country": country,
+        "answer_matcher": FlagQuiz.get_answer_matcher(country),
         "difficulty": "easy",
         "continent_specified": False,
         "tips_given": 0,
@@ -253,6 +262,7 @@ async def test_handle_flag_quiz_answer_tip_with_continent(commands, update, cont
         "chat_id": 999,
         "thread_id": 42,
         "country": country,
+        "answer_matcher": FlagQuiz.get_answer_matcher(country),
         "difficulty": "easy",
         "continent_specified": True,
         "tips_given": 0,
@@ -285,6 +295,7 @@ async def test_handle_flag_quiz_answer_logic(commands, update, context, user_ans
         "chat_id": 999,
         "thread_id": 42,
         "country": country,
+        "answer_matcher": FlagQuiz.get_answer_matcher(country),
         "difficulty": "easy",
         "continent_specified": False,
         "tips_given": 0,
@@ -312,6 +323,7 @@ async def test_flag_quiz_timeout(commands, context):
         "chat_id": 999,
         "thread_id": 42,
         "country": country,
+        "answer_matcher": FlagQuiz.get_answer_matcher(country),
         "difficulty": "easy",
         "continent_specified": False,
         "tips_given": 0,
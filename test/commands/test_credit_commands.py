@@ -4,6 +4,7 @@ import pandas as pd
 import pytest
 
 from src.commands.credit_commands import CreditCommands
+from src.models.map_quiz import MapQuiz
 
 
 @pytest.fixture()
@@ -92,7 +93,12 @@ async def test_handle_map_quiz_answer_ignores_wrong_thread(commands, update, con
 async def test_handle_map_quiz_answer_logic(mocker, commands, update, context, user_answer, is_correct):
     job_mock = MagicMock()
     person = {"name_pl": "Jan Kowalski", "description": "A brave man."}
-    commands.bot_state.map_quiz_cache[111] = {"thread_id": 42, "person": person, "job": job_mock}
+    commands.bot_state.map_quiz_cache[111] = {
+        "thread_id": 42,
+        "person": person,
+        "answer_matcher": MapQuiz.get_answer_matcher(person),
+        "job": job_mock,
+    }
     update.message.text = user_answer
 
     mocker.patch("src.commands.credit_commands.core_utils.send_message", new_callable=AsyncMock)
@@ -5,8 +5,10 @@ import pytest
 from telegram.constants import ParseMode
 
 from src.commands.misc_commands import Commands
+from src.config.constants import BIBLE_GROUP_COLUMNS, QURAN_GROUP_COLUMNS
 from src.config.enums import ErrorMessage, HolyTextType, Table
 from src.models.bot_state import BotState
+from src.models.text_index import HolyTextIndex, KiepscyIndex, TextSearchIndex
 
 
 @pytest.fixture()
@@ -57,6 +59,9 @@ def db(users_df):
         def load_table(self, table):
             return self._tables[table]
 
+        def get_table_version(self, table) -> int:
+            return 0
+
     return FakeDB(users_df)
 
 
@@ -84,17 +89,28 @@ def assets(bible_df, quran_df):
     a = MagicMock()
     a.bible_df = bible_df
     a.quran_df = quran_df
+    a.bible_index = HolyTextIndex(bible_df, BIBLE_GROUP_COLUMNS)
+    a.quran_index = HolyTextIndex(quran_df, QURAN_GROUP_COLUMNS)
     a.ozjasz_phrases = ["Fajansen, moansen", "Guten tag", "Szanuje"]
     a.boczek_phrases = ["curse_one", "curse_two"]
     a.europejskafirma_phrases = ["firma phrase"]
     a.bartosiak_phrases = ["bartosiak quote"]
     a.shopping_sundays = ["01-01-2024"]
     a.kiepscy_df = pd.DataFrame([{"nr": "1", "title": "t", "url": "u", "description": "d"}])
+    a.kiepscy_index = KiepscyIndex(a.kiepscy_df)
     a.tvp_headlines = ["Tusk powraca", "Kaczynski na wakacjach"]
     a.tvp_latest_headlines = ["Nowy podatek"]
     a.walesa_phrases = ["Ja to zrobilem"]
     a.commands = ["/help", "/ozjasz"]
     a.arguments_help = ["--all"]
+    a.ozjasz_index = TextSearchIndex(a.ozjasz_phrases)
+    a.bartosiak_index = TextSearchIndex(a.bartosiak_phrases)
+    a.europejskafirma_index = TextSearchIndex(a.europejskafirma_phrases)
+    a.tvp_index = TextSearchIndex(a.tvp_latest_headlines + a.tvp_headlines)
+    a.tvp_latest_index = TextSearchIndex(a.tvp_latest_headlines)
+    a.tusk_index = TextSearchIndex(["Tusk powraca"])
+    a.walesa_index = TextSearchIndex(a.walesa_phrases)
+    a.help_index = TextSearchIndex(a.commands + a.arguments_help)
     return a
 
 
@@ -155,6 +171,24 @@ async def test_cmd_ozjasz_edge_cases(mocker, commands, update, context, args, ex
     assert kwargs["text"] == expected_text
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "method_name, args, expected_text",
+    [
+        pytest.param("cmd_tvp", ["podatek"], "Nowy podatek", id="tvp_includes_latest_headlines"),
+        pytest.param("cmd_tvp", ["[^kaczynski]"], "Kaczynski na wakacjach", id="tvp_regex"),
+        pytest.param("cmd_tusk", ["kaczynski"], ErrorMessage.NO_SUCH_HEADLINE.value, id="tusk_subset_only"),
+        pytest.param("cmd_ozjasz", ["[(a+)+]"], "(a+)+ - is and invalid regex pattern.", id="catastrophic_regex_rejected"),
+    ],
+)
+async def test_phrase_commands_use_phrase_index(commands, update, context, method_name, args, expected_text):
+    context.args = args
+
+    await getattr(commands, method_name)(update, context)
+
+    assert context.bot.send_message.await_args.kwargs["text"] == expected_text
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "args, expected_prefix",
@@ -554,3 +588,38 @@ async def test_cmd_kiepscy_search(mocker, commands, update, context):
 
     sent = context.bot.send_message.await_args.kwargs["text"]
     assert "t" in sent
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "args, expected_substring",
+    [
+        pytest.param(["(t"], ErrorMessage.INVALID_REGEX.value, id="invalid_regex"),
+        pytest.param(["^T$"], r"*1\: t* \- d", id="regex_ignore_case"),
+    ],
+)
+async def test_cmd_kiepscy_regex_goes_through_sandbox(mocker, commands, update, context, args, expected_substring):
+    context.args = args
+    mocker.patch("src.commands.misc_commands.stats_utils.escape_special_characters", side_effect=lambda s: s)
+
+    await commands.cmd_kiepscy(update, context)
+
+    assert expected_substring in context.bot.send_message.await_args.kwargs["text"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "args, expected_substring",
+    [
+        pytest.param(["[bóg"], "Invalid regex pattern", id="invalid_regex"),
+        pytest.param(["Bóg", "--book", "Mat"], ErrorMessage.NO_SUCH_VERSE.value, id="book_scope_without_match"),
+        pytest.param(["wodami", "--book", "Rdz", "--all"], "Rdz 1, 2", id="book_scope_with_match"),
+    ],
+)
+async def test_cmd_bible_indexed_search(mocker, commands, update, context, bot_state, args, expected_substring):
+    context.args = args
+
+    await commands.cmd_bible(update, context, bot_state)
+
+    sent = context.bot.send_message.await_args.kwargs["text"]
+    assert expected_substring in sent
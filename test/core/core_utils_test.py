@@ -1,16 +1,18 @@
 """Tests for core utility functions."""
 
 from datetime import datetime
+from unittest.mock import MagicMock
 from zoneinfo import ZoneInfo
 
 import pandas as pd
 import pytest
 
 from src.config.constants import TIMEZONE
-from src.config.enums import ArgType, DatetimeFormat, ErrorMessage, MessageType, PeriodFilterMode
+from src.config.enums import ArgType, DatetimeFormat, ErrorMessage, ETLJob, MessageType, PeriodFilterMode
 from src.core.utils import (
     calculate_skewed_probability,
     datetime_to_ms,
+    download_media,
     dt_to_pretty_str,
     generate_period_headline,
     generate_unique_number,
@@ -29,6 +31,7 @@ from src.core.utils import (
     max_str_length_in_list,
     merge_spaced_args,
     message_id_to_path,
+    parse_args,
     parse_date,
     parse_date_range,
     parse_int,
@@ -43,6 +46,7 @@ from src.core.utils import (
     x_to_light_years_str,
 )
 from src.models.command_args import CommandArgs
+from src.stats import etl_runs
 
 # Test constants
 TEST_DT_2024_01_15 = datetime(2024, 1, 15, tzinfo=ZoneInfo(TIMEZONE))
@@ -501,6 +505,9 @@ def test_generate_period_headline_date_range():
         pytest.param("JohnDoe", True, "JohnDoe", 123, id="exact_match"),
         pytest.param("Jane", True, "JaneSmith", 456, id="partial_match"),
         pytest.param("@JohnDoe", True, "JohnDoe", 123, id="with_at_symbol"),
+        pytest.param("smith", True, "JaneSmith", 456, id="substring_match"),
+        pytest.param("janesmith", True, "JaneSmith", 456, id="telegram_username"),
+        pytest.param("J.*", False, None, None, id="regex_is_literal"),
         pytest.param("NonExistent", False, None, None, id="non_existent"),
     ],
 )
@@ -630,6 +637,23 @@ def test_message_id_to_path(message_id, message_type, expected_extension):
     assert str(message_id) in result
 
 
+@pytest.mark.asyncio
+async def test_download_media_counts_the_downloaded_bytes(mocker, tmp_path):
+    """Test that a media download is timed with the size of the downloaded file."""
+    path = tmp_path / "123.jpg"
+    mocker.patch("src.core.utils.message_id_to_path", return_value=str(path))
+
+    async def fake_download_media(file):
+        path.write_bytes(b"x" * 42)
+        return file
+
+    message = MagicMock(id=123, download_media=fake_download_media)
+    with etl_runs.track_run(MagicMock(), ETLJob.CHAT_ETL) as run:
+        await download_media(message, MessageType.IMAGE)
+
+    assert (run.stages["media_download"].rows, run.stages["media_download"].bytes_downloaded) == (1, 42)
+
+
 @pytest.mark.parametrize(
     "file_content, expected_commands",
     [
@@ -644,7 +668,7 @@ def test_message_id_to_path(message_id, message_type, expected_extension):
             id="ignore_empty_or_invalid_lines",
         ),
         pytest.param(
-            f"{'A'*40} - {'B'*300}",
+            f"{'A' * 40} - {'B' * 300}",
             [("a" * 32, "B" * 256)],
             id="truncation_limits",
         ),
@@ -659,3 +683,38 @@ def test_get_bot_commands(tmp_path, file_content, expected_commands):
     for bot_cmd, (exp_cmd, exp_desc) in zip(result, expected_commands, strict=False):
         assert bot_cmd.command == exp_cmd
         assert bot_cmd.description == exp_desc
+
+
+@pytest.mark.parametrize(
+    "args, available_named_args, expected_args, expected_named_args",
+    [
+        pytest.param(["foo", "bar"], {}, ["foo bar"], {}, id="text_only"),
+        pytest.param(["foo", "--num", "5"], {"num": ArgType.POSITIVE_INT}, ["foo"], {"num": 5}, id="with_named_arg"),
+    ],
+)
+def test_parse_args_shares_phrases_and_keeps_input_untouched(args, available_named_args, expected_args, expected_named_args):
+    phrases = [f"phrase {i}" for i in range(1000)]
+    command_args = CommandArgs(args=list(args), phrases=phrases, is_text_arg=True, available_named_args=available_named_args)
+
+    result = parse_args(TEST_USERS_DF, command_args)
+
+    assert result.phrases is phrases
+    assert result.args == expected_args
+    assert result.named_args == expected_named_args
+    assert command_args.args == args
+    assert command_args.named_args == {}
+
+
+def test_command_args_fork_copies_only_parsing_containers():
+    phrases = ["a", "b"]
+    command_args = CommandArgs(args=["x"], phrases=phrases, errors=["e"])
+
+    forked = command_args.fork()
+    forked.args.append("y")
+    forked.errors.append("f")
+    forked.named_args["num"] = 1
+
+    assert forked.phrases is phrases
+    assert command_args.args == ["x"]
+    assert command_args.errors == ["e"]
+    assert command_args.named_args == {}
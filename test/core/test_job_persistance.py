@@ -0,0 +1,94 @@
+import pickle
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import src.core.utils as core_utils
+from src.core.job_persistance import JobPersistance, to_due_at
+from src.models.db.db import DB
+
+
+@pytest.fixture()
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.models.db.db.DB_PATH", tmp_path / "test_bot.db")
+    return DB()
+
+
+@pytest.fixture(autouse=True)
+def jobs_path(monkeypatch, tmp_path):
+    path = tmp_path / "scheduled_jobs.pkl"
+    monkeypatch.setattr("src.core.job_persistance.SCHEDULED_JOBS_PATH", str(path))
+    return path
+
+
+@pytest.fixture()
+def job_queue():
+    return MagicMock()
+
+
+def test_save_job_queues_jobs_due_within_horizon(db, job_queue):
+    job_persistance = JobPersistance(job_queue, db)
+    dt_now = core_utils.get_dt_now()
+
+    job_persistance.save_job(job_queue, dt_now + timedelta(hours=1), core_utils.send_response_message, [1, 2, "soon"])
+    job_persistance.save_job(job_queue, dt_now + timedelta(days=30), core_utils.send_response_message, [1, 2, "later"])
+
+    job_queue.run_once.assert_called_once()
+    assert job_queue.run_once.call_args.kwargs["when"] == dt_now + timedelta(hours=1)
+    assert len(db.load_scheduled_jobs(to_due_at(dt_now), to_due_at(dt_now + timedelta(days=31)))) == 2
+
+
+def test_startup_loads_only_jobs_within_horizon_and_expires_missed_ones(db, job_queue):
+    dt_now = core_utils.get_dt_now()
+    db.insert_scheduled_job(to_due_at(dt_now - timedelta(hours=1)), "send_response_message", [1, 2, "missed"])
+    db.insert_scheduled_job(to_due_at(dt_now + timedelta(hours=2)), "send_response_message", [1, 2, "soon"])
+    db.insert_scheduled_job(to_due_at(dt_now + timedelta(days=10)), "send_response_message", [1, 2, "later"])
+
+    job_persistance = JobPersistance(job_queue, db)
+
+    assert job_queue.run_once.call_count == 1
+    assert len(job_persistance.queued_job_ids) == 1
+    assert db.load_scheduled_jobs(to_due_at(dt_now - timedelta(days=1)), to_due_at(dt_now)) == []
+    job_queue.run_repeating.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_refill_does_not_queue_jobs_twice(db, job_queue):
+    job_persistance = JobPersistance(job_queue, db)
+    job_persistance.save_job(job_queue, core_utils.get_dt_now() + timedelta(hours=1), core_utils.send_response_message, [1, 2, "hi"])
+
+    await job_persistance.refill_jobs(MagicMock(job_queue=job_queue))
+
+    job_queue.run_once.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_fired_job_is_marked_done(db, job_queue):
+    job_persistance = JobPersistance(job_queue, db)
+    dt_now = core_utils.get_dt_now()
+    job_persistance.save_job(job_queue, dt_now + timedelta(hours=1), core_utils.send_response_message, [1, 2, "hi"])
+    context = MagicMock()
+    context.bot.send_message = AsyncMock()
+
+    await job_queue.run_once.call_args.kwargs["callback"](context)
+
+    context.bot.send_message.assert_called_once_with(chat_id=1, reply_to_message_id=2, text="hi")
+    assert db.load_scheduled_jobs(to_due_at(dt_now), to_due_at(dt_now + timedelta(days=1))) == []
+    assert job_persistance.queued_job_ids == set()
+
+
+def test_migrates_pickled_jobs(db, job_queue, jobs_path):
+    dt_now = core_utils.get_dt_now()
+    jobs = {
+        0: {"dt": dt_now - timedelta(hours=1), "func": core_utils.send_response_message, "args": [1, 2, "missed"]},
+        1: {"dt": dt_now + timedelta(hours=1), "func": core_utils.send_response_message, "args": [1, 2, "soon"]},
+    }
+    with open(jobs_path, "wb") as f:
+        pickle.dump(jobs, f)
+
+    JobPersistance(job_queue, db)
+
+    assert not jobs_path.exists()
+    assert [job[3] for job in db.load_scheduled_jobs(to_due_at(dt_now), to_due_at(dt_now + timedelta(days=1)))] == [[1, 2, "soon"]]
+    job_queue.run_once.assert_called_once()
@@ -0,0 +1,65 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.core.message_router import ANY_USER, MessageRouter
+
+
+def make_update(chat_id=1, thread_id=10, user_id=111, text="polska"):
+    update = MagicMock()
+    update.effective_chat.id = chat_id
+    update.effective_user.id = user_id
+    update.message.message_thread_id = thread_id
+    update.message.text = text
+    return update
+
+
+@pytest.fixture
+def router():
+    return MessageRouter()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "update_kwargs, expected_calls",
+    [
+        pytest.param({}, 1, id="session_owner"),
+        pytest.param({"user_id": 222}, 0, id="other_user"),
+        pytest.param({"thread_id": 11}, 0, id="other_thread"),
+        pytest.param({"chat_id": 2}, 0, id="other_chat"),
+        pytest.param({"text": None}, 0, id="no_text"),
+    ],
+)
+async def test_route_to_user_session(router, update_kwargs, expected_calls):
+    handler = AsyncMock()
+    router.register(1, 10, 111, handler)
+
+    await router.route(make_update(**update_kwargs), MagicMock())
+
+    assert handler.await_count == expected_calls
+
+
+@pytest.mark.asyncio
+async def test_route_to_user_and_thread_sessions(router):
+    quiz_handler, tournament_handler = AsyncMock(), AsyncMock()
+    router.register(1, 10, 111, quiz_handler)
+    router.register(1, 10, ANY_USER, tournament_handler)
+
+    await router.route(make_update(user_id=111), MagicMock())
+    await router.route(make_update(user_id=222), MagicMock())
+
+    assert quiz_handler.await_count == 1
+    assert tournament_handler.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_unregister_drops_session(router):
+    handler = AsyncMock()
+    router.register(1, 10, 111, handler)
+    router.unregister(1, 10, 111)
+    router.unregister(1, 10, 111)
+
+    await router.route(make_update(), MagicMock())
+
+    handler.assert_not_awaited()
+    assert len(router) == 0
@@ -47,7 +47,9 @@ class TestOzjaszBot:
 
         # Verify handlers were added
         assert mock_app.add_handlers.called
-        assert mock_app.add_handler.call_count >= 3
+        assert mock_app.add_handler.call_count == 2  # quiz buttons and the single text message router
+        message_handler = mock_app.add_handler.call_args_list[1].args[0]
+        assert message_handler.callback == bot.bot_state.message_router.route
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize("commands_count", [0, 5])
@@ -0,0 +1,103 @@
+import re
+
+import pandas as pd
+import pytest
+
+from src.core.regex_sandbox import RegexSandbox, compile_user_regex, is_regex
+
+
+@pytest.fixture(scope="module")
+def sandbox():
+    sandbox = RegexSandbox(time_budget_seconds=0.5)
+    yield sandbox
+    sandbox.stop()
+
+
+@pytest.mark.parametrize(
+    "pattern, flags, expected",
+    [
+        pytest.param("tusk", 0, [0], id="literal_in_process"),
+        pytest.param("tusk", re.IGNORECASE, [0, 2], id="literal_ignore_case"),
+        pytest.param("^k.*n$", re.IGNORECASE, [1], id="regex_in_worker"),
+        pytest.param("xyz|abc", 0, [], id="no_match"),
+    ],
+)
+def test_search(sandbox, pattern, flags, expected):
+    assert sandbox.search(pattern, ["tusk powraca", "Kaczynski na urlopie. Amen", "TUSK"], flags) == expected
+
+
+def test_search_fullmatch(sandbox):
+    assert sandbox.search("ala ma .*", ["ala ma kota", "ola ma ala ma kota"], fullmatch=True) == [0]
+
+
+def test_search_invalid_pattern_raises(sandbox):
+    with pytest.raises(re.error):
+        sandbox.search("[abc", ["abc"])
+
+
+def test_search_timeout_restarts_worker_and_rejects_pattern(sandbox):
+    slow_pattern = "(a|aa)*$"
+    texts = ["a" * 40 + "b"]
+
+    with pytest.raises(TimeoutError):
+        sandbox.search(slow_pattern, texts)
+    with pytest.raises(TimeoutError):
+        sandbox.search(slow_pattern, texts)
+
+    assert sandbox.search("a+b", texts) == [0]
+    metrics = sandbox.get_metrics()
+    assert metrics["timeouts"] == 1
+    assert metrics["rejections"] == 1
+
+
+def test_search_keeps_a_registered_corpus_resident_in_the_worker(sandbox, mocker):
+    texts = ["tusk powraca", "Kaczynski na urlopie. Amen", "TUSK"]
+    corpus_key = sandbox.register_corpus("headlines")
+    assert sandbox.search("^t.*k", texts, re.IGNORECASE, corpus_key=corpus_key) == [0, 2]
+    send = mocker.spy(sandbox._connection, "send")
+
+    assert sandbox.search("^k.*n$", texts, re.IGNORECASE, positions=[1, 2], corpus_key=corpus_key) == [1]
+    assert sandbox.search("^k.*n$", texts, re.IGNORECASE) == [1]
+
+    assert [call.args[0][0] for call in send.call_args_list] == ["search", "search_texts"]
+    assert sandbox.register_corpus("headlines") != corpus_key
+
+
+def test_resident_corpora_are_bounded(sandbox, monkeypatch):
+    monkeypatch.setattr("src.core.regex_sandbox.REGEX_MAX_RESIDENT_CORPORA", 2)
+    for text in ["ala", "ola", "ela"]:
+        assert sandbox.search("^.la$", [text], corpus_key=sandbox.register_corpus(text)) == [0]
+
+    assert len(sandbox._corpora) == 2
+
+
+@pytest.mark.asyncio
+async def test_search_async(sandbox):
+    assert await sandbox.search_async("^k.*n$", ["tusk", "Kaczynski na urlopie. Amen"], re.IGNORECASE) == [1]
+
+
+def test_contains_matches_unique_values(sandbox):
+    series = pd.Series(["ala ma kota", None, "ala ma kota", "kot ma ale"], index=[10, 11, 12, 13])
+    assert sandbox.contains(series, "^ala").tolist() == [True, False, True, False]
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        pytest.param("(a+)+$", id="nested_plus"),
+        pytest.param("(x*)*y", id="nested_star"),
+        pytest.param("(ab{1,3})+", id="nested_braces"),
+    ],
+)
+def test_compile_user_regex_rejects_nested_quantifiers(pattern):
+    with pytest.raises(re.error):
+        compile_user_regex(pattern)
+
+
+def test_compile_user_regex_is_cached():
+    assert compile_user_regex("bóg", re.IGNORECASE) is compile_user_regex("bóg", re.IGNORECASE)
+
+
+@pytest.mark.parametrize("text, expected", [("ala ma kota", False), ("ala|kot", True), ("[abc]", True)])
+def test_is_regex(text, expected):
+    assert is_regex(text) == expected
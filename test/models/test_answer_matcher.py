@@ -0,0 +1,87 @@
+import difflib
+import random
+import re
+
+import pytest
+
+from src.models.answer_matcher import AnswerMatcher, BKTree, levenshtein
+
+
+def reference_is_answer_correct(user_answer: str, valid_answers: set[str]) -> bool:
+    """The difflib scan over every valid word that AnswerMatcher replaces."""
+    if user_answer in valid_answers:
+        return True
+
+    user_words = user_answer.split()
+    if not user_words:
+        return False
+
+    valid_parts = {w for w in valid_answers if len(w.split()) == 1}
+    matched_words = 0
+    for word in user_words:
+        matches = difflib.get_close_matches(word, valid_parts, n=1, cutoff=0.75)
+        if word in valid_answers or (
+            len(word) >= 3
+            and not re.match(r"^m{0,4}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$", word)
+            and matches
+            and abs(len(word) - len(matches[0])) <= (1 if len(word) <= 6 else 2)
+        ):
+            matched_words += 1
+
+    return matched_words == len(user_words)
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [("kitten", "sitting", 3), ("", "abc", 3), ("abc", "abc", 0), ("flaw", "lawn", 2)],
+)
+def test_levenshtein(a, b, expected):
+    assert levenshtein(a, b) == expected
+    assert levenshtein(b, a) == expected
+
+
+def test_bk_tree_search_matches_linear_scan():
+    words = ["henryk", "tudor", "henryka", "katarzyna", "wielka", "piłsudski", "józef", "jozefina"]
+    tree = BKTree(words)
+
+    for query in ["henrik", "tudo", "jozef", "xyz", "wielk"]:
+        for max_distance in range(4):
+            expected = {word for word in words if levenshtein(query, word) <= max_distance}
+            assert set(tree.search(query, max_distance)) == expected
+
+
+def test_matches_diacritic_folded_words():
+    matcher = AnswerMatcher({"lech wałęsa", "lech", "wałęsa"})
+
+    assert matcher.is_correct("lech walesa")
+    assert not matcher.is_correct("lech kaczynski")
+
+
+def test_caches_word_results():
+    matcher = AnswerMatcher({"alan turing", "alan", "turing"})
+
+    assert matcher.is_correct("alan turnig")
+    assert matcher.word_cache == {"alan": True, "turnig": True}
+
+
+def test_keeps_difflib_rules_on_ascii_answers():
+    rng = random.Random(7)
+    alphabet = "abcdeilmnorstuvx"
+    for _ in range(300):
+        parts = ["".join(rng.choices(alphabet, k=rng.randint(2, 10))) for _ in range(rng.randint(1, 4))]
+        valid_answers = {" ".join(parts), *parts}
+        matcher = AnswerMatcher(valid_answers)
+        for _ in range(10):
+            word = list(rng.choice(parts))
+            for _ in range(rng.randint(0, 3)):
+                position = rng.randrange(len(word) + 1)
+                operation = rng.choice(["insert", "delete", "replace"])
+                if operation == "insert":
+                    word.insert(position, rng.choice(alphabet))
+                elif word and position < len(word):
+                    if operation == "delete":
+                        del word[position]
+                    else:
+                        word[position] = rng.choice(alphabet)
+            answer = "".join(word)
+            assert matcher.is_correct(answer) == reference_is_answer_correct(answer, valid_answers), (answer, valid_answers)
@@ -0,0 +1,100 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.models.base_map_cache import TILE_SIZE, BaseMapCache, BaseMapLevel, mercator_x, mercator_y
+from src.models.map_quiz import MapQuiz
+
+WORLD_LEVEL = BaseMapLevel("world_4", 4, "50m", False)
+DETAIL_LEVEL = BaseMapLevel("detail_8", 8, "10m", True)
+LAND_COLOR = (211, 208, 203)
+
+
+def build_tiles(tiles_dir, level: BaseMapLevel, skip: tuple[int, int] = None):
+    (tiles_dir / level.name).mkdir()
+    columns, rows = level.grid_size
+    cache = BaseMapCache(tiles_dir, [level])
+    for row in range(rows):
+        for column in range(columns):
+            if (column, row) != skip:
+                Image.new("RGB", (TILE_SIZE, TILE_SIZE), LAND_COLOR).save(cache.get_tile_path(level, column, row))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    build_tiles(tmp_path, WORLD_LEVEL)
+    return BaseMapCache(tmp_path, [WORLD_LEVEL, DETAIL_LEVEL])
+
+
+def test_mercator_matches_cartopy():
+    assert mercator_x(10.0) == pytest.approx(1113194.9079, abs=0.01)
+    assert mercator_y(52.0) == pytest.approx(6766432.4906, abs=0.01)
+    assert mercator_y(-45.0) == pytest.approx(-5591295.9186, abs=0.01)
+
+
+def test_choose_level_only_from_built_levels(cache):
+    assert cache.choose_level(1000.0, show_borders=False) == WORLD_LEVEL
+    assert cache.choose_level(1000.0, show_borders=True) is None
+
+
+def test_choose_level_prefers_coarsest_sharp_enough(tmp_path):
+    coarse, fine = BaseMapLevel("coarse", 4, "50m", False), BaseMapLevel("fine", 16, "50m", False)
+    (tmp_path / "coarse").mkdir()
+    (tmp_path / "fine").mkdir()
+    cache = BaseMapCache(tmp_path, [fine, coarse])
+
+    assert cache.choose_level(coarse.meters_per_pixel, show_borders=False) == coarse
+    assert cache.choose_level(fine.meters_per_pixel * 2, show_borders=False) == fine
+    assert cache.choose_level(fine.meters_per_pixel / 4, show_borders=False) == fine
+
+
+def test_get_base_map_fits_max_size(cache):
+    base_map = cache.get_base_map([-20.0, 40.0, 30.0, 70.0], show_borders=False, max_size=(600, 400))
+
+    assert base_map.size[1] == 400
+    assert base_map.size[0] <= 600
+    assert np.array(base_map)[200, 200].tolist() == list(LAND_COLOR)
+
+
+def test_get_base_map_missing_tile_returns_none(tmp_path):
+    build_tiles(tmp_path, WORLD_LEVEL, skip=(0, 0))
+    cache = BaseMapCache(tmp_path, [WORLD_LEVEL])
+
+    assert cache.get_base_map([-170.0, -150.0, 60.0, 75.0], show_borders=False, max_size=(600, 400)) is None
+    assert cache.get_base_map([-20.0, 40.0, 30.0, 70.0], show_borders=False, max_size=(600, 400)) is not None
+
+
+def test_missing_levels_are_reported_once(tmp_path, caplog):
+    build_tiles(tmp_path, WORLD_LEVEL)
+
+    BaseMapCache(tmp_path, [WORLD_LEVEL, DETAIL_LEVEL])
+    cache = BaseMapCache(tmp_path, [WORLD_LEVEL, DETAIL_LEVEL])
+
+    assert cache.get_missing_levels() == [DETAIL_LEVEL]
+    assert [record.levelname for record in caplog.records] == ["ERROR"]
+    assert "detail_8" in caplog.text
+
+
+def test_project_corners():
+    extent = [-20.0, 40.0, 30.0, 70.0]
+    assert BaseMapCache.project(-20.0, 70.0, extent, (600, 400)) == pytest.approx((0.0, 0.0))
+    assert BaseMapCache.project(40.0, 30.0, extent, (600, 400)) == pytest.approx((600.0, 400.0))
+
+
+def test_generate_image_composites_markers_on_cached_base_map(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr("src.models.map_quiz.TEMP_DIR", tmp_path / "temp")
+    quiz = MapQuiz(base_map_cache=cache)
+    locations = [(-7.9898, 31.6225, "1963", "red"), (24.9384, 60.1699, "1917", "green")]
+
+    path = quiz.generate_image(locations)
+
+    image = np.array(Image.open(path).convert("RGB")).astype(int)
+    assert image.shape[0] == 1200 or image.shape[1] == 2000
+    is_red = (image[:, :, 0] > 200) & (image[:, :, 1] < 80) & (image[:, :, 2] < 80)
+    is_green = (image[:, :, 1] > 100) & (image[:, :, 0] < 80) & (image[:, :, 2] < 80)
+    assert is_red.any()
+    assert is_green.any()
@@ -115,13 +115,18 @@ def test_pop_random_country_refills_after_exhaustion(mock_countries_df):
     assert second_cycle == all_codes
 
 
-def test_pop_random_country_filtered_does_not_use_queue(mock_countries_df):
-    """When filtered_df is passed the queue is bypassed and the result is in the filtered set."""
+def test_pop_random_country_filtered_does_not_repeat(mock_countries_df):
+    """Filtered draws get their own queue, every country of the filtered pool appears once before any repeats."""
     countries = Countries(data=mock_countries_df)
-    europa_df = countries.get_countries(continent="Europa")
-    europa_codes = set(europa_df["country_code"].tolist())
+    europa_codes = set(countries.get_countries(continent="Europa")["country_code"].tolist())
 
-    result = countries.pop_random_country(filtered_df=europa_df)
-    assert result["country_code"] in europa_codes
-    # Queue must remain untouched (still empty / not consumed)
-    assert len(countries._shuffle_queue) == 0
+    drawn = [countries.pop_random_country(continent="eu")["country_code"] for _ in range(len(europa_codes))]
+
+    assert sorted(drawn) == sorted(europa_codes)
+    assert countries.pop_random_country(continent="eu", difficulty="easy")["continent"] == "Europa"
+
+
+def test_pop_random_country_no_match(mock_countries_df):
+    countries = Countries(data=mock_countries_df)
+    assert countries.pop_random_country(continent="Antarktyda") is None
+    assert countries.get_countries(continent="Antarktyda").empty
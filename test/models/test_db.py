@@ -1,6 +1,8 @@
+import pandas as pd
 import pytest
 
-from src.config.enums import Table
+from src.config.constants import TIMEZONE
+from src.config.enums import DBSaveMode, Table
 from src.models.db.db import DB
 
 
@@ -57,3 +59,131 @@ class TestLoadRowsByMessageIds:
     def test_nonexistent_ids_returns_empty_df(self, db):
         df = db.load_rows_by_message_ids(Table.CLEANED_CHAT_HISTORY, [9999])
         assert df.empty
+
+    def test_loads_ids_in_chunks(self, db, monkeypatch):
+        monkeypatch.setattr("src.models.db.db.SQLITE_MAX_PARAMS", 2)
+        self._insert_chat_rows(
+            db, [(i, f"2025-01-01T1{i}:00:00+00:00", 111, "user_a", "hello", None, "[]", "[]", "text") for i in range(1, 6)]
+        )
+        df = db.load_rows_by_message_ids(Table.CLEANED_CHAT_HISTORY, [1, 2, 3, 5, 9999])
+        assert sorted(df["message_id"].tolist()) == [1, 2, 3, 5]
+
+
+class TestQuizProgress:
+    def test_round_trip(self, db):
+        db.save_quiz_progress(111, b"\x80\x01")
+        db.save_quiz_progress(222, b"\x00")
+        db.save_quiz_progress(111, b"\xc0")
+        assert db.load_quiz_progress() == {111: b"\xc0", 222: b"\x00"}
+
+    def test_empty(self, db):
+        assert db.load_quiz_progress() == {}
+
+
+class TestScheduledJobs:
+    def test_load_in_due_order_within_window(self, db):
+        late_id = db.insert_scheduled_job("2025-01-03T10:00:00+00:00", "send_response_message", [1, 2, "late"])
+        early_id = db.insert_scheduled_job("2025-01-02T10:00:00+00:00", "send_response_message", [1, 2, "early"])
+        db.insert_scheduled_job("2025-01-05T10:00:00+00:00", "send_response_message", [1, 2, "outside"])
+
+        jobs = db.load_scheduled_jobs("2025-01-01T00:00:00+00:00", "2025-01-04T00:00:00+00:00")
+
+        assert [job[0] for job in jobs] == [early_id, late_id]
+        assert jobs[0][3] == [1, 2, "early"]
+
+    def test_mark_done(self, db):
+        job_id = db.insert_scheduled_job("2025-01-02T10:00:00+00:00", "send_response_message", [])
+        db.insert_scheduled_job("2025-01-01T10:00:00+00:00", "send_response_message", [])
+        db.insert_scheduled_job("2025-01-03T10:00:00+00:00", "send_response_message", [])
+
+        db.mark_scheduled_jobs_done(job_ids=[job_id])
+        db.mark_scheduled_jobs_done(due_before="2025-01-02T00:00:00+00:00")
+
+        jobs = db.load_scheduled_jobs("2025-01-01T00:00:00+00:00", "2025-01-04T00:00:00+00:00")
+        assert [job[1] for job in jobs] == ["2025-01-03T10:00:00+00:00"]
+
+
+class TestUpsertAndDeleteMessages:
+    def _chat_df(self, text):
+        return pd.DataFrame(
+            {
+                "message_id": [1],
+                "timestamp": [pd.Timestamp("2025-01-01 12:00", tz="UTC")],
+                "user_id": [10],
+                "final_username": ["user"],
+                "text": [text],
+                "image_text": [""],
+                "reaction_emojis": [[]],
+                "reaction_user_ids": [[]],
+                "message_type": ["text"],
+            }
+        )
+
+    def test_upsert_replaces_edited_messages(self, db):
+        db.save_dataframe(self._chat_df("hello"), Table.CLEANED_CHAT_HISTORY, DBSaveMode.APPEND)
+        db.save_dataframe(self._chat_df("edited"), Table.CLEANED_CHAT_HISTORY, DBSaveMode.APPEND)
+        assert db.load_table(Table.CLEANED_CHAT_HISTORY)["text"].tolist() == ["hello"]
+
+        db.save_dataframe(self._chat_df("edited"), Table.CLEANED_CHAT_HISTORY, DBSaveMode.UPSERT)
+        assert db.load_table(Table.CLEANED_CHAT_HISTORY)["text"].tolist() == ["edited"]
+
+    def test_reply_and_topic_ids_round_trip(self, db):
+        chat_df = pd.concat([self._chat_df("hello"), self._chat_df("reply").assign(message_id=2)], ignore_index=True)
+        chat_df["reply_to_msg_id"] = pd.array([None, 1], dtype="Int64")
+        chat_df["topic_id"] = pd.array([1, 5], dtype="Int64")
+        db.save_dataframe(chat_df, Table.CLEANED_CHAT_HISTORY, DBSaveMode.APPEND)
+
+        loaded_df = db.load_table(Table.CLEANED_CHAT_HISTORY)
+
+        assert loaded_df["reply_to_msg_id"].dtype == "Int64"
+        assert loaded_df["reply_to_msg_id"].tolist() == [pd.NA, 1]
+        assert loaded_df["topic_id"].tolist() == [1, 5]
+
+    def test_delete_messages_records_them_as_updated(self, db):
+        db.save_dataframe(self._chat_df("hello"), Table.CLEANED_CHAT_HISTORY, DBSaveMode.APPEND)
+
+        db.delete_messages([1, 2])
+
+        assert db.count_rows(Table.CLEANED_CHAT_HISTORY) == 0
+        assert sorted(db.pop_updated_message_ids()) == [1, 2]
+
+
+class TestLoadRowsSince:
+    def test_loads_rows_at_or_after_the_timestamp_across_offsets(self, db):
+        commands_df = pd.DataFrame(
+            {
+                "timestamp": pd.to_datetime(["2025-01-01 09:00", "2025-01-01 11:00", "2025-01-01 12:00"], utc=True),
+                "user_id": [1, 2, 3],
+                "command_name": ["tvp", "ozjasz", "bible"],
+            }
+        )
+        commands_df["timestamp"] = commands_df["timestamp"].dt.tz_convert(TIMEZONE)
+        db.save_dataframe(commands_df, Table.COMMANDS_USAGE, DBSaveMode.APPEND)
+        # Rows migrated from parquet are stored with a UTC offset
+        db.conn.execute("INSERT INTO commands_usage (timestamp, user_id, command_name) VALUES ('2025-01-01T11:30:00+00:00', 4, 'cwel')")
+
+        df = db.load_rows_since(Table.COMMANDS_USAGE, pd.Timestamp("2025-01-01 11:00", tz="UTC").to_pydatetime())
+
+        assert sorted(df["user_id"].tolist()) == [2, 3, 4]
+        assert str(df["timestamp"].dt.tz) == TIMEZONE
+
+
+class TestAddMissingColumns:
+    def test_adds_the_message_feature_columns_to_an_existing_table(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("src.models.db.db.DB_PATH", tmp_path / "test_bot.db")
+        old_db = DB()
+        old_db.conn.execute("DROP TABLE cleaned_chat_history")
+        old_db.conn.execute(
+            "CREATE TABLE cleaned_chat_history (message_id INTEGER PRIMARY KEY, [timestamp] TEXT NOT NULL, user_id INTEGER NOT NULL, "
+            "final_username TEXT NOT NULL, text TEXT, image_text TEXT, reaction_emojis TEXT, reaction_user_ids TEXT, message_type TEXT NOT NULL)"
+        )
+        old_db.conn.execute(
+            "INSERT INTO cleaned_chat_history VALUES (1, '2025-01-01T10:00:00+00:00', 111, 'user_a', 'hello', '', '[]', '[]', 'text')"
+        )
+
+        db = DB()
+
+        df = db.load_rows_missing(Table.CLEANED_CHAT_HISTORY, "word_count")
+        assert df["message_id"].tolist() == [1]
+        assert {"word_count", "has_link", "local_day", "text_folded", "topic_id"} <= set(df.columns)
+        assert "idx_cleaned_chat_topic_id" in {row[1] for row in db.conn.execute("PRAGMA index_list(cleaned_chat_history)")}
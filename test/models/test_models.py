@@ -222,6 +222,8 @@ class TestChatMessageRow:
             "reaction_emojis",
             "reaction_user_ids",
             "message_type",
+            "reply_to_msg_id",
+            "topic_id",
         }
         assert set(d.keys()) == expected_keys
 
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models import flag_quiz, map_quiz
+from src.models.flag_quiz import FlagQuiz
+from src.models.map_quiz import MapQuiz
+from src.models.quiz_texts import SOURCE_HASH_COLUMN, add_quiz_texts, build_quiz_texts
+
+
+@pytest.fixture
+def people_df():
+    return pd.DataFrame(
+        [
+            {
+                "uri": "Q1",
+                "name_pl": "Jan Kowalski",
+                "name_en": "John Smith",
+                "description": "Jan Kowalski - polski inżynier. Zbudował most.",
+            },
+            {"uri": "Q2", "name_pl": "Adam Nowak", "name_en": "Adam Nowak", "description": "Adam Nowak - malarz. Malował obrazy."},
+        ],
+        index=[5, 6],
+    )
+
+
+@pytest.fixture
+def countries_df():
+    return pd.DataFrame(
+        [{"country_name": "Polska", "country_code": "PL", "continent": "Europa", "population": 38000000, "capital": "Warszawa"}]
+    )
+
+
+def build_people_texts(people_df):
+    return build_quiz_texts(people_df, "uri", map_quiz.QUIZ_TEXT_SOURCE_COLUMNS, MapQuiz.build_quiz_texts)
+
+
+def test_build_quiz_texts(people_df):
+    texts_df = build_people_texts(people_df)
+
+    assert texts_df["uri"].tolist() == ["Q1", "Q2"]
+    assert texts_df.loc[0, "quiz_display_name"] == "John Smith"
+    assert texts_df.loc[0, "quiz_tips"] == ["polski inżynier.", "Zbudował most."]
+    assert texts_df.loc[0, "quiz_description"] == MapQuiz.build_person_description(people_df.iloc[0].to_dict())
+
+
+def test_add_quiz_texts_looks_up_precomputed_texts(people_df, tmp_path):
+    texts_path = str(tmp_path / "texts.parquet")
+    texts_df = build_people_texts(people_df)
+    texts_df.loc[0, "quiz_display_name"] = "Precomputed"
+    texts_df.to_parquet(texts_path)
+
+    df = MapQuiz.add_quiz_texts(people_df, texts_path)
+
+    assert df.index.tolist() == [5, 6]
+    assert SOURCE_HASH_COLUMN not in df.columns
+    person = df.loc[5].to_dict()
+    assert MapQuiz.get_person_display_name(person) == "Precomputed"
+    assert isinstance(person["quiz_tips"], np.ndarray)
+    assert MapQuiz.get_tips(person) == ["polski inżynier.", "Zbudował most."]
+
+
+def test_add_quiz_texts_rebuilds_stale_and_missing_texts(people_df, tmp_path):
+    texts_path = str(tmp_path / "texts.parquet")
+    texts_df = build_people_texts(people_df.iloc[:1])
+    texts_df.loc[0, "quiz_display_name"] = "Precomputed"
+    texts_df.to_parquet(texts_path)
+    people_df.loc[5, "name_en"] = "John Smithson"
+
+    df = add_quiz_texts(people_df, "uri", map_quiz.QUIZ_TEXT_SOURCE_COLUMNS, MapQuiz.build_quiz_texts, texts_path)
+
+    assert df["quiz_display_name"].tolist() == ["John Smithson", "Adam Nowak"]
+
+
+def test_add_quiz_texts_without_texts_file(countries_df, tmp_path):
+    df = FlagQuiz.add_quiz_texts(countries_df, str(tmp_path / "missing.parquet"))
+    country = df.iloc[0].to_dict()
+
+    assert FlagQuiz.get_country_display_name(country) == "Polska"
+    assert FlagQuiz.get_country_description(country) == FlagQuiz.build_country_description(countries_df.iloc[0].to_dict())
+    assert FlagQuiz.get_tips(country) == ["Continent: Europa", "First letter: P", "Second letter: o"]
+    assert FlagQuiz.get_tips(country, continent_specified=True) == ["First letter: P", "Second letter: o"]
+
+
+def test_country_texts_round_trip_through_parquet(countries_df, tmp_path):
+    texts_path = str(tmp_path / "texts.parquet")
+    build_quiz_texts(countries_df, "country_code", flag_quiz.QUIZ_TEXT_SOURCE_COLUMNS, FlagQuiz.build_quiz_texts).to_parquet(texts_path)
+
+    country = FlagQuiz.add_quiz_texts(countries_df, texts_path).iloc[0].to_dict()
+
+    assert FlagQuiz.get_tips(country, continent_specified=True) == ["First letter: P", "Second letter: o"]
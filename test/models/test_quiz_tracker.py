@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models.quiz_tracker import QuizTracker
+
+
+@pytest.fixture
+def quiz_df():
+    return pd.DataFrame({"quiz_id": [10, 11, 12, 13]})
+
+
+class FakeDB:
+    def __init__(self):
+        self.quiz_progress = {}
+
+    def save_quiz_progress(self, user_id, seen_quiz_ids):
+        self.quiz_progress[user_id] = seen_quiz_ids
+
+    def load_quiz_progress(self):
+        return dict(self.quiz_progress)
+
+
+def test_draw_does_not_repeat_until_exhausted(quiz_df):
+    tracker = QuizTracker(quiz_df)
+    positions = np.array([0, 3])
+
+    drawn = {tracker.draw(1, positions), tracker.draw(1, positions)}
+
+    assert drawn == {0, 3}
+    assert tracker.draw(1, positions) == -1
+    assert tracker.draw(2, positions) in {0, 3}
+
+
+def test_draw_resets_after_all_quizzes_are_seen(quiz_df):
+    tracker = QuizTracker(quiz_df)
+    positions = np.arange(4)
+
+    assert sorted(tracker.draw(1, positions) for _ in range(4)) == [0, 1, 2, 3]
+    assert tracker.draw(1, positions) in {0, 1, 2, 3}
+
+
+def test_progress_is_persisted_by_quiz_id(quiz_df):
+    db = FakeDB()
+    tracker = QuizTracker(quiz_df, db)
+    seen_quiz_ids = {int(tracker.quiz_ids[tracker.draw(1, np.arange(4))]) for _ in range(3)}
+
+    reordered_tracker = QuizTracker(quiz_df.iloc[::-1].reset_index(drop=True), db)
+
+    assert set(reordered_tracker.quiz_ids[reordered_tracker.get_seen_positions(1)].tolist()) == seen_quiz_ids
+    last_position = reordered_tracker.draw(1, np.arange(4))
+    assert reordered_tracker.quiz_ids[last_position] == ({10, 11, 12, 13} - seen_quiz_ids).pop()
+
+
+def test_seen_quizzes_take_a_bit_each():
+    tracker = QuizTracker(pd.DataFrame({"quiz_id": np.arange(20)}))
+
+    tracker.draw(1, np.array([9]))
+
+    assert tracker.seen[1].dtype == np.uint8 and tracker.seen[1].size == 3
+    assert tracker.get_seen_positions(1).tolist() == [9]
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from src.models.record_pools import RecordPools, ShuffledPool
+
+
+@pytest.fixture
+def record_pools():
+    df = pd.DataFrame(
+        [
+            (10, "Geography", "easy", "boolean"),
+            (11, "Entertainment: Music", "easy", "multiple"),
+            (12, "Entertainment: Film", "hard", "multiple"),
+            (13, "Geography", "hard", "multiple"),
+        ],
+        columns=["quiz_id", "category", "difficulty", "type"],
+    )
+    return RecordPools(df, ["category", "difficulty", "type"])
+
+
+def test_shuffled_pool_draws_every_position_before_repeating():
+    pool = ShuffledPool([4, 5, 6])
+    assert sorted(pool.pop() for _ in range(3)) == [4, 5, 6]
+    assert sorted(pool.pop() for _ in range(3)) == [4, 5, 6]
+
+
+def test_exact_pools_are_precomputed(record_pools):
+    assert (frozenset(["Geography"]), None, frozenset(["multiple"])) in record_pools.pools
+    assert len(record_pools.pools) == 1 + 3 + 2 + 2 + 4 + 4 + 3 + 4  # any value + every existing value combination
+    assert record_pools.get_pool(difficulty=frozenset(["hard"]), type=frozenset(["multiple"])).positions.tolist() == [2, 3]
+
+
+@pytest.mark.parametrize(
+    "filters, expected_quiz_ids",
+    [
+        pytest.param({}, [10, 11, 12, 13], id="no_filters"),
+        pytest.param({"category": "entertainment"}, [11, 12], id="category_substring_ignore_case"),
+        pytest.param({"category": "geo", "difficulty": "hard"}, [13], id="combined_filters"),
+        pytest.param({"difficulty": "Hard", "type": None}, [12, 13], id="none_matches_any"),
+        pytest.param({"type": "multiple", "category": "sports"}, [], id="no_match"),
+    ],
+)
+def test_get_pool(record_pools, filters, expected_quiz_ids):
+    values = {column: record_pools.match_values(column, query) for column, query in filters.items()}
+    pool = record_pools.get_pool(**values)
+    assert [record_pools.records[position]["quiz_id"] for position in pool.positions] == expected_quiz_ids
+    assert record_pools.get_pool(**values) is pool
+
+
+def test_pop_does_not_repeat_within_a_pool(record_pools):
+    categories = record_pools.match_values("category", "entertainment")
+
+    drawn = [record_pools.pop(category=categories)["quiz_id"] for _ in range(2)]
+
+    assert sorted(drawn) == [11, 12]
+    assert record_pools.pop(category=frozenset()) is None
@@ -0,0 +1,162 @@
+import re
+
+import pandas as pd
+import pytest
+
+from src.models.text_index import HolyTextIndex, KiepscyIndex, TextSearchIndex
+
+
+@pytest.fixture
+def texts():
+    return [
+        "Na początku Bóg stworzył niebo i ziemię.",
+        "Ziemia zaś była bezładem i pustkowiem.",
+        "Wtedy Bóg rzekł: Niechaj się stanie światłość!",
+        "Będziecie się cieszyć wobec Pana, Boga swego.",
+    ]
+
+
+@pytest.fixture
+def text_index(texts):
+    return TextSearchIndex(texts)
+
+
+@pytest.mark.parametrize(
+    "query, expected_positions",
+    [
+        pytest.param("", [0, 1, 2, 3], id="empty_query_matches_all"),
+        pytest.param("bóg", [0, 2], id="single_word"),
+        pytest.param("BÓG", [0, 2], id="case_insensitive"),
+        pytest.param("bog", [0, 2, 3], id="ascii_query_matches_folded_text"),
+        pytest.param("ziemi", [0, 1], id="substring_inside_token"),
+        pytest.param("bóg stworzył", [0], id="multiword_phrase"),
+        pytest.param("stworzył bóg", [], id="multiword_phrase_order_matters"),
+        pytest.param("bóg & światłość", [2], id="and_terms"),
+        pytest.param("bóg & pustkowiem", [], id="and_terms_no_match"),
+        pytest.param("^ziemia", [1], id="regex_anchor"),
+        pytest.param("nie(bo|chaj)", [0, 2], id="regex_alternation"),
+        pytest.param("bo?g", [0, 2, 3], id="regex_optional_char"),
+        pytest.param("xyz", [], id="no_match"),
+    ],
+)
+def test_search(text_index, query, expected_positions):
+    assert text_index.search(query).tolist() == expected_positions
+
+
+def test_search_limited_to_scope(text_index):
+    assert text_index.search("bóg", scope=[2, 3]).tolist() == [2]
+
+
+def test_search_invalid_regex_raises(text_index):
+    with pytest.raises(re.error):
+        text_index.search("[bóg")
+
+
+def test_search_literal_mode_ignores_regex_metacharacters(text_index):
+    assert text_index.search("światłość!", is_regex=False).tolist() == [2]
+    assert text_index.search("b.g", is_regex=False).tolist() == []
+
+
+@pytest.mark.parametrize(
+    "pattern, expected_texts",
+    [
+        pytest.param("^ziemia", ["Ziemia zaś była bezładem i pustkowiem."], id="anchor_ignore_case"),
+        pytest.param(
+            r"Bóg \w+ł", ["Na początku Bóg stworzył niebo i ziemię.", "Wtedy Bóg rzekł: Niechaj się stanie światłość!"], id="escape"
+        ),
+        pytest.param("pana|boga", ["Będziecie się cieszyć wobec Pana, Boga swego."], id="alternation"),
+        pytest.param(r"\x42\u00f3g rzek", ["Wtedy Bóg rzekł: Niechaj się stanie światłość!"], id="hex_escapes"),
+        pytest.param(r"\N{LATIN SMALL LETTER O WITH ACUTE}g s", ["Na początku Bóg stworzył niebo i ziemię."], id="named_escape"),
+    ],
+)
+def test_regex_search(text_index, pattern, expected_texts):
+    assert text_index.get_texts(text_index.regex_search(pattern)) == expected_texts
+
+
+def test_empty_query_returns_the_texts_without_a_copy(text_index, texts):
+    assert text_index.get_texts(text_index.search("")) is texts
+
+
+@pytest.mark.parametrize(
+    "pattern, expected_literals",
+    [
+        pytest.param("bóg", ["bóg"], id="plain"),
+        pytest.param("^na pocz.tku", ["na", "pocz", "tku"], id="wildcard_splits"),
+        pytest.param("colou?r", ["colo", "r"], id="optional_char_dropped"),
+        pytest.param("a{0,2}bc", ["bc"], id="quantified_char_dropped"),
+        pytest.param(r"\w+ziemi[aeę]", ["ziemi"], id="escape_and_class_dropped"),
+        pytest.param(r"\x41men \u0105", ["men"], id="hex_escapes_dropped_whole"),
+        pytest.param(r"\N{LATIN SMALL LETTER O WITH ACUTE}g", ["g"], id="named_escape_dropped_whole"),
+        pytest.param(r"\101b\d{2}c", ["b", "c"], id="octal_escape_and_quantified_escape_dropped"),
+        pytest.param("bóg|pan", [], id="alternation_has_no_literals"),
+    ],
+)
+def test_get_required_literals(pattern, expected_literals):
+    assert TextSearchIndex.get_required_literals(pattern) == expected_literals
+
+
+@pytest.fixture
+def holy_text_index():
+    df = pd.DataFrame(
+        [
+            ("Rdz", "Księga Rodzaju", 1, "1", "Na początku Bóg stworzył niebo i ziemię."),
+            ("Rdz", "Księga Rodzaju", 2, "1", "Tak zostały ukończone niebo i ziemia."),
+            ("Wj", "Księga Wyjścia", 1, "1", "Oto imiona synów Izraela."),
+        ],
+        columns=["abbreviation", "book", "chapter", "verse", "text"],
+    )
+    return HolyTextIndex(df, ["book", ("book", "chapter")])
+
+
+def test_holy_text_index_group_positions(holy_text_index):
+    assert holy_text_index.get_group_positions("book", "Księga Rodzaju").tolist() == [0, 1]
+    assert holy_text_index.get_group_positions(("book", "chapter"), ("Księga Rodzaju", 2)).tolist() == [1]
+    assert holy_text_index.get_group_positions("book", "Apokalipsa").tolist() == []
+
+
+def test_holy_text_index_scoped_search(holy_text_index):
+    scope = holy_text_index.get_group_positions("book", "Księga Rodzaju")
+    rows = holy_text_index.get_rows(holy_text_index.search("niebo", scope))
+    assert rows.index.tolist() == [0, 1]
+
+
+@pytest.fixture
+def kiepscy_index():
+    df = pd.DataFrame(
+        [
+            ("3", "Piwo", "Ferdek szuka pieniędzy."),
+            ("—", "Sylwester", "Ferdek i Boczek piją piwo."),
+            ("1", "Ferdek", "Halina wraca z pracy."),
+            ("2", "Boczek", "Paździoch kupuje piwo."),
+        ],
+        columns=["nr", "title", "description"],
+    )
+    return KiepscyIndex(df)
+
+
+def test_kiepscy_index_is_sorted_by_episode_number(kiepscy_index):
+    assert kiepscy_index.df["nr"].tolist() == [1, 2, 3, 999]
+
+
+@pytest.mark.parametrize(
+    "query, expected_nrs",
+    [
+        pytest.param("ferdek", [1, 3, 999], id="title_matches_ranked_first"),
+        pytest.param("piwo", [3, 2, 999], id="description_matches_sorted_by_nr"),
+        pytest.param("ferdek & boczek", [999], id="and_terms"),
+        pytest.param("^boczek", [2], id="regex"),
+        pytest.param("wiadro", [], id="no_match"),
+    ],
+)
+def test_kiepscy_index_search(kiepscy_index, query, expected_nrs):
+    assert kiepscy_index.df["nr"].iloc[kiepscy_index.search(query)].tolist() == expected_nrs
+
+
+def test_kiepscy_index_pages_fit_message_limit(kiepscy_index, mocker):
+    mocker.patch("src.models.text_index.MESSAGE_LENGTH_LIMIT", 60)
+
+    pages = kiepscy_index.get_pages("piwo", "header\n")
+
+    assert pages[0].startswith("header")
+    assert len(pages) == 3
+    assert all(len(page) <= 60 for page in pages)
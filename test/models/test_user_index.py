@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from src.models.user_index import UserIndex, get_user_index
+
+
+@pytest.fixture
+def users_df():
+    return pd.DataFrame(
+        [
+            ("Łukasz", "Żak", "lukaszzak", "Łukasz Ż", ["Łuki"]),
+            ("Anna", None, None, "Ania", []),
+            ("Annabelle", "Smith", "annabelle", "Annabelle", ["Bella"]),
+            ("Tom", "Plus", "tom", "C++ Tom", None),
+        ],
+        columns=["first_name", "last_name", "username", "final_username", "nicknames"],
+        index=[1, 2, 3, 4],
+    )
+
+
+@pytest.fixture
+def user_index(users_df):
+    return UserIndex(users_df)
+
+
+@pytest.mark.parametrize(
+    "user_str, expected",
+    [
+        pytest.param("Ania", ("Ania", 2), id="exact"),
+        pytest.param("@ania", ("Ania", 2), id="at_symbol_and_case"),
+        pytest.param("lukasz ż", ("Łukasz Ż", 1), id="diacritics_folded"),
+        pytest.param("lukaszzak", ("Łukasz Ż", 1), id="telegram_username"),
+        pytest.param("luki", ("Łukasz Ż", 1), id="nickname"),
+        pytest.param("bella", ("Annabelle", 3), id="nickname_before_partial_match"),
+        pytest.param("anna", ("Annabelle", 3), id="prefix"),
+        pytest.param("tom", ("C++ Tom", 4), id="exact_username_over_prefix"),
+        pytest.param("c++", ("C++ Tom", 4), id="regex_metacharacters_are_literal"),
+        pytest.param("++ t", ("C++ Tom", 4), id="substring"),
+        pytest.param("an", None, id="too_short_for_partial_match"),
+        pytest.param(".*", None, id="no_regex"),
+        pytest.param("", None, id="empty"),
+    ],
+)
+def test_resolve(user_index, user_str, expected):
+    assert user_index.resolve(user_str) == expected
+
+
+def test_update_user_replaces_only_that_user(user_index):
+    user_index.update_user(3, "Belle", ["Belle"], ["Annie"])
+
+    assert user_index.resolve("annabelle") is None
+    assert user_index.resolve("annie") == ("Belle", 3)
+    assert user_index.resolve("ania") == ("Ania", 2)
+    assert len(user_index) == 4
+
+
+def test_get_user_index_is_built_once_per_users_df(users_df):
+    assert get_user_index(users_df) is get_user_index(users_df)
+    assert get_user_index(users_df) is not get_user_index(users_df.copy())
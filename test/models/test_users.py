@@ -0,0 +1,122 @@
+import pandas as pd
+import pytest
+
+from src.config.constants import GENERAL_TOPIC_ID, TIMEZONE
+from src.config.enums import DBSaveMode, Table
+from src.models.db.db import DB
+from src.models.user_index import get_user_index
+from src.models.users import Users
+from src.stats.chat_etl import ChatETL
+
+
+@pytest.fixture()
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.models.db.db.DB_PATH", tmp_path / "test_bot.db")
+    db = DB()
+    users_df = pd.DataFrame(
+        [("Ferdynand", "Kiepski", "ferdek", "ferdek", ["Ferdek"]), ("Marian", None, None, "Marian", [])],
+        columns=["first_name", "last_name", "username", "final_username", "nicknames"],
+        index=pd.Index([1, 2], name="user_id"),
+    )
+    db.save_dataframe(users_df, Table.USERS, DBSaveMode.APPEND)
+    return db
+
+
+@pytest.fixture()
+def chat_etl(db, monkeypatch):
+    monkeypatch.setattr("src.stats.chat_etl.ClientAPIHandler", lambda db: None)
+    return ChatETL(db)
+
+
+def make_chat_df(rows):
+    """rows of (message_id, user_id, first_name, last_name, username)"""
+    chat_df = pd.DataFrame(rows, columns=["message_id", "user_id", "first_name", "last_name", "username"])
+    chat_df["timestamp"] = pd.date_range("2025-01-01", periods=len(chat_df), freq="min", tz=TIMEZONE).astype(f"datetime64[ns, {TIMEZONE}]")
+    chat_df["text"] = "siema"
+    chat_df["image_text"] = ""
+    chat_df["reaction_emojis"] = [[] for _ in range(len(chat_df))]
+    chat_df["reaction_user_ids"] = [[] for _ in range(len(chat_df))]
+    chat_df["message_type"] = "text"
+    chat_df["reply_to_msg_id"] = pd.array([None] * len(chat_df), dtype="Int64")
+    chat_df["topic_id"] = pd.array([GENERAL_TOPIC_ID] * len(chat_df), dtype="Int64")
+    return chat_df
+
+
+def test_refresh_reloads_only_after_a_write(db):
+    users = Users(db)
+    users_df = users.df
+
+    assert not users.refresh()
+    assert users.df is users_df
+
+    db.save_dataframe(users_df.loc[[2]].assign(first_name="Marian Paździoch"), Table.USERS, DBSaveMode.UPSERT)
+
+    assert users.refresh()
+    assert users.df.at[2, "first_name"] == "Marian Paździoch"
+    assert users.map == {1: "ferdek", 2: "Marian"}
+
+
+def test_add_nickname_is_seen_by_other_processes(db):
+    users, other_users = Users(db), Users(db)
+
+    assert users.add_nickname(1, "Ferdziu") == ["Ferdek", "Ferdziu"]
+
+    assert get_user_index(users.df).resolve("ferdziu") == ("ferdek", 1)
+    assert other_users.refresh()
+    assert other_users.df.at[1, "nicknames"] == ["Ferdek", "Ferdziu"]
+
+
+def test_cleaning_applies_new_and_renamed_users(chat_etl, db):
+    chat_df = make_chat_df(
+        [
+            (10, 1, "Ferdynand", "Kiepski", "ferdek_kiepski"),
+            (11, 3, "Arnold", "Boczek", None),
+            (12, 2, "Marian", None, None),
+        ]
+    )
+
+    cleaned_chat_df = chat_etl.clean_chat_history(chat_df)
+
+    assert cleaned_chat_df["final_username"].tolist() == ["ferdek", "Arnold Boczek", "Marian"]
+    users_df = db.load_table(Table.USERS)
+    assert users_df.at[1, "username"] == "ferdek_kiepski"
+    assert users_df.at[1, "final_username"] == "ferdek"
+    assert users_df.at[1, "nicknames"] == ["Ferdek"]
+    assert users_df.at[3, "final_username"] == "Arnold Boczek"
+    assert chat_etl.users.df.index.tolist() == users_df.index.tolist()
+
+
+def test_cleaning_without_user_changes_keeps_the_version(chat_etl, db):
+    version = db.get_table_version(Table.USERS)
+
+    chat_etl.clean_chat_history(make_chat_df([(10, 1, "Ferdynand", "Kiepski", "ferdek"), (11, 2, "Marian", None, None)]))
+
+    assert db.get_table_version(Table.USERS) == version
+
+
+def test_new_user_with_a_taken_username_gets_a_unique_one(chat_etl, db):
+    chat_df = make_chat_df([(10, 3, "Ferdynand", "Kiepski", "ferdek"), (11, 4, "Ferdynand", "Kiepski", "ferdek")])
+
+    cleaned_chat_df = chat_etl.clean_chat_history(chat_df)
+
+    assert cleaned_chat_df["final_username"].tolist() == ["ferdek 2", "ferdek 3"]
+    assert db.load_table(Table.USERS).loc[[1, 3, 4], "final_username"].tolist() == ["ferdek", "ferdek 2", "ferdek 3"]
+
+
+def test_renaming_keeps_a_nickname_added_meanwhile(chat_etl, db, monkeypatch):
+    refresh = chat_etl.users.refresh
+    nicknames_added = []
+
+    def refresh_then_add_nickname():
+        reloaded = refresh()
+        if not nicknames_added:  # /addnickname in the bot, right after the ETL loaded the users
+            nicknames_added.append(Users(db).add_nickname(1, "Ferdziu"))
+        return reloaded
+
+    monkeypatch.setattr(chat_etl.users, "refresh", refresh_then_add_nickname)
+
+    chat_etl.clean_chat_history(make_chat_df([(10, 1, "Ferdynand", "Kiepski", "ferdek_kiepski")]))
+
+    users_df = db.load_table(Table.USERS)
+    assert users_df.at[1, "username"] == "ferdek_kiepski"
+    assert users_df.at[1, "nicknames"] == ["Ferdek", "Ferdziu"]
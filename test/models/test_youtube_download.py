@@ -0,0 +1,174 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.models.youtube_download import YoutubeDownload
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.fixture()
+def ytdl(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.models.youtube_download.TEMP_DIR", str(tmp_path / "temp"))
+    return YoutubeDownload(cache_dir=str(tmp_path / "cache"), max_cache_bytes=100)
+
+
+def fake_download(ytdl, size=10):
+    """Mock the subprocesses, yt-dlp writes the requested output file and ffmpeg always succeeds."""
+
+    def run_subprocess(args, timeout_seconds):
+        if "--output" in args:
+            output = args[args.index("--output") + 1].replace("%(ext)s", "webm")
+            with open(output, "wb") as f:
+                f.write(b"x" * size)
+        return ""
+
+    ytdl.run_subprocess = AsyncMock(side_effect=run_subprocess)
+
+
+async def get_audio(ytdl, *args):
+    async with ytdl.use_audio(*args) as (path, error):
+        return path, error
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (URL, VIDEO_ID),
+        ("https://youtu.be/dQw4w9WgXcQ?si=abc", VIDEO_ID),
+        ("https://www.youtube.com/shorts/dQw4w9WgXcQ", VIDEO_ID),
+        ("https://example.com/watch?v=dQw4w9WgXcQ", None),
+    ],
+)
+def test_get_video_id(url, expected):
+    assert YoutubeDownload.get_video_id(url) == expected
+
+
+@pytest.mark.asyncio
+async def test_get_audio_invalid_url(ytdl):
+    assert await get_audio(ytdl, "https://example.com") == ("", "Invalid youtube url")
+
+
+@pytest.mark.asyncio
+async def test_get_audio_fetches_only_the_window(ytdl):
+    fake_download(ytdl)
+
+    path, error = await get_audio(ytdl, URL, 30, 10)
+
+    assert error == ""
+    assert os.path.basename(path) == f"{VIDEO_ID}_30_40.webm"
+    args = ytdl.run_subprocess.await_args.args[0]
+    assert args[args.index("--download-sections") + 1] == "*30-40"
+
+
+@pytest.mark.asyncio
+async def test_get_audio_hits_cache_for_same_and_overlapping_windows(ytdl):
+    fake_download(ytdl)
+    await get_audio(ytdl, URL, 30, 10)
+
+    path, error = await get_audio(ytdl, URL, 30, 10)
+    assert (os.path.basename(path), error) == (f"{VIDEO_ID}_30_40.webm", "")
+    assert ytdl.run_subprocess.await_count == 1
+
+    path, error = await get_audio(ytdl, URL, 32, 5)
+    assert error == ""
+    ffmpeg_args = ytdl.run_subprocess.await_args.args[0]
+    assert ffmpeg_args[0] == "ffmpeg"
+    assert ffmpeg_args[ffmpeg_args.index("-ss") + 1] == "2"
+    assert ffmpeg_args[ffmpeg_args.index("-t") + 1] == "5"
+
+
+@pytest.mark.asyncio
+async def test_get_audio_downloads_windows_outside_cached_segment(ytdl):
+    fake_download(ytdl)
+    await get_audio(ytdl, URL, 30, 10)
+
+    await get_audio(ytdl, URL, 35, 10)
+
+    assert sorted(os.listdir(ytdl.cache_dir)) == [f"{VIDEO_ID}_30_40.webm", f"{VIDEO_ID}_35_45.webm"]
+
+
+@pytest.mark.asyncio
+async def test_full_audio_serves_every_window(ytdl):
+    fake_download(ytdl)
+    path, _ = await get_audio(ytdl, URL)
+    assert os.path.basename(path) == f"{VIDEO_ID}_0_end.webm"
+    assert "--download-sections" not in ytdl.run_subprocess.await_args.args[0]
+
+    await get_audio(ytdl, URL, 100, 10)
+
+    assert ytdl.run_subprocess.await_args.args[0][0] == "ffmpeg"
+
+
+@pytest.mark.asyncio
+async def test_download_error(ytdl):
+    ytdl.run_subprocess = AsyncMock(return_value="HTTP Error 403")
+
+    assert await get_audio(ytdl, URL) == ("", "Error with downloading youtube video")
+
+
+@pytest.mark.asyncio
+async def test_failed_download_leaves_no_partial_segment(ytdl):
+    fake_download(ytdl)
+    run_subprocess = ytdl.run_subprocess.side_effect
+
+    async def timed_out_download(args, timeout_seconds):
+        run_subprocess(args, timeout_seconds)
+        return "Timed out after 1s"
+
+    ytdl.run_subprocess.side_effect = timed_out_download
+    assert await get_audio(ytdl, URL, 0, 10) == ("", "Error with downloading youtube video")
+    assert os.listdir(ytdl.cache_dir) == []
+
+    fake_download(ytdl)  # the window isn't served from the cache, it's downloaded again
+    _, error = await get_audio(ytdl, URL, 0, 10)
+    assert error == ""
+    ytdl.run_subprocess.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used_segments(ytdl):
+    fake_download(ytdl, size=40)
+    await get_audio(ytdl, URL, 0, 10)
+    await get_audio(ytdl, URL, 20, 10)
+    os.utime(os.path.join(ytdl.cache_dir, f"{VIDEO_ID}_0_10.webm"), (0, 0))
+    os.utime(os.path.join(ytdl.cache_dir, f"{VIDEO_ID}_20_30.webm"), (1, 1))
+
+    await get_audio(ytdl, URL, 40, 10)
+
+    assert sorted(os.listdir(ytdl.cache_dir)) == [f"{VIDEO_ID}_20_30.webm", f"{VIDEO_ID}_40_50.webm"]
+
+
+@pytest.mark.asyncio
+async def test_cache_keeps_segments_in_use(ytdl):
+    fake_download(ytdl, size=60)
+
+    async with ytdl.use_audio(URL, 0, 10):
+        await get_audio(ytdl, URL, 20, 10)
+        await get_audio(ytdl, URL, 40, 10)
+
+        assert sorted(os.listdir(ytdl.cache_dir)) == [f"{VIDEO_ID}_0_10.webm", f"{VIDEO_ID}_40_50.webm"]
+
+    assert ytdl.segments_in_use == {}
+
+
+@pytest.mark.asyncio
+async def test_video_locks_are_dropped_once_unused(ytdl):
+    fake_download(ytdl)
+
+    await asyncio.gather(get_audio(ytdl, URL, 0, 10), get_audio(ytdl, URL, 0, 10), get_audio(ytdl, URL, 20, 10))
+
+    assert ytdl.run_subprocess.await_count == 2
+    assert ytdl.video_locks == {}
+    assert ytdl.video_lock_users == {}
+
+
+@pytest.mark.asyncio
+async def test_run_subprocess_timeout_and_failure():
+    assert await YoutubeDownload.run_subprocess([sys.executable, "-c", "pass"], 10) == ""
+    assert await YoutubeDownload.run_subprocess([sys.executable, "-c", "import time; time.sleep(10)"], 0.2) == "Timed out after 0.2s"
+    assert "boom" in await YoutubeDownload.run_subprocess([sys.executable, "-c", "import sys; sys.exit('boom')"], 10)
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+from PIL import Image
+
+import src.scripts.pregenerate_map_quiz_images as pregenerate
+from src.models.map_quiz import MapQuiz
+
+PEOPLE = [
+    {"uri": "Q1", "name_en": "Ada Lovelace", "name_pl": "Ada Lovelace", "birth_lon": -0.1, "birth_lat": 51.5, "dob": "1815-12-10"},
+    {"uri": "Q2", "name_en": "Alan Turing", "name_pl": "Alan Turing", "birth_lon": -0.2, "birth_lat": 51.5, "dob": "1912-06-23"},
+]
+
+
+@pytest.fixture
+def images_dir(tmp_path, monkeypatch):
+    images_dir = tmp_path / "map_quiz_images"
+    images_dir.mkdir()
+    monkeypatch.setattr(pregenerate, "MAP_QUIZ_IMAGES_DIR_PATH", str(images_dir))
+    return images_dir
+
+
+@pytest.fixture
+def flags_dir(tmp_path, monkeypatch):
+    flags_dir = tmp_path / "flags"
+    flags_dir.mkdir()
+    monkeypatch.setattr(pregenerate, "FLAGS_DIR_PATH", str(flags_dir))
+    return flags_dir
+
+
+def write_image(images_dir, person: dict, content: bytes = b"jpg") -> str:
+    path = images_dir / MapQuiz.get_image_filename_for_person(person)
+    path.write_bytes(content)
+    return str(path)
+
+
+def make_entry(images_dir, person: dict) -> dict:
+    path = write_image(images_dir, person)
+    return {
+        "file": os.path.basename(path),
+        "location_hash": pregenerate.get_location_hash(person),
+        "image_hash": pregenerate.hash_file(path),
+    }
+
+
+def test_plan_people_renders_missing_images(images_dir):
+    to_render, entries, stale_files = pregenerate.plan_people(PEOPLE, {"people": {}, "flags": {}})
+
+    assert to_render == [0, 1]
+    assert entries == {}
+    assert stale_files == []
+
+
+def test_plan_people_skips_up_to_date_images(images_dir):
+    manifest = {"people": {"Q1": make_entry(images_dir, PEOPLE[0]), "Q2": make_entry(images_dir, PEOPLE[1])}, "flags": {}}
+
+    to_render, entries, _ = pregenerate.plan_people(PEOPLE, manifest)
+
+    assert to_render == []
+    assert entries == manifest["people"]
+
+
+def test_plan_people_renders_changed_locations_and_images(images_dir):
+    manifest = {"people": {"Q1": make_entry(images_dir, PEOPLE[0]), "Q2": make_entry(images_dir, PEOPLE[1])}, "flags": {}}
+    moved_people = [{**PEOPLE[0], "birth_lat": 40.0}, PEOPLE[1]]
+    write_image(images_dir, PEOPLE[1], b"edited")
+
+    to_render, entries, _ = pregenerate.plan_people(moved_people, manifest)
+
+    assert to_render == [0, 1]
+    assert entries == {}
+
+
+def test_plan_people_adopts_images_without_manifest_entry(images_dir):
+    write_image(images_dir, PEOPLE[0])
+
+    to_render, entries, _ = pregenerate.plan_people(PEOPLE, {"people": {}, "flags": {}})
+
+    assert to_render == [1]
+    assert entries["Q1"]["location_hash"] == pregenerate.get_location_hash(PEOPLE[0])
+    assert pregenerate.plan_people(PEOPLE, {"people": {}, "flags": {}}, force=True)[0] == [0, 1]
+
+
+def test_plan_people_prunes_images_of_removed_people(images_dir):
+    write_image(images_dir, PEOPLE[0])
+    write_image(images_dir, PEOPLE[1])
+
+    _, _, stale_files = pregenerate.plan_people(PEOPLE[:1], {"people": {}, "flags": {}})
+
+    assert stale_files == ["alan_turing.jpg"]
+
+
+def test_manifest_round_trip(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = {"people": {"Q1": {"file": "a.jpg", "location_hash": "x", "image_hash": "y"}}, "flags": {"PL.jpg": "z"}}
+
+    pregenerate.save_manifest(manifest, path)
+
+    assert pregenerate.load_manifest(path) == manifest
+    assert pregenerate.load_manifest(str(tmp_path / "missing.json")) == {"people": {}, "flags": {}}
+
+
+def test_normalize_flag_converts_to_jpeg_of_flag_width(flags_dir):
+    Image.new("RGBA", (320, 200), (255, 0, 0, 255)).save(flags_dir / "PL.jpg", format="PNG")
+
+    result = pregenerate.normalize_flag("PL.jpg")
+
+    with Image.open(flags_dir / "PL.jpg") as image:
+        assert (image.format, image.mode, image.size) == ("JPEG", "RGB", (pregenerate.FLAG_WIDTH, 400))
+    assert result["status"] == "generated"
+    assert pregenerate.normalize_flag("PL.jpg") == {"file": "PL.jpg", "status": "skipped", "image_hash": result["image_hash"]}
+
+
+def test_plan_flags_skips_unchanged_flags(flags_dir):
+    Image.new("RGB", (640, 400)).save(flags_dir / "PL.jpg")
+    Image.new("RGB", (640, 400)).save(flags_dir / "DE.jpg")
+    manifest = {"people": {}, "flags": {"PL.jpg": pregenerate.hash_file(str(flags_dir / "PL.jpg"))}}
+
+    to_normalize, entries = pregenerate.plan_flags(manifest)
+
+    assert to_normalize == ["DE.jpg"]
+    assert entries == manifest["flags"]
@@ -1,6 +1,8 @@
 """Tests for stats utility functions."""
 
 import os
+import subprocess
+import sys
 from datetime import datetime
 from unittest.mock import MagicMock
 from zoneinfo import ZoneInfo
@@ -577,29 +579,49 @@ def test_get_random_media_path(mocker):
 
 
 # Tests for chat ETL lock functions
-def test_is_chat_etl_locked(mocker):
-    """Test checking if chat ETL is locked."""
-    mocker.patch("os.path.exists", return_value=True)
+@pytest.fixture
+def lock_path(monkeypatch, tmp_path):
+    path = tmp_path / "chat_etl.lock"
+    monkeypatch.setattr("src.stats.utils.CHAT_ETL_LOCK_PATH", path)
+    yield path
+    remove_chat_etl_lock()
+
+
+def test_is_chat_etl_locked(lock_path):
+    """Test checking if chat ETL is locked by a live process."""
+    assert not is_chat_etl_locked()
+
+    lock_path.write_text(str(os.getppid()))
     assert is_chat_etl_locked()
 
-    mocker.patch("os.path.exists", return_value=False)
+
+def test_lock_of_a_dead_process_is_stale(lock_path):
+    """Test that a lock left behind by a killed process is removed."""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    lock_path.write_text(str(process.pid))
+
     assert not is_chat_etl_locked()
+    assert not lock_path.exists()
+
 
+def test_lock_of_this_pid_is_stale_unless_taken_by_this_process(lock_path):
+    """Test that a lock with our PID left by a previous container run is removed, but not the one we hold."""
+    lock_path.write_text(str(os.getpid()))
+    assert not is_chat_etl_locked()
 
-def test_lock_chat_etl(mocker):
-    """Test locking chat ETL."""
-    mock_open = mocker.patch("builtins.open", mocker.mock_open())
     lock_chat_etl()
-    mock_open.assert_called_once()
+    assert lock_path.read_text() == str(os.getpid())
+    assert is_chat_etl_locked()
 
 
-def test_remove_chat_etl_lock(mocker):
+def test_remove_chat_etl_lock(lock_path):
     """Test removing chat ETL lock."""
-    mocker.patch("os.path.exists", return_value=True)
-    mock_remove = mocker.patch("os.remove")
+    lock_chat_etl()
 
     remove_chat_etl_lock()
-    mock_remove.assert_called_once()
+    assert not lock_path.exists()
+    assert not is_chat_etl_locked()
 
 
 # Tests for remove_diactric_accents
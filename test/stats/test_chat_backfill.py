@@ -0,0 +1,110 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pandas as pd
+import pytest
+
+from src.models.db.db import DB
+from src.stats.chat_backfill import ChatBackfill, get_chunks
+
+
+@pytest.fixture()
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.models.db.db.DB_PATH", tmp_path / "test_bot.db")
+    return DB()
+
+
+@pytest.fixture()
+def backfill(db):
+    chat_etl = MagicMock()
+    chat_etl.db = db
+    chat_etl.client_api_handler.get_latest_message_id = AsyncMock(return_value=25)
+    chat_etl.client_api_handler.fetch_message_range = AsyncMock(
+        side_effect=lambda min_id, max_id, client: (list(range(min_id + 1, max_id)), ["text"] * (max_id - min_id - 1))
+    )
+    chat_etl.client_api_handler.fetch_reactions = AsyncMock(return_value={})
+    chat_etl.get_message_ids_for_reaction_api_update.return_value = []
+    chat_etl.build_chat_history_df.side_effect = lambda messages, *_: pd.DataFrame({"message_id": messages})
+    return ChatBackfill(chat_etl, chunk_size=10, concurrency=2)
+
+
+def get_fetched_ranges(backfill):
+    return sorted(call.args[:2] for call in backfill.client_api_handler.fetch_message_range.await_args_list)
+
+
+@pytest.mark.parametrize(
+    "first_message_id, last_message_id, expected",
+    [
+        (1, 25, [(21, 30), (11, 20), (1, 10)]),
+        (15, 20, [(11, 20)]),
+        (0, 10, [(1, 10)]),
+        (20, 10, []),
+    ],
+)
+def test_get_chunks(first_message_id, last_message_id, expected):
+    assert get_chunks(first_message_id, last_message_id, chunk_size=10) == expected
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_written_and_checkpointed(backfill, db):
+    await backfill.backfill(days=None, use_takeout=False)
+
+    assert get_fetched_ranges(backfill) == [(0, 11), (10, 21), (20, 31)]
+    assert backfill.chat_etl.save_chat_history.call_count == 3
+    assert backfill.message_count == 30
+    # The newest chunk isn't full yet, so it's not checkpointed
+    assert db.load_backfill_chunks() == {(1, 10), (11, 20)}
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_completed_chunks(backfill, db):
+    db.mark_backfill_chunk_done(11, 20, 10, "2025-01-01T00:00:00")
+
+    await backfill.backfill(days=None, use_takeout=False)
+
+    assert get_fetched_ranges(backfill) == [(0, 11), (20, 31)]
+
+
+@pytest.mark.asyncio
+async def test_failed_chunks_are_retried_on_resume(backfill, db):
+    backfill.chat_etl.save_chat_history.side_effect = [None, RuntimeError("database is locked"), None]
+
+    await backfill.backfill(days=None, use_takeout=False)
+    assert backfill.failed_chunks == 1
+    assert len(db.load_backfill_chunks()) == 1
+
+    backfill.chat_etl.save_chat_history.side_effect = None
+    backfill.client_api_handler.fetch_message_range.reset_mock()
+    await backfill.backfill(days=None, use_takeout=False)
+    assert db.load_backfill_chunks() == {(1, 10), (11, 20)}
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(backfill):
+    backfill.client_api_handler.get_latest_message_id.return_value = 100
+    running, max_running = 0, 0
+
+    async def fetch_message_range(min_id, max_id, client):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [], []
+
+    backfill.client_api_handler.fetch_message_range = AsyncMock(side_effect=fetch_message_range)
+    backfill.chat_etl.build_chat_history_df.side_effect = lambda *_: pd.DataFrame()
+
+    await backfill.backfill(days=None, use_takeout=False)
+
+    assert max_running == 2
+
+
+def test_restart_drops_checkpoints(backfill, db, monkeypatch, tmp_path):
+    monkeypatch.setattr("src.stats.utils.CHAT_ETL_LOCK_PATH", tmp_path / "chat_etl.lock")
+    db.mark_backfill_chunk_done(1, 10, 10, "2025-01-01T00:00:00")
+    backfill.client_api_handler.client.loop.run_until_complete = lambda coroutine: coroutine.close()
+
+    backfill.run(restart=True)
+
+    assert db.load_backfill_chunks() == set()
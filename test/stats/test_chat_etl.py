@@ -0,0 +1,137 @@
+import pandas as pd
+import pytest
+
+from src.config.constants import TIMEZONE
+from src.config.enums import DBSaveMode, Table
+from src.models.db.db import DB
+from src.stats.chat_etl import ChatETL, diff_reactions
+
+REACTIONS_COLUMNS = ["message_id", "timestamp", "reacted_to_username", "reacting_username", "text", "emoji"]
+
+
+@pytest.fixture()
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.models.db.db.DB_PATH", tmp_path / "test_bot.db")
+    db = DB()
+    users_df = pd.DataFrame(
+        [("Ferdynand", "Kiepski", "ferdek", "ferdek", []), ("Marian", None, None, "Marian", []), ("Arnold", "Boczek", None, "boczek", [])],
+        columns=["first_name", "last_name", "username", "final_username", "nicknames"],
+        index=pd.Index([1, 2, 3], name="user_id"),
+    )
+    db.save_dataframe(users_df, Table.USERS, DBSaveMode.APPEND)
+    return db
+
+
+@pytest.fixture()
+def chat_etl(db, monkeypatch):
+    monkeypatch.setattr("src.stats.chat_etl.ClientAPIHandler", lambda db: None)
+    return ChatETL(db)
+
+
+def make_cleaned_chat_df(rows):
+    """rows of (message_id, user_id, final_username, text, reaction_emojis, reaction_user_ids)"""
+    df = pd.DataFrame(rows, columns=["message_id", "user_id", "final_username", "text", "reaction_emojis", "reaction_user_ids"])
+    df["timestamp"] = pd.Series(pd.Timestamp("2025-01-01 12:00", tz=TIMEZONE), index=df.index).astype(f"datetime64[ns, {TIMEZONE}]")
+    df["image_text"] = ""
+    df["message_type"] = "text"
+    return df
+
+
+def make_reactions_df(rows):
+    """rows of (message_id, reacted_to_username, reacting_username, text, emoji)"""
+    df = pd.DataFrame(rows, columns=["message_id", "reacted_to_username", "reacting_username", "text", "emoji"])
+    df["timestamp"] = pd.Timestamp("2025-01-01 12:00", tz=TIMEZONE)
+    return df[REACTIONS_COLUMNS]
+
+
+def load_reactions(db) -> list[tuple]:
+    reactions_df = db.load_table(Table.REACTIONS)
+    return sorted(reactions_df[["message_id", "reacting_username", "emoji", "text"]].itertuples(index=False, name=None))
+
+
+def test_diff_reactions():
+    stored_df = make_reactions_df(
+        [(1, "ferdek", "Marian", "siema", "👍"), (1, "ferdek", "boczek", "siema", "😂"), (2, "Marian", "ferdek", "co tam", "🔥")]
+    )
+    reactions_df = make_reactions_df(
+        [
+            (1, "ferdek", "Marian", "siema", "👍"),
+            (1, "ferdek", "boczek", "siema", "🤡"),
+            (1, "ferdek", "boczek", "siema", "👎"),
+            (3, "boczek", "ferdek", "piwo", "❤"),
+        ]
+    )
+
+    inserts_df, updates_df, deletes_df = diff_reactions(reactions_df, stored_df)
+
+    assert inserts_df[["message_id", "emoji"]].values.tolist() == [[3, "❤"]]
+    assert updates_df[["message_id", "reacting_username", "emoji"]].values.tolist() == [[1, "boczek", "🤡"]]
+    assert deletes_df.values.tolist() == [[2, "Marian", "ferdek"]]
+
+
+def test_diff_reactions_with_nothing_stored():
+    reactions_df = make_reactions_df([(1, "ferdek", "Marian", None, "👍")])
+
+    inserts_df, updates_df, deletes_df = diff_reactions(reactions_df, pd.DataFrame())
+
+    assert len(inserts_df) == 1 and updates_df.empty and deletes_df.empty
+
+
+def test_generate_reactions_writes_only_the_changes(chat_etl, db):
+    chat_etl.generate_reactions_df(
+        make_cleaned_chat_df([(1, 1, "ferdek", "siema", ["👍", "😂"], [2, 3]), (2, 2, "Marian", "co tam", ["🔥"], [1])])
+    )
+    db.pop_updated_message_ids()
+
+    # Marian changed the reaction to message 1, boczek's reaction was removed and message 2 lost its only reaction
+    chat_etl.generate_reactions_df(
+        make_cleaned_chat_df([(1, 1, "ferdek", "siema", ["🤡"], [2]), (2, 2, "Marian", "co tam", [], []), (3, 3, "boczek", "piwo", [], [])])
+    )
+
+    assert load_reactions(db) == [(1, "Marian", "🤡", "siema")]
+    assert sorted(db.pop_updated_message_ids()) == [1, 2]
+
+
+def test_generate_reactions_without_changes_writes_nothing(chat_etl, db):
+    cleaned_chat_df = make_cleaned_chat_df([(1, 1, "ferdek", "siema", ["👍"], [2])])
+    chat_etl.generate_reactions_df(cleaned_chat_df.copy())
+    db.pop_updated_message_ids()
+
+    chat_etl.generate_reactions_df(cleaned_chat_df.copy())
+
+    assert load_reactions(db) == [(1, "Marian", "👍", "siema")]
+    assert db.pop_updated_message_ids() == []
+
+
+def test_backfill_message_features_fills_old_rows(db, monkeypatch):
+    cleaned_chat_df = make_cleaned_chat_df([(1, 1, "ferdek", "Zażółć https://x.pl", [], [])])
+    db.save_dataframe(cleaned_chat_df, Table.CLEANED_CHAT_HISTORY, DBSaveMode.APPEND)
+    monkeypatch.setattr("src.stats.chat_etl.ClientAPIHandler", lambda db: None)
+
+    ChatETL(db)
+
+    cleaned_chat_df = db.load_table(Table.CLEANED_CHAT_HISTORY)
+    assert cleaned_chat_df[["word_count", "has_link", "local_hour", "text_folded"]].values.tolist() == [
+        [2, True, 12, "zazolc https://x.pl"]
+    ]
+    assert db.pop_updated_message_ids() == [1]
+    assert db.load_rows_missing(Table.CLEANED_CHAT_HISTORY, "word_count").empty
+
+
+def test_refetched_messages_fill_the_reply_and_topic_ids_of_stored_rows(chat_etl, db):
+    chat_df = make_cleaned_chat_df([(1, 1, "ferdek", "siema", [], [])]).drop(columns="final_username")
+    chat_df[["first_name", "last_name", "username"]] = ["Ferdynand", "Kiepski", "ferdek"]
+    no_ids = pd.array([None], dtype="Int64")
+    stored_chat_df = chat_df.assign(image_text="tekst z obrazka", reply_to_msg_id=no_ids, topic_id=no_ids)
+    chat_etl.save_chat_history(stored_chat_df)
+    chat_etl.clean_chat_history(stored_chat_df.copy())
+    assert db.load_table(Table.CLEANED_CHAT_HISTORY)["topic_id"].isna().all()
+
+    refetched_chat_df = chat_df.assign(reply_to_msg_id=no_ids, topic_id=pd.array([7], dtype="Int64"))
+    chat_etl.save_chat_history(refetched_chat_df)
+    chat_etl.clean_chat_history(refetched_chat_df.copy())
+
+    for table in (Table.CHAT_HISTORY, Table.CLEANED_CHAT_HISTORY):
+        stored_df = db.load_table(table)
+        assert stored_df[["topic_id", "image_text"]].values.tolist() == [[7, "tekst z obrazka"]]
+        assert stored_df["reply_to_msg_id"].isna().all()
@@ -0,0 +1,73 @@
+import random
+from types import SimpleNamespace
+
+import pandas as pd
+import pydantic
+import pytest
+
+from src.config.constants import GENERAL_TOPIC_ID
+from src.config.enums import MessageType
+from src.scripts.benchmark_chat_row_builder import build_with_pydantic_rows, make_messages, make_reaction
+from src.stats.chat_row_builder import ChatRowBuilder, get_reply_and_topic_ids, validate_sample
+
+
+def build(messages, message_types, message_reactions):
+    row_builder = ChatRowBuilder()
+    row_builder.add_messages(messages, message_types, message_reactions)
+    return row_builder.build()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_identical_to_pydantic_rows(seed):
+    messages = make_messages(2000, seed=seed)
+
+    pd.testing.assert_frame_equal(build(*messages), build_with_pydantic_rows(*messages))
+
+
+def test_identical_to_pydantic_rows_without_detailed_reactions():
+    messages, message_types, _ = make_messages(500)
+
+    pd.testing.assert_frame_equal(build(messages, message_types, []), build_with_pydantic_rows(messages, message_types, []))
+
+
+def test_malformed_reactions_skip_the_message():
+    messages, message_types, message_reactions = make_messages(3)
+    messages[1].reactions = SimpleNamespace(
+        recent_reactions=[make_reaction(random.Random(0), is_malformed=True)], results=[SimpleNamespace(count=1)]
+    )
+    row_builder = ChatRowBuilder()
+
+    row_builder.add_messages(messages, message_types, message_reactions)
+
+    assert row_builder.build()["message_id"].tolist() == [1, 3]
+    assert row_builder.malformed_count == 1
+    assert len(row_builder.reaction_emojis) == row_builder.reaction_offsets[-1]
+
+
+def test_empty():
+    assert build([None], [MessageType.NONE], []).empty
+
+
+def test_validate_sample():
+    chat_df = build(*make_messages(100))
+    assert validate_sample(chat_df, 0) == 0
+    assert validate_sample(chat_df, 10) == 10
+
+    chat_df["message_type"] = None
+    with pytest.raises(pydantic.ValidationError):
+        validate_sample(chat_df, 10)
+
+
+@pytest.mark.parametrize(
+    "reply_to, expected",
+    [
+        (None, (None, GENERAL_TOPIC_ID)),
+        (SimpleNamespace(reply_to_msg_id=10, reply_to_top_id=None, forum_topic=False), (10, GENERAL_TOPIC_ID)),
+        (SimpleNamespace(reply_to_msg_id=5, reply_to_top_id=None, forum_topic=True), (None, 5)),
+        (SimpleNamespace(reply_to_msg_id=10, reply_to_top_id=5, forum_topic=True), (10, 5)),
+        (SimpleNamespace(story_id=3), (None, GENERAL_TOPIC_ID)),
+    ],
+    ids=["general", "general_reply", "topic", "topic_reply", "story_reply"],
+)
+def test_get_reply_and_topic_ids(reply_to, expected):
+    assert get_reply_and_topic_ids(SimpleNamespace(reply_to=reply_to)) == expected
@@ -0,0 +1,123 @@
+import os
+import time
+from datetime import UTC, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import src.stats.utils as stats_utils
+from src.config.constants import ETL_RUNS_RETENTION_DAYS
+from src.config.enums import ETLJob, ETLRunStatus
+from src.models.db.db import DB
+from src.stats import etl_runs
+
+
+@pytest.fixture()
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.models.db.db.DB_PATH", tmp_path / "test_bot.db")
+    return DB()
+
+
+def load_runs(db):
+    return db.load_etl_runs(datetime.now(UTC) - timedelta(days=1))
+
+
+def test_nested_stages_are_excluded_from_the_outer_stage(db):
+    with etl_runs.track_run(db, ETLJob.CHAT_ETL) as run:
+        with etl_runs.stage("cleaning") as cleaning_timing:
+            cleaning_timing.count(rows=3)
+            with etl_runs.stage("db_write") as write_timing:
+                time.sleep(0.05)
+                write_timing.count(rows=2)
+        with etl_runs.stage("db_write") as write_timing:
+            write_timing.count(rows=1)
+
+    assert run.stages["cleaning"].seconds < 0.05 <= run.stages["db_write"].seconds
+    assert sum(timing.seconds for timing in run.stages.values()) <= run.duration_seconds
+    runs_df, stages_df = load_runs(db)
+    assert runs_df[["job", "status"]].values.tolist() == [["chat_etl", "success"]]
+    assert stages_df[["stage", "row_count"]].values.tolist() == [["cleaning", 3], ["db_write", 3]]
+
+
+def test_stage_outside_of_a_run_is_not_recorded(db):
+    with etl_runs.stage("download") as stage_timing:
+        stage_timing.count(rows=1, bytes_downloaded=10)
+
+    assert etl_runs.current_run.get() is None
+    assert load_runs(db)[0].empty
+
+
+def test_failed_run_is_recorded(db):
+    with pytest.raises(ValueError), etl_runs.track_run(db, ETLJob.WORD_STATS), etl_runs.stage("ngrams"):
+        raise ValueError("broken ngrams")
+
+    runs_df, stages_df = load_runs(db)
+    assert runs_df["status"].tolist() == ["failed"]
+    assert stages_df["stage"].tolist() == ["ngrams"]
+
+
+def test_locked_run_is_recorded(db, monkeypatch, tmp_path):
+    lock_path = tmp_path / "chat_etl.lock"
+    lock_path.write_text(str(os.getppid()))
+    monkeypatch.setattr("src.stats.utils.CHAT_ETL_LOCK_PATH", lock_path)
+
+    class ETL:
+        def __init__(self, db):
+            self.db = db
+
+        @etl_runs.recorded_run(ETLJob.CHAT_ETL)
+        @stats_utils.chat_etl_lock_decorator
+        def update(self):
+            raise AssertionError("a locked ETL shouldn't run")
+
+    ETL(db).update()
+
+    assert load_runs(db)[0]["status"].tolist() == [ETLRunStatus.LOCKED.value]
+
+
+def test_old_runs_are_pruned(db):
+    old_started_at = (datetime.now(UTC) - timedelta(days=ETL_RUNS_RETENTION_DAYS + 1)).isoformat()
+    db.insert_etl_run(("chat_etl", old_started_at, 1.0, 0.0, "success"), [("download", 1.0, 10, 0)])
+
+    run_id = db.insert_etl_run(("chat_etl", datetime.now(UTC).isoformat(), 2.0, 0.0, "success"), [("download", 2.0, 20, 0)])
+
+    runs_df, stages_df = db.load_etl_runs(datetime.now(UTC) - timedelta(days=ETL_RUNS_RETENTION_DAYS + 2))
+    assert runs_df["run_id"].tolist() == [run_id]
+    assert stages_df["run_id"].tolist() == [run_id]
+
+
+def test_stage_percentiles_and_recent_runs():
+    runs_df = pd.DataFrame(
+        {
+            "run_id": [1, 2, 3, 4],
+            "job": ["chat_etl", "chat_etl", "chat_etl", "word_stats"],
+            "started_at": [datetime(2025, 1, 1, hour, tzinfo=UTC).isoformat() for hour in range(4)],
+            "duration_seconds": [10.0, 20.0, 99.0, 5.0],
+            "lock_wait_seconds": [0.0, 1.0, 0.0, 0.0],
+            "status": ["success", "success", "failed", "success"],
+        }
+    )
+    stages_df = pd.DataFrame(
+        [
+            (1, "download", 4.0, 100, 1_000_000),
+            (2, "download", 8.0, 200, 3_000_000),
+            (3, "download", 90.0, 0, 0),
+            (4, "ngrams", 3.0, 50, 0),
+        ],
+        columns=["run_id", "stage", "duration_seconds", "row_count", "bytes_downloaded"],
+    )
+
+    percentiles_df = etl_runs.get_stage_percentiles(runs_df, stages_df)
+
+    assert percentiles_df.loc[("chat_etl", "download"), ["p50", "max", "runs", "rows", "mb"]].tolist() == [6.0, 8.0, 2, 150, 2.0]
+    assert percentiles_df.loc[("chat_etl", "total"), "p50"] == 15.0
+    assert percentiles_df.loc[("chat_etl", "lock_wait"), "max"] == 1.0
+    assert percentiles_df.loc[("word_stats", "ngrams"), "p99"] == 3.0
+
+    recent_runs_df = etl_runs.get_recent_runs(runs_df, stages_df, limit=2)
+    assert recent_runs_df.index.tolist() == [4, 3]
+    assert recent_runs_df[["status", "total", "download", "ngrams"]].fillna(0).values.tolist() == [
+        ["success", 5.0, 0, 3.0],
+        ["failed", 99.0, 90.0, 0],
+    ]
+    assert recent_runs_df.at[4, "started_at"] == "2025-01-01 04:00"
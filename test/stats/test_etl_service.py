@@ -0,0 +1,366 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pandas as pd
+import pytest
+from telethon import utils
+from telethon.tl.types import PeerChannel
+
+from src.config.constants import ETL_FULL_VALIDATION_INTERVAL_HOURS, ETL_SERVICE_DAYS, ETL_SERVICE_SWEEP_DAYS
+from src.config.enums import MessageType
+from src.stats import etl_runs
+from src.stats.etl_service import ETLService, ETLStage, StageGraph, has_new_data
+
+
+def make_message(message_id, text="hello", edit_date=None):
+    return SimpleNamespace(id=message_id, text=text, edit_date=edit_date, reactions=None, get_sender=AsyncMock())
+
+
+@pytest.fixture(autouse=True)
+def lock_path(monkeypatch, tmp_path):
+    path = tmp_path / "chat_etl.lock"
+    monkeypatch.setattr("src.stats.utils.CHAT_ETL_LOCK_PATH", path)
+    return path
+
+
+@pytest.fixture()
+def service():
+    chat_etl = MagicMock()
+    chat_etl.client_api_handler.fetch_chat_history = AsyncMock(return_value=([], []))
+    chat_etl.client_api_handler.fetch_reactions = AsyncMock(return_value={})
+    chat_etl.client_api_handler.fetch_messages = AsyncMock(return_value=[])
+    chat_etl.client_api_handler.get_message_types = AsyncMock(side_effect=lambda messages: [MessageType.TEXT] * len(messages))
+    chat_etl.get_message_ids_for_reaction_api_update.return_value = []
+    chat_etl.build_chat_history_df.side_effect = lambda messages, *_: pd.DataFrame({"message_id": [message.id for message in messages]})
+    chat_etl.clean_chat_history.side_effect = lambda chat_df, mode: chat_df
+    return ETLService(MagicMock(), chat_etl, MagicMock())
+
+
+def set_messages(service, messages):
+    service.client_api_handler.fetch_chat_history.return_value = (messages, [MessageType.TEXT] * len(messages))
+
+
+@pytest.mark.parametrize(
+    "output, expected",
+    [(None, False), ([], False), (pd.DataFrame(), False), ([1], True), (pd.DataFrame({"a": [1]}), True), (3, True)],
+)
+def test_has_new_data(output, expected):
+    assert has_new_data(output) == expected
+
+
+@pytest.mark.asyncio
+async def test_stage_graph_skips_stages_without_new_upstream_data():
+    calls = []
+
+    async def extract(days):
+        calls.append("extract")
+        return list(range(days))
+
+    def transform(rows):
+        calls.append("transform")
+        return []
+
+    graph = StageGraph(
+        [
+            ETLStage("extract", extract, ("days",)),
+            ETLStage("transform", transform, ("extract",)),
+            ETLStage("load", lambda rows: calls.append("load"), ("transform",)),
+        ],
+        inputs=("days",),
+    )
+
+    outputs = await graph.run(days=2)
+
+    assert calls == ["extract", "transform"]
+    assert outputs == {"days": 2, "extract": [0, 1], "transform": []}
+
+
+@pytest.mark.asyncio
+async def test_stage_graph_does_not_run_stages_passed_in():
+    graph = StageGraph([ETLStage("extract", lambda: [1]), ETLStage("transform", lambda rows: [row * 2 for row in rows], ("extract",))])
+
+    assert await graph.run(extract=[5]) == {"extract": [5], "transform": [10]}
+
+
+def test_stage_graph_rejects_unknown_dependencies():
+    with pytest.raises(ValueError):
+        StageGraph([ETLStage("load", print, ("transform",)), ETLStage("transform", print)])
+
+
+@pytest.mark.asyncio
+async def test_cycle_processes_only_new_or_changed_messages(service):
+    set_messages(service, [make_message(1), make_message(2)])
+    await service.run_cycle(ETL_SERVICE_DAYS)
+    assert service.chat_etl.save_chat_history.call_args.args[0]["message_id"].tolist() == [1, 2]
+    service.word_stats.update_ngrams.assert_called_once()
+    service.chat_etl.generate_reactions_df.assert_called_once()
+
+    set_messages(service, [make_message(1), make_message(2, text="edited"), make_message(3)])
+    await service.run_cycle(ETL_SERVICE_DAYS)
+    assert service.chat_etl.save_chat_history.call_args.args[0]["message_id"].tolist() == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_cycle_without_changes_stops_after_download(service):
+    set_messages(service, [make_message(1)])
+    await service.run_cycle(ETL_SERVICE_DAYS)
+    service.chat_etl.reset_mock()
+
+    await service.run_cycle(ETL_SERVICE_DAYS)
+
+    service.chat_etl.build_chat_history_df.assert_not_called()
+    service.chat_etl.clean_chat_history.assert_not_called()
+    assert service.word_stats.update_ngrams.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_cycle_retries_messages(service, lock_path):
+    set_messages(service, [make_message(1)])
+    service.chat_etl.save_chat_history.side_effect = [RuntimeError("db is locked"), None]
+
+    assert await service.run_cycle(ETL_SERVICE_DAYS) is None
+    assert not lock_path.exists()
+    await service.run_cycle(ETL_SERVICE_DAYS)
+
+    assert service.chat_etl.save_chat_history.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cycle_is_skipped_while_a_manual_run_holds_the_lock(service, lock_path):
+    lock_path.write_text(str(os.getppid()))  # a manual run is a different live process
+
+    assert await service.run_cycle(ETL_SERVICE_DAYS) is None
+
+    service.client_api_handler.fetch_chat_history.assert_not_called()
+    assert lock_path.exists()
+    assert service.db.insert_etl_run.call_args.args[0][4] == "locked"
+
+
+@pytest.mark.asyncio
+async def test_cycle_is_recorded_with_its_stages(service):
+    set_messages(service, [make_message(1)])
+
+    def clean_chat_history(chat_df, mode):
+        with etl_runs.stage("cleaning"):
+            return chat_df
+
+    service.chat_etl.clean_chat_history.side_effect = clean_chat_history
+
+    await service.run_cycle(ETL_SERVICE_DAYS)
+
+    run_row, stage_rows = service.db.insert_etl_run.call_args.args
+    assert run_row[0] == "etl_cycle" and run_row[4] == "success"
+    assert [stage_row[0] for stage_row in stage_rows] == [
+        "graph.chat_download",
+        "graph.reactions",
+        "graph.cleaning",
+        "cleaning",
+        "graph.ngrams",
+        "graph.aggregates",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_event_batch_is_recorded_with_its_refetch(service):
+    async def get_message_types(messages):
+        with etl_runs.stage("media_download"):
+            return [MessageType.TEXT] * len(messages)
+
+    service.client_api_handler.get_message_types.side_effect = get_message_types
+    await service.on_message(SimpleNamespace(message=make_message(1)))
+
+    await service.process_event_batch()
+
+    service.db.insert_etl_run.assert_called_once()
+    run_row, stage_rows = service.db.insert_etl_run.call_args.args
+    assert run_row[0] == "etl_events" and run_row[4] == "success"
+    assert [stage_row[0] for stage_row in stage_rows] == [
+        "graph.chat_download",
+        "media_download",
+        "graph.reactions",
+        "graph.cleaning",
+        "graph.ngrams",
+        "graph.aggregates",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_event_batch_refetch_is_recorded_as_failed(service):
+    await service.on_message(SimpleNamespace(message=make_message(1)))
+    service.client_api_handler.get_message_types.side_effect = ConnectionError("telegram is down")
+
+    with pytest.raises(ConnectionError):
+        await service.process_event_batch()
+
+    run_row, _ = service.db.insert_etl_run.call_args.args
+    assert run_row[0] == "etl_events" and run_row[4] == "failed"
+
+
+def test_first_cycle_is_a_sweep(service):
+    assert service.get_cycle_days() == ETL_SERVICE_SWEEP_DAYS
+    assert service.get_cycle_days() == ETL_SERVICE_DAYS
+
+
+@pytest.mark.asyncio
+async def test_event_batch_runs_new_edited_and_deleted_messages(service):
+    await service.on_message(SimpleNamespace(message=make_message(1)))
+    await service.on_message(SimpleNamespace(message=make_message(2)))
+    await service.on_message(SimpleNamespace(message=make_message(2, text="edited")))
+    await service.on_message_deleted(SimpleNamespace(deleted_ids=[1, 7]))
+
+    await service.process_event_batch()
+
+    service.client_api_handler.fetch_chat_history.assert_not_called()
+    assert service.chat_etl.save_chat_history.call_args.args[0]["message_id"].tolist() == [2]
+    service.db.delete_messages.assert_called_once_with([1, 7])
+    service.word_stats.delete_ngrams.assert_called_once_with([1, 7])
+    assert service.message_fingerprints.keys() == {2}
+    assert not service.event_messages and not service.event_deleted_message_ids
+
+
+@pytest.mark.asyncio
+async def test_event_batch_refetches_messages_with_updated_reactions(service, monkeypatch):
+    monkeypatch.setattr("src.stats.etl_service.CHAT_ID", utils.get_peer_id(PeerChannel(123)))
+    service.client_api_handler.fetch_messages.return_value = [make_message(5)]
+
+    await service.on_reactions_update(SimpleNamespace(peer=PeerChannel(123), msg_id=5))
+    await service.on_reactions_update(SimpleNamespace(peer=PeerChannel(456), msg_id=6))
+    await service.process_event_batch()
+
+    service.client_api_handler.fetch_messages.assert_awaited_once_with([5])
+    assert service.chat_etl.save_chat_history.call_args.args[0]["message_id"].tolist() == [5]
+
+
+@pytest.mark.asyncio
+async def test_event_batch_is_kept_while_a_manual_run_holds_the_lock(service, lock_path):
+    await service.on_message(SimpleNamespace(message=make_message(1)))
+    lock_path.write_text(str(os.getppid()))  # a manual run is a different live process
+
+    assert await service.process_event_batch() is None
+    assert service.event_messages.keys() == {1}
+
+    lock_path.unlink()
+    await service.process_event_batch()
+    assert service.chat_etl.save_chat_history.call_args.args[0]["message_id"].tolist() == [1]
+
+
+@pytest.mark.asyncio
+async def test_failed_event_batch_keeps_its_events(service, monkeypatch):
+    monkeypatch.setattr("src.stats.etl_service.CHAT_ID", utils.get_peer_id(PeerChannel(123)))
+    await service.on_message(SimpleNamespace(message=make_message(1)))
+    await service.on_message_deleted(SimpleNamespace(deleted_ids=[7]))
+    await service.on_reactions_update(SimpleNamespace(peer=PeerChannel(123), msg_id=5))
+    service.client_api_handler.fetch_messages.side_effect = ConnectionError("telegram is down")
+
+    with pytest.raises(ConnectionError):
+        await service.process_event_batch()
+
+    assert service.event_messages.keys() == {1}
+    assert service.event_reaction_message_ids == {5}
+    assert service.event_deleted_message_ids == {7}
+    service.db.delete_messages.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_event_batches_survive_a_failed_batch(service, monkeypatch):
+    monkeypatch.setattr("src.stats.etl_service.ETL_EVENT_BATCH_SECONDS", 0)
+    service.process_event_batch = AsyncMock(side_effect=[RuntimeError("boom"), None, asyncio.CancelledError()])
+
+    with pytest.raises(asyncio.CancelledError):
+        await service.run_event_batches()
+
+    assert service.process_event_batch.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_dead_event_batches_task_is_restarted(service):
+    service.run_event_batches = AsyncMock(side_effect=[SystemError("boom"), None])
+
+    service.start_event_batches()
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+    assert service.run_event_batches.await_count == 2
+    assert service.event_batches_task.done()
+
+
+@pytest.mark.asyncio
+async def test_deleted_messages_are_dropped_from_the_ngrams_backlog(service):
+    for message_ids in [[1], [2, 3]]:  # the first batch updates the ngrams, the second is kept in the backlog
+        for message_id in message_ids:
+            await service.on_message(SimpleNamespace(message=make_message(message_id)))
+        await service.process_event_batch()
+
+    await service.on_message_deleted(SimpleNamespace(deleted_ids=[2]))
+    await service.process_event_batch()
+
+    assert [backlog_df["message_id"].tolist() for backlog_df in service.ngrams_backlog] == [[3]]
+
+
+def test_failed_ngrams_update_keeps_the_backlog(service):
+    service.ngrams_backlog = [pd.DataFrame({"message_id": [1]})]
+    service.word_stats.update_ngrams.side_effect = OSError("disk full")
+
+    with pytest.raises(OSError):
+        service.update_ngrams(force=True)
+
+    assert service.ngrams_backlog[0]["message_id"].tolist() == [1]
+
+
+@pytest.mark.asyncio
+async def test_polling_after_events_skips_processed_messages(service):
+    await service.on_message(SimpleNamespace(message=make_message(1)))
+    await service.process_event_batch()
+    service.chat_etl.reset_mock()
+
+    set_messages(service, [make_message(1)])
+    await service.run_cycle(ETL_SERVICE_DAYS)
+
+    service.chat_etl.build_chat_history_df.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ngrams_are_batched_in_realtime_mode(service):
+    for message_id in [1, 2]:
+        await service.on_message(SimpleNamespace(message=make_message(message_id)))
+        await service.process_event_batch()
+
+    assert service.word_stats.update_ngrams.call_count == 1
+    assert len(service.ngrams_backlog) == 1
+
+
+@pytest.mark.asyncio
+async def test_event_batches_record_the_ngrams_backlog_merge(service, monkeypatch):
+    monkeypatch.setattr("src.stats.etl_service.ETL_EVENT_BATCH_SECONDS", 0)
+    service.last_ngrams_update_time = 0.0  # the interval has passed
+    service.ngrams_backlog = [pd.DataFrame({"message_id": [1]})]
+
+    def update_ngrams(backlog_df):
+        with etl_runs.stage("parquet_write"):
+            pass
+
+    service.word_stats.update_ngrams.side_effect = update_ngrams
+    service.process_event_batch = AsyncMock(side_effect=[None, None, asyncio.CancelledError()])
+
+    with pytest.raises(asyncio.CancelledError):
+        await service.run_event_batches()
+
+    service.db.insert_etl_run.assert_called_once()  # the second batch had no backlog to merge
+    run_row, stage_rows = service.db.insert_etl_run.call_args.args
+    assert run_row[0] == "word_stats" and run_row[4] == "success"
+    assert [stage_row[0] for stage_row in stage_rows] == ["parquet_write"]
+    assert not service.ngrams_backlog
+
+
+def test_validation_is_incremental_between_full_sweeps(service, monkeypatch):
+    dt_now = pd.Timestamp("2025-01-01 12:00", tz="UTC")
+    monkeypatch.setattr("src.stats.etl_service.core_utils.get_dt_now", lambda: dt_now)
+    assert service.get_validation_since_dt() is None
+
+    previous_dt, dt_now = dt_now, dt_now + pd.Timedelta(minutes=5)
+    assert service.get_validation_since_dt() == previous_dt
+
+    dt_now += pd.Timedelta(hours=ETL_FULL_VALIDATION_INTERVAL_HOURS)
+    assert service.get_validation_since_dt() is None
@@ -0,0 +1,83 @@
+import re
+
+import pandas as pd
+import pytest
+
+from src.config.constants import TIMEZONE
+from src.stats import utils as stats_utils
+from src.stats.message_features import (
+    add_message_features,
+    ensure_message_features,
+    fold_text,
+    get_text_filter,
+    local_day_to_period,
+    to_local_day,
+)
+
+
+def make_chat_df(texts, timestamps=None):
+    timestamps = timestamps or ["2025-01-01 12:00"] * len(texts)
+    return pd.DataFrame(
+        {"text": texts, "timestamp": pd.to_datetime(timestamps).tz_localize(TIMEZONE).astype(f"datetime64[ns, {TIMEZONE}]")}
+    )
+
+
+def test_text_features_match_the_row_wise_versions():
+    texts = ["Zażółć gęślą jaźń", "  dwa   słowa ", "", None, "patrz https://youtu.be/abc 😂😂", "www.onet.pl 👍 ❤"]
+    df = add_message_features(make_chat_df(texts))
+
+    assert df["word_count"].tolist() == [len(str(text).split()) if text is not None else 0 for text in texts]
+    assert df["word_length"].tolist() == [stats_utils.text_to_word_length_sum(text) if text is not None else 0 for text in texts]
+    assert df["char_length"].tolist() == [17, 14, 0, 0, 29, 15]
+    assert df["emoji_count"].tolist() == [0, 0, 0, 0, 2, 2]
+    assert df["has_link"].tolist() == [False, False, False, False, True, True]
+    assert df["text_folded"].tolist()[:3] == ["zazolc gesla jazn", "  dwa   slowa ", ""]
+    assert pd.isna(df["text_folded"].iloc[3])
+
+
+def test_local_day_and_hour_are_in_the_local_timezone():
+    df = make_chat_df(["a", "b"], ["2025-01-01 00:30", "2025-06-30 23:59"])
+    df["timestamp"] = df["timestamp"].dt.tz_convert("UTC")
+
+    df = add_message_features(df)
+
+    assert df["local_hour"].tolist() == [0, 23]
+    assert df["local_day"].tolist() == [
+        to_local_day(pd.Timestamp("2025-01-01")),
+        to_local_day(pd.Timestamp("2025-06-30 23:59", tz=TIMEZONE)),
+    ]
+    assert local_day_to_period(df["local_day"]).tolist() == [pd.Period("2025-01-01", "D"), pd.Period("2025-06-30", "D")]
+
+
+def test_fold_text_matches_text_folded():
+    assert fold_text("ŻÓŁW") == add_message_features(make_chat_df(["ŻÓŁW"]))["text_folded"].iloc[0] == "zolw"
+
+
+@pytest.mark.parametrize(
+    "phrase, expected_filter",
+    [
+        pytest.param("Gęś", ("text_folded", "ges", 0), id="diacritics_folded"),
+        pytest.param("łódź", ("text_folded", "lodz", 0), id="undecomposed_letter_folded"),
+        pytest.param("😂", ("text", "😂", re.IGNORECASE), id="emoji_kept"),
+        pytest.param("gęś 😂", ("text", "gęś 😂", re.IGNORECASE), id="mixed_phrase_kept"),
+        pytest.param("привет", ("text", "привет", re.IGNORECASE), id="other_script_kept"),
+    ],
+)
+def test_get_text_filter(phrase, expected_filter):
+    assert get_text_filter(phrase) == expected_filter
+
+
+def test_emoji_text_filter_matches_only_messages_with_the_emoji():
+    df = add_message_features(make_chat_df(["haha 😂", "nic śmiesznego", "😂😂"]))
+
+    column, pattern, flags = get_text_filter("😂")
+
+    assert df[column].str.contains(pattern, flags=flags).tolist() == [True, False, True]
+
+
+def test_ensure_message_features_fills_only_missing_features():
+    df = add_message_features(make_chat_df(["raz dwa"]))
+    assert ensure_message_features(df) is df
+
+    df.loc[0, "word_count"] = None
+    assert ensure_message_features(df)["word_count"].tolist() == [2]
@@ -0,0 +1,113 @@
+import pandas as pd
+import pandera.pandas as pa
+import pytest
+
+from src.config.constants import TIMEZONE
+from src.models.schemas import cleaned_chat_history_schema, reactions_schema, users_schema
+from src.stats.schema_checks import check_schema, get_failure_cases
+
+
+def make_reactions_df(**columns):
+    df = pd.DataFrame(
+        {
+            "message_id": [1, 2, 3],
+            "timestamp": pd.to_datetime(["2025-01-01", "2025-01-02", "2025-01-03"], utc=True).tz_convert(TIMEZONE),
+            "reacted_to_username": ["ferdek", "boczek", "ferdek"],
+            "reacting_username": ["boczek", "ferdek", "marian"],
+            "text": ["siema", None, "co tam"],
+            "emoji": ["👍", "😂", "🔥"],
+        }
+    )
+    df["timestamp"] = df["timestamp"].astype(f"datetime64[ns, {TIMEZONE}]")
+    for name, values in columns.items():
+        df[name] = values
+    return df
+
+
+def make_users_df():
+    return pd.DataFrame(
+        {
+            "first_name": ["Ferdynand", "Marian"],
+            "last_name": ["Kiepski", None],
+            "username": ["ferdek", None],
+            "final_username": ["ferdek", "Marian"],
+            "nicknames": [[], ["Paździoch"]],
+        },
+        index=pd.Index([1, 2], name="user_id"),
+    )
+
+
+def get_pandera_failure_cases(df, schema) -> pd.DataFrame:
+    try:
+        schema.validate(df, lazy=True)
+    except pa.errors.SchemaErrors as e:
+        return e.failure_cases
+    return pd.DataFrame(columns=["schema_context", "column", "check", "check_number", "failure_case", "index"])
+
+
+def to_comparable(failure_cases: pd.DataFrame) -> set[tuple]:
+    return {
+        (
+            row.schema_context,
+            row.column,
+            row.check,
+            None if pd.isna(row.check_number) else int(row.check_number),
+            str(row.failure_case),
+            str(row.index),
+        )
+        for row in failure_cases.itertuples()
+    }
+
+
+@pytest.mark.parametrize(
+    "df",
+    [
+        make_reactions_df(),
+        make_reactions_df(emoji=["👍", None, None]),
+        make_reactions_df(reacting_username=["boczek", 3, None]),
+        make_reactions_df(message_id=[0, -5, 3]),
+        make_reactions_df(timestamp=pd.to_datetime(["2025-01-01", "2025-01-02", "2025-01-03"])),
+        make_reactions_df().drop(columns=["emoji"]),
+    ],
+    ids=["valid", "nulls", "mixed_types", "range", "dtype", "missing_column"],
+)
+def test_failure_cases_match_pandera(df):
+    assert to_comparable(get_failure_cases(df, reactions_schema)) == to_comparable(get_pandera_failure_cases(df, reactions_schema))
+
+
+def test_index_failure_cases_match_pandera():
+    users_df = make_users_df()
+    users_df.index = users_df.index.astype(str)
+
+    failure_cases = get_failure_cases(users_df, users_schema)
+
+    assert failure_cases["schema_context"].tolist() == ["Index"]
+    assert to_comparable(failure_cases) == to_comparable(get_pandera_failure_cases(users_df, users_schema))
+
+
+def test_custom_checks_fall_back_to_pandera():
+    schema = pa.DataFrameSchema({"value": pa.Column(int, pa.Check(lambda series: series % 2 == 0, error="is_even"))})
+    df = pd.DataFrame({"value": [2, 3, 4, 5]})
+
+    assert to_comparable(get_failure_cases(df, schema)) == to_comparable(get_pandera_failure_cases(df, schema))
+
+
+def test_check_schema_passes_valid_dfs():
+    check_schema(make_reactions_df(), reactions_schema)
+    check_schema(make_users_df(), users_schema)
+    check_schema(pd.DataFrame(), cleaned_chat_history_schema)
+
+
+@pytest.mark.parametrize(
+    "df",
+    [make_reactions_df(reacted_to_username=["ferdek", None, "marian"]), make_reactions_df(message_id=[1, 0, 3])],
+    ids=["nulls", "range"],
+)
+def test_check_schema_raises_the_pandera_error(df):
+    with pytest.raises(pa.errors.SchemaError) as pandera_error:
+        reactions_schema(df)
+
+    with pytest.raises(pa.errors.SchemaError) as error:
+        check_schema(df, reactions_schema)
+
+    assert str(error.value) == str(pandera_error.value)
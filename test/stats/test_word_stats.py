@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from src.config.constants import TIMEZONE
+from src.models.command_args import CommandArgs
+from src.stats.word_stats import WordStats
+
+
+@pytest.fixture()
+def word_stats(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.stats.word_stats.CHAT_WORD_STATS_DIR_PATH", tmp_path / "word_stats")
+    word_stats = WordStats(MagicMock(), MagicMock())
+    word_stats.ngram_dfs = {
+        1: pd.DataFrame(
+            {
+                "timestamp": pd.Timestamp("2025-01-01 12:00", tz=TIMEZONE),
+                "final_username": ["ferdek", "boczek", "ferdek"],
+                "message_id": [1, 2, 3],
+                "ngram_id": [1, 1, 1],
+                "ngrams": ["piwo", "kiełbasa", "piwo"],
+                "topic_id": pd.array([1, 5, pd.NA], dtype="Int64"),
+            }
+        )
+    }
+    return word_stats
+
+
+def test_get_ngram_dfs_partitions_by_topic_once(word_stats):
+    topic_ngram_dfs = word_stats.get_ngram_dfs(5)
+
+    assert topic_ngram_dfs[1]["message_id"].tolist() == [2]
+    assert word_stats.get_ngram_dfs(5) is topic_ngram_dfs
+    assert word_stats.get_ngram_dfs(None) is word_stats.ngram_dfs
+
+
+def test_filter_ngrams_by_topic(word_stats):
+    filtered_ngram_dfs = word_stats.filter_ngrams(CommandArgs(topic_id=1))
+
+    assert filtered_ngram_dfs[1]["ngrams"].tolist() == ["piwo"]
+
+
+def test_filter_ngrams_reports_an_invalid_regex(word_stats):
+    command_args = CommandArgs()
+
+    assert word_stats.filter_ngrams(command_args, text_filter="[piwo") == {}
+    assert command_args.error.startswith("[piwo - ")
+
+
+def test_update_ngram_resets_the_topic_partitions(word_stats):
+    word_stats.get_ngram_dfs(1)
+    latest_df = word_stats.ngram_dfs[1].head(1).assign(message_id=4)
+
+    word_stats.update_ngram(1, latest_df)
+
+    assert word_stats.get_ngram_dfs(1)[1]["message_id"].tolist() == [1, 4]
+
+
+def test_delete_ngrams_of_deleted_messages(word_stats, monkeypatch, tmp_path):
+    monkeypatch.setattr("src.stats.word_stats.WORD_STATS_UPDATE_LOCK_PATH", tmp_path / "word_stats" / "update.lock")
+    word_stats.get_ngram_dfs(1)
+
+    word_stats.delete_ngrams([1, 7])
+
+    assert word_stats.ngram_dfs[1]["message_id"].tolist() == [2, 3]
+    assert pd.read_parquet(word_stats.get_ngram_path(1))["message_id"].tolist() == [2, 3]
+    assert word_stats.get_ngram_dfs(1)[1].empty